@@ -0,0 +1,13 @@
+"""
+Offline benchmark suite for CedarPy hot paths (python -m benchmarks; see runner.py for usage).
+"""
+
+from .runner import (  # noqa: F401
+    BENCHMARKS,
+    BenchmarkSkipped,
+    benchmark,
+    compare_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
@@ -0,0 +1,147 @@
+"""
+Synthetic data generators for the benchmark suite.
+
+Everything here is deterministic for a given seed and needs only the standard library, so
+benchmark inputs can be regenerated offline on any machine instead of being checked in.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+WORDS = (
+    "cedar sample assay protein gene expression cohort baseline control variance signal noise model "
+    "estimate regression cluster survey response latency throughput branch merge dataset table column "
+    "value measure trial dose outcome region market revenue forecast season weather station reading"
+).split()
+
+
+def synthetic_text(words: int, seed: int = 0) -> str:
+    """Prose-like text: sentences of 8-20 words, paragraphs of 4-8 sentences."""
+    rng = random.Random(seed)
+    paragraphs: List[str] = []
+    sentences: List[str] = []
+    n = 0
+    while n < words:
+        k = min(rng.randint(8, 20), words - n)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(k))
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        n += k
+        if len(sentences) >= rng.randint(4, 8):
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def csv_rows(rows: int, seed: int = 0) -> List[List[Any]]:
+    rng = random.Random(seed)
+    out: List[List[Any]] = [["id", "site", "date", "measure", "value", "weight", "flag", "note"]]
+    for i in range(rows):
+        out.append([
+            i + 1,
+            rng.choice(("north", "south", "east", "west")),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.choice(WORDS),
+            round(rng.gauss(100, 15), 3),
+            rng.randint(1, 1000),
+            rng.random() < 0.1,
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))),
+        ])
+    return out
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(csv_rows(rows, seed))
+    return path
+
+
+def json_records(records: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{
+        "id": i + 1,
+        "name": f"{rng.choice(WORDS)}-{i}",
+        "tags": rng.sample(WORDS, 3),
+        "metrics": {"value": round(rng.random() * 1000, 4), "count": rng.randint(0, 500)},
+        "active": rng.random() < 0.5,
+        "children": [{"k": rng.choice(WORDS), "v": rng.randint(0, 9)} for _ in range(rng.randint(0, 3))],
+    } for i in range(records)]
+
+
+def write_json(path: str, records: int, seed: int = 0) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(json_records(records, seed), f)
+    return path
+
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_bytes(pages: int, words_per_page: int = 300, seed: int = 0) -> bytes:
+    """A minimal, valid PDF (catalog, page tree, Helvetica, one text stream per page) with a correct xref table.
+
+    Written by hand so no PDF library is needed to produce benchmark inputs.
+    """
+    objects: List[bytes] = []
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i in range(pages):
+        words = synthetic_text(words_per_page, seed=seed + i).replace("\n\n", " ").split()
+        lines = [" ".join(words[j:j + 12]) for j in range(0, len(words), 12)]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td"] + [f"({_pdf_escape(line)}) '" for line in lines] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def write_pdf(path: str, pages: int, seed: int = 0) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(pdf_bytes(pages, seed=seed))
+    return path
+
+
+def thread_messages(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Chat history in the shapes collect_code_items looks for: tool payloads, fenced code, JSON plans, prose."""
+    rng = random.Random(seed)
+    out: List[Dict[str, Any]] = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            out.append({"role": "user", "content": synthetic_text(rng.randint(8, 30), seed + i)})
+        elif kind == 1:
+            out.append({"role": "assistant", "display_title": "Tool: code", "content": "ran code",
+                        "payload_json": {"args": {"language": "python", "source": f"print(sum(range({i})))"},
+                                         "result": {"ok": True, "stdout": str(i)}}})
+        elif kind == 2:
+            out.append({"role": "assistant", "display_title": "Tool: sql", "content": "ran sql",
+                        "payload_json": {"args": {"sql": f"SELECT site, avg(value) FROM data_{i % 7} GROUP BY site"},
+                                         "result": {"ok": True, "rows": [[1]]}}})
+        elif kind == 3:
+            out.append({"role": "assistant", "content": f"Here is the analysis:\n```python\nimport math\nprint(math.sqrt({i}))\n```\n"
+                                                         + synthetic_text(40, seed + i)})
+        else:
+            out.append({"role": "assistant", "content": json.dumps({"plan": [{"step": s, "tool": "code"} for s in range(3)]})})
+    return out
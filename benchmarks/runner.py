@@ -0,0 +1,367 @@
+"""
+Benchmark runner: registry, timing, JSON results and baseline comparison.
+
+A benchmark is a function registered with @benchmark. It receives a Context plus its size
+parameters (the "quick" or "full" set), builds its synthetic inputs, and returns
+ctx.measure(fn, ...). That call runs warmup + timed repeats and reduces them to
+median/p95/min/max/mean in milliseconds. Setup passed to measure() is not timed. When the
+timed function returns a dict of numbers, the per-repeat medians are reported under
+"metrics", for example time-to-first-event for websocket chat. A benchmark that cannot run
+here raises BenchmarkSkipped(reason), for example when an optional dependency is missing or a
+route is not registered. It is then recorded as skipped rather than failing the run.
+
+Results file (JSON):
+  {"version": 1, "mode": "quick", "created_at": ..., "python": ..., "platform": ..., "commit": ...,
+   "results": {name: {"status": "ok" | "skipped" | "error", "params": {...}, "repeat": n,
+                      "median_ms": ..., "p95_ms": ..., "min_ms": ..., "max_ms": ..., "mean_ms": ...,
+                      "metrics": {...}, "info": {...}, "threshold_pct": ..., "reason"/"error": ...}}}
+
+Comparison
+  compare_results(baseline, current) flags a benchmark as regressed when its median grows by
+  more than its threshold percentage AND by at least min_delta_ms. The absolute floor stops
+  sub-millisecond benchmarks from tripping on noise. The threshold for a benchmark comes from
+  (in order): a per-name override, a global --threshold, or the benchmark's own default.
+  Benchmarks whose params differ between the two files (quick vs full) are reported as
+  "incomparable" and never fail the comparison. A benchmark that ran in the baseline but errors
+  now is reported as "broken" and fails it.
+
+Usage
+  python -m benchmarks list
+  python -m benchmarks run [--quick] [--only PATTERN ...] [--repeat N] [--out FILE]
+                           [--compare BASELINE] [--threshold PCT | NAME=PCT ...] [--data-dir DIR] [--keep]
+  python -m benchmarks compare BASELINE CURRENT [--threshold PCT | NAME=PCT ...]
+
+  run and compare exit with status 1 when any benchmark regressed or broke. Without --data-dir the
+  run uses a throwaway CEDARPY_DATA_DIR, so projects and caches never touch real user data.
+  It also runs in test mode with the fake LLM (see cedar_app/llm/fake_server.py), so
+  everything stays offline.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD_PCT = 25.0
+DEFAULT_MIN_DELTA_MS = 1.0
+
+
+class BenchmarkSkipped(Exception):
+    """Raised by a benchmark that cannot run in this environment; the message is the reason."""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    fn: Callable[..., Dict[str, Any]]
+    quick: Dict[str, Any]
+    full: Dict[str, Any]
+    threshold_pct: float = DEFAULT_THRESHOLD_PCT
+    repeat: int = 5
+    description: str = ""
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, *, quick: Dict[str, Any], full: Dict[str, Any], threshold_pct: float = DEFAULT_THRESHOLD_PCT,
+              repeat: int = 5):
+    """Register a benchmark function under `name` with its quick/full size parameters."""
+    def deco(fn):
+        BENCHMARKS[name] = Benchmark(name=name, fn=fn, quick=dict(quick), full=dict(full), threshold_pct=threshold_pct,
+                                     repeat=repeat, description=(fn.__doc__ or "").strip().splitlines()[0] if fn.__doc__ else "")
+        return fn
+    return deco
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    s = sorted(samples_ms)
+    return {
+        "median_ms": round(statistics.median(s), 3) if s else 0.0,
+        "p95_ms": round(_percentile(s, 95), 3),
+        "min_ms": round(s[0], 3) if s else 0.0,
+        "max_ms": round(s[-1], 3) if s else 0.0,
+        "mean_ms": round(statistics.fmean(s), 3) if s else 0.0,
+    }
+
+
+@dataclass
+class Context:
+    """Per-run state shared by benchmarks: scratch directory, repeat override and the lazily imported app."""
+    workdir: str
+    repeat: Optional[int] = None
+    _app: Any = field(default=None, repr=False)
+    _current: Optional[Benchmark] = field(default=None, repr=False)
+
+    def path(self, *parts: str) -> str:
+        p = os.path.join(self.workdir, *parts)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        return p
+
+    def app(self):
+        """(main module, TestClient) for benchmarks that go through the FastAPI app; imported on first use."""
+        if self._app is None:
+            from fastapi.testclient import TestClient
+            import main
+            self._app = (main, TestClient(main.app))
+        return self._app
+
+    def measure(self, fn: Callable[..., Any], *, setup: Optional[Callable[[], Any]] = None, repeat: Optional[int] = None,
+                warmup: int = 1, info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Time fn over warmup + repeat runs.
+
+        With setup, fn(setup()) is called and only fn is timed. If fn returns a dict, its numeric
+        values are collected per repeat and their medians reported under "metrics".
+        """
+        n = self.repeat or repeat or (self._current.repeat if self._current else 5)
+        samples: List[float] = []
+        metrics: Dict[str, List[float]] = {}
+        for i in range(warmup + n):
+            state = setup() if setup is not None else None
+            started = time.perf_counter()
+            out = fn(state) if setup is not None else fn()
+            elapsed = (time.perf_counter() - started) * 1000.0
+            if i < warmup:
+                continue
+            samples.append(elapsed)
+            if isinstance(out, dict):
+                for k, v in out.items():
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        metrics.setdefault(k, []).append(float(v))
+        result: Dict[str, Any] = {"repeat": n, **summarize(samples)}
+        if metrics:
+            result["metrics"] = {k: round(statistics.median(v), 3) for k, v in metrics.items()}
+        if info:
+            result["info"] = info
+        return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def select(only: Optional[List[str]] = None) -> List[Benchmark]:
+    """Benchmarks whose name matches any of the glob patterns (or contains the pattern), in registration order."""
+    _load_suite()
+    if not only:
+        return list(BENCHMARKS.values())
+    return [b for b in BENCHMARKS.values() if any(fnmatch.fnmatch(b.name, p) or p in b.name for p in only)]
+
+
+def _load_suite() -> None:
+    from . import suite  # noqa: F401  (registers the benchmarks)
+
+
+def run_benchmarks(only: Optional[List[str]] = None, mode: str = "full", repeat: Optional[int] = None,
+                   workdir: Optional[str] = None) -> Dict[str, Any]:
+    """Run the selected benchmarks and return the results document."""
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="cedar-bench-work-")
+    ctx = Context(workdir=workdir, repeat=repeat)
+    results: Dict[str, Any] = {}
+    try:
+        for b in select(only):
+            params = dict(b.quick if mode == "quick" else b.full)
+            ctx._current = b
+            entry: Dict[str, Any] = {"params": params, "threshold_pct": b.threshold_pct}
+            started = time.perf_counter()
+            try:
+                entry.update(b.fn(ctx, **params))
+                entry["status"] = "ok"
+            except BenchmarkSkipped as e:
+                entry.update({"status": "skipped", "reason": str(e)})
+            except Exception as e:
+                entry.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+            entry["wall_s"] = round(time.perf_counter() - started, 3)
+            results[b.name] = entry
+            print(f"[bench] {b.name}: {_describe(entry)}")
+    finally:
+        ctx._current = None
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": RESULTS_VERSION,
+        "mode": mode,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": _git_commit(),
+        "results": results,
+    }
+
+
+def _describe(entry: Dict[str, Any]) -> str:
+    if entry.get("status") == "ok":
+        return f"median {entry['median_ms']:.2f} ms, p95 {entry['p95_ms']:.2f} ms over {entry['repeat']}"
+    return f"{entry.get('status')}: {entry.get('reason') or entry.get('error')}"
+
+
+def save_results(doc: Dict[str, Any], path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    if not isinstance(doc, dict) or "results" not in doc:
+        raise ValueError(f"{path} is not a benchmark results file")
+    return doc
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: Optional[float] = None,
+                    thresholds: Optional[Dict[str, float]] = None, metric: str = "median_ms",
+                    min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> Dict[str, Any]:
+    """Compare two results documents; ok is False when any benchmark regressed past its threshold."""
+    base_results = baseline.get("results") or {}
+    cur_results = current.get("results") or {}
+    rows: List[Dict[str, Any]] = []
+    for name in list(base_results) + [n for n in cur_results if n not in base_results]:
+        b, c = base_results.get(name), cur_results.get(name)
+        row: Dict[str, Any] = {"name": name}
+        if b is None:
+            row["status"] = "new"
+        elif c is None:
+            row["status"] = "missing"
+        elif c.get("status") == "error" and b.get("status") == "ok":
+            row.update({"status": "broken", "error": c.get("error")})
+        elif b.get("status") != "ok" or c.get("status") != "ok":
+            row["status"] = c.get("status") if c.get("status") != "ok" else b.get("status")
+        elif (b.get("params") or {}) != (c.get("params") or {}):
+            row["status"] = "incomparable"
+        else:
+            pct = (thresholds or {}).get(name)
+            if pct is None:
+                pct = threshold_pct if threshold_pct is not None else float(c.get("threshold_pct") or DEFAULT_THRESHOLD_PCT)
+            before, after = float(b.get(metric) or 0.0), float(c.get(metric) or 0.0)
+            delta = after - before
+            change = (delta / before * 100.0) if before > 0 else 0.0
+            row.update({"before": before, "after": after, "delta_ms": round(delta, 3), "change_pct": round(change, 1),
+                        "threshold_pct": pct})
+            if change > pct and delta >= min_delta_ms:
+                row["status"] = "regressed"
+            elif change < -pct and -delta >= min_delta_ms:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return {"ok": not any(r["status"] in ("regressed", "broken") for r in rows), "metric": metric, "rows": rows}
+
+
+def format_comparison(cmp: Dict[str, Any]) -> str:
+    lines = [f"{'benchmark':40} {'before':>10} {'after':>10} {'change':>8} {'limit':>7}  status"]
+    for r in cmp["rows"]:
+        if "before" in r:
+            lines.append(f"{r['name']:40} {r['before']:>10.2f} {r['after']:>10.2f} {r['change_pct']:>7.1f}% "
+                         f"{r['threshold_pct']:>6.0f}%  {r['status']}")
+        else:
+            lines.append(f"{r['name']:40} {'':>10} {'':>10} {'':>8} {'':>7}  {r['status']}")
+    return "\n".join(lines)
+
+
+def _parse_thresholds(values: Optional[List[str]]):
+    """['30', 'view_project=50'] -> (30.0, {'view_project': 50.0})"""
+    global_pct: Optional[float] = None
+    per_name: Dict[str, float] = {}
+    for v in values or []:
+        if "=" in v:
+            name, pct = v.split("=", 1)
+            per_name[name.strip()] = float(pct)
+        else:
+            global_pct = float(v)
+    return global_pct, per_name
+
+
+def prepare_environment(data_dir: str) -> None:
+    """Point the app at an isolated data dir and keep every LLM call offline. Must run before main is imported."""
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["CEDARPY_DATA_DIR"] = data_dir
+    os.environ["CEDARPY_DATABASE_URL"] = f"sqlite:///{os.path.join(data_dir, 'cedarpy-registry.db')}"
+    os.environ.setdefault("CEDARPY_TEST_MODE", "1")
+    os.environ.setdefault("CEDARPY_FAKE_LLM", "1")
+    if not os.getenv("CEDARPY_FAKE_LLM_SCRIPT"):
+        from .suite import FAKE_LLM_RULES
+        path = os.path.join(data_dir, "fake-llm-script.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"rules": FAKE_LLM_RULES}, f)
+        os.environ["CEDARPY_FAKE_LLM_SCRIPT"] = path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline benchmarks for CedarPy hot paths")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    rp = sub.add_parser("run")
+    rp.add_argument("--quick", action="store_true", help="small inputs (seconds, not minutes)")
+    rp.add_argument("--only", nargs="+", help="glob patterns or substrings of benchmark names")
+    rp.add_argument("--repeat", type=int, help="override the timed repeat count of every benchmark")
+    rp.add_argument("--out", help="results JSON path (default bench-<mode>-<timestamp>.json)")
+    rp.add_argument("--compare", help="baseline results JSON to compare against")
+    rp.add_argument("--threshold", nargs="+", help="PCT for all benchmarks and/or NAME=PCT overrides")
+    rp.add_argument("--data-dir", help="CEDARPY_DATA_DIR for the run (default: a temporary directory)")
+    rp.add_argument("--keep", action="store_true", help="keep the temporary data dir")
+    cp = sub.add_parser("compare")
+    cp.add_argument("baseline")
+    cp.add_argument("current")
+    cp.add_argument("--threshold", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for b in select():
+            print(f"{b.name:32} threshold {b.threshold_pct:>4.0f}%  {b.description}")
+        return 0
+    if args.command == "compare":
+        global_pct, per_name = _parse_thresholds(args.threshold)
+        cmp = compare_results(load_results(args.baseline), load_results(args.current), global_pct, per_name)
+        print(format_comparison(cmp))
+        return 0 if cmp["ok"] else 1
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="cedar-bench-")
+    prepare_environment(data_dir)
+    mode = "quick" if args.quick else "full"
+    try:
+        doc = run_benchmarks(only=args.only, mode=mode, repeat=args.repeat)
+    finally:
+        if not args.data_dir and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    out = args.out or f"bench-{mode}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    print(f"[bench] results written to {save_results(doc, out)}")
+    if not args.compare:
+        return 0
+    global_pct, per_name = _parse_thresholds(args.threshold)
+    cmp = compare_results(load_results(args.compare), doc, global_pct, per_name)
+    print(format_comparison(cmp))
+    return 0 if cmp["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+"""
+The hot-path benchmarks. Each one builds its own synthetic inputs (see datagen.py) in a fresh
+project or scratch database, so benchmarks never depend on each other's state.
+
+Paths covered:
+  interpret_file.{csv,json,pdf}  file metadata extraction, artifact cache disabled (cold path)
+  chunk_document_insert          LangExtract chunking + doc_chunks/FTS5 inserts
+  retrieve_top_chunks            FTS5 BM25 retrieval over a seeded doc_chunks table
+  view_project                   GET /project/{id} with N files, threads and notes
+  collect_code_items             code extraction over N threads x M messages
+  merge_to_main                  POST /project/{id}/merge_to_main from a seeded branch
+  sql_with_undo.{update,insert}  _execute_sql_with_undo on a branch-aware table
+  tabular_import                 the LLM tabular importer (offline, fake LLM)
+  ws_chat                        one /ws/chat turn end to end against the fake LLM
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+from . import datagen
+from .runner import BenchmarkSkipped, Context, benchmark
+
+
+@contextmanager
+def _env(**values: str) -> Iterator[None]:
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+@contextmanager
+def _project_session(project_id: int):
+    from sqlalchemy.orm import sessionmaker
+    from cedar_app.db_utils import _get_project_engine
+    db = sessionmaker(bind=_get_project_engine(project_id), autoflush=False, autocommit=False, future=True)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _new_project(ctx: Context) -> Tuple[int, int]:
+    """Create a project through the app and return (project_id, main_branch_id)."""
+    from main_helpers import ensure_main_branch
+    _, client = ctx.app()
+    r = client.post("/projects/create", data={"title": f"bench-{uuid.uuid4().hex[:12]}"}, follow_redirects=False)
+    m = re.search(r"/project/(\d+)", r.headers.get("location", ""))
+    if not m:
+        raise RuntimeError(f"project creation failed: HTTP {r.status_code}")
+    project_id = int(m.group(1))
+    with _project_session(project_id) as db:
+        return project_id, ensure_main_branch(db, project_id).id
+
+
+def _new_branch(project_id: int, name: str) -> int:
+    from main_models import Branch
+    with _project_session(project_id) as db:
+        b = Branch(project_id=project_id, name=name, is_default=False)
+        db.add(b)
+        db.commit()
+        return b.id
+
+
+def _seed(project_id: int, branch_id: int, *, files: int = 0, threads: int = 0, messages: int = 0, notes: int = 0,
+          file_dir: str = "", prefix: str = "") -> None:
+    """Insert synthetic files, threads (with messages) and notes directly into the project database."""
+    from main_models import FileEntry, Note, Thread, ThreadMessage
+    with _project_session(project_id) as db:
+        for i in range(files):
+            name = f"{prefix}file_{i:05d}.csv"
+            storage_path = None
+            if file_dir:
+                storage_path = os.path.join(file_dir, name)
+                with open(storage_path, "w", encoding="utf-8") as f:
+                    f.write("id,value\n" + "".join(f"{j},{j * i}\n" for j in range(20)))
+            db.add(FileEntry(project_id=project_id, branch_id=branch_id, filename=name, display_name=name, file_type="csv",
+                             structure="tabular", mime_type="text/csv", size_bytes=1024 + i, storage_path=storage_path,
+                             metadata_json={"format": "csv", "csv_dialect": {"columns": ["id", "value"]}, "line_count": 21},
+                             ai_title=f"Synthetic table {i}", ai_description=datagen.synthetic_text(25, seed=i),
+                             ai_category="Tabular Data"))
+        thread_rows = [Thread(project_id=project_id, branch_id=branch_id, title=f"{prefix}Thread {i}") for i in range(threads)]
+        db.add_all(thread_rows)
+        db.flush()
+        for t in thread_rows:
+            for m in datagen.thread_messages(messages, seed=t.id):
+                db.add(ThreadMessage(project_id=project_id, branch_id=branch_id, thread_id=t.id, role=m["role"],
+                                     content=m["content"], display_title=m.get("display_title"),
+                                     payload_json=m.get("payload_json")))
+        for i in range(notes):
+            db.add(Note(project_id=project_id, branch_id=branch_id, title=f"{prefix}Note {i}", tags=["bench", f"n{i % 10}"],
+                        content=datagen.synthetic_text(60, seed=i), note_type="agent_finding", agent_name="ResearchAgent"))
+        db.commit()
+
+
+def _seed_table(project_id: int, branch_id: int, table: str, rows: int) -> None:
+    from cedar_app.db_utils import _get_project_engine
+    with _get_project_engine(project_id).begin() as conn:
+        conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, project_id INTEGER NOT NULL, "
+                             f"branch_id INTEGER NOT NULL, site TEXT, value REAL)")
+        conn.exec_driver_sql(f"INSERT INTO {table} (project_id, branch_id, site, value) VALUES (?, ?, ?, ?)",
+                             [(project_id, branch_id, ("north", "south", "east", "west")[i % 4], float(i)) for i in range(rows)])
+
+
+# -------------------- interpret_file --------------------
+
+def _interpret(ctx: Context, path: str, name: str) -> Dict[str, Any]:
+    from cedar_app.file_utils import interpret_file
+    with _env(CEDARPY_ARTIFACT_CACHE="0"):
+        meta = interpret_file(path, name)
+
+        def run():
+            interpret_file(path, name)
+        return ctx.measure(run,
+                           info={"bytes": os.path.getsize(path), "keys": len(meta), "format": meta.get("format")})
+
+
+@benchmark("interpret_file.csv", quick={"rows": 5_000}, full={"rows": 200_000})
+def bench_interpret_csv(ctx: Context, rows: int):
+    """interpret_file on a synthetic CSV with mixed column types"""
+    return _interpret(ctx, datagen.write_csv(ctx.path("interpret", "data.csv"), rows), "data.csv")
+
+
+@benchmark("interpret_file.json", quick={"records": 2_000}, full={"records": 100_000})
+def bench_interpret_json(ctx: Context, records: int):
+    """interpret_file on a large JSON array of nested records"""
+    return _interpret(ctx, datagen.write_json(ctx.path("interpret", "data.json"), records), "data.json")
+
+
+@benchmark("interpret_file.pdf", quick={"pages": 10}, full={"pages": 300})
+def bench_interpret_pdf(ctx: Context, pages: int):
+    """interpret_file on a generated multi-page text PDF"""
+    return _interpret(ctx, datagen.write_pdf(ctx.path("interpret", "doc.pdf"), pages), "doc.pdf")
+
+
+# -------------------- LangExtract chunking / retrieval --------------------
+
+def _chunk_engine(ctx: Context, name: str):
+    from sqlalchemy import create_engine
+    import cedar_langextract as lx
+    engine = create_engine(f"sqlite:///{ctx.path('chunks', name)}")
+    lx.ensure_langextract_schema(engine)
+    return engine
+
+
+@benchmark("chunk_document_insert", quick={"words": 20_000}, full={"words": 500_000})
+def bench_chunk_insert(ctx: Context, words: int):
+    """chunk_document_insert of one synthetic document into doc_chunks (FTS5 triggers included)"""
+    import cedar_langextract as lx
+    if lx.chunking is None:
+        raise BenchmarkSkipped("langextract is not installed; chunk_document_insert stores nothing without it")
+    engine = _chunk_engine(ctx, "insert.db")
+    text = datagen.synthetic_text(words)
+    file_ids = itertools.count(1)
+    return ctx.measure(lambda fid: {"chunks": lx.chunk_document_insert(engine, fid, text)}, setup=lambda: next(file_ids),
+                       info={"chars": len(text)})
+
+
+@benchmark("retrieve_top_chunks", quick={"chunks": 2_000, "files": 10}, full={"chunks": 50_000, "files": 100})
+def bench_retrieve(ctx: Context, chunks: int, files: int):
+    """retrieve_top_chunks BM25 queries over a seeded doc_chunks table"""
+    import cedar_langextract as lx
+    engine = _chunk_engine(ctx, "retrieve.db")
+    rows = []
+    offsets = [0] * files
+    for i in range(chunks):
+        body = datagen.synthetic_text(200, seed=i)
+        fid = i % files
+        rows.append((f"{fid}:{i:07d}", fid, offsets[fid], offsets[fid] + len(body), body))
+        offsets[fid] += len(body)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO doc_chunks (id, file_id, char_start, char_end, text) VALUES (?,?,?,?,?)", rows)
+    queries = itertools.cycle(["protein expression variance", "branch merge dataset", "weather station reading forecast",
+                               "cohort baseline control"])
+    return ctx.measure(lambda q: {"hits": len(list(lx.retrieve_top_chunks(engine, q, None, 20)))}, setup=lambda: next(queries))
+
+
+# -------------------- project page, code items, merge --------------------
+
+@benchmark("view_project", quick={"files": 50, "threads": 20, "messages": 10, "notes": 20},
+           full={"files": 2_000, "threads": 500, "messages": 20, "notes": 500}, threshold_pct=30)
+def bench_view_project(ctx: Context, files: int, threads: int, messages: int, notes: int):
+    """GET /project/{id} rendering with N files, threads and notes"""
+    _, client = ctx.app()
+    project_id, branch_id = _new_project(ctx)
+    _seed(project_id, branch_id, files=files, threads=threads, messages=messages, notes=notes)
+    url = f"/project/{project_id}?branch_id={branch_id}"
+    size = len(client.get(url).content)
+
+    def render():
+        r = client.get(url)
+        if r.status_code != 200:
+            raise RuntimeError(f"GET {url} returned HTTP {r.status_code}")
+    return ctx.measure(render, info={"html_bytes": size})
+
+
+@benchmark("collect_code_items", quick={"threads": 20, "messages": 25}, full={"threads": 300, "messages": 50})
+def bench_collect_code_items(ctx: Context, threads: int, messages: int):
+    """collect_code_items over N threads x M messages of tool payloads, fenced code and JSON plans"""
+    from main_models import Thread
+    from cedar_app.utils.code_collection import collect_code_items
+    project_id, branch_id = _new_project(ctx)
+    _seed(project_id, branch_id, threads=threads, messages=messages)
+    with _project_session(project_id) as db:
+        def load_threads():
+            db.expire_all()
+            return db.query(Thread).filter(Thread.project_id == project_id).all()
+        return ctx.measure(lambda ts: {"items": len(collect_code_items(db, project_id, ts))}, setup=load_threads)
+
+
+@benchmark("merge_to_main", quick={"files": 20, "threads": 10, "notes": 10, "rows": 1_000},
+           full={"files": 500, "threads": 200, "notes": 200, "rows": 50_000}, repeat=3)
+def bench_merge_to_main(ctx: Context, files: int, threads: int, notes: int, rows: int):
+    """POST merge_to_main from a branch holding files, threads, notes and a branch-aware table"""
+    from cedar_app.db_utils import _project_dirs
+    _, client = ctx.app()
+
+    def fresh_branch():
+        project_id, main_id = _new_project(ctx)
+        branch_id = _new_branch(project_id, "feature")
+        file_dir = os.path.join(_project_dirs(project_id)["files_root"], "branch_feature")
+        os.makedirs(file_dir, exist_ok=True)
+        _seed(project_id, branch_id, files=files, threads=threads, messages=2, notes=notes, file_dir=file_dir, prefix="f_")
+        _seed_table(project_id, branch_id, "bench_rows", rows)
+        return project_id, branch_id
+
+    def merge(state):
+        project_id, branch_id = state
+        r = client.post(f"/project/{project_id}/merge_to_main?branch_id={branch_id}", follow_redirects=False)
+        if r.status_code != 303:
+            raise RuntimeError(f"merge_to_main returned HTTP {r.status_code}")
+    return ctx.measure(merge, setup=fresh_branch)
+
+
+# -------------------- SQL with undo --------------------
+
+@benchmark("sql_with_undo.update", quick={"rows": 5_000, "batch": 500}, full={"rows": 200_000, "batch": 20_000})
+def bench_sql_undo_update(ctx: Context, rows: int, batch: int):
+    """_execute_sql_with_undo: journaled UPDATE of a batch of rows in a branch-aware table"""
+    from cedar_app.utils.sql_utils import _execute_sql_with_undo
+    project_id, branch_id = _new_project(ctx)
+    _seed_table(project_id, branch_id, "bench_measure", rows)
+    sql = (f"UPDATE bench_measure SET value = value + 1 WHERE project_id = {project_id} AND branch_id = {branch_id} "
+           f"AND id <= {batch}")
+    with _project_session(project_id) as db:
+        def run():
+            res = _execute_sql_with_undo(db, sql, project_id, branch_id)
+            if not res.get("success"):
+                raise RuntimeError(res.get("error"))
+            return {"rowcount": res.get("rowcount") or 0}
+        return ctx.measure(run)
+
+
+@benchmark("sql_with_undo.insert", quick={"rows": 5_000}, full={"rows": 200_000}, threshold_pct=50)
+def bench_sql_undo_insert(ctx: Context, rows: int):
+    """_execute_sql_with_undo: single-row journaled INSERT into a populated table"""
+    from cedar_app.utils.sql_utils import _execute_sql_with_undo
+    project_id, branch_id = _new_project(ctx)
+    _seed_table(project_id, branch_id, "bench_measure", rows)
+    n = itertools.count()
+    with _project_session(project_id) as db:
+        def run(i):
+            res = _execute_sql_with_undo(db, f"INSERT INTO bench_measure (project_id, branch_id, site, value) "
+                                             f"VALUES ({project_id}, {branch_id}, 'bench', {i})", project_id, branch_id)
+            if not res.get("success"):
+                raise RuntimeError(res.get("error"))
+        return ctx.measure(run, setup=lambda: next(n), repeat=20)
+
+
+# -------------------- tabular import --------------------
+
+# What the fake LLM answers to the tabular codegen prompt: a plain stdlib importer, so the benchmark
+# measures prompt building, the sandboxed run and the row count check rather than model quality.
+TABULAR_IMPORTER = """```python
+import csv
+import re
+import sqlite3
+
+
+def run_import(src_path, sqlite_path, table_name, project_id, branch_id):
+    with open(src_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        cols = [re.sub(r"[^a-z0-9_]+", "_", h.strip().lower()) or f"col_{i + 1}" for i, h in enumerate(header)]
+        cols = ["src_" + c if c in ("id", "project_id", "branch_id") else c for c in cols]
+        conn = sqlite3.connect(sqlite_path)
+        try:
+            conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+            conn.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, "
+                         f"branch_id INTEGER NOT NULL, " + ", ".join(c + " TEXT" for c in cols) + ")")
+            sql = (f"INSERT INTO {table_name} (project_id, branch_id, {', '.join(cols)}) "
+                   f"VALUES ({', '.join(['?'] * (len(cols) + 2))})")
+            rows = 0
+            batch = []
+            for row in reader:
+                batch.append([project_id, branch_id] + row)
+                if len(batch) >= 1000:
+                    conn.executemany(sql, batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(sql, batch)
+                rows += len(batch)
+            conn.commit()
+        finally:
+            conn.close()
+    return {"ok": True, "table": table_name, "rows_inserted": rows, "columns": cols, "warnings": []}
+```"""
+
+FAKE_LLM_RULES = [
+    {"name": "tabular-import", "match": "import a local tabular file into SQLite", "reply": TABULAR_IMPORTER},
+]
+
+
+def _require_fake_llm() -> None:
+    from cedar_app.llm.fake_server import fake_llm_enabled
+    if not fake_llm_enabled():
+        raise BenchmarkSkipped("needs CEDARPY_FAKE_LLM=1 to stay offline (python -m benchmarks sets it)")
+
+
+@benchmark("tabular_import", quick={"rows": 2_000}, full={"rows": 100_000}, repeat=3)
+def bench_tabular_import(ctx: Context, rows: int):
+    """the LLM tabular importer on a synthetic CSV: codegen (fake LLM) + sandboxed run, artifact cache disabled"""
+    _require_fake_llm()
+    from main_models import FileEntry
+    from cedar_app.db_utils import _project_dirs
+    from cedar_app.file_utils import interpret_file
+    main, _ = ctx.app()
+    project_id, branch_id = _new_project(ctx)
+    path = datagen.write_csv(os.path.join(_project_dirs(project_id)["files_root"], "branch_Main", "measurements.csv"), rows)
+    with _env(CEDARPY_ARTIFACT_CACHE="0"), _project_session(project_id) as db:
+        rec = FileEntry(project_id=project_id, branch_id=branch_id, filename="measurements.csv", display_name="measurements.csv",
+                        file_type="csv", structure="tabular", mime_type="text/csv", size_bytes=os.path.getsize(path),
+                        storage_path=path, metadata_json=interpret_file(path, "measurements.csv"))
+        db.add(rec)
+        db.commit()
+
+        def run():
+            res = main._tabular_import_via_llm(project_id, branch_id, rec, db, options={})
+            if not res.get("ok"):
+                raise RuntimeError(res.get("error") or "import failed")
+            return {"rows_inserted": res.get("rows_inserted") or 0}
+        return ctx.measure(run, info={"bytes": os.path.getsize(path)})
+
+
+# -------------------- websocket chat --------------------
+
+@benchmark("ws_chat", quick={"turns": 1}, full={"turns": 3}, threshold_pct=50, repeat=5)
+def bench_ws_chat(ctx: Context, turns: int):
+    """/ws/chat turns end to end (orchestrator + agents) against the fake LLM"""
+    import time
+    _require_fake_llm()
+    main, client = ctx.app()
+    if not any(getattr(r, "path", None) == "/ws/chat/{project_id}" for r in main.app.routes):
+        raise BenchmarkSkipped("/ws/chat is not registered (cedar_orchestrator failed to import; see the [startup] log)")
+    from cedar_app.llm.gateway import get_llm_gateway
+    fake = get_llm_gateway().fake
+    project_id, branch_id = _new_project(ctx)
+    n = itertools.count()
+
+    def chat(i):
+        started = time.perf_counter()
+        first = None
+        events = 0
+        calls_before = fake.snapshot()["calls"] if fake is not None else 0
+        with client.websocket_connect(f"/ws/chat/{project_id}") as ws:
+            for t in range(turns):
+                # full_pipeline: the arithmetic fast path would answer without the orchestrator
+                ws.send_json({"type": "message", "content": f"what is {i}+{t}?", "branch_id": branch_id, "full_pipeline": True})
+                while True:
+                    msg = ws.receive_json()
+                    events += 1
+                    if first is None:
+                        first = (time.perf_counter() - started) * 1000.0
+                    if msg.get("type") == "error":
+                        raise RuntimeError(msg.get("error") or msg.get("content"))
+                    if msg.get("type") == "final":
+                        break
+        llm_calls = (fake.snapshot()["calls"] - calls_before) if fake is not None else None
+        if llm_calls is not None and llm_calls < turns:
+            raise RuntimeError(f"{turns} turns made {llm_calls} LLM calls; the replies did not come from the orchestrator")
+        return {"first_event_ms": first or 0.0, "events": events, "llm_calls": llm_calls}
+    return ctx.measure(chat, setup=lambda: next(n))
@@ -42,7 +42,10 @@ def record_changelog(db: Session, project_id: int, branch_id: int, action: str,
         summary = None
     
     if not summary and llm_summarize_action_fn:
-        summary = llm_summarize_action_fn(action, input_payload, output_payload)
+        # Background work: the LLM scheduler serves chat first and shares capacity fairly across projects
+        from cedar_app.llm.scheduler import llm_lane
+        with llm_lane("nearline", project_id):
+            summary = llm_summarize_action_fn(action, input_payload, output_payload)
     
     try:
         entry = ChangelogEntry(
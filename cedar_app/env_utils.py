@@ -0,0 +1,42 @@
+"""
+Typed readers for numeric CEDARPY_* tuning knobs.
+
+The caches, budgets, routers and LLM plumbing all read a handful of numeric
+settings from the environment at call time so tests and operators can change
+them without restarting. They share these two helpers instead of each module
+carrying its own copy:
+
+- a missing, blank or unparsable value returns the default (never raises);
+- `minimum` clamps the parsed value, e.g. minimum=0.0 for TTLs and durations
+  where a negative number has no meaning.
+
+This module deliberately has no imports beyond the standard library so the
+lowest-level utilities can use it without pulling in cedar_app.config (which
+loads .env files as an import side effect).
+"""
+
+import os
+from typing import Optional
+
+
+def env_int(name: str, default: int, minimum: Optional[int] = None) -> int:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        value = int(raw)
+    except Exception:
+        return default
+    return value if minimum is None else max(minimum, value)
+
+
+def env_float(name: str, default: Optional[float], minimum: Optional[float] = None) -> Optional[float]:
+    """Parse a float setting; `default` may be None for "unset means no limit" knobs."""
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        value = float(raw)
+    except Exception:
+        return default
+    return value if minimum is None else max(minimum, value)
@@ -7,19 +7,19 @@ This module contains all file processing and interpretation utilities including:
 - Text vs binary detection
 - Metadata extraction
 - JSON/CSV validation
-- Hash computation
+- Hash computation (content analysis is cached per sha256)
 """
 
 import os
 import csv
 import json
-import hashlib
 import mimetypes
 from datetime import datetime, timezone
 from typing import Dict, Any
 
 # Import file_extension_to_type from main_helpers
 from main_helpers import file_extension_to_type
+from cedar_app.utils.artifact_cache import cached_artifact, file_sha256
 
 
 def is_probably_text(path: str, sample_bytes: int = 4096) -> bool:
@@ -92,24 +92,41 @@ def interpret_file(path: str, original_name: str) -> Dict[str, Any]:
     }
     meta["language"] = language_map.get(ftype)
 
-    # Text / binary detection
-    is_text = is_probably_text(path)
-    meta["is_text"] = is_text
-
-    # Store a UTF-8 text sample of the first N bytes (for LLM inspection)
+    # Content analysis depends only on the bytes (and extension), so it is reused for files with the
+    # same sha256 (see utils/artifact_cache); name- and stat-derived fields above are always fresh
+    sha = file_sha256(path)
+    if sha:
+        meta["sha256"] = sha
     try:
         limit = int(os.getenv("CEDARPY_SAMPLE_BYTES", "65536"))
     except Exception:
         limit = 65536
-    
+    content = cached_artifact(
+        "interpret_file", sha,
+        lambda: _analyze_content(path, ext, limit, meta.get("size_bytes") or 0),
+        variant=(ext, limit),
+    )
+    meta.update(content or {})
+    return meta
+
+
+def _analyze_content(path: str, ext: str, limit: int, size_bytes: int) -> Dict[str, Any]:
+    """Content-derived metadata: text detection, sample, JSON/CSV validation, line count."""
+    content: Dict[str, Any] = {}
+
+    # Text / binary detection
+    is_text = is_probably_text(path)
+    content["is_text"] = is_text
+
+    # Store a UTF-8 text sample of the first N bytes (for LLM inspection)
     try:
         with open(path, "rb") as f:
             sample_b = f.read(max(0, limit))
         sample_text = sample_b.decode("utf-8", errors="replace")
-        meta["sample_text"] = sample_text
-        meta["sample_bytes_read"] = len(sample_b)
-        meta["sample_truncated"] = (meta.get("size_bytes") or 0) > len(sample_b)
-        meta["sample_encoding"] = "utf-8-replace"
+        content["sample_text"] = sample_text
+        content["sample_bytes_read"] = len(sample_b)
+        content["sample_truncated"] = (size_bytes or 0) > len(sample_b)
+        content["sample_encoding"] = "utf-8-replace"
     except Exception:
         pass
 
@@ -123,24 +140,24 @@ def interpret_file(path: str, original_name: str) -> Dict[str, Any]:
                         # Count lines and JSON-parse first line only
                         first = f.readline()
                         json.loads(first)
-                        meta["json_valid"] = True
+                        content["json_valid"] = True
                     else:
                         data = json.load(f)
-                        meta["json_valid"] = True
+                        content["json_valid"] = True
                         if isinstance(data, dict):
-                            meta["json_top_level_keys"] = list(data.keys())[:50]
+                            content["json_top_level_keys"] = list(data.keys())[:50]
                         elif isinstance(data, list):
-                            meta["json_list_length_sample"] = min(len(data), 1000)
+                            content["json_list_length_sample"] = min(len(data), 1000)
             except Exception:
-                meta["json_valid"] = False
-                
+                content["json_valid"] = False
+
         # CSV dialect detection
         if ext in {"csv", "tsv"}:
             try:
                 with open(path, "r", encoding="utf-8", errors="replace") as f:
                     sample = f.read(2048)
                 dialect = csv.Sniffer().sniff(sample)
-                meta["csv_dialect"] = {
+                content["csv_dialect"] = {
                     "delimiter": getattr(dialect, "delimiter", ","),
                     "quotechar": getattr(dialect, "quotechar", '"'),
                     "doublequote": getattr(dialect, "doublequote", True),
@@ -148,7 +165,7 @@ def interpret_file(path: str, original_name: str) -> Dict[str, Any]:
                 }
             except Exception:
                 pass
-                
+
         # Line count (bounded to avoid excessive memory usage)
         try:
             lc = 0
@@ -157,18 +174,8 @@ def interpret_file(path: str, original_name: str) -> Dict[str, Any]:
                     lc = i + 1
                     if lc > 2000000:
                         break
-            meta["line_count"] = lc
+            content["line_count"] = lc
         except Exception:
             pass
 
-    # SHA256 hash computation
-    try:
-        h = hashlib.sha256()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(1024 * 1024), b""):
-                h.update(chunk)
-        meta["sha256"] = h.hexdigest()
-    except Exception:
-        pass
-
-    return meta
\ No newline at end of file
+    return content
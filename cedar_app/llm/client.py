@@ -9,7 +9,7 @@ from typing import Optional, Tuple, Dict, Any
 def _llm_client_config():
     """
     Returns (client, model) if OpenAI SDK is available and a key is configured.
-    Looks up key from env first, then falls back to the user settings file via _env_get.
+    Looks up key from env first, then falls back to the user settings file (see gateway.setting).
 
     CI/Test mode: if CEDARPY_TEST_MODE is truthy, returns a stub client that emits
     deterministic JSON (no network calls). See README: "CI test mode (deterministic LLM stubs)".
@@ -26,6 +26,10 @@ def _llm_client_config():
                     _test_mode = True
     except Exception:
         _test_mode = False
+    # The fake LLM (CEDARPY_FAKE_LLM) replaces the stub: it goes through the gateway like the real API
+    from .fake_server import fake_llm_enabled
+    if _test_mode and fake_llm_enabled():
+        _test_mode = False
     if _test_mode:
         try:
             print("[llm-test] CEDARPY_TEST_MODE=1; using stubbed LLM client")
@@ -134,21 +138,21 @@ def run_import(src_path, sqlite_path, table_name, project_id, branch_id):
         class _StubClient:
             def __init__(self):
                 self.chat = _StubChat()
-        return _StubClient(), (os.getenv("CEDARPY_OPENAI_MODEL") or _env_get("CEDARPY_OPENAI_MODEL") or "gpt-5")
+        from .gateway import llm_default_model
+        return _StubClient(), llm_default_model()
 
-    # Normal client
+    # Normal client: the shared gateway (pooled connections, retries, circuit breaker)
     try:
-        from openai import OpenAI  # type: ignore
+        import openai  # type: ignore  # noqa: F401
     except Exception:
         return None, None
-    # Prefer env, then fallback to settings file
-    api_key = os.getenv("CEDARPY_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or _env_get("CEDARPY_OPENAI_API_KEY") or _env_get("OPENAI_API_KEY")
-    if not api_key or not str(api_key).strip():
+    from .gateway import get_llm_gateway, llm_api_key, llm_default_model
+    # Prefer env, then fallback to settings file (cached; re-read when it changes)
+    api_key = llm_api_key()
+    if not api_key:
         return None, None
-    model = os.getenv("CEDARPY_OPENAI_MODEL") or _env_get("CEDARPY_OPENAI_MODEL") or "gpt-5"
     try:
-        client = OpenAI(api_key=str(api_key).strip())
-        return client, model
+        return get_llm_gateway().sync_client(api_key), llm_default_model()
     except Exception:
         return None, None
 
@@ -182,6 +186,12 @@ def _llm_classify_file(meta: Dict[str, Any], file_content: Optional[str] = None)
         except Exception:
             pass
         return None
+    # Same bytes, name and model: reuse the earlier extraction (see utils/artifact_cache)
+    from ..utils.artifact_cache import get_artifact, put_artifact
+    artifact_variant = (model, meta.get("display_name"), bool(file_content))
+    cached = get_artifact("llm_extract", meta.get("sha256"), artifact_variant)
+    if cached is not None:
+        return cached
     # Determine if we should send full content or just sample
     size_bytes = meta.get("size_bytes", 0)
     send_full_content = size_bytes < 20 * 1024 * 1024  # 20MB limit
@@ -238,7 +248,11 @@ def _llm_classify_file(meta: Dict[str, Any], file_content: Optional[str] = None)
         {"role": "user", "content": _json.dumps(user_payload, ensure_ascii=False)},
     ]
     try:
-        resp = client.chat.completions.create(model=model, messages=messages)
+        from .scheduler import llm_lane
+        from .response_cache import llm_cache
+        from .usage_ledger import llm_usage
+        with llm_lane("batch"), llm_cache(), llm_usage("classify_file"):
+            resp = client.chat.completions.create(model=model, messages=messages)
         content = (resp.choices[0].message.content or "").strip()
         result = _json.loads(content)
         # Normalize and enforce limits
@@ -266,6 +280,7 @@ def _llm_classify_file(meta: Dict[str, Any], file_content: Optional[str] = None)
             print(f"[llm] model={model} structure={struct} title={len(title)} chars cat={cat}")
         except Exception:
             pass
+        put_artifact("llm_extract", meta.get("sha256"), out, artifact_variant)
         return out
     except Exception as e:
         try:
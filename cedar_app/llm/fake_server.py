@@ -0,0 +1,821 @@
+"""
+Fake OpenAI-compatible LLM for offline load tests: scripted replies, latency, errors and rate limits.
+
+The CEDARPY_TEST_MODE stub in llm_client_config() only covers the sync client and answers instantly,
+so the orchestrator's AsyncOpenAI agents (and the gateway policy around them: scheduler, retries,
+breaker, cache, usage ledger) could not be exercised without the real API. FakeLLM implements
+chat.completions.create() for both client flavours, including streaming (with stream_options
+include_usage) and JSON mode (response_format json_object / json_schema always yields valid JSON):
+
+  in-process  get_llm_gateway() builds its pooled clients from the fake when CEDARPY_FAKE_LLM is on, so
+              the whole multi-agent flow runs unchanged against it (llm_api_key() returns a dummy key).
+  loopback    FakeLLMServer serves POST /v1/chat/completions (JSON or SSE), GET /v1/models and GET /stats
+              on 127.0.0.1 for the real SDK and httpx stack; point Cedar at it with
+              CEDARPY_OPENAI_BASE_URL=http://127.0.0.1:PORT/v1 or run
+              python -m cedar_app.llm.fake_server --port 8765 --latency lognormal:400:0.5
+
+Replies come from rules, tried in order: the rules of the script file, then built-in rules that give
+each Cedar agent a well-formed answer (Chief Agent decision JSON, code with a SUMMARY, SQL, file
+classification). A rule matches a regex against the joined message text (optionally also the model
+and JSON mode) and answers with text, a JSON value or an error; "times" limits how often it fires.
+
+Script file (JSON):
+  {"rules": [{"name": "sql-slow", "match": "SQL expert", "reply": "SELECT 2;", "latency_ms": "fixed:900"},
+             {"match": "Chief Agent", "error": 503, "times": 1},
+             {"match": "Classify", "json": {"structure": "sources"}}],
+   "latency_ms": "uniform:50:300", "token_ms": 5, "errors": "500:0.01,timeout:0.005", "rpm": 600}
+
+Latency specs (milliseconds): N | fixed:N | uniform:LO:HI | normal:MEAN:SD | lognormal:MEDIAN:SIGMA |
+exp:MEAN. The latency is the time to the first token; each streamed chunk then takes token_ms (non-stream
+calls wait for the whole generation). A sampled latency beyond the call's timeout raises a timeout.
+Errors: status codes (429, 500, 503, ...) raise APIStatusError-like exceptions with the status_code and
+response.headers the gateway classifies; "timeout" and "connection" raise TimeoutError/ConnectionError.
+The rate limiter keeps a sliding one-minute window of requests and tokens and answers 429 with
+retry-after and x-ratelimit-* headers once rpm/tpm is exceeded.
+
+Configuration:
+  CEDARPY_FAKE_LLM            on: the gateway uses the fake instead of the OpenAI SDK (default off)
+  CEDARPY_FAKE_LLM_SCRIPT     path of a JSON script (rules and any of the settings below)
+  CEDARPY_FAKE_LLM_LATENCY_MS latency spec (default 0)
+  CEDARPY_FAKE_LLM_TOKEN_MS   latency spec per streamed chunk (default 0)
+  CEDARPY_FAKE_LLM_ERRORS     kind:probability list, e.g. "500:0.02,429:0.01,timeout:0.01"
+  CEDARPY_FAKE_LLM_RPM        simulated requests per minute limit (default 0 = unlimited)
+  CEDARPY_FAKE_LLM_TPM        simulated tokens per minute limit (default 0 = unlimited)
+  CEDARPY_FAKE_LLM_SEED       random seed for latency and error sampling
+
+Usage:
+    fake = FakeLLM(rules=[Rule(match="SQL expert", reply="SELECT 1;")], latency_ms="uniform:20:80")
+    gw = LLMGateway(sync_factory=fake.sync_factory, async_factory=fake.async_factory)
+    with FakeLLMServer(fake) as server:   # server.base_url -> http://127.0.0.1:PORT/v1
+        ...
+    fake.snapshot()                        # calls, max concurrency, errors, rate limits, tokens, rule hits
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import threading
+import collections
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from cedar_app.utils.query_budget import estimate_tokens
+from cedar_app.env_utils import env_float
+
+
+def fake_llm_enabled() -> bool:
+    return str(os.getenv("CEDARPY_FAKE_LLM", "")).strip().lower() in {"1", "true", "yes", "on"}
+
+
+FAKE_API_KEY = "sk-fake-llm"
+
+
+# ----------------------------------------------------------------------------------
+# Errors (shaped like the SDK's so the gateway classifies them the same way)
+# ----------------------------------------------------------------------------------
+
+class FakeAPIError(Exception):
+    """APIStatusError look-alike: status_code, response.headers and an OpenAI-style error body."""
+
+    def __init__(self, status_code: int, message: str = "", headers: Optional[Dict[str, str]] = None):
+        self.status_code = int(status_code)
+        self.message = message or f"Fake LLM error {status_code}"
+        self.headers = dict(headers or {})
+        self.response = _FakeHTTPResponse(self.status_code, self.headers)
+        self.body = {"error": {"message": self.message, "type": _ERROR_TYPES.get(self.status_code, "api_error"), "code": self.status_code}}
+        super().__init__(f"Error code: {self.status_code} - {self.message}")
+
+
+class FakeTimeoutError(TimeoutError):
+    pass
+
+
+class FakeConnectionError(ConnectionError):
+    pass
+
+
+class _FakeHTTPResponse:
+    def __init__(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = {k.lower(): v for k, v in headers.items()}
+
+
+_ERROR_TYPES = {400: "invalid_request_error", 401: "authentication_error", 404: "not_found_error",
+                429: "rate_limit_exceeded", 500: "server_error", 502: "server_error", 503: "server_error"}
+
+
+def make_error(kind: Union[int, str], message: str = "", headers: Optional[Dict[str, str]] = None) -> Exception:
+    kind = str(kind).strip().lower()
+    if kind == "timeout":
+        return FakeTimeoutError(message or "Fake LLM request timed out")
+    if kind == "connection":
+        return FakeConnectionError(message or "Fake LLM connection reset")
+    return FakeAPIError(int(kind), message, headers)
+
+
+# ----------------------------------------------------------------------------------
+# Latency distributions
+# ----------------------------------------------------------------------------------
+
+Sampler = Callable[[random.Random], float]
+
+
+def parse_latency(spec: Any) -> Sampler:
+    """Sampler returning seconds for a latency spec in milliseconds (see the module docstring)."""
+    if callable(spec):
+        return spec
+    if spec is None or str(spec).strip() in {"", "0"}:
+        return lambda rng: 0.0
+    if isinstance(spec, (int, float)):
+        ms = max(0.0, float(spec))
+        return lambda rng: ms / 1000.0
+    name, _, rest = str(spec).strip().lower().partition(":")
+    try:
+        args = [float(a) for a in rest.split(":") if a.strip()]
+        if not rest:
+            ms = float(name)
+            return lambda rng: ms / 1000.0
+        if name == "fixed":
+            return lambda rng: args[0] / 1000.0
+        if name == "uniform":
+            lo, hi = args[0], args[1]
+            return lambda rng: rng.uniform(lo, hi) / 1000.0
+        if name == "normal":
+            mean, sd = args[0], args[1]
+            return lambda rng: max(0.0, rng.gauss(mean, sd)) / 1000.0
+        if name == "lognormal":
+            median, sigma = args[0], args[1]
+            return lambda rng: rng.lognormvariate(math.log(max(median, 1e-6)), sigma) / 1000.0
+        if name in {"exp", "exponential"}:
+            mean = args[0]
+            return lambda rng: (rng.expovariate(1.0 / mean) if mean > 0 else 0.0) / 1000.0
+    except (ValueError, IndexError):
+        pass
+    raise ValueError(f"Bad latency spec: {spec!r}")
+
+
+def parse_errors(spec: Any) -> List[Tuple[str, float]]:
+    """[(kind, probability)] from "500:0.02,timeout:0.01" or a {kind: probability} dict."""
+    if not spec:
+        return []
+    if isinstance(spec, dict):
+        items = list(spec.items())
+    else:
+        items = [part.rsplit(":", 1) for part in str(spec).split(",") if ":" in part]
+    out = []
+    for kind, p in items:
+        try:
+            out.append((str(kind).strip().lower(), max(0.0, float(p))))
+        except ValueError:
+            raise ValueError(f"Bad error spec: {spec!r}")
+    return out
+
+
+# ----------------------------------------------------------------------------------
+# Rules
+# ----------------------------------------------------------------------------------
+
+@dataclass
+class Rule:
+    match: Union[str, Callable[[Dict[str, Any]], bool], None] = None  # regex over the message text, or a predicate
+    reply: Union[str, Callable[[Dict[str, Any]], str], None] = None
+    json: Any = None                       # reply with this value as JSON
+    error: Union[int, str, None] = None    # status code, "timeout" or "connection"
+    latency_ms: Any = None                 # overrides the fake's latency spec
+    times: Optional[int] = None            # fire at most this many times
+    model: Optional[str] = None            # regex the model name must match
+    json_mode: Optional[bool] = None       # only for (True) / only without (False) response_format
+    name: str = ""
+    hits: int = 0
+    _sampler: Optional[Sampler] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if not self.name:
+            self.name = self.match if isinstance(self.match, str) else getattr(self.match, "__name__", "rule")
+        if self.latency_ms is not None:
+            self._sampler = parse_latency(self.latency_ms)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Rule":
+        keys = {"match", "reply", "json", "error", "latency_ms", "times", "model", "json_mode", "name"}
+        unknown = set(data) - keys
+        if unknown:
+            raise ValueError(f"Unknown fake LLM rule keys: {sorted(unknown)}")
+        return cls(**data)
+
+    def matches(self, kwargs: Dict[str, Any], text: str) -> bool:
+        if self.times is not None and self.hits >= self.times:
+            return False
+        if self.json_mode is not None and self.json_mode != is_json_mode(kwargs):
+            return False
+        if self.model and not re.search(self.model, str(kwargs.get("model") or "")):
+            return False
+        if self.match is None:
+            return True
+        if callable(self.match):
+            return bool(self.match(kwargs))
+        return re.search(self.match, text, re.IGNORECASE | re.DOTALL) is not None
+
+    def text(self, kwargs: Dict[str, Any]) -> str:
+        if self.json is not None:
+            return json.dumps(self.json)
+        if callable(self.reply):
+            return str(self.reply(kwargs))
+        return "" if self.reply is None else str(self.reply)
+
+
+def is_json_mode(kwargs: Dict[str, Any]) -> bool:
+    fmt = kwargs.get("response_format")
+    kind = fmt.get("type") if isinstance(fmt, dict) else getattr(fmt, "type", None)
+    return kind in {"json_object", "json_schema"}
+
+
+def message_text(messages: Any) -> str:
+    parts = []
+    for m in messages or []:
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", None)
+        if isinstance(content, list):  # multi-part content
+            content = " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def _last_user(kwargs: Dict[str, Any]) -> str:
+    for m in reversed(kwargs.get("messages") or []):
+        if (m.get("role") if isinstance(m, dict) else getattr(m, "role", None)) == "user":
+            return message_text([m])
+    return ""
+
+
+def _chief_decision(kwargs: Dict[str, Any]) -> str:
+    query = re.search(r"User Query: (.*)", _last_user(kwargs))
+    return json.dumps({
+        "decision": "final",
+        "final_answer": f"Fake LLM answer for: {query.group(1).strip() if query else 'the query'}\n\n"
+                        "Suggested Next Steps: Review the results.",
+        "selected_agent": "CodeAgent",
+        "reasoning": "Fake LLM: the agent results answer the query",
+    })
+
+
+def _json_fallback(kwargs: Dict[str, Any]) -> str:
+    return json.dumps({"result": "Fake LLM response", "ok": True})
+
+
+def default_rules() -> List[Rule]:
+    """Well-formed answers for each Cedar agent prompt, so an orchestration completes end to end."""
+    return [
+        Rule(name="chief", match=r"You are the Chief Agent", reply=_chief_decision),
+        Rule(name="code", match=r"You are a Python code generator",
+             reply="SUMMARY: Prints a fixed result computed by the fake LLM.\n\nprint(42)"),
+        Rule(name="sql", match=r"You are a SQL expert", reply="SELECT 1 AS result;"),
+        Rule(name="classify", match=r"Classify incoming files|Classify this file",
+             json={"structure": "sources", "ai_title": "Fake File", "ai_description": "Described by the fake LLM",
+                   "ai_category": "General"}),
+        Rule(name="shell", match=r"analyzing shell command execution results",
+             reply="SUMMARY: The command ran and produced the expected output.\n\nThe goal was achieved."),
+        Rule(name="json", json_mode=True, reply=_json_fallback),
+        Rule(name="default", reply="Fake LLM response."),
+    ]
+
+
+# ----------------------------------------------------------------------------------
+# Rate limit simulation
+# ----------------------------------------------------------------------------------
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens."""
+
+    WINDOW_S = 60.0
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, clock: Callable[[], float] = time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._events: Deque[Tuple[float, int]] = collections.deque()
+        self._tokens = 0
+
+    def admit(self, tokens: int) -> None:
+        """Record the request, or raise a 429 FakeAPIError when it would exceed rpm/tpm."""
+        if not self.rpm and not self.tpm:
+            return
+        with self._lock:
+            now = self._clock()
+            while self._events and now - self._events[0][0] >= self.WINDOW_S:
+                self._tokens -= self._events.popleft()[1]
+            over_requests = bool(self.rpm) and len(self._events) + 1 > self.rpm
+            over_tokens = bool(self.tpm) and self._tokens + tokens > self.tpm and bool(self._events)
+            if not over_requests and not over_tokens:
+                self._events.append((now, tokens))
+                self._tokens += tokens
+                return
+            retry_after = max(0.001, self.WINDOW_S - (now - self._events[0][0]))
+            headers = {"retry-after": f"{retry_after:.3f}"}
+            if self.rpm:
+                headers.update({"x-ratelimit-limit-requests": str(int(self.rpm)),
+                                "x-ratelimit-remaining-requests": str(max(0, int(self.rpm) - len(self._events)))})
+            if self.tpm:
+                headers.update({"x-ratelimit-limit-tokens": str(int(self.tpm)),
+                                "x-ratelimit-remaining-tokens": str(max(0, int(self.tpm) - self._tokens))})
+        kind = "requests" if over_requests else "tokens"
+        raise FakeAPIError(429, f"Rate limit reached for {kind} per minute (fake)", headers)
+
+
+# ----------------------------------------------------------------------------------
+# Fake LLM
+# ----------------------------------------------------------------------------------
+
+@dataclass
+class _Plan:
+    """One admitted call: what to answer and how long each phase takes."""
+    kwargs: Dict[str, Any]
+    text: str
+    chunks: List[str]
+    first_token_s: float
+    chunk_s: List[float]
+    prompt_tokens: int
+    completion_tokens: int
+    timeout_s: Optional[float]
+    id: str = field(default_factory=lambda: "chatcmpl-fake-" + uuid.uuid4().hex[:12])
+    created: int = field(default_factory=lambda: int(time.time()))
+
+    @property
+    def model(self) -> str:
+        return str(self.kwargs.get("model") or "fake-model")
+
+    def usage(self) -> Dict[str, Any]:
+        return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}}
+
+    def completion(self) -> Dict[str, Any]:
+        return {"id": self.id, "object": "chat.completion", "created": self.created, "model": self.model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.text}}],
+                "usage": self.usage()}
+
+    def chunk(self, content: Optional[str], first: bool = False, finish: bool = False) -> Dict[str, Any]:
+        delta: Dict[str, Any] = {"content": content}
+        if first:
+            delta["role"] = "assistant"
+        return {"id": self.id, "object": "chat.completion.chunk", "created": self.created, "model": self.model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if finish else None}]}
+
+    def chunk_dicts(self) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """(delay before it, chunk) for each stream event, ending with the usage chunk when requested."""
+        for i, piece in enumerate(self.chunks):
+            yield (self.first_token_s if i == 0 else self.chunk_s[i]), self.chunk(piece, first=i == 0)
+        yield 0.0, self.chunk(None, finish=True)
+        opts = self.kwargs.get("stream_options") or {}
+        if opts.get("include_usage"):
+            yield 0.0, {"id": self.id, "object": "chat.completion.chunk", "created": self.created,
+                        "model": self.model, "choices": [], "usage": self.usage()}
+
+    def total_s(self) -> float:
+        return self.first_token_s + sum(self.chunk_s[1:])
+
+
+def _namespace(value: Any) -> Any:
+    import types
+    if isinstance(value, dict):
+        return types.SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def chat_object(data: Dict[str, Any], chunk: bool = False) -> Any:
+    """A ChatCompletion / ChatCompletionChunk when the SDK is installed, else an attribute namespace."""
+    try:
+        if chunk:
+            from openai.types.chat import ChatCompletionChunk  # type: ignore
+            return ChatCompletionChunk.model_validate(data)
+        from openai.types.chat import ChatCompletion  # type: ignore
+        return ChatCompletion.model_validate(data)
+    except Exception:
+        return _namespace(data)
+
+
+class FakeLLM:
+    def __init__(self, rules: Optional[List[Union[Rule, Dict[str, Any]]]] = None, latency_ms: Any = 0, token_ms: Any = 0,
+                 errors: Any = None, rpm: float = 0, tpm: float = 0, seed: Optional[int] = None, chunk_chars: int = 16,
+                 include_defaults: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.rules: List[Rule] = [r if isinstance(r, Rule) else Rule.from_dict(r) for r in (rules or [])]
+        if include_defaults:
+            self.rules += default_rules()
+        self.latency = parse_latency(latency_ms)
+        self.token_latency = parse_latency(token_ms)
+        self.errors = parse_errors(errors)
+        self.limiter = RateLimiter(rpm, tpm, clock)
+        self.chunk_chars = max(1, int(chunk_chars))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats: Dict[str, Any] = {"calls": 0, "completed": 0, "streams": 0, "json_mode": 0, "errors": {},
+                                      "rate_limited": 0, "max_in_flight": 0, "prompt_tokens": 0,
+                                      "completion_tokens": 0, "latency_s": 0.0}
+
+    # -- planning ------------------------------------------------------------------
+
+    def _pick(self, kwargs: Dict[str, Any]) -> Rule:
+        text = message_text(kwargs.get("messages"))
+        with self._lock:
+            for rule in self.rules:
+                if rule.matches(kwargs, text):
+                    rule.hits += 1
+                    return rule
+        return Rule(name="empty", reply="")
+
+    def _fail(self, kind: str, exc: Exception) -> Exception:
+        with self._lock:
+            self.stats["errors"][kind] = self.stats["errors"].get(kind, 0) + 1
+            if kind == "429":
+                self.stats["rate_limited"] += 1
+        return exc
+
+    def plan(self, kwargs: Dict[str, Any]) -> _Plan:
+        """Pick the reply and sample its timing; raises the injected error (before any latency) if any."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["json_mode"] += is_json_mode(kwargs)
+            self.stats["streams"] += bool(kwargs.get("stream"))
+        prompt_tokens = estimate_tokens(kwargs.get("messages"))
+        try:
+            self.limiter.admit(prompt_tokens)
+        except FakeAPIError as e:
+            raise self._fail("429", e)
+        with self._lock:
+            roll = self._rng.random()
+        for kind, p in self.errors:
+            if roll < p:
+                raise self._fail(kind, make_error(kind, "Injected fake LLM error"))
+            roll -= p
+        rule = self._pick(kwargs)
+        if rule.error is not None:
+            raise self._fail(str(rule.error).lower(), make_error(rule.error, f"Scripted error from rule {rule.name!r}"))
+        text = rule.text(kwargs)
+        if is_json_mode(kwargs):
+            try:
+                json.loads(text)
+            except ValueError:
+                text = json.dumps({"text": text})
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        with self._lock:
+            first = (rule._sampler or self.latency)(self._rng)
+            per_chunk = [0.0] + [self.token_latency(self._rng) for _ in chunks[1:]]
+        timeout = kwargs.get("timeout")
+        return _Plan(kwargs=kwargs, text=text, chunks=chunks, first_token_s=first, chunk_s=per_chunk,
+                     prompt_tokens=prompt_tokens, completion_tokens=estimate_tokens(text),
+                     timeout_s=float(timeout) if isinstance(timeout, (int, float)) and timeout > 0 else None)
+
+    def _begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+
+    def _end(self, plan: Optional[_Plan], waited_s: float) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.stats["latency_s"] += waited_s
+            if plan is not None:
+                self.stats["completed"] += 1
+                self.stats["prompt_tokens"] += plan.prompt_tokens
+                self.stats["completion_tokens"] += plan.completion_tokens
+
+    def _wait_s(self, plan: _Plan, seconds: float) -> Tuple[float, bool]:
+        """How long to wait before the response, and whether the call times out instead."""
+        if plan.timeout_s is not None and seconds > plan.timeout_s:
+            return plan.timeout_s, True
+        return seconds, False
+
+    # -- sync ----------------------------------------------------------------------
+
+    def complete_sync(self, kwargs: Dict[str, Any]) -> Any:
+        plan = self.plan(kwargs)
+        if kwargs.get("stream"):
+            return _SyncStream(self, plan)
+        self._begin()
+        wait, timed_out = self._wait_s(plan, plan.total_s())
+        try:
+            time.sleep(wait)
+        finally:
+            self._end(None if timed_out else plan, wait)
+        if timed_out:
+            raise self._fail("timeout", FakeTimeoutError("Fake LLM request timed out"))
+        return chat_object(plan.completion())
+
+    # -- async ---------------------------------------------------------------------
+
+    async def complete_async(self, kwargs: Dict[str, Any]) -> Any:
+        plan = self.plan(kwargs)
+        if kwargs.get("stream"):
+            return _AsyncStream(self, plan)
+        self._begin()
+        wait, timed_out = self._wait_s(plan, plan.total_s())
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self._end(None if timed_out else plan, wait)
+        if timed_out:
+            raise self._fail("timeout", FakeTimeoutError("Fake LLM request timed out"))
+        return chat_object(plan.completion())
+
+    # -- clients -------------------------------------------------------------------
+
+    def sync_factory(self, api_key: str = FAKE_API_KEY) -> "FakeOpenAI":
+        return FakeOpenAI(self)
+
+    def async_factory(self, api_key: str = FAKE_API_KEY) -> "FakeAsyncOpenAI":
+        return FakeAsyncOpenAI(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+            out["errors"] = dict(self.stats["errors"])
+            out["in_flight"] = self.in_flight
+            out["rules"] = {r.name: r.hits for r in self.rules if r.hits}
+        out["latency_s"] = round(out["latency_s"], 3)
+        return out
+
+
+class _SyncStream:
+    def __init__(self, fake: FakeLLM, plan: _Plan):
+        self._fake = fake
+        self._plan = plan
+
+    def __iter__(self):
+        self._fake._begin()
+        waited, done = 0.0, None
+        try:
+            for i, (delay, data) in enumerate(self._plan.chunk_dicts()):
+                timed_out = False
+                if i == 0:  # only the time to the first chunk counts against the timeout
+                    delay, timed_out = self._fake._wait_s(self._plan, delay)
+                time.sleep(delay)
+                waited += delay
+                if timed_out:
+                    raise self._fake._fail("timeout", FakeTimeoutError("Fake LLM request timed out"))
+                yield chat_object(data, chunk=True)
+            done = self._plan
+        finally:
+            self._fake._end(done, waited)
+
+    def close(self):
+        pass
+
+
+class _AsyncStream:
+    def __init__(self, fake: FakeLLM, plan: _Plan):
+        self._fake = fake
+        self._plan = plan
+
+    async def _aiter(self):
+        self._fake._begin()
+        waited, done = 0.0, None
+        try:
+            for i, (delay, data) in enumerate(self._plan.chunk_dicts()):
+                timed_out = False
+                if i == 0:  # only the time to the first chunk counts against the timeout
+                    delay, timed_out = self._fake._wait_s(self._plan, delay)
+                await asyncio.sleep(delay)
+                waited += delay
+                if timed_out:
+                    raise self._fake._fail("timeout", FakeTimeoutError("Fake LLM request timed out"))
+                yield chat_object(data, chunk=True)
+            done = self._plan
+        finally:
+            self._fake._end(done, waited)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def aclose(self):
+        pass
+
+
+class _Completions:
+    def __init__(self, fake: FakeLLM, is_async: bool):
+        self._fake = fake
+        self._is_async = is_async
+
+    def create(self, **kwargs):
+        if self._is_async:
+            return self._fake.complete_async(kwargs)
+        return self._fake.complete_sync(kwargs)
+
+
+class _Chat:
+    def __init__(self, fake: FakeLLM, is_async: bool):
+        self.completions = _Completions(fake, is_async)
+
+
+class FakeOpenAI:
+    """OpenAI-compatible in-process client backed by a FakeLLM."""
+
+    def __init__(self, fake: FakeLLM):
+        self.fake = fake
+        self.chat = _Chat(fake, is_async=False)
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI-compatible in-process client backed by a FakeLLM."""
+
+    def __init__(self, fake: FakeLLM):
+        self.fake = fake
+        self.chat = _Chat(fake, is_async=True)
+
+
+# ----------------------------------------------------------------------------------
+# Configuration from the environment
+# ----------------------------------------------------------------------------------
+
+def load_script(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"rules": data}
+    return data
+
+
+def fake_llm_from_env() -> FakeLLM:
+    script: Dict[str, Any] = {}
+    path = os.getenv("CEDARPY_FAKE_LLM_SCRIPT")
+    if path:
+        try:
+            script = load_script(path)
+        except Exception as e:
+            print(f"[fake-llm] could not load script {path}: {e}")
+    seed = os.getenv("CEDARPY_FAKE_LLM_SEED", script.get("seed"))
+    fake = FakeLLM(
+        rules=script.get("rules"),
+        latency_ms=os.getenv("CEDARPY_FAKE_LLM_LATENCY_MS", script.get("latency_ms", 0)),
+        token_ms=os.getenv("CEDARPY_FAKE_LLM_TOKEN_MS", script.get("token_ms", 0)),
+        errors=os.getenv("CEDARPY_FAKE_LLM_ERRORS", script.get("errors")),
+        rpm=env_float("CEDARPY_FAKE_LLM_RPM", float(script.get("rpm", 0)), minimum=0.0),
+        tpm=env_float("CEDARPY_FAKE_LLM_TPM", float(script.get("tpm", 0)), minimum=0.0),
+        seed=int(seed) if seed not in (None, "") else None,
+    )
+    print(f"[fake-llm] serving chat completions from the fake LLM ({len(fake.rules)} rules)")
+    return fake
+
+
+# ----------------------------------------------------------------------------------
+# Loopback HTTP server
+# ----------------------------------------------------------------------------------
+
+class FakeLLMServer:
+    """OpenAI-compatible HTTP endpoint on the loopback interface, served from a background thread."""
+
+    def __init__(self, fake: Optional[FakeLLM] = None, host: str = "127.0.0.1", port: int = 0):
+        from http.server import ThreadingHTTPServer
+        self.fake = fake or FakeLLM()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self.fake))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def _make_handler(fake: FakeLLM):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # keep load tests quiet
+            pass
+
+        def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "cedar"}]})
+            elif path.endswith("/stats"):
+                self._send_json(200, fake.snapshot())
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found_error"}})
+
+        def do_POST(self):
+            if not self.path.split("?", 1)[0].rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found_error"}})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                kwargs = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send_json(400, {"error": {"message": f"Invalid JSON body: {e}", "type": "invalid_request_error"}})
+                return
+            try:
+                plan = fake.plan(kwargs)
+            except FakeAPIError as e:
+                self._send_json(e.status_code, e.body, e.headers)
+                return
+            except (FakeTimeoutError, FakeConnectionError):
+                self.close_connection = True  # the client sees the connection drop
+                return
+            if kwargs.get("stream"):
+                self._stream(plan)
+                return
+            fake._begin()
+            wait = plan.total_s()
+            try:
+                time.sleep(wait)
+            finally:
+                fake._end(plan, wait)
+            self._send_json(200, plan.completion())
+
+        def _stream(self, plan: _Plan) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            fake._begin()
+            waited = 0.0
+            try:
+                for delay, data in plan.chunk_dicts():
+                    time.sleep(delay)
+                    waited += delay
+                    self.wfile.write(b"data: " + json.dumps(data).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                fake._end(plan, waited)
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible chat completions API on loopback")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="JSON script with rules and settings (see the module docstring)")
+    parser.add_argument("--latency", help="latency spec in ms, e.g. lognormal:400:0.5")
+    parser.add_argument("--token-ms", help="latency spec per streamed chunk in ms")
+    parser.add_argument("--errors", help='e.g. "500:0.02,429:0.01,timeout:0.01"')
+    parser.add_argument("--rpm", type=float)
+    parser.add_argument("--tpm", type=float)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    for env, value in (("CEDARPY_FAKE_LLM_SCRIPT", args.script), ("CEDARPY_FAKE_LLM_LATENCY_MS", args.latency),
+                       ("CEDARPY_FAKE_LLM_TOKEN_MS", args.token_ms), ("CEDARPY_FAKE_LLM_ERRORS", args.errors),
+                       ("CEDARPY_FAKE_LLM_RPM", args.rpm), ("CEDARPY_FAKE_LLM_TPM", args.tpm),
+                       ("CEDARPY_FAKE_LLM_SEED", args.seed)):
+        if value is not None:
+            os.environ[env] = str(value)
+    server = FakeLLMServer(fake_llm_from_env(), host=args.host, port=args.port)
+    print(f"[fake-llm] listening on {server.base_url} (set CEDARPY_OPENAI_BASE_URL to this)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
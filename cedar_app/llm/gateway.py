@@ -0,0 +1,588 @@
+"""
+Process-wide LLM gateway: pooled clients, cached config, retries and circuit breaking.
+
+Before this module every llm_client_config() call built a new OpenAI client (and re-read the
+settings .env file), throwing away HTTP keep-alive and TLS sessions, and the orchestrator agents
+called the API without any retry policy. The gateway keeps one pooled client per API key (sync
+clients shared by all threads, async clients per event loop) and puts every chat.completions.create()
+call through the same policy:
+
+  retries     connection errors, timeouts, 408/409/429 and 5xx are retried with exponential backoff
+              and full jitter (Retry-After is honored when the server sends it). Other errors are raised
+              immediately. Streamed calls are retried only while opening the stream.
+  breaker     CEDARPY_LLM_BREAKER_FAILURES consecutive 5xx/timeout/connection failures for a model open
+              its circuit for CEDARPY_LLM_BREAKER_COOLDOWN_S; calls fail fast with LLMCircuitOpen until a
+              single trial call succeeds (half-open).
+  timeout     per-call timeout CEDARPY_LLM_TIMEOUT_S, shortened to the remaining query budget time when a
+              query budget is active (see query_budget).
+  admission   each attempt is admitted by the fair-share scheduler (lanes, token buckets; see scheduler)
+              and reconciled with the reported token usage afterwards.
+  cache       calls made inside llm_cache() are answered from the persistent response cache when
+              possible, before admission (see response_cache).
+  usage       every call (including cache hits and final failures) is appended to the usage ledger
+              with its project, agent, feature, tokens, cost and latency (see usage_ledger).
+  tracing     inside a chat trace each call is an llm.chat span with the model, token usage and
+              whether it was a cache hit (see cedar_app.utils.tracing).
+  cassette    while a chat session is recorded each call's answer is taped; on replay it is answered
+              from the tape instead (see cedar_app.utils.cassette).
+
+Config (API key, default model) comes from the environment, then the settings file (DATA_DIR/.env).
+The parsed settings file is cached and re-read only when its mtime or size changes.
+
+Configuration:
+  CEDARPY_LLM_MAX_RETRIES        (default 3)
+  CEDARPY_LLM_BACKOFF_BASE_S     (default 0.5)
+  CEDARPY_LLM_BACKOFF_MAX_S      (default 8)
+  CEDARPY_LLM_TIMEOUT_S          (default 120)
+  CEDARPY_LLM_BREAKER_FAILURES   (default 5; 0 disables the breaker)
+  CEDARPY_LLM_BREAKER_COOLDOWN_S (default 30)
+  CEDARPY_LLM_MAX_CONNECTIONS    (default 20 per pooled client)
+  CEDARPY_OPENAI_BASE_URL        (default unset: api.openai.com; e.g. a loopback fake_server)
+  CEDARPY_FAKE_LLM               (default off; serve all calls from the in-process fake, see fake_server)
+
+Usage:
+    gw = get_llm_gateway()
+    client = gw.sync_client()          # OpenAI-compatible: client.chat.completions.create(...)
+    aclient = gw.async_client()        # AsyncOpenAI-compatible
+    llm_gateway_stats()                # calls, retries, failures, breaker states
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .scheduler import LLMScheduler, get_llm_scheduler
+from .response_cache import LLMResponseCache, get_llm_response_cache
+from .usage_ledger import UsageLedger, get_usage_ledger
+from cedar_app.utils.tracing import instrument
+from cedar_app.utils.cassette import LLM_CODEC, llm_is_stream, llm_key, tape
+from cedar_app.env_utils import env_float
+
+
+class LLMCircuitOpen(Exception):
+    def __init__(self, model: str, retry_in_s: float):
+        self.model = model
+        self.retry_in_s = retry_in_s
+        super().__init__(f"LLM circuit open for {model or 'default model'}; retry in {retry_in_s:.0f}s")
+
+
+# ----------------------------------------------------------------------------------
+# Settings file cache (mtime invalidation)
+# ----------------------------------------------------------------------------------
+
+_settings_lock = threading.Lock()
+_settings_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, str]]] = {}
+
+
+def settings_path() -> str:
+    from cedar_app.config import DATA_DIR
+    return os.path.join(DATA_DIR, ".env")
+
+
+def settings_values(path: Optional[str] = None) -> Dict[str, str]:
+    """Parsed KEY=VALUE pairs of the settings file; re-read only when its mtime/size changes."""
+    path = path or settings_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _settings_lock:
+        cached = _settings_cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    values: Dict[str, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                s = line.strip()
+                if not s or s.startswith("#") or "=" not in s:
+                    continue
+                kk, vv = s.split("=", 1)
+                values.setdefault(kk.strip(), vv.strip().strip('"').strip("'"))
+    except Exception as e:
+        print(f"[llm-gateway] could not read settings file {path}: {e}")
+    with _settings_lock:
+        _settings_cache[path] = (stamp, values)
+    return values
+
+
+def setting(key: str, path: Optional[str] = None) -> Optional[str]:
+    """Environment first, then the (cached) settings file."""
+    v = os.getenv(key)
+    if v is not None:
+        return v
+    return settings_values(path).get(key)
+
+
+def llm_api_key() -> Optional[str]:
+    for k in ("CEDARPY_OPENAI_API_KEY", "OPENAI_API_KEY"):
+        v = os.getenv(k)
+        if v and v.strip():
+            return v.strip()
+    for k in ("CEDARPY_OPENAI_API_KEY", "OPENAI_API_KEY"):
+        v = settings_values().get(k)
+        if v and v.strip():
+            return v.strip()
+    from .fake_server import fake_llm_enabled, FAKE_API_KEY
+    return FAKE_API_KEY if fake_llm_enabled() else None
+
+
+def llm_base_url() -> Optional[str]:
+    v = setting("CEDARPY_OPENAI_BASE_URL")
+    return v.strip() if v and v.strip() else None
+
+
+def llm_default_model() -> str:
+    return setting("CEDARPY_OPENAI_MODEL") or "gpt-5"
+
+
+# ----------------------------------------------------------------------------------
+# Retry classification
+# ----------------------------------------------------------------------------------
+
+_TIMEOUT_NAMES = {"APITimeoutError", "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout"}
+_CONNECTION_NAMES = {"APIConnectionError", "ConnectError", "RemoteProtocolError", "ReadError", "WriteError", "NetworkError"}
+_RETRY_STATUS = {408, 409, 429}
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, bool]:
+    """(retryable, counts_toward_breaker) for an exception raised by the SDK."""
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        if status >= 500:
+            return True, True
+        return status in _RETRY_STATUS, False
+    names = {c.__name__ for c in type(exc).__mro__}
+    if names & (_TIMEOUT_NAMES | _CONNECTION_NAMES) or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True, True
+    return False, False
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    try:
+        value = exc.response.headers.get("retry-after")  # type: ignore[attr-defined]
+        return float(value) if value is not None else None
+    except Exception:
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: Optional[int] = None, base_s: Optional[float] = None, max_s: Optional[float] = None,
+                 rng: Optional[random.Random] = None):
+        self.max_retries = int(env_float("CEDARPY_LLM_MAX_RETRIES", 3, minimum=0.0)) if max_retries is None else max_retries
+        self.base_s = env_float("CEDARPY_LLM_BACKOFF_BASE_S", 0.5, minimum=0.0) if base_s is None else base_s
+        self.max_s = env_float("CEDARPY_LLM_BACKOFF_MAX_S", 8.0, minimum=0.0) if max_s is None else max_s
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        """Full-jitter exponential backoff for retry number `attempt` (1-based)."""
+        hinted = _retry_after(exc) if exc is not None else None
+        if hinted is not None:
+            return min(self.max_s, max(0.0, hinted))
+        return self._rng.uniform(0, min(self.max_s, self.base_s * (2 ** (attempt - 1))))
+
+
+# ----------------------------------------------------------------------------------
+# Circuit breaker
+# ----------------------------------------------------------------------------------
+
+class CircuitBreaker:
+    def __init__(self, failures: Optional[int] = None, cooldown_s: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.threshold = int(env_float("CEDARPY_LLM_BREAKER_FAILURES", 5, minimum=0.0)) if failures is None else failures
+        self.cooldown_s = env_float("CEDARPY_LLM_BREAKER_COOLDOWN_S", 30.0, minimum=0.0) if cooldown_s is None else cooldown_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self.opened_at >= self.cooldown_s else "open"
+
+    def before_call(self, model: str = "") -> None:
+        """Raise LLMCircuitOpen while open; in half-open, let exactly one trial call through."""
+        if not self.threshold:
+            return
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            remaining = max(0.0, self.cooldown_s - (self._clock() - (self.opened_at or 0)))
+        raise LLMCircuitOpen(model, remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            reopen = self.trial_in_flight
+            self.trial_in_flight = False
+            if self.threshold and (reopen or self.consecutive_failures >= self.threshold):
+                if self.opened_at is None or reopen:
+                    self.times_opened += 1
+                self.opened_at = self._clock()
+
+    def release_trial(self) -> None:
+        """A half-open trial ended with an error that says nothing about availability (e.g. 400)."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self.consecutive_failures, "times_opened": self.times_opened}
+
+
+# ----------------------------------------------------------------------------------
+# Gateway
+# ----------------------------------------------------------------------------------
+
+_DEFAULT_COMPLETION_TOKENS = 1000
+
+
+def estimate_call_tokens(kwargs: Dict[str, Any]) -> int:
+    """Prompt estimate plus the completion limit, for rate-limit admission before the call."""
+    from cedar_app.utils.query_budget import estimate_tokens
+    completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or _DEFAULT_COMPLETION_TOKENS
+    try:
+        completion = int(completion)
+    except Exception:
+        completion = _DEFAULT_COMPLETION_TOKENS
+    return estimate_tokens(kwargs.get("messages")) + completion
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return int(total) if isinstance(total, int) else None
+
+
+def _llm_span_attributes(gateway: Any, api_key: Optional[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {"model": kwargs.get("model"), "stream": bool(kwargs.get("stream")), "messages": len(kwargs.get("messages") or [])}
+
+
+def _llm_result_attributes(response: Any) -> Dict[str, Any]:
+    usage = getattr(response, "usage", None)
+    return {
+        "cache_hit": bool(getattr(response, "cedar_cache_hit", False)),
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+    }
+
+
+class LLMGateway:
+    def __init__(self, policy: Optional[RetryPolicy] = None, sync_factory: Optional[Callable[[str], Any]] = None,
+                 async_factory: Optional[Callable[[str], Any]] = None, scheduler: Optional[LLMScheduler] = None,
+                 cache: Optional[LLMResponseCache] = None, ledger: Optional[UsageLedger] = None):
+        self.policy = policy or RetryPolicy()
+        self.fake = None  # the FakeLLM behind the factories, when running against the fake
+        self.scheduler = scheduler or get_llm_scheduler()
+        self.cache = cache or get_llm_response_cache()
+        self.ledger = ledger or get_usage_ledger()
+        self.timeout_s = env_float("CEDARPY_LLM_TIMEOUT_S", 120.0, minimum=0.0)
+        self._sync_factory = sync_factory or self._make_sync_client
+        self._async_factory = async_factory or self._make_async_client
+        self._lock = threading.Lock()
+        self._sync_clients: Dict[str, Any] = {}
+        self._async_clients: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"calls": 0, "cache_hits": 0, "retries": 0, "failures": 0, "circuit_rejections": 0, "clients_created": 0}
+
+    # -- pooled clients ----------------------------------------------------------------
+
+    @staticmethod
+    def _limits():
+        import httpx
+        n = int(env_float("CEDARPY_LLM_MAX_CONNECTIONS", 20, minimum=0.0)) or 20
+        return httpx.Limits(max_connections=n, max_keepalive_connections=n)
+
+    def _make_sync_client(self, api_key: str):
+        import httpx
+        from openai import OpenAI  # type: ignore
+        return OpenAI(api_key=api_key, base_url=llm_base_url(), max_retries=0, timeout=self.timeout_s or None,
+                      http_client=httpx.Client(limits=self._limits(), timeout=self.timeout_s or None))
+
+    def _make_async_client(self, api_key: str):
+        import httpx
+        from openai import AsyncOpenAI  # type: ignore
+        return AsyncOpenAI(api_key=api_key, base_url=llm_base_url(), max_retries=0, timeout=self.timeout_s or None,
+                           http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.timeout_s or None))
+
+    def raw_sync(self, api_key: Optional[str] = None):
+        key = api_key or llm_api_key()
+        if not key:
+            return None
+        with self._lock:
+            client = self._sync_clients.get(key)
+            if client is None:
+                client = self._sync_factory(key)
+                self._sync_clients[key] = client
+                self.stats["clients_created"] += 1
+            return client
+
+    def raw_async(self, api_key: Optional[str] = None):
+        """The pooled async client for the running event loop (httpx pools are bound to one loop)."""
+        key = api_key or llm_api_key()
+        if not key:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_clients.get((key, id(loop)))
+            if entry is None or entry[0] is not loop:
+                # Forget clients of loops that have been closed (tests, worker threads)
+                for k in [k for k, (lp, _) in self._async_clients.items() if lp.is_closed()]:
+                    del self._async_clients[k]
+                entry = (loop, self._async_factory(key))
+                self._async_clients[(key, id(loop))] = entry
+                self.stats["clients_created"] += 1
+            return entry[1]
+
+    def sync_client(self, api_key: Optional[str] = None) -> "GatewayClient":
+        return GatewayClient(self, api_key, is_async=False)
+
+    def async_client(self, api_key: Optional[str] = None) -> "GatewayClient":
+        return GatewayClient(self, api_key, is_async=True)
+
+    # -- policy ---------------------------------------------------------------------
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            b = self._breakers.get(model)
+            if b is None:
+                b = self._breakers[model] = CircuitBreaker()
+            return b
+
+    def _call_timeout(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if "timeout" in kwargs:
+            return kwargs
+        timeout = self.timeout_s or None
+        try:
+            from cedar_app.utils.query_budget import get_current_budget, cap_timeout
+            timeout = cap_timeout(timeout, get_current_budget())
+        except Exception:
+            pass
+        return {**kwargs, "timeout": timeout} if timeout else kwargs
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _on_error(self, breaker: CircuitBreaker, exc: BaseException, attempt: int) -> Optional[float]:
+        """Record the failure; return the delay before the next attempt, or None to raise."""
+        retryable, trips = classify_error(exc)
+        if getattr(exc, "status_code", None) == 429:
+            try:
+                self.scheduler.observe_rate_limit(exc.response.headers)  # type: ignore[attr-defined]
+            except Exception:
+                pass
+        if trips:
+            breaker.record_failure()
+        else:
+            breaker.release_trial()
+        if not retryable or attempt > self.policy.max_retries or breaker.state == "open":
+            self._count("failures")
+            return None
+        self._count("retries")
+        delay = self.policy.delay(attempt, exc)
+        print(f"[llm-gateway] {type(exc).__name__} (attempt {attempt}); retrying in {delay:.2f}s")
+        return delay
+
+    @instrument("llm.chat", kind="client", attributes=_llm_span_attributes, result_attributes=_llm_result_attributes)
+    @tape("llm.chat", key=llm_key, codec=LLM_CODEC, stream=llm_is_stream)
+    def call_sync(self, api_key: Optional[str], kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            response = self._call_sync(api_key, kwargs)
+        except Exception:
+            self.ledger.observe_failure(kwargs, started)
+            raise
+        return self.ledger.observe(kwargs, response, started)
+
+    def _call_sync(self, api_key: Optional[str], kwargs: Dict[str, Any]) -> Any:
+        kwargs, cache_key, cache_ttl, serve_cached = self.cache.plan(kwargs)
+        stream = bool(kwargs.get("stream"))
+        if cache_key and serve_cached:
+            cached = self.cache.lookup(cache_key, stream)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+        model = str(kwargs.get("model") or "")
+        breaker = self.breaker(model)
+        kwargs = self._call_timeout(kwargs)
+        estimate = estimate_call_tokens(kwargs)
+        attempt = 0
+        while True:
+            attempt += 1
+            grant = self.scheduler.acquire_sync(estimate)
+            try:
+                breaker.before_call(model)
+            except LLMCircuitOpen:
+                self.scheduler.release(grant, 0)
+                self._count("circuit_rejections")
+                raise
+            client = self.raw_sync(api_key)
+            if client is None:
+                self.scheduler.release(grant, 0)
+                breaker.release_trial()
+                raise RuntimeError("No OpenAI API key configured")
+            self._count("calls")
+            try:
+                response = client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.scheduler.release(grant)
+                delay = self._on_error(breaker, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.scheduler.release(grant, _usage_tokens(response))
+            breaker.record_success()
+            if cache_key:
+                return self.cache.record(cache_key, cache_ttl, response, stream)
+            return response
+
+    @instrument("llm.chat", kind="client", attributes=_llm_span_attributes, result_attributes=_llm_result_attributes)
+    @tape("llm.chat", key=llm_key, codec=LLM_CODEC, stream=llm_is_stream)
+    async def call_async(self, api_key: Optional[str], kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            response = await self._call_async(api_key, kwargs)
+        except Exception:
+            self.ledger.observe_failure(kwargs, started)
+            raise
+        return self.ledger.observe(kwargs, response, started)
+
+    async def _call_async(self, api_key: Optional[str], kwargs: Dict[str, Any]) -> Any:
+        kwargs, cache_key, cache_ttl, serve_cached = self.cache.plan(kwargs)
+        stream = bool(kwargs.get("stream"))
+        if cache_key and serve_cached:
+            cached = self.cache.lookup(cache_key, stream)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+        model = str(kwargs.get("model") or "")
+        breaker = self.breaker(model)
+        kwargs = self._call_timeout(kwargs)
+        estimate = estimate_call_tokens(kwargs)
+        attempt = 0
+        while True:
+            attempt += 1
+            grant = await self.scheduler.acquire_async(estimate)
+            try:
+                breaker.before_call(model)
+            except LLMCircuitOpen:
+                self.scheduler.release(grant, 0)
+                self._count("circuit_rejections")
+                raise
+            client = self.raw_async(api_key)
+            if client is None:
+                self.scheduler.release(grant, 0)
+                breaker.release_trial()
+                raise RuntimeError("No OpenAI API key configured")
+            self._count("calls")
+            try:
+                response = await client.chat.completions.create(**kwargs)
+            except asyncio.CancelledError:
+                self.scheduler.release(grant)
+                breaker.release_trial()
+                raise
+            except Exception as e:
+                self.scheduler.release(grant)
+                delay = self._on_error(breaker, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.release(grant, _usage_tokens(response))
+            breaker.record_success()
+            if cache_key:
+                return self.cache.record(cache_key, cache_ttl, response, stream)
+            return response
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+            breakers = dict(self._breakers)
+            out["pooled_clients"] = {"sync": len(self._sync_clients), "async": len(self._async_clients)}
+        out["breakers"] = {m or "default": b.snapshot() for m, b in breakers.items()}
+        out["scheduler"] = self.scheduler.snapshot()
+        if self.fake is not None:
+            out["fake_llm"] = self.fake.snapshot()
+        out["policy"] = {"max_retries": self.policy.max_retries, "backoff_base_s": self.policy.base_s,
+                         "backoff_max_s": self.policy.max_s, "timeout_s": self.timeout_s}
+        return out
+
+
+class _GatewayCompletions:
+    def __init__(self, client: "GatewayClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        gw = self._client._gateway
+        if self._client._is_async:
+            return gw.call_async(self._client._api_key, kwargs)
+        return gw.call_sync(self._client._api_key, kwargs)
+
+
+class _GatewayChat:
+    def __init__(self, client: "GatewayClient"):
+        self.completions = _GatewayCompletions(client)
+
+
+class GatewayClient:
+    """OpenAI/AsyncOpenAI-compatible face of the gateway. chat.completions.create() goes through the
+    retry/breaker policy; any other attribute (models, files, ...) is served by the pooled client."""
+
+    def __init__(self, gateway: LLMGateway, api_key: Optional[str] = None, is_async: bool = False):
+        self._gateway = gateway
+        self._api_key = api_key
+        self._is_async = is_async
+        self.chat = _GatewayChat(self)
+
+    def __getattr__(self, name):
+        raw = self._gateway.raw_async(self._api_key) if self._is_async else self._gateway.raw_sync(self._api_key)
+        if raw is None:
+            raise AttributeError(name)
+        return getattr(raw, name)
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            from .fake_server import fake_llm_enabled, fake_llm_from_env
+            if fake_llm_enabled():
+                fake = fake_llm_from_env()
+                _gateway = LLMGateway(sync_factory=fake.sync_factory, async_factory=fake.async_factory)
+                _gateway.fake = fake
+            else:
+                _gateway = LLMGateway()
+        return _gateway
+
+
+def llm_gateway_stats() -> Dict[str, Any]:
+    return get_llm_gateway().snapshot()
@@ -0,0 +1,557 @@
+"""
+Persistent response cache for LLM calls that are pure functions of their inputs.
+
+Classifying a file with the same content, naming the same dataset, summarizing an identical changelog
+payload or re-asking the same question on unchanged project data used to send the same request to
+the API every time. Calls made inside an llm_cache() block are looked up in a SQLite file before they
+reach the scheduler, so a repeat is answered from disk in well under a millisecond and costs nothing:
+
+    with llm_cache():                                  # default TTL
+        resp = client.chat.completions.create(...)
+    with llm_cache(ttl_s=3600, scope="project:3:..."):  # scope is part of the key
+        ...
+    with chat_cache(project_id, branch_id):              # chat: scope = project database fingerprint
+        ...
+
+The key is a sha256 of the model, the normalized messages (line endings and surrounding whitespace
+of text parts), tools / functions / response_format schemas, temperature and every other request
+parameter, plus the caller's scope. Messages built with volatile_message() (run-time state such as
+the query budget counters, which change on every call) are sent but left out of the key. Transport-only parameters (stream, timeout, extra headers, user)
+are not part of the key, so a streamed call and a plain call share entries: a hit for a streamed call
+is replayed as a one-chunk stream. A streamed response is stored only when it ends normally with
+plain text (no tool calls).
+
+Bypass: a call is never served from the cache (but its fresh answer is stored) when
+  - it is made inside llm_cache_bypass(), which the HTTP middleware and chat websocket enter when the
+    request carries the header "X-Cedar-LLM-Cache: bypass" (or the chat message has "llm_cache": "bypass");
+  - the call itself passes extra_headers={"X-Cedar-LLM-Cache": "bypass"} (the header is not sent upstream).
+
+Hits are marked with response.cedar_cache_hit = True; the query budget does not count or charge them.
+
+Configuration:
+  CEDARPY_LLM_CACHE              (default 1; 0 disables the cache)
+  CEDARPY_LLM_CACHE_PATH         (default DATA_DIR/cache/llm_responses.sqlite)
+  CEDARPY_LLM_CACHE_TTL_S        (default 604800 = 7 days; per-block ttl_s overrides)
+  CEDARPY_LLM_CACHE_CHAT_TTL_S   (default 3600; chat answers, keyed on the project's data; 0 disables)
+  CEDARPY_LLM_CACHE_MAX_MB       (default 256; least recently used entries are evicted beyond it)
+  CEDARPY_LLM_CACHE_MAX_ENTRY_KB (default 512; larger responses are not stored)
+
+Usage:
+    llm_response_cache_stats()   # hits, misses, stores, evictions, bytes, hit_rate, saved_tokens
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import types
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+from cedar_app.env_utils import env_float
+
+BYPASS_HEADER = "X-Cedar-LLM-Cache"
+_BYPASS_VALUES = {"bypass", "no-cache", "off", "0", "false", "refresh"}
+
+# Messages with this name carry run-time state and are not part of the cache key (see volatile_message)
+VOLATILE_MESSAGE_NAME = "cedar_volatile"
+
+# Request parameters that change how the answer is delivered, not what it is
+_TRANSPORT_PARAMS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query", "extra_body", "user", "metadata", "store"}
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl_s: Optional[float] = None
+    scope: Optional[str] = None
+
+
+current_cache_policy: contextvars.ContextVar[Optional[CachePolicy]] = contextvars.ContextVar("cedar_llm_cache_policy", default=None)
+current_cache_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("cedar_llm_cache_bypass", default=False)
+
+
+@contextmanager
+def llm_cache(ttl_s: Optional[float] = None, scope: Optional[str] = None) -> Iterator[CachePolicy]:
+    """Mark LLM calls made in this block (and tasks started from it) as cacheable."""
+    policy = CachePolicy(ttl_s=ttl_s, scope=scope)
+    token = current_cache_policy.set(policy)
+    try:
+        yield policy
+    finally:
+        current_cache_policy.reset(token)
+
+
+@contextmanager
+def llm_cache_bypass(active: bool = True) -> Iterator[None]:
+    """Do not serve calls in this block from the cache (fresh answers are still stored)."""
+    token = current_cache_bypass.set(bool(active) or current_cache_bypass.get())
+    try:
+        yield
+    finally:
+        current_cache_bypass.reset(token)
+
+
+def project_scope(project_id: Optional[int], branch_id: Optional[int] = None) -> Optional[str]:
+    """Scope for answers that depend on a project's data; it changes with every write to the project
+    database (mtime and size of the file and its WAL). None if the database cannot be inspected."""
+    if not project_id:
+        return "project:none"
+    try:
+        from cedar_app.db_utils import _project_dirs
+        db_path = _project_dirs(int(project_id))["db_path"]
+    except Exception:
+        return None
+    parts = [f"project:{project_id}", f"branch:{branch_id}"]
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+@contextmanager
+def chat_cache(project_id: Optional[int] = None, branch_id: Optional[int] = None, bypass: bool = False) -> Iterator[None]:
+    """Cache policy for one chat orchestration: the same question on unchanged project data is answered
+    from the cache for CEDARPY_LLM_CACHE_CHAT_TTL_S (0 turns chat caching off)."""
+    ttl = env_float("CEDARPY_LLM_CACHE_CHAT_TTL_S", 3600, minimum=0.0)
+    scope = project_scope(project_id, branch_id) if ttl > 0 else None
+    if scope is None:
+        yield
+        return
+    with llm_cache(ttl_s=ttl, scope=scope), llm_cache_bypass(bypass):
+        yield
+
+
+def bypass_requested(headers: Any) -> bool:
+    """True if a request's headers ask for a cache bypass (X-Cedar-LLM-Cache: bypass)."""
+    try:
+        value = headers.get(BYPASS_HEADER) or headers.get(BYPASS_HEADER.lower())
+    except Exception:
+        return False
+    return str(value or "").strip().lower() in _BYPASS_VALUES
+
+
+def is_cache_hit(response: Any) -> bool:
+    return bool(getattr(response, "cedar_cache_hit", False))
+
+
+def cache_enabled() -> bool:
+    return str(os.getenv("CEDARPY_LLM_CACHE", "1")).strip().lower() not in {"0", "false", "no", "off"}
+
+
+# ----------------------------------------------------------------------------------
+# Keys and (de)serialization
+# ----------------------------------------------------------------------------------
+
+def _plain(value: Any) -> Any:
+    """JSON-compatible form of SDK objects (pydantic models, namespaces), dicts and lists."""
+    if hasattr(value, "model_dump"):
+        try:
+            return _plain(value.model_dump(mode="json", exclude_none=True))
+        except Exception:
+            pass
+    if isinstance(value, types.SimpleNamespace):
+        value = vars(value)
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _normalize_text(text: str) -> str:
+    return text.replace("\r\n", "\n").strip()
+
+
+def volatile_message(content: str, role: str = "system") -> Dict[str, Any]:
+    """A message that is sent to the model but does not split the cache (e.g. budget counters, elapsed time)."""
+    return {"role": role, "name": VOLATILE_MESSAGE_NAME, "content": content}
+
+
+def normalize_messages(messages: Any) -> Any:
+    out = []
+    for m in _plain(messages) or []:
+        if isinstance(m, dict):
+            if m.get("name") == VOLATILE_MESSAGE_NAME:
+                continue
+            m = dict(m)
+            content = m.get("content")
+            if isinstance(content, str):
+                m["content"] = _normalize_text(content)
+            elif isinstance(content, list):
+                m["content"] = [dict(p, text=_normalize_text(p["text"])) if isinstance(p, dict) and isinstance(p.get("text"), str) else p
+                                for p in content]
+        out.append(m)
+    return out
+
+
+def cache_key(kwargs: Dict[str, Any], scope: Optional[str] = None) -> str:
+    payload = {k: _plain(v) for k, v in kwargs.items() if k not in _TRANSPORT_PARAMS and k != "messages"}
+    payload["messages"] = normalize_messages(kwargs.get("messages"))
+    payload["__scope__"] = scope
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _mark(obj: Any) -> Any:
+    try:
+        setattr(obj, "cedar_cache_hit", True)
+    except Exception:
+        try:
+            object.__setattr__(obj, "cedar_cache_hit", True)
+        except Exception:
+            pass
+    return obj
+
+
+def _namespace(value: Any) -> Any:
+    if isinstance(value, dict):
+        return types.SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def materialize(data: Dict[str, Any]) -> Any:
+    """A ChatCompletion (or an attribute-compatible namespace) for a stored response."""
+    try:
+        from openai.types.chat import ChatCompletion  # type: ignore
+        obj = ChatCompletion.model_validate(data)
+    except Exception:
+        obj = _namespace(data)
+        for choice in getattr(obj, "choices", None) or []:
+            msg = getattr(choice, "message", None)
+            if msg is not None and not hasattr(msg, "tool_calls"):
+                msg.tool_calls = None
+    return _mark(obj)
+
+
+def _replay_chunk(data: Dict[str, Any]) -> Any:
+    choices = []
+    for c in data.get("choices") or []:
+        msg = c.get("message") or {}
+        choices.append(types.SimpleNamespace(
+            index=c.get("index", 0),
+            delta=types.SimpleNamespace(role=msg.get("role", "assistant"), content=msg.get("content"), tool_calls=None),
+            finish_reason=c.get("finish_reason") or "stop",
+        ))
+    return types.SimpleNamespace(id=data.get("id"), object="chat.completion.chunk", model=data.get("model"),
+                                 created=data.get("created"), choices=choices, usage=None, cedar_cache_hit=True)
+
+
+class ReplayStream:
+    """A cached answer served to a caller that asked for stream=True: one chunk with the full text."""
+
+    cedar_cache_hit = True
+
+    def __init__(self, data: Dict[str, Any]):
+        self._chunks = [_replay_chunk(data)]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    async def _aiter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    def __aiter__(self):
+        return self._aiter()
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class RecordingStream:
+    """Passes a live stream through and stores the assembled answer when it ends normally."""
+
+    def __init__(self, stream: Any, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._parts = []
+        self._meta: Dict[str, Any] = {}
+        self._finish: Optional[str] = None
+        self._storable = True
+
+    def _observe(self, chunk: Any) -> None:
+        try:
+            for key in ("id", "model", "created"):
+                if getattr(chunk, key, None) is not None and key not in self._meta:
+                    self._meta[key] = getattr(chunk, key)
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                self._meta["usage"] = _plain(usage)
+            for choice in getattr(chunk, "choices", None) or []:
+                if getattr(choice, "index", 0):
+                    self._storable = False
+                    continue
+                delta = getattr(choice, "delta", None)
+                if getattr(delta, "tool_calls", None) or getattr(delta, "function_call", None):
+                    self._storable = False
+                text = getattr(delta, "content", None)
+                if text:
+                    self._parts.append(text)
+                if getattr(choice, "finish_reason", None):
+                    self._finish = choice.finish_reason
+        except Exception:
+            self._storable = False
+
+    def _complete(self) -> None:
+        if not (self._storable and self._finish):
+            return
+        data = {
+            "id": self._meta.get("id") or "cached",
+            "object": "chat.completion",
+            "created": int(self._meta.get("created") or time.time()),
+            "model": self._meta.get("model") or "",
+            "choices": [{"index": 0, "finish_reason": self._finish,
+                         "message": {"role": "assistant", "content": "".join(self._parts)}}],
+        }
+        if self._meta.get("usage"):
+            data["usage"] = self._meta["usage"]
+        self._on_complete(data)
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._observe(chunk)
+            yield chunk
+        self._complete()
+
+    async def _aiter(self):
+        async for chunk in self._stream:
+            self._observe(chunk)
+            yield chunk
+        self._complete()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# ----------------------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------------------
+
+def _default_path() -> str:
+    from cedar_app.config import DATA_DIR
+    return os.path.join(DATA_DIR, "cache", "llm_responses.sqlite")
+
+
+class LLMResponseCache:
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None, default_ttl_s: Optional[float] = None,
+                 max_entry_bytes: Optional[int] = None, clock=time.time):
+        self._path = path
+        self.max_bytes = int(env_float("CEDARPY_LLM_CACHE_MAX_MB", 256, minimum=0.0) * 1024 * 1024) if max_bytes is None else max_bytes
+        self.max_entry_bytes = int(env_float("CEDARPY_LLM_CACHE_MAX_ENTRY_KB", 512, minimum=0.0) * 1024) if max_entry_bytes is None else max_entry_bytes
+        self.default_ttl_s = env_float("CEDARPY_LLM_CACHE_TTL_S", 7 * 86400, minimum=0.0) if default_ttl_s is None else default_ttl_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bytes = 0
+        self._broken = False
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "expired": 0, "evictions": 0,
+                      "too_large": 0, "errors": 0, "saved_tokens": 0}
+
+    @property
+    def path(self) -> str:
+        return self._path or os.getenv("CEDARPY_LLM_CACHE_PATH") or _default_path()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Open lazily; caller holds the lock. After an open failure the cache stays off."""
+        if self._conn is not None or self._broken:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, size INTEGER NOT NULL,"
+                " tokens INTEGER, created REAL NOT NULL, expires REAL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses(last_used)")
+            self._bytes = int(conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0])
+            self._conn = conn
+        except Exception as e:
+            self._broken = True
+            print(f"[llm-cache] disabled; could not open {self.path}: {e}")
+        return self._conn
+
+    # -- storage -------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT response, expires, size, tokens FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                if row[1] is not None and row[1] <= now:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    conn.commit()
+                    self._bytes -= int(row[2])
+                    self.stats["expired"] += 1
+                    self.stats["misses"] += 1
+                    return None
+                conn.execute("UPDATE llm_responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                conn.commit()
+                self.stats["hits"] += 1
+                self.stats["saved_tokens"] += int(row[3] or 0)
+                return json.loads(row[0])
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[llm-cache] lookup failed: {type(e).__name__}: {e}")
+                return None
+
+    def put(self, key: str, data: Dict[str, Any], ttl_s: Optional[float] = None) -> bool:
+        ttl = self.default_ttl_s if ttl_s is None else ttl_s
+        try:
+            blob = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        except Exception:
+            return False
+        size = len(blob.encode("utf-8"))
+        now = self._clock()
+        usage = data.get("usage") if isinstance(data, dict) else None
+        tokens = usage.get("total_tokens") if isinstance(usage, dict) else None
+        with self._lock:
+            if self.max_entry_bytes and size > self.max_entry_bytes:
+                self.stats["too_large"] += 1
+                return False
+            conn = self._db()
+            if conn is None:
+                return False
+            try:
+                old = conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model, response, size, tokens, created, expires, last_used, hits)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, str(data.get("model") or ""), blob, size, tokens if isinstance(tokens, int) else None,
+                     now, (now + ttl) if ttl else None, now),
+                )
+                self._bytes += size - (int(old[0]) if old else 0)
+                if self.max_bytes and self._bytes > self.max_bytes:
+                    self._evict(conn, now)
+                conn.commit()
+                self.stats["stores"] += 1
+                return True
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[llm-cache] store failed: {type(e).__name__}: {e}")
+                return False
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least recently used ones down to 90% of max_bytes."""
+        expired = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses WHERE expires IS NOT NULL AND expires <= ?", (now,)).fetchone()
+        if expired[0]:
+            conn.execute("DELETE FROM llm_responses WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            self._bytes -= int(expired[1])
+            self.stats["expired"] += int(expired[0])
+        target = int(self.max_bytes * 0.9)
+        if self._bytes <= target:
+            return
+        doomed = []
+        freed = 0
+        for key, size in conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used ASC"):
+            if self._bytes - freed <= target:
+                break
+            doomed.append((key,))
+            freed += int(size)
+        conn.executemany("DELETE FROM llm_responses WHERE key = ?", doomed)
+        self._bytes -= freed
+        self.stats["evictions"] += len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_responses")
+                conn.commit()
+                self._bytes = 0
+
+    # -- gateway integration -------------------------------------------------------
+
+    def plan(self, kwargs: Dict[str, Any]):
+        """(kwargs to send, key, ttl_s, serve_from_cache) for this call; key is None when it is not cacheable."""
+        headers = kwargs.get("extra_headers")
+        per_call_bypass = isinstance(headers, dict) and any(k.lower() == BYPASS_HEADER.lower() for k in headers)
+        if per_call_bypass:
+            per_call_bypass = bypass_requested({k.lower(): v for k, v in headers.items()})
+            rest = {k: v for k, v in headers.items() if k.lower() != BYPASS_HEADER.lower()}
+            kwargs = dict(kwargs)
+            if rest:
+                kwargs["extra_headers"] = rest
+            else:
+                kwargs.pop("extra_headers")
+        policy = current_cache_policy.get()
+        if policy is None or not cache_enabled() or kwargs.get("n", 1) not in (1, None):
+            return kwargs, None, None, False
+        serve = not (per_call_bypass or current_cache_bypass.get())
+        if not serve:
+            with self._lock:
+                self.stats["bypassed"] += 1
+        return kwargs, cache_key(kwargs, policy.scope), policy.ttl_s, serve
+
+    def lookup(self, key: str, stream: bool = False) -> Any:
+        data = self.get(key)
+        if data is None:
+            return None
+        return ReplayStream(data) if stream else materialize(data)
+
+    def record(self, key: str, ttl_s: Optional[float], response: Any, stream: bool = False) -> Any:
+        """Store a fresh response (streams are stored when they finish); returns what the caller should get."""
+        if stream:
+            return RecordingStream(response, lambda data: self.put(key, data, ttl_s))
+        data = _plain(response)
+        if isinstance(data, dict) and data.get("choices"):
+            self.put(key, data, ttl_s)
+        return response
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+            conn = self._db()
+            entries = 0
+            if conn is not None:
+                try:
+                    entries = int(conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0])
+                except Exception:
+                    pass
+            out.update({"entries": entries, "bytes": self._bytes, "max_bytes": self.max_bytes,
+                        "default_ttl_s": self.default_ttl_s, "path": self.path, "enabled": cache_enabled() and not self._broken})
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
+
+
+def llm_response_cache_stats() -> Dict[str, Any]:
+    return get_llm_response_cache().snapshot()
@@ -0,0 +1,397 @@
+"""
+Fair-share scheduling of LLM calls between interactive chat and background work.
+
+Upload classification, tabular import codegen, dataset naming, changelog summaries and image analysis
+share the API key (and the provider's rate limits) with interactive chat. Without scheduling a bulk
+upload fills the provider's per-minute quota and chat answers queue behind it or hit 429s. Every call
+made through the LLM gateway is admitted here first:
+
+  lanes       interactive (chat, agents) > nearline (changelog summaries, dataset naming, image analysis)
+              > batch (upload classification, tabular import). The lane comes from a context variable
+              (llm_lane); calls outside any lane are interactive. Waiting calls are served in lane order;
+              a call that has waited CEDARPY_LLM_AGING_S is promoted one lane per period, so batch work
+              cannot starve forever.
+  fair share  within a lane, the project that received the least recent service (in flight plus a
+              decaying count of grants) goes first, so one project's bulk upload does not block another's.
+  rate        token buckets for requests/minute and tokens/minute. Lower lanes may only use the bucket
+              down to a reserve (nearline 10%, batch 30%), which keeps headroom for chat bursts. Limits come
+              from CEDARPY_LLM_RPM / CEDARPY_LLM_TPM, or are learned from the provider's
+              x-ratelimit-limit-* headers on a 429 (0 = unknown, no bucket).
+  concurrency at most CEDARPY_LLM_NEARLINE_CONCURRENCY (4) nearline and CEDARPY_LLM_BATCH_CONCURRENCY (2)
+              batch calls are in flight at once; interactive calls are not capped.
+
+A call waits at most CEDARPY_LLM_QUEUE_TIMEOUT_S (default 300) before LLMQueueTimeout is raised.
+
+Usage:
+    with llm_lane("batch", project_id=pid):
+        client.chat.completions.create(...)      # admitted by the gateway
+    llm_scheduler_stats()                        # per-lane queue-wait metrics (also in /api/llm/gateway/stats)
+"""
+
+from __future__ import annotations
+
+import os
+import math
+import time
+import asyncio
+import itertools
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from cedar_app.env_utils import env_float
+
+LANES = ("interactive", "nearline", "batch")
+_PRIORITY = {lane: i for i, lane in enumerate(LANES)}
+_RESERVE = {"interactive": 0.0, "nearline": 0.1, "batch": 0.3}
+_SHARE_HALF_LIFE_S = 60.0
+
+current_lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("cedar_llm_lane", default=None)
+current_project: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("cedar_llm_project", default=None)
+
+
+class LLMQueueTimeout(TimeoutError):
+    def __init__(self, lane: str, waited_s: float):
+        self.lane = lane
+        self.waited_s = waited_s
+        super().__init__(f"LLM call waited {waited_s:.0f}s in the {lane} lane without being admitted")
+
+
+@contextlib.contextmanager
+def llm_lane(lane: str, project_id: Optional[int] = None) -> Iterator[None]:
+    """Run the enclosed LLM calls in `lane` (and on behalf of `project_id`, if given)."""
+    lane = lane if lane in _PRIORITY else "interactive"
+    lane_token = current_lane.set(lane)
+    project_token = current_project.set(project_id) if project_id is not None else None
+    try:
+        yield
+    finally:
+        if project_token is not None:
+            current_project.reset(project_token)
+        current_lane.reset(lane_token)
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding up to `per_minute` units (0 = unlimited)."""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.per_minute = float(per_minute or 0)
+        self.level = self.per_minute
+        self._last = clock()
+
+    def set_limit(self, per_minute: float) -> None:
+        self.refill()
+        self.per_minute = float(per_minute or 0)
+        self.level = min(self.level, self.per_minute) if self.level else self.per_minute
+
+    def refill(self) -> None:
+        now = self._clock()
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self._last) * self.per_minute / 60.0)
+        self._last = now
+
+    def shortfall(self, amount: float, reserve_fraction: float) -> float:
+        """Seconds until `amount` can be taken while leaving the reserve (0 = available now)."""
+        if not self.per_minute:
+            return 0.0
+        need = min(self.per_minute, amount + reserve_fraction * self.per_minute)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + amount)
+
+
+@dataclass
+class Grant:
+    lane: str
+    project: Optional[int]
+    tokens: int
+    wait_ms: float
+
+
+class _Waiter:
+    __slots__ = ("lane", "project", "tokens", "seq", "enqueued", "wake")
+
+    def __init__(self, lane: str, project: Optional[int], tokens: int, seq: int, enqueued: float, wake: Callable[[], None]):
+        self.lane = lane
+        self.project = project
+        self.tokens = tokens
+        self.seq = seq
+        self.enqueued = enqueued
+        self.wake = wake
+
+
+class _LaneStats:
+    def __init__(self):
+        self.granted = 0
+        self.queued_total = 0
+        self.timeouts = 0
+        self.waits_ms: Deque[float] = deque(maxlen=1000)
+
+    def snapshot(self, queued: int, in_flight: int) -> Dict[str, Any]:
+        waits = sorted(self.waits_ms)
+
+        def pct(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 1) if waits else 0.0
+
+        return {
+            "queued": queued,
+            "in_flight": in_flight,
+            "granted": self.granted,
+            "waited": self.queued_total,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_ms_p50": pct(0.50),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+        }
+
+
+class LLMScheduler:
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._configured = {"rpm": rpm is not None or bool(os.getenv("CEDARPY_LLM_RPM")),
+                            "tpm": tpm is not None or bool(os.getenv("CEDARPY_LLM_TPM"))}
+        self.requests = TokenBucket(env_float("CEDARPY_LLM_RPM", 0, minimum=0.0) if rpm is None else rpm, clock)
+        self.tokens = TokenBucket(env_float("CEDARPY_LLM_TPM", 0, minimum=0.0) if tpm is None else tpm, clock)
+        self.concurrency = {
+            "interactive": 0,
+            "nearline": int(env_float("CEDARPY_LLM_NEARLINE_CONCURRENCY", 4, minimum=0.0)),
+            "batch": int(env_float("CEDARPY_LLM_BATCH_CONCURRENCY", 2, minimum=0.0)),
+        }
+        self.aging_s = env_float("CEDARPY_LLM_AGING_S", 60.0, minimum=0.0)
+        self.queue_timeout_s = env_float("CEDARPY_LLM_QUEUE_TIMEOUT_S", 300.0, minimum=0.0)
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._project_in_flight: Dict[Tuple[str, Any], int] = {}
+        self._share: Dict[Tuple[str, Any], Tuple[float, float]] = {}  # (lane, project) -> (value, at)
+        self._stats = {lane: _LaneStats() for lane in LANES}
+
+    # -- ordering --------------------------------------------------------------------
+
+    def _decayed_share(self, key: Tuple[str, Any], now: float) -> float:
+        value, at = self._share.get(key, (0.0, now))
+        return value * math.exp(-(now - at) * math.log(2) / _SHARE_HALF_LIFE_S)
+
+    def _effective_priority(self, w: _Waiter, now: float) -> int:
+        prio = _PRIORITY[w.lane]
+        if self.aging_s:
+            prio -= int((now - w.enqueued) / self.aging_s)
+        return max(0, prio)
+
+    def _order(self, w: _Waiter, now: float):
+        key = (w.lane, w.project)
+        return (self._effective_priority(w, now), self._project_in_flight.get(key, 0) + self._decayed_share(key, now), w.seq)
+
+    # -- admission (call with the lock held) ------------------------------------------
+
+    def _capped(self, lane: str) -> bool:
+        cap = self.concurrency.get(lane) or 0
+        return bool(cap) and self._in_flight[lane] >= cap
+
+    def _try_grant(self, w: _Waiter) -> Optional[float]:
+        """Grant `w` if it is next in line and capacity allows; otherwise return seconds to wait."""
+        now = self._clock()
+        # Waiters of lanes at their concurrency cap cannot be admitted and must not hold up the others
+        eligible = [x for x in self._waiters if not self._capped(x.lane)]
+        if w not in eligible or min(eligible, key=lambda x: self._order(x, now)) is not w:
+            return 1.0  # woken when a call is admitted or capacity is released
+        reserve = _RESERVE[LANES[self._effective_priority(w, now)]]
+        self.requests.refill()
+        self.tokens.refill()
+        wait = max(self.requests.shortfall(1, reserve), self.tokens.shortfall(w.tokens, reserve))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(w.tokens)
+        self._waiters.remove(w)
+        key = (w.lane, w.project)
+        self._in_flight[w.lane] += 1
+        self._project_in_flight[key] = self._project_in_flight.get(key, 0) + 1
+        self._share[key] = (self._decayed_share(key, now) + 1.0, now)
+        return None
+
+    def _enqueue(self, lane: str, project: Optional[int], tokens: int, wake: Callable[[], None]) -> _Waiter:
+        lane = lane if lane in _PRIORITY else "interactive"
+        w = _Waiter(lane, project, max(0, int(tokens)), next(self._seq), self._clock(), wake)
+        self._waiters.append(w)
+        return w
+
+    def _granted(self, w: _Waiter, waited: bool) -> Grant:
+        wait_ms = (self._clock() - w.enqueued) * 1000.0
+        st = self._stats[w.lane]
+        st.granted += 1
+        if waited:
+            st.queued_total += 1
+        st.waits_ms.append(wait_ms)
+        self._wake_all()
+        return Grant(w.lane, w.project, w.tokens, wait_ms)
+
+    def _abandon(self, w: _Waiter, timed_out: bool) -> None:
+        if w in self._waiters:
+            self._waiters.remove(w)
+        if timed_out:
+            self._stats[w.lane].timeouts += 1
+        self._wake_all()
+
+    def _wake_all(self) -> None:
+        for other in list(self._waiters):
+            try:
+                other.wake()
+            except Exception:
+                pass
+
+    def _pause(self, w: _Waiter, wait: float) -> Optional[float]:
+        """How long to sleep before re-checking (None = the queue timeout has passed)."""
+        pause = min(max(wait, 0.01), 1.0)
+        if self.queue_timeout_s:
+            left = self.queue_timeout_s - (self._clock() - w.enqueued)
+            if left <= 0:
+                return None
+            pause = min(pause, left)
+        return pause
+
+    def _lane_and_project(self, lane: Optional[str], project: Optional[int]) -> Tuple[str, Optional[int]]:
+        return (lane or current_lane.get() or "interactive"), (project if project is not None else current_project.get())
+
+    # -- public API --------------------------------------------------------------------
+
+    def acquire_sync(self, tokens: int = 0, lane: Optional[str] = None, project: Optional[int] = None) -> Grant:
+        lane, project = self._lane_and_project(lane, project)
+        event = threading.Event()
+        with self._lock:
+            w = self._enqueue(lane, project, tokens, event.set)
+            wait = self._try_grant(w)
+            if wait is None:
+                return self._granted(w, waited=False)
+        while True:
+            pause = self._pause(w, wait)
+            if pause is None:
+                with self._lock:
+                    self._abandon(w, timed_out=True)
+                raise LLMQueueTimeout(w.lane, self._clock() - w.enqueued)
+            event.wait(pause)
+            event.clear()
+            with self._lock:
+                wait = self._try_grant(w)
+                if wait is None:
+                    return self._granted(w, waited=True)
+
+    async def acquire_async(self, tokens: int = 0, lane: Optional[str] = None, project: Optional[int] = None) -> Grant:
+        lane, project = self._lane_and_project(lane, project)
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(event.set)
+
+        with self._lock:
+            w = self._enqueue(lane, project, tokens, wake)
+            wait = self._try_grant(w)
+            if wait is None:
+                return self._granted(w, waited=False)
+        try:
+            while True:
+                pause = self._pause(w, wait)
+                if pause is None:
+                    with self._lock:
+                        self._abandon(w, timed_out=True)
+                    raise LLMQueueTimeout(w.lane, self._clock() - w.enqueued)
+                # A timer instead of wait_for: wait_for can swallow a cancellation racing a wake-up
+                timer = loop.call_later(pause, event.set)
+                try:
+                    await event.wait()
+                finally:
+                    timer.cancel()
+                event.clear()
+                with self._lock:
+                    wait = self._try_grant(w)
+                    if wait is None:
+                        return self._granted(w, waited=True)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._abandon(w, timed_out=False)
+            raise
+
+    def release(self, grant: Grant, actual_tokens: Optional[int] = None) -> None:
+        """End a call; reconcile its token estimate with the reported usage."""
+        with self._lock:
+            key = (grant.lane, grant.project)
+            self._in_flight[grant.lane] = max(0, self._in_flight[grant.lane] - 1)
+            left = self._project_in_flight.get(key, 1) - 1
+            if left > 0:
+                self._project_in_flight[key] = left
+            else:
+                self._project_in_flight.pop(key, None)
+            if actual_tokens is not None:
+                self.tokens.refill()
+                if actual_tokens < grant.tokens:
+                    self.tokens.give_back(grant.tokens - actual_tokens)
+                else:
+                    self.tokens.take(actual_tokens - grant.tokens)
+            self._wake_all()
+
+    def observe_rate_limit(self, headers: Any) -> None:
+        """Learn limits from x-ratelimit-* headers of a 429 and lower the buckets to the reported remaining
+        capacity so callers back off (a 429 without headers empties the requests bucket)."""
+        def header(name: str) -> Optional[float]:
+            try:
+                v = headers.get(name)
+                return float(v) if v is not None else None
+            except Exception:
+                return None
+
+        with self._lock:
+            reported = False
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                limit = header(f"x-ratelimit-limit-{kind}")
+                if limit and not self._configured["rpm" if kind == "requests" else "tpm"]:
+                    bucket.set_limit(limit)
+                remaining = header(f"x-ratelimit-remaining-{kind}")
+                bucket.refill()
+                if remaining is not None:
+                    reported = True
+                    if bucket.per_minute:
+                        bucket.level = min(bucket.level, remaining)
+            if not reported and self.requests.per_minute:
+                self.requests.level = min(self.requests.level, 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {lane: sum(1 for w in self._waiters if w.lane == lane) for lane in LANES}
+            self.requests.refill()
+            self.tokens.refill()
+            return {
+                "lanes": {lane: self._stats[lane].snapshot(queued[lane], self._in_flight[lane]) for lane in LANES},
+                "limits": {"rpm": self.requests.per_minute, "tpm": self.tokens.per_minute,
+                           "concurrency": dict(self.concurrency), "aging_s": self.aging_s},
+                "available": {"requests": round(self.requests.level, 1), "tokens": round(self.tokens.level)},
+            }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def llm_scheduler_stats() -> Dict[str, Any]:
+    return get_llm_scheduler().snapshot()
@@ -0,0 +1,495 @@
+"""
+Append-only ledger of LLM token usage, cost and latency.
+
+The query budget only bounds one chat question and forgets it afterwards; nothing recorded which
+project, feature or agent was spending tokens. Every call that goes through the gateway now appends
+one row to the llm_usage table:
+
+    ts, day (UTC), project_id, thread, agent, feature, lane, model, prompt_tokens, completion_tokens,
+    cached_tokens (prompt tokens served from the provider's prompt cache), total_tokens, cost_usd,
+    latency_ms, status (ok | error | cache_hit), estimated, stream, trace_id
+
+Attribution comes from the context the call runs in: the project and lane from llm_lane(), the agent
+from run_as_agent(), the trace from tracing, and the feature and thread from llm_usage():
+
+    with llm_usage("classify_file"):
+        client.chat.completions.create(...)
+    with llm_usage("chat", thread="chat:7"):       # nested blocks inherit the unset fields
+        ...
+
+Streamed calls are recorded when the stream ends, with the usage chunk when the server sends one and
+otherwise an estimate of about four characters per token (estimated = 1). Answers served by the LLM
+response cache are recorded as cache_hit rows without tokens or cost. Calls that fail after all
+retries are recorded as error rows.
+
+Cost uses the query budget's price table (CEDARPY_LLM_PRICES); cached prompt tokens are charged at
+CEDARPY_LLM_CACHED_INPUT_RATIO of the input price. The table has triggers that reject UPDATE and
+DELETE. Rows are buffered and written by a background thread every CEDARPY_USAGE_FLUSH_S seconds (0
+writes each row immediately); reads flush first.
+
+Budgets (CEDARPY_USAGE_BUDGETS) are a JSON object mapping a scope to limits, for example
+    {"*": {"daily_usd": 20}, "project:3": {"daily_usd": 5, "monthly_usd": 60},
+     "feature:classify_file": {"daily_tokens": 500000}, "agent:ResearchAgent": {"daily_usd": 2}}
+with daily_usd, daily_tokens, monthly_usd and monthly_tokens (UTC day, calendar month). check_budgets()
+reports every scope at or above CEDARPY_USAGE_BUDGET_WARN (default 0.8) of a limit, and whether it is
+over; /api/llm/usage/alerts serves it for alerting.
+
+Configuration:
+  CEDARPY_USAGE_LEDGER            (default 1; 0 disables recording)
+  CEDARPY_USAGE_LEDGER_PATH       (default DATA_DIR/llm_usage.sqlite)
+  CEDARPY_USAGE_FLUSH_S           (default 2)
+  CEDARPY_LLM_CACHED_INPUT_RATIO  (default 0.1)
+  CEDARPY_USAGE_BUDGETS           (default none)
+  CEDARPY_USAGE_BUDGET_WARN       (default 0.8)
+
+Usage:
+    usage_rollup(group_by=("project", "day"), days=7)   # calls, tokens, cost, latency per group
+    check_budgets()                                     # {"ok": bool, "alerts": [...]}
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from cedar_app.env_utils import env_float
+
+# group_by names accepted by rollup() -> column
+GROUP_COLUMNS = {
+    "project": "project_id", "thread": "thread", "agent": "agent", "feature": "feature",
+    "lane": "lane", "model": "model", "day": "day", "status": "status",
+}
+_COLUMNS = ("ts", "day", "project_id", "thread", "agent", "feature", "lane", "model", "prompt_tokens",
+            "completion_tokens", "cached_tokens", "total_tokens", "cost_usd", "latency_ms", "status",
+            "estimated", "stream", "trace_id")
+_LIMIT_KEYS = ("daily_usd", "daily_tokens", "monthly_usd", "monthly_tokens")
+
+
+@dataclass(frozen=True)
+class UsageContext:
+    feature: Optional[str] = None
+    project_id: Optional[int] = None
+    thread: Optional[str] = None
+
+
+current_usage: contextvars.ContextVar[UsageContext] = contextvars.ContextVar("cedar_llm_usage", default=UsageContext())
+
+
+@contextmanager
+def llm_usage(feature: Optional[str] = None, project_id: Optional[int] = None, thread: Optional[Any] = None) -> Iterator[UsageContext]:
+    """Attribute LLM calls in this block (and tasks started from it) to a feature, project and thread."""
+    outer = current_usage.get()
+    ctx = replace(outer, **{k: v for k, v in (("feature", feature), ("project_id", project_id),
+                                              ("thread", None if thread is None else str(thread))) if v is not None})
+    token = current_usage.set(ctx)
+    try:
+        yield ctx
+    finally:
+        current_usage.reset(token)
+
+
+def ledger_enabled() -> bool:
+    return str(os.getenv("CEDARPY_USAGE_LEDGER", "1")).strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _usage_numbers(usage: Any) -> Optional[tuple]:
+    """(prompt, completion, cached) from a usage object or dict."""
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda k, d=None: getattr(usage, k, d)
+    p, c = get("prompt_tokens"), get("completion_tokens")
+    if p is None and c is None:
+        return None
+    details = get("prompt_tokens_details")
+    cached = (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)) if details else None
+    return int(p or 0), int(c or 0), int(cached or 0)
+
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    from cedar_app.utils.query_budget import price_for
+    price_in, price_out = price_for(model)
+    ratio = env_float("CEDARPY_LLM_CACHED_INPUT_RATIO", 0.1, minimum=0.0)
+    cached = min(cached_tokens, prompt_tokens)
+    return ((prompt_tokens - cached) * price_in + cached * price_in * ratio + completion_tokens * price_out) / 1e6
+
+
+def _attribution() -> Dict[str, Any]:
+    ctx = current_usage.get()
+    out: Dict[str, Any] = {"feature": ctx.feature, "thread": ctx.thread, "project_id": ctx.project_id}
+    try:
+        from .scheduler import current_lane, current_project
+        out["lane"] = current_lane.get()
+        if out["project_id"] is None:
+            out["project_id"] = current_project.get()
+    except Exception:
+        pass
+    try:
+        from cedar_app.utils.model_router import current_agent
+        out["agent"] = current_agent.get()
+    except Exception:
+        pass
+    try:
+        from cedar_app.utils.tracing import current_trace_id
+        out["trace_id"] = current_trace_id()
+    except Exception:
+        pass
+    if out["feature"] is None:
+        out["feature"] = "chat" if out.get("agent") else (out.get("lane") or "other")
+    return out
+
+
+class _UsageStream:
+    """Passes a streamed completion through and records its usage when it ends (or is abandoned)."""
+
+    def __init__(self, stream: Any, ledger: "UsageLedger", row: Dict[str, Any], prompt_estimate: int, started: float):
+        self._stream = stream
+        self._ledger = ledger
+        self._row = row
+        self._prompt_estimate = prompt_estimate
+        self._started = started
+        self._chars = 0
+        self._usage: Optional[tuple] = None
+        self._done = False
+
+    def _observe(self, chunk: Any) -> None:
+        try:
+            usage = _usage_numbers(getattr(chunk, "usage", None))
+            if usage:
+                self._usage = usage
+            for choice in getattr(chunk, "choices", None) or []:
+                self._chars += len(getattr(getattr(choice, "delta", None), "content", None) or "")
+        except Exception:
+            pass
+
+    def _finish(self, status: str = "ok") -> None:
+        if self._done:
+            return
+        self._done = True
+        if self._usage:
+            p, c, cached = self._usage
+            estimated = 0
+        else:
+            p, c, cached, estimated = self._prompt_estimate, max(0, self._chars // 4), 0, 1
+        self._ledger.record(**self._row, prompt_tokens=p, completion_tokens=c, cached_tokens=cached,
+                            latency_ms=(time.monotonic() - self._started) * 1000, status=status, estimated=estimated)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                self._observe(chunk)
+                yield chunk
+        except Exception:
+            self._finish("error")
+            raise
+        finally:
+            self._finish()
+
+    async def _aiter(self):
+        try:
+            async for chunk in self._stream:
+                self._observe(chunk)
+                yield chunk
+        except Exception:
+            self._finish("error")
+            raise
+        finally:
+            self._finish()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _default_path() -> str:
+    from cedar_app.config import DATA_DIR
+    return os.path.join(DATA_DIR, "llm_usage.sqlite")
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class UsageLedger:
+    def __init__(self, path: Optional[str] = None, flush_s: Optional[float] = None, clock=time.time):
+        self._path = path
+        self.flush_s = env_float("CEDARPY_USAGE_FLUSH_S", 2.0, minimum=0.0) if flush_s is None else flush_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._broken = False
+        self._writer: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self.stats = {"recorded": 0, "written": 0, "errors": 0}
+
+    @property
+    def path(self) -> str:
+        return self._path or os.getenv("CEDARPY_USAGE_LEDGER_PATH") or _default_path()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Open lazily; caller holds _db_lock. After an open failure the ledger stays off."""
+        if self._conn is not None or self._broken:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_usage ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, day TEXT NOT NULL, project_id INTEGER,"
+                " thread TEXT, agent TEXT, feature TEXT, lane TEXT, model TEXT, prompt_tokens INTEGER NOT NULL DEFAULT 0,"
+                " completion_tokens INTEGER NOT NULL DEFAULT 0, cached_tokens INTEGER NOT NULL DEFAULT 0,"
+                " total_tokens INTEGER NOT NULL DEFAULT 0, cost_usd REAL NOT NULL DEFAULT 0, latency_ms REAL,"
+                " status TEXT NOT NULL, estimated INTEGER NOT NULL DEFAULT 0, stream INTEGER NOT NULL DEFAULT 0, trace_id TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_usage_day ON llm_usage(day)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_usage_project_day ON llm_usage(project_id, day)")
+            for op in ("UPDATE", "DELETE"):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS llm_usage_no_{op.lower()} BEFORE {op} ON llm_usage"
+                             " BEGIN SELECT RAISE(ABORT, 'llm_usage is append-only'); END")
+            conn.commit()
+            self._conn = conn
+        except Exception as e:
+            self._broken = True
+            self.stats["errors"] += 1
+            print(f"[usage] ledger unavailable at {self.path}: {type(e).__name__}: {e}")
+        return self._conn
+
+    # -- writing ---------------------------------------------------------------------
+
+    def record(self, model: Optional[str] = None, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cached_tokens: int = 0, latency_ms: Optional[float] = None, status: str = "ok",
+               estimated: int = 0, stream: bool = False, **attribution: Any) -> None:
+        if not ledger_enabled():
+            return
+        ts = self._clock()
+        model = str(model or "")
+        cost = usage_cost(model, prompt_tokens, completion_tokens, cached_tokens) if status != "cache_hit" else 0.0
+        row = {
+            "ts": ts, "day": _day(ts), "project_id": attribution.get("project_id"), "thread": attribution.get("thread"),
+            "agent": attribution.get("agent"), "feature": attribution.get("feature"), "lane": attribution.get("lane"),
+            "model": model, "prompt_tokens": int(prompt_tokens or 0), "completion_tokens": int(completion_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0), "total_tokens": int(prompt_tokens or 0) + int(completion_tokens or 0),
+            "cost_usd": round(cost, 8), "latency_ms": None if latency_ms is None else round(latency_ms, 3),
+            "status": status, "estimated": int(bool(estimated)), "stream": int(bool(stream)), "trace_id": attribution.get("trace_id"),
+        }
+        with self._lock:
+            self._pending.append(tuple(row[c] for c in _COLUMNS))
+            self.stats["recorded"] += 1
+        if self.flush_s <= 0:
+            self.flush()
+        else:
+            self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="cedar-usage-ledger", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            try:
+                with conn:
+                    conn.executemany(f"INSERT INTO llm_usage ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+                self.stats["written"] += len(rows)
+                return len(rows)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[usage] could not write {len(rows)} ledger rows: {type(e).__name__}: {e}")
+                return 0
+
+    # -- gateway hooks ---------------------------------------------------------------
+
+    def observe(self, kwargs: Dict[str, Any], response: Any, started: float) -> Any:
+        """Record a completed gateway call; returns what the caller should get (streams are wrapped)."""
+        if not ledger_enabled():
+            return response
+        try:
+            row = dict(_attribution(), model=str(kwargs.get("model") or getattr(response, "model", "") or ""),
+                       stream=bool(kwargs.get("stream")))
+            latency = (time.monotonic() - started) * 1000
+            if getattr(response, "cedar_cache_hit", False):
+                self.record(**row, latency_ms=latency, status="cache_hit")
+                return response
+            if kwargs.get("stream"):
+                from cedar_app.utils.query_budget import estimate_tokens
+                return _UsageStream(response, self, row, estimate_tokens(kwargs.get("messages")), started)
+            usage = _usage_numbers(getattr(response, "usage", None))
+            if usage:
+                self.record(**row, prompt_tokens=usage[0], completion_tokens=usage[1], cached_tokens=usage[2], latency_ms=latency)
+            else:
+                from cedar_app.utils.query_budget import estimate_tokens
+                text = ""
+                try:
+                    text = response.choices[0].message.content or ""
+                except Exception:
+                    pass
+                self.record(**row, prompt_tokens=estimate_tokens(kwargs.get("messages")), completion_tokens=estimate_tokens(text),
+                            latency_ms=latency, estimated=1)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[usage] {type(e).__name__}: {e}")
+        return response
+
+    def observe_failure(self, kwargs: Dict[str, Any], started: float) -> None:
+        if not ledger_enabled():
+            return
+        try:
+            self.record(**_attribution(), model=str(kwargs.get("model") or ""), stream=bool(kwargs.get("stream")),
+                        latency_ms=(time.monotonic() - started) * 1000, status="error")
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[usage] {type(e).__name__}: {e}")
+
+    # -- reading ---------------------------------------------------------------------
+
+    def _query(self, sql: str, args: Iterable[Any]) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return []
+            cur = conn.execute(sql, list(args))
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def rollup(self, group_by: Iterable[str] = ("project",), since: Optional[float] = None, until: Optional[float] = None,
+               **filters: Any) -> List[Dict[str, Any]]:
+        """Totals per group. group_by: project, thread, agent, feature, lane, model, day, status.
+        filters: any of those names (project=3, feature="chat")."""
+        keys = [g for g in group_by if g in GROUP_COLUMNS]
+        cols = [GROUP_COLUMNS[g] for g in keys]
+        where, args = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            args.append(until)
+        for name, value in filters.items():
+            if name in GROUP_COLUMNS and value is not None:
+                where.append(f"{GROUP_COLUMNS[name]} = ?")
+                args.append(value)
+        select = ", ".join(f"{c} AS {k}" for k, c in zip(keys, cols))
+        sql = (
+            f"SELECT {select + ', ' if select else ''}COUNT(*) AS calls,"
+            " SUM(status = 'cache_hit') AS cache_hits, SUM(status = 'error') AS errors,"
+            " SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,"
+            " SUM(cached_tokens) AS cached_tokens, SUM(total_tokens) AS total_tokens, SUM(estimated) AS estimated_calls,"
+            " ROUND(SUM(cost_usd), 6) AS cost_usd, ROUND(AVG(latency_ms), 1) AS avg_latency_ms, ROUND(MAX(latency_ms), 1) AS max_latency_ms"
+            " FROM llm_usage" + (" WHERE " + " AND ".join(where) if where else "")
+            + (f" GROUP BY {', '.join(cols)}" if cols else "") + " ORDER BY cost_usd DESC"
+        )
+        return self._query(sql, args)
+
+    def recent(self, limit: int = 100, **filters: Any) -> List[Dict[str, Any]]:
+        where, args = [], []
+        for name, value in filters.items():
+            if name in GROUP_COLUMNS and value is not None:
+                where.append(f"{GROUP_COLUMNS[name]} = ?")
+                args.append(value)
+        sql = ("SELECT * FROM llm_usage" + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY id DESC LIMIT ?")
+        return self._query(sql, args + [max(1, int(limit))])
+
+    def check_budgets(self, budgets: Optional[Dict[str, Dict[str, float]]] = None, warn_at: Optional[float] = None) -> Dict[str, Any]:
+        budgets = load_budgets() if budgets is None else budgets
+        warn_at = env_float("CEDARPY_USAGE_BUDGET_WARN", 0.8, minimum=0.0) if warn_at is None else warn_at
+        now = datetime.fromtimestamp(self._clock(), tz=timezone.utc)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+        alerts = []
+        for scope, limits in budgets.items():
+            if not isinstance(limits, dict):
+                continue
+            filters: Dict[str, Any] = {}
+            if scope != "*":
+                kind, _, value = scope.partition(":")
+                if kind not in GROUP_COLUMNS or not value:
+                    continue
+                filters[kind] = int(value) if kind == "project" and value.isdigit() else value
+            for key in _LIMIT_KEYS:
+                limit = limits.get(key)
+                if not limit:
+                    continue
+                window, unit = key.split("_")
+                totals = self.rollup(group_by=(), since=day_start if window == "daily" else month_start, **filters)
+                used = (totals[0]["cost_usd"] if unit == "usd" else totals[0]["total_tokens"]) if totals else 0
+                used = used or 0
+                ratio = used / float(limit)
+                if ratio >= warn_at:
+                    alerts.append({"scope": scope, "limit": key, "used": round(used, 6), "budget": limit,
+                                   "ratio": round(ratio, 4), "over": ratio >= 1.0})
+        alerts.sort(key=lambda a: -a["ratio"])
+        return {"ok": not any(a["over"] for a in alerts), "alerts": alerts, "budgets": budgets,
+                "checked_at": now.isoformat()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+            out["pending"] = len(self._pending)
+        out.update({"path": self.path, "flush_s": self.flush_s, "enabled": ledger_enabled() and not self._broken})
+        return out
+
+
+def load_budgets() -> Dict[str, Dict[str, float]]:
+    raw = os.getenv("CEDARPY_USAGE_BUDGETS")
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        print(f"[usage] ignoring invalid CEDARPY_USAGE_BUDGETS: {e}")
+        return {}
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger()
+            atexit.register(_ledger.flush)
+        return _ledger
+
+
+def usage_rollup(group_by: Iterable[str] = ("project",), days: Optional[float] = None, **filters: Any) -> List[Dict[str, Any]]:
+    since = time.time() - days * 86400 if days else None
+    return get_usage_ledger().rollup(group_by=group_by, since=since, **filters)
+
+
+def check_budgets() -> Dict[str, Any]:
+    return get_usage_ledger().check_budgets()
@@ -16,15 +16,17 @@ import os
 import re
 import json
 import csv
-import io
-import contextlib
 import sqlite3
-import math
-import builtins
-import types
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
 
+from .utils.code_sandbox import run_code
+from .llm.gateway import get_llm_gateway, llm_api_key, llm_default_model, setting
+from .llm.scheduler import llm_lane
+from .llm.response_cache import llm_cache
+from .llm.usage_ledger import llm_usage
+from .utils.artifact_cache import get_artifact, put_artifact, get_artifact_cache
+
 # ----------------------------------------------------------------------------------
 # LLM Configuration and Client
 # ----------------------------------------------------------------------------------
@@ -49,6 +51,10 @@ def llm_client_config():
                     _test_mode = True
     except Exception:
         _test_mode = False
+    # The fake LLM (CEDARPY_FAKE_LLM) replaces the stub: it goes through the gateway like the real API
+    from .llm.fake_server import fake_llm_enabled
+    if _test_mode and fake_llm_enabled():
+        _test_mode = False
     if _test_mode:
         try:
             print("[llm-test] CEDARPY_TEST_MODE=1; using stubbed LLM client")
@@ -158,40 +164,25 @@ def run_import(src_path, sqlite_path, table_name, project_id, branch_id):
                 self.chat = _StubChat()
         return _StubClient(), (os.getenv("CEDARPY_OPENAI_MODEL") or _env_get("CEDARPY_OPENAI_MODEL") or "gpt-5")
 
-    # Normal client
+    # Normal client: the shared gateway (pooled connections, retries, circuit breaker)
     try:
-        from openai import OpenAI  # type: ignore
+        import openai  # type: ignore  # noqa: F401
     except Exception:
         return None, None
-    # Prefer env, then fallback to settings file
-    api_key = os.getenv("CEDARPY_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or _env_get("CEDARPY_OPENAI_API_KEY") or _env_get("OPENAI_API_KEY")
-    if not api_key or not str(api_key).strip():
+    # Prefer env, then fallback to settings file (cached; re-read when it changes)
+    api_key = llm_api_key()
+    if not api_key:
         return None, None
-    model = os.getenv("CEDARPY_OPENAI_MODEL") or _env_get("CEDARPY_OPENAI_MODEL") or "gpt-5"
     try:
-        client = OpenAI(api_key=str(api_key).strip())
-        return client, model
+        return get_llm_gateway().sync_client(api_key), llm_default_model()
     except Exception:
         return None, None
 
 
 def _env_get(k: str) -> Optional[str]:
     """Helper to get environment variables from settings file"""
-    from cedar_app.config import DATA_DIR
-    SETTINGS_PATH = os.path.join(DATA_DIR, ".env")
     try:
-        v = os.getenv(k)
-        if v is None and os.path.isfile(SETTINGS_PATH):
-            # Fallback: try file parse
-            with open(SETTINGS_PATH, "r", encoding="utf-8", errors="ignore") as f:
-                for line in f:
-                    s = line.strip()
-                    if not s or s.startswith("#") or "=" not in s:
-                        continue
-                    kk, vv = s.split("=", 1)
-                    if kk.strip() == k:
-                        return vv.strip().strip('"').strip("'")
-        return v
+        return setting(k)
     except Exception:
         return None
 
@@ -223,6 +214,11 @@ def llm_classify_file(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         except Exception:
             pass
         return None
+    # Same bytes, name and model: reuse the earlier classification (see utils/artifact_cache)
+    artifact_variant = (model, meta.get("display_name"))
+    cached = get_artifact("llm_classify", meta.get("sha256"), artifact_variant)
+    if cached is not None:
+        return cached
     # Prepare a bounded sample
     sample_text = (meta.get("sample_text") or "")
     if len(sample_text) > 8000:
@@ -250,7 +246,8 @@ def llm_classify_file(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
     ]
     try:
-        resp = client.chat.completions.create(model=model, messages=messages)
+        with llm_lane("batch"), llm_cache(), llm_usage("classify_file"):
+            resp = client.chat.completions.create(model=model, messages=messages)
         content = (resp.choices[0].message.content or "").strip()
         result = json.loads(content)
         # Normalize and enforce limits
@@ -268,6 +265,7 @@ def llm_classify_file(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             print(f"[llm] model={model} structure={struct} title={len(title)} chars cat={cat}")
         except Exception:
             pass
+        put_artifact("llm_classify", meta.get("sha256"), out, artifact_variant)
         return out
     except Exception as e:
         try:
@@ -295,15 +293,15 @@ def llm_summarize_action(action: str, input_payload: Dict[str, Any], output_payl
     except Exception:
         pass
     try:
-        from openai import OpenAI  # type: ignore
+        import openai  # type: ignore  # noqa: F401
     except Exception:
         return None
-    api_key = os.getenv("CEDARPY_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key = llm_api_key()
     if not api_key:
         return None
     model = os.getenv("CEDARPY_SUMMARY_MODEL", "gpt-5-nano")
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_llm_gateway().sync_client(api_key)
         sys_prompt = (
             "You are Cedar's changelog assistant. Summarize the action in 1-3 concise sentences. "
             "Focus on what changed, why, and outcomes (including errors). Avoid secrets and long dumps."
@@ -316,7 +314,8 @@ def llm_summarize_action(action: str, input_payload: Dict[str, Any], output_payl
             {"role": "user", "content": "Output payload:"},
             {"role": "user", "content": json.dumps(output_payload, ensure_ascii=False)},
         ]
-        resp = client.chat.completions.create(model=model, messages=messages)
+        with llm_lane("nearline"), llm_cache(), llm_usage("changelog_summary"):
+            resp = client.chat.completions.create(model=model, messages=messages)
         text = (resp.choices[0].message.content or "").strip()
         return text
     except Exception as e:
@@ -343,15 +342,15 @@ def llm_dataset_friendly_name(file_rec, table_name: str, columns: List[str]) ->
     except Exception:
         pass
     try:
-        from openai import OpenAI  # type: ignore
+        import openai  # type: ignore  # noqa: F401
     except Exception:
         return None
-    api_key = os.getenv("CEDARPY_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key = llm_api_key()
     if not api_key:
         return None
     model = os.getenv("CEDARPY_SUMMARY_MODEL", "gpt-5-nano")
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_llm_gateway().sync_client(api_key)
         sys_prompt = (
             "You propose concise, human-friendly dataset names (<= 60 chars). "
             "Use the provided file title, category, and columns. Output plain text only."
@@ -366,7 +365,8 @@ def llm_dataset_friendly_name(file_rec, table_name: str, columns: List[str]) ->
             {"role": "system", "content": sys_prompt},
             {"role": "user", "content": json.dumps(info, ensure_ascii=False)}
         ]
-        resp = client.chat.completions.create(model=model, messages=messages)
+        with llm_lane("nearline"), llm_cache(), llm_usage("dataset_name"):
+            resp = client.chat.completions.create(model=model, messages=messages)
         name = (resp.choices[0].message.content or "").strip()
         name = name.replace("\n", " ").strip()
         if len(name) > 60:
@@ -418,7 +418,7 @@ def tabular_import_via_llm(project_id: int, branch_id: int, file_rec, db: Sessio
                            options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Generate Python code via LLM to import a tabular file into the per-project SQLite DB and execute it safely.
-    - Uses only stdlib modules (csv/json/sqlite3/re/io) in a restricted exec environment.
+    - Uses only stdlib modules (csv/json/sqlite3/re/io), run in a restricted sandbox worker process.
     - Creates a branch-aware table with columns: id (INTEGER PRIMARY KEY AUTOINCREMENT), project_id, branch_id, + inferred columns.
     - Inserts rows scoped to (project_id, branch_id).
     Returns a result dict with keys: ok, table, rows_inserted, columns, warnings, logs, code_size, model.
@@ -493,103 +493,66 @@ def tabular_import_via_llm(project_id: int, branch_id: int, file_rec, db: Sessio
         {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
     ]
 
-    try:
-        print(f"[tabular] codegen model={model} file={file_rec.display_name} table_suggest={table_suggest}")
-    except Exception:
-        pass
-
-    try:
-        resp = client.chat.completions.create(model=model, messages=messages)
-        content = (resp.choices[0].message.content or "").strip()
-    except Exception as e:
+    # The importer takes paths and ids as arguments, so code that worked for the same bytes (in any
+    # project or branch) is reused without asking the model again (see utils/artifact_cache)
+    artifact_variant = (model, file_rec.display_name, table_suggest, options or {})
+    code = get_artifact("tabular_codegen", meta.get("sha256"), artifact_variant)
+    reused_code = code is not None
+    if reused_code:
         try:
-            print(f"[tabular-error] codegen {type(e).__name__}: {e}")
+            print(f"[tabular] reusing importer code for sha256={meta.get('sha256', '')[:12]} table_suggest={table_suggest}")
+        except Exception:
+            pass
+    else:
+        try:
+            print(f"[tabular] codegen model={model} file={file_rec.display_name} table_suggest={table_suggest}")
         except Exception:
             pass
-        return {"ok": False, "error": str(e), "stage": "codegen", "model": model}
-
-    code = extract_code_from_markdown(content)
-
-    # Prepare a restricted exec environment
-    # Provide a small typing shim so "from typing import List" doesn't fail
-    class _TypingParam:
-        def __getitem__(self, item):
-            return object
-
-    _typing_dummy = types.SimpleNamespace(
-        __name__="typing",
-        List=list,
-        Dict=dict,
-        Tuple=tuple,
-        Set=set,
-        Optional=_TypingParam(),
-        Any=object,
-        Iterable=_TypingParam(),
-        Union=_TypingParam(),
-        Callable=_TypingParam(),
-    )
-
-    allowed_modules = {
-        "csv": csv,
-        "json": json,
-        "sqlite3": sqlite3,
-        "re": re,
-        "io": io,
-        "math": math,
-        "typing": _typing_dummy,
-    }
-
-    def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
-        if name in allowed_modules and allowed_modules[name] is not None:
-            return allowed_modules[name]
-        raise ImportError(f"disallowed import: {name}")
-
-    def _safe_open(p, mode="r", *args, **kwargs):
-        ab = os.path.abspath(p)
-        if ("w" in mode) or ("a" in mode) or ("+" in mode):
-            raise PermissionError("open() write modes are not allowed")
-        if ab != src_path:
-            raise PermissionError("open() denied for this path")
-        return builtins.open(p, mode, *args, **kwargs)
-
-    allowed_builtin_names = [
-        "abs", "min", "max", "sum", "len", "range", "enumerate", "zip", "map", "filter",
-        "any", "all", "sorted", "reversed", "str", "int", "float", "bool", "list", "dict", "set", "tuple",
-        "print", "Exception", "isinstance", "StopIteration", "next", "iter"
-    ]
-    _base_builtins = {}
-    try:
-        for n in allowed_builtin_names:
-            _base_builtins[n] = getattr(builtins, n)
-    except Exception:
-        pass
-    _base_builtins["__import__"] = _safe_import
-    _base_builtins["open"] = _safe_open
-
-    safe_globals: Dict[str, Any] = {"__builtins__": _base_builtins}
-
-    # Also inject modules for import-less usage
-    safe_globals.update({"csv": csv, "json": json, "sqlite3": sqlite3, "re": re, "io": io})
 
-    buf = io.StringIO()
+        try:
+            with llm_lane("batch", project_id), llm_cache(), llm_usage("tabular_import"):
+                resp = client.chat.completions.create(model=model, messages=messages)
+            content = (resp.choices[0].message.content or "").strip()
+        except Exception as e:
+            try:
+                print(f"[tabular-error] codegen {type(e).__name__}: {e}")
+            except Exception:
+                pass
+            return {"ok": False, "error": str(e), "stage": "codegen", "model": model}
+
+        code = extract_code_from_markdown(content)
+
+    # Run the generated importer in a sandbox worker process: stdlib-only imports, read-only
+    # open() of the source file, and the pool's CPU/memory/wall-clock limits
+    run = run_code(
+        code,
+        filename="<llm_tabular_import>",
+        builtins=[
+            "abs", "min", "max", "sum", "len", "range", "enumerate", "zip", "map", "filter",
+            "any", "all", "sorted", "reversed", "str", "int", "float", "bool", "list", "dict", "set", "tuple",
+            "print", "Exception", "isinstance", "StopIteration", "next", "iter"
+        ],
+        modules=["csv", "json", "sqlite3", "re", "io"],
+        allowed_imports=["csv", "json", "sqlite3", "re", "io", "math", "typing"],
+        readable_paths=[src_path],
+        entry="run_import",
+        args=[src_path, sqlite_path, table_suggest, int(project_id), int(branch_id)],
+    )
     run_ok = False
     result: Dict[str, Any] = {}
-    try:
-        with contextlib.redirect_stdout(buf):
-            # Compile then exec
-            compiled = compile(code, filename="<llm_tabular_import>", mode="exec")
-            exec(compiled, safe_globals, safe_globals)
-            run_import = safe_globals.get("run_import")
-            if not callable(run_import):
-                raise RuntimeError("Generated code did not define run_import()")
-            ret = run_import(src_path, sqlite_path, table_suggest, int(project_id), int(branch_id))
-            if not isinstance(ret, dict):
-                raise RuntimeError("run_import() did not return a dict")
-            result = ret
-            run_ok = bool(ret.get("ok"))
-    except Exception as e:
-        result = {"ok": False, "error": f"exec: {type(e).__name__}: {e}"}
-    logs = buf.getvalue()
+    if not run.get("ok"):
+        result = {"ok": False, "error": f"exec: {run.get('error')}"}
+    elif not isinstance(run.get("value"), dict):
+        result = {"ok": False, "error": "exec: RuntimeError: run_import() did not return a dict"}
+    else:
+        result = run["value"]
+        run_ok = bool(result.get("ok"))
+    logs = (run.get("stdout") or "") + (run.get("stderr") or "")
+    if run_ok and not reused_code:
+        put_artifact("tabular_codegen", meta.get("sha256"), code, artifact_variant)
+    elif reused_code and not run_ok:
+        # Do not keep handing out code that failed here; the next import asks the model again
+        get_artifact_cache().invalidate("tabular_codegen", meta.get("sha256"), variant=artifact_variant)
 
     # Optionally verify row count via our engine
     table_name = str(result.get("table") or table_suggest)
@@ -624,6 +587,7 @@ def tabular_import_via_llm(project_id: int, branch_id: int, file_rec, db: Sessio
         "columns": result.get("columns"),
         "warnings": result.get("warnings"),
         "code_size": len(code or ""),
+        "code_reused": reused_code,
         "logs": logs[-10000:] if logs else "",
         "model": model,
     }
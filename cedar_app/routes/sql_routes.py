@@ -81,8 +81,8 @@ def make_table_branch_aware_impl(project_id: int, request: Request, table: str,
 def undo_last_sql_impl(project_id: int, request: Request, db: Session):
     """Undo the last SQL operation for the project."""
     from cedar_app.db_utils import ensure_project_initialized, _get_project_engine
-    from main_models import SQLUndoLog
-    from main_helpers import record_changelog
+    from main_models import SQLUndoLog, ChangelogEntry
+    from cedar_app.changelog_utils import record_changelog
     
     try:
         ensure_project_initialized(project_id)
@@ -97,55 +97,66 @@ def undo_last_sql_impl(project_id: int, request: Request, db: Session):
         
         engine = _get_project_engine(project_id)
         
-        # Execute undo operation based on the original operation type
-        with engine.begin() as conn:
-            if last_log.op == "insert" and last_log.rows_after:
-                # Delete the inserted rows
-                for row in last_log.rows_after:
-                    if last_log.pk_columns:
-                        where_clauses = []
-                        for pk_col in last_log.pk_columns:
-                            if pk_col in row:
-                                where_clauses.append(f"{pk_col} = {row[pk_col]}")
-                        if where_clauses:
-                            undo_sql = f"DELETE FROM {last_log.table_name} WHERE {' AND '.join(where_clauses)}"
-                            conn.exec_driver_sql(undo_sql)
+        if last_log.op == "changeset":
+            # Trigger-journaled statement: revert every captured row change and drop the log in one transaction
+            from cedar_app.utils.sql_journal import undo_changeset_log
+            with engine.begin() as conn:
+                undo_changeset_log(conn, last_log)
+            db.expunge(last_log)
+        else:
+            # Execute undo operation based on the original operation type
+            with engine.begin() as conn:
+                if last_log.op == "insert" and last_log.rows_after:
+                    # Delete the inserted rows
+                    for row in last_log.rows_after:
+                        if last_log.pk_columns:
+                            where_clauses = []
+                            for pk_col in last_log.pk_columns:
+                                if pk_col in row:
+                                    where_clauses.append(f"{pk_col} = {row[pk_col]}")
+                            if where_clauses:
+                                undo_sql = f"DELETE FROM {last_log.table_name} WHERE {' AND '.join(where_clauses)}"
+                                conn.exec_driver_sql(undo_sql)
             
-            elif last_log.op == "delete" and last_log.rows_before:
-                # Re-insert the deleted rows
-                for row in last_log.rows_before:
-                    columns = list(row.keys())
-                    values = list(row.values())
-                    placeholders = ",".join(["?" for _ in values])
-                    undo_sql = f"INSERT INTO {last_log.table_name} ({','.join(columns)}) VALUES ({placeholders})"
-                    conn.exec_driver_sql(undo_sql, values)
+                elif last_log.op == "delete" and last_log.rows_before:
+                    # Re-insert the deleted rows
+                    for row in last_log.rows_before:
+                        columns = list(row.keys())
+                        values = list(row.values())
+                        placeholders = ",".join(["?" for _ in values])
+                        undo_sql = f"INSERT INTO {last_log.table_name} ({','.join(columns)}) VALUES ({placeholders})"
+                        conn.exec_driver_sql(undo_sql, values)
             
-            elif last_log.op == "update" and last_log.rows_before:
-                # Restore the original values
-                for row in last_log.rows_before:
-                    if last_log.pk_columns:
-                        where_clauses = []
-                        set_clauses = []
-                        for pk_col in last_log.pk_columns:
-                            if pk_col in row:
-                                where_clauses.append(f"{pk_col} = {row[pk_col]}")
-                        for col, val in row.items():
-                            if col not in last_log.pk_columns:
-                                set_clauses.append(f"{col} = {repr(val)}")
-                        if where_clauses and set_clauses:
-                            undo_sql = f"UPDATE {last_log.table_name} SET {','.join(set_clauses)} WHERE {' AND '.join(where_clauses)}"
-                            conn.exec_driver_sql(undo_sql)
-        
-        # Mark the log entry as undone
-        db.delete(last_log)
-        db.commit()
+                elif last_log.op == "update" and last_log.rows_before:
+                    # Restore the original values
+                    for row in last_log.rows_before:
+                        if last_log.pk_columns:
+                            where_clauses = []
+                            set_clauses = []
+                            for pk_col in last_log.pk_columns:
+                                if pk_col in row:
+                                    where_clauses.append(f"{pk_col} = {row[pk_col]}")
+                            for col, val in row.items():
+                                if col not in last_log.pk_columns:
+                                    set_clauses.append(f"{col} = {repr(val)}")
+                            if where_clauses and set_clauses:
+                                undo_sql = f"UPDATE {last_log.table_name} SET {','.join(set_clauses)} WHERE {' AND '.join(where_clauses)}"
+                                conn.exec_driver_sql(undo_sql)
+        
+            # Mark the log entry as undone
+            db.delete(last_log)
+            db.commit()
         
         # Record the undo operation
-        record_changelog(
-            db, project_id, last_log.branch_id or 1, "sql_undo",
-            {"original_op": last_log.op, "table": last_log.table_name},
-            f"Undid {last_log.op} operation on {last_log.table_name}"
-        )
+        try:
+            record_changelog(
+                db, project_id, last_log.branch_id or 1, "sql_undo",
+                {"original_op": last_log.op, "table": last_log.table_name},
+                {"message": f"Undid {last_log.op} operation on {last_log.table_name}"},
+                ChangelogEntry=ChangelogEntry
+            )
+        except Exception:
+            pass
         
         return JSONResponse({"ok": True, "message": f"Undid {last_log.op} operation on {last_log.table_name}"})
         
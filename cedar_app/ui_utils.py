@@ -36,18 +36,9 @@ def env_get(k: str) -> Optional[str]:
         Value of the environment variable or None if not found
     """
     try:
-        v = os.getenv(k)
-        if v is None and os.path.isfile(SETTINGS_PATH):
-            # Fallback: try file parse
-            with open(SETTINGS_PATH, "r", encoding="utf-8", errors="ignore") as f:
-                for line in f:
-                    s = line.strip()
-                    if not s or s.startswith("#") or "=" not in s:
-                        continue
-                    kk, vv = s.split("=", 1)
-                    if kk.strip() == k:
-                        return vv.strip().strip('"').strip("'")
-        return v
+        # Fallback: the settings file, parsed once and re-read only when it changes
+        from cedar_app.llm.gateway import setting
+        return setting(k, SETTINGS_PATH)
     except Exception:
         return None
 
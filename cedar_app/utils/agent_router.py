@@ -0,0 +1,279 @@
+"""
+Learned agent router for the Thinker phase.
+
+ThinkerOrchestrator.think() picks agents with keyword rules. Every orchestration that ends in a
+final answer logs (query, agents launched, agents the Chief Agent actually selected) to a JSONL
+file; AgentRouter trains a small TF-IDF + one-vs-rest logistic regression model (numpy, batch
+gradient descent) on that log and predicts, per agent, the probability that it is worth launching
+for a new query. Agents at or above the threshold replace the keyword choice; when the model is not
+trained yet, numpy is missing or no agent is confident enough, think() keeps the keyword rules.
+
+The log only says something about agents that were actually launched: an agent the Chief never saw
+is not a negative example, so each agent's "selected" output is trained only on the queries it ran
+on. A second output per agent learns how likely it was to be launched for the query; an agent is only
+routed for queries like the ones it was tried on (CEDARPY_ROUTER_MIN_SUPPORT), since the selection
+output has no evidence elsewhere. Because routed queries launch only the agents the router already
+likes, a share of queries (CEDARPY_ROUTER_EXPLORE) still goes through the keyword rules so the other
+agents keep getting labels.
+
+Configuration:
+  CEDARPY_ROUTER_LOG            log path (default <DATA_DIR>/router/agent_routing.jsonl)
+  CEDARPY_ROUTER_DISABLED       1 = never route (logging continues)
+  CEDARPY_ROUTER_THRESHOLD      minimum probability to launch an agent (default 0.6)
+  CEDARPY_ROUTER_MIN_EXAMPLES   examples needed before the model is used (default 30)
+  CEDARPY_ROUTER_MAX_AGENTS     at most this many routed agents (default 3)
+  CEDARPY_ROUTER_MIN_SUPPORT    minimum probability that the agent was launched for similar
+                                queries (default 0.5)
+  CEDARPY_ROUTER_EXPLORE        share of queries left to the keyword rules (default 0.1)
+
+The model is refit when the log changed and the last fit is older than 60s. Fitting runs on a
+background thread (it can take seconds for a full log), and predictions keep using the previous model
+until the new one is ready; the first queries after startup fall back to the keyword rules.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import math
+import time
+import random
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from cedar_app.env_utils import env_float, env_int
+
+AGENTS = (
+    "CodeAgent", "SQLAgent", "ShellAgent", "MathAgent", "ResearchAgent",
+    "StrategyAgent", "DataAgent", "NotesAgent", "FileAgent",
+)
+
+_TOKEN = re.compile(r"[a-z0-9_+#]+")
+_MAX_FEATURES = 2000
+_MAX_EXAMPLES = 2000
+_REFIT_S = 60.0
+
+
+def default_log_path() -> str:
+    path = os.getenv("CEDARPY_ROUTER_LOG")
+    if path:
+        return path
+    try:
+        from cedar_app.config import DATA_DIR
+    except Exception:
+        DATA_DIR = os.path.join(os.path.expanduser("~"), "CedarPyData")
+    return os.path.join(DATA_DIR, "router", "agent_routing.jsonl")
+
+
+def tokenize(text: str) -> List[str]:
+    """Word unigrams plus bigrams."""
+    words = _TOKEN.findall((text or "").lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfLogReg:
+    """TF-IDF features (l2-normalized, smooth idf) and one logistic regression per label."""
+
+    def __init__(self, labels: Iterable[str], l2: float = 1e-3, epochs: int = 300, lr: float = 2.0):
+        self.labels = list(labels)
+        self.l2 = l2
+        self.epochs = epochs
+        self.lr = lr
+        self.vocab: Dict[str, int] = {}
+        self.idf = None
+        self.W = None
+        self.b = None
+
+    def _vectorize(self, np, docs: List[List[str]]):
+        X = np.zeros((len(docs), len(self.vocab)), dtype=np.float32)
+        for r, toks in enumerate(docs):
+            for t, n in Counter(toks).items():
+                c = self.vocab.get(t)
+                if c is not None:
+                    X[r, c] = 1.0 + math.log(n)
+        X *= self.idf
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return X / norms
+
+    def fit(self, texts: List[str], Y, M=None) -> "TfidfLogReg":
+        """Y: 0/1 label matrix; M: 0/1 mask of the (example, label) pairs that count (default all)."""
+        import numpy as np
+        docs = [tokenize(t) for t in texts]
+        df = Counter(t for toks in docs for t in set(toks))
+        terms = [t for t, _ in sorted(df.items(), key=lambda kv: (-kv[1], kv[0]))[:_MAX_FEATURES]]
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        n = len(docs)
+        self.idf = np.array([math.log((1 + n) / (1 + df[t])) + 1.0 for t in terms], dtype=np.float32)
+        X = self._vectorize(np, docs)
+        Y = np.asarray(Y, dtype=np.float32)
+        M = np.ones_like(Y) if M is None else np.asarray(M, dtype=np.float32)
+        counts = np.maximum(M.sum(axis=0), 1.0)
+        W = np.zeros((X.shape[1], Y.shape[1]), dtype=np.float32)
+        # Start from each label's base rate so rare labels are not over-predicted early on
+        rate = np.clip((Y * M).sum(axis=0) / counts, 1e-3, 1 - 1e-3)
+        b = np.log(rate / (1 - rate)).astype(np.float32)
+        for _ in range(self.epochs):
+            P = 1.0 / (1.0 + np.exp(-(X @ W + b)))
+            G = (P - Y) * M / counts
+            W -= self.lr * (X.T @ G + self.l2 * W)
+            b -= self.lr * G.sum(axis=0)
+        self.W, self.b = W, b
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        import numpy as np
+        if self.W is None:
+            return {}
+        x = self._vectorize(np, [tokenize(text)])
+        p = 1.0 / (1.0 + np.exp(-(x @ self.W + self.b)))[0]
+        return {label: float(p[i]) for i, label in enumerate(self.labels)}
+
+
+class AgentRouter:
+    def __init__(self, log_path: Optional[str] = None, background: bool = True):
+        self.log_path = log_path or default_log_path()
+        self.background = background  # False: refit inline (tests, scripts)
+        self.threshold = env_float("CEDARPY_ROUTER_THRESHOLD", 0.6)
+        self.min_examples = env_int("CEDARPY_ROUTER_MIN_EXAMPLES", 30)
+        self.max_agents = env_int("CEDARPY_ROUTER_MAX_AGENTS", 3)
+        self.min_support = env_float("CEDARPY_ROUTER_MIN_SUPPORT", 0.5)
+        self.explore = env_float("CEDARPY_ROUTER_EXPLORE", 0.1)
+        self._rng = random.Random()
+        self.model: Optional[TfidfLogReg] = None
+        self.examples = 0
+        self._fitted_stat: Optional[Tuple[int, int]] = None
+        self._fitted_at = 0.0
+        self._lock = threading.Lock()
+        self._fitter: Optional[threading.Thread] = None
+
+    # -- logging -----------------------------------------------------------------------
+
+    def record(self, query: str, chosen: Iterable[str], selected: Iterable[str]) -> None:
+        """Append one training example (agents launched for the query, agents the Chief selected).
+
+        Only launched agents can have been selected; anything else in `selected` is dropped.
+        """
+        chosen = set(chosen)
+        try:
+            entry = {
+                "ts": time.time(),
+                "query": query,
+                "chosen": sorted(chosen),
+                "selected": sorted(chosen & set(selected)),
+            }
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except Exception as e:
+            print(f"[router] failed to record routing example: {e}")
+
+    def load_examples(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ex = json.loads(line)
+                    except Exception:
+                        continue
+                    if ex.get("query") and ex.get("selected"):
+                        out.append(ex)
+        except FileNotFoundError:
+            return []
+        return out[-_MAX_EXAMPLES:]
+
+    # -- model -------------------------------------------------------------------------
+
+    def fit(self, examples: List[Dict[str, Any]]) -> bool:
+        self.examples = len(examples)
+        if len(examples) < max(1, self.min_examples):
+            self.model = None
+            return False
+        try:
+            import numpy  # noqa: F401
+        except Exception:
+            self.model = None
+            return False
+        # Outputs: selected (given launched) per agent, then launched per agent. An agent that was
+        # not launched says nothing about whether it would have been selected; older entries
+        # without "chosen" count as launching every agent.
+        Y, M = [], []
+        for ex in examples:
+            selected = set(ex["selected"])
+            launched = set(ex.get("chosen") or AGENTS) | selected
+            Y.append([1.0 if a in selected else 0.0 for a in AGENTS] + [1.0 if a in launched else 0.0 for a in AGENTS])
+            M.append([1.0 if a in launched else 0.0 for a in AGENTS] + [1.0] * len(AGENTS))
+        labels = list(AGENTS) + [f"launched:{a}" for a in AGENTS]
+        self.model = TfidfLogReg(labels).fit([ex["query"] for ex in examples], Y, M)
+        return True
+
+    def _maybe_refit(self) -> None:
+        try:
+            st = os.stat(self.log_path)
+            stat = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stat = None
+        with self._lock:
+            if stat == self._fitted_stat:
+                return
+            if self._fitted_stat is not None and time.monotonic() - self._fitted_at < _REFIT_S:
+                return
+            if self._fitter is not None and self._fitter.is_alive():
+                return
+            self._fitted_stat = stat
+            self._fitted_at = time.monotonic()
+            if self.background:
+                self._fitter = threading.Thread(target=self._refit, args=(stat,), name="cedar-router-fit", daemon=True)
+                self._fitter.start()
+                return
+        self._refit(stat)
+
+    def _refit(self, stat: Optional[Tuple[int, int]]) -> None:
+        """fit() builds the new model before swapping it in, so readers never see a half-trained one."""
+        try:
+            self.fit(self.load_examples() if stat else [])
+        except Exception as e:
+            print(f"[router] training failed: {e}")
+            self.model = None
+
+    def predict(self, query: str) -> Dict[str, float]:
+        """Per-agent probability that launching it is worthwhile ({} when the model is unavailable)."""
+        return {a: p for a, p in self._predict_all(query).items() if a in AGENTS}
+
+    def _predict_all(self, query: str) -> Dict[str, float]:
+        if os.getenv("CEDARPY_ROUTER_DISABLED", "").strip().lower() in ("1", "true", "yes"):
+            return {}
+        self._maybe_refit()
+        model = self.model
+        if model is None:
+            return {}
+        try:
+            return model.predict_proba(query)
+        except Exception as e:
+            print(f"[router] prediction failed: {e}")
+            return {}
+
+    def route(self, query: str) -> Optional[Tuple[List[str], Dict[str, float]]]:
+        """(agents to launch, probabilities), or None to fall back to the keyword rules."""
+        if self.explore > 0 and self._rng.random() < self.explore:
+            return None
+        scores = self._predict_all(query)
+        probs = {a: p for a, p in scores.items() if a in AGENTS}
+        chosen = sorted((a for a, p in probs.items()
+                         if p >= self.threshold and scores.get(f"launched:{a}", 0.0) >= self.min_support),
+                        key=lambda a: -probs[a])
+        if not chosen:
+            return None
+        return chosen[: max(1, self.max_agents)], probs
+
+
+_router: Optional[AgentRouter] = None
+
+
+def get_agent_router() -> AgentRouter:
+    global _router
+    if _router is None:
+        _router = AgentRouter()
+    return _router
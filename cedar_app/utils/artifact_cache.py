@@ -0,0 +1,403 @@
+"""
+Content-addressed cache of derived file artifacts.
+
+Uploading the same document again, or into another branch or project, used to redo text extraction,
+PDF image extraction, OCR, language detection, LLM classification, chunking and tabular import code
+generation from scratch. Each stage of the file pipeline now stores its output under
+
+    (sha256 of the stage input, stage, variant)  + the stage version
+
+where the variant holds the other inputs that change the result (display name, model, chunk size,
+...). A later upload with the same bytes reuses the artifact instead of recomputing it. Files a stage
+writes (extracted page images, OCR text) are copied into the cache and restored into the new upload's
+output directory on a hit.
+
+STAGE_VERSIONS holds each stage's code version; bump it whenever a change to the stage changes what it
+produces. Lookups only match the current version, and the first time the cache is opened after a bump
+every artifact of that stage with another version is deleted (invalidate() does the same on demand).
+
+Artifacts live in DATA_DIR/cache/artifacts: index.sqlite plus one directory per artifact with files.
+
+Configuration:
+  CEDARPY_ARTIFACT_CACHE         (default 1; 0 disables)
+  CEDARPY_ARTIFACT_CACHE_DIR     (default DATA_DIR/cache/artifacts)
+  CEDARPY_ARTIFACT_CACHE_MAX_MB  (default 1024; least recently used artifacts are evicted beyond it)
+
+Usage:
+    sha = file_sha256(path)
+    text = cached_artifact("file_to_text", sha, lambda: convert(path), variant=ext)
+    entry = get_artifact_entry("pdf_extract", sha)      # value + restore(dest_dir) for stage files
+    put_artifact("pdf_extract", sha, value, files=[...])
+    artifact_cache_stats()
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from cedar_app.env_utils import env_float
+
+# Bump a stage's version when its code changes what it produces
+STAGE_VERSIONS: Dict[str, int] = {
+    "interpret_file": 1,      # content part of file_utils.interpret_file
+    "file_to_text": 1,        # cedar_langextract.file_to_text
+    "chunks": 1,              # cedar_langextract chunk spans (keyed on the text's sha256)
+    "llm_classify": 1,        # llm_utils.llm_classify_file
+    "llm_extract": 1,         # llm.client._llm_classify_file (classification + extracted content)
+    "tabular_codegen": 1,     # importer code generated by tabular_import_via_llm (stored after a successful run)
+    "file_reader": 1,         # FileProcessingOrchestrator stages
+    "pdf_extract": 1,
+    "ocr": 1,
+    "langdetect": 1,
+    "image_analysis": 1,
+}
+
+
+def artifact_cache_enabled() -> bool:
+    return str(os.getenv("CEDARPY_ARTIFACT_CACHE", "1")).strip().lower() not in {"0", "false", "no", "off"}
+
+
+# ----------------------------------------------------------------------------------
+# Hashing
+# ----------------------------------------------------------------------------------
+
+_sha_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_sha_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """sha256 of a file's bytes; remembered per (path, mtime, size) so pipeline stages hash once."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _sha_lock:
+        sha = _sha_memo.get(stamp)
+        if sha is not None:
+            _sha_memo.move_to_end(stamp)
+            return sha
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    sha = h.hexdigest()
+    with _sha_lock:
+        _sha_memo[stamp] = sha
+        while len(_sha_memo) > 256:
+            _sha_memo.popitem(last=False)
+    return sha
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8", errors="replace")).hexdigest()
+
+
+def variant_key(variant: Any) -> str:
+    """Short stable key for the non-content inputs of a stage ("" when there are none)."""
+    if variant is None or variant == "" or variant == ():
+        return ""
+    blob = json.dumps(variant, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:24]
+
+
+# ----------------------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------------------
+
+class ArtifactEntry:
+    def __init__(self, value: Any, files: List[Dict[str, str]], files_dir: str):
+        self.value = value
+        self.files = files  # [{"name": stored file name, "path": path the stage originally wrote}]
+        self.files_dir = files_dir
+
+    def restore(self, dest_dir: str) -> Dict[str, str]:
+        """Copy the stage's files into dest_dir, keeping their layout below the directory they had in
+        common; returns {original path: restored path} for the files and their directories."""
+        mapping: Dict[str, str] = {}
+        if not self.files:
+            return mapping
+        try:
+            base = os.path.commonpath([os.path.dirname(f["path"]) for f in self.files])
+        except ValueError:  # e.g. different drives: fall back to the unique stored names
+            base = None
+        for f in self.files:
+            if base is None:
+                target = os.path.join(dest_dir, f["name"])
+            else:
+                target = os.path.join(dest_dir, os.path.relpath(f["path"], base))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(self.files_dir, f["name"]), target)
+            mapping[f["path"]] = target
+        for f in self.files:
+            old_dir = os.path.dirname(f["path"])
+            mapping[old_dir] = dest_dir if base is None else os.path.normpath(os.path.join(dest_dir, os.path.relpath(old_dir, base)))
+        if base is not None:
+            mapping[base] = dest_dir
+        return mapping
+
+
+def remap_paths(value: Any, mapping: Dict[str, str]) -> Any:
+    """Replace original artifact paths inside a stored value with their restored locations."""
+    if not mapping:
+        return value
+    if isinstance(value, str):
+        return mapping.get(value, value)
+    if isinstance(value, list):
+        return [remap_paths(v, mapping) for v in value]
+    if isinstance(value, dict):
+        return {k: remap_paths(v, mapping) for k, v in value.items()}
+    return value
+
+
+_ANY_VARIANT = object()  # invalidate(): match every variant
+
+
+def _default_root() -> str:
+    from cedar_app.config import DATA_DIR
+    return os.path.join(DATA_DIR, "cache", "artifacts")
+
+
+class ArtifactCache:
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, versions: Optional[Dict[str, int]] = None,
+                 clock: Callable[[], float] = time.time):
+        self._root = root
+        self.max_bytes = int(env_float("CEDARPY_ARTIFACT_CACHE_MAX_MB", 1024, minimum=0.0) * 1024 * 1024) if max_bytes is None else max_bytes
+        self.versions = dict(STAGE_VERSIONS if versions is None else versions)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._broken = False
+        self._bytes = 0
+        self.stats: Dict[str, Any] = {"hits": 0, "misses": 0, "stores": 0, "errors": 0, "evictions": 0,
+                                      "invalidated": 0, "saved_ms": 0.0, "by_stage": {}}
+
+    @property
+    def root(self) -> str:
+        return self._root or os.getenv("CEDARPY_ARTIFACT_CACHE_DIR") or _default_root()
+
+    def version(self, stage: str) -> int:
+        return int(self.versions.get(stage, 1))
+
+    def _dir_for(self, sha: str, stage: str, variant: str) -> str:
+        return os.path.join(self.root, sha[:2], sha, f"{stage}-v{self.version(stage)}" + (f"-{variant}" if variant else ""))
+
+    def _count(self, stage: str, key: str) -> None:
+        self.stats[key] += 1
+        per = self.stats["by_stage"].setdefault(stage, {"hits": 0, "misses": 0, "stores": 0})
+        if key in per:
+            per[key] += 1
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Open lazily (caller holds the lock) and drop artifacts of outdated stage versions."""
+        if self._conn is not None or self._broken:
+            return self._conn
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " sha256 TEXT NOT NULL, stage TEXT NOT NULL, variant TEXT NOT NULL, version INTEGER NOT NULL,"
+                " value TEXT NOT NULL, files TEXT, files_dir TEXT, size INTEGER NOT NULL, compute_ms REAL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (sha256, stage, variant))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_artifacts_last_used ON artifacts(last_used)")
+            self._conn = conn
+            for stage, version in self.versions.items():
+                self._delete(conn, "stage = ? AND version != ?", (stage, int(version)), "invalidated")
+            conn.commit()
+            self._bytes = int(conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0])
+        except Exception as e:
+            self._conn = None
+            self._broken = True
+            print(f"[artifact-cache] disabled; could not open {self.root}: {e}")
+        return self._conn
+
+    def _delete(self, conn: sqlite3.Connection, where: str, params: Tuple, counter: str) -> int:
+        rows = conn.execute(f"SELECT sha256, stage, variant, files_dir, size FROM artifacts WHERE {where}", params).fetchall()
+        for sha, stage, variant, files_dir, size in rows:
+            conn.execute("DELETE FROM artifacts WHERE sha256 = ? AND stage = ? AND variant = ?", (sha, stage, variant))
+            if files_dir:
+                shutil.rmtree(files_dir, ignore_errors=True)
+            self._bytes -= int(size or 0)
+        self.stats[counter] += len(rows)
+        return len(rows)
+
+    def get(self, stage: str, sha: Optional[str], variant: Any = None) -> Optional[ArtifactEntry]:
+        if not sha or not artifact_cache_enabled():
+            return None
+        vkey = variant_key(variant)
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT value, files, files_dir, compute_ms FROM artifacts WHERE sha256 = ? AND stage = ? AND variant = ? AND version = ?",
+                    (sha, stage, vkey, self.version(stage)),
+                ).fetchone()
+                if row is None:
+                    self._count(stage, "misses")
+                    return None
+                files = json.loads(row[1]) if row[1] else []
+                if any(not os.path.exists(os.path.join(row[2] or "", f["name"])) for f in files):
+                    self._delete(conn, "sha256 = ? AND stage = ? AND variant = ?", (sha, stage, vkey), "errors")
+                    conn.commit()
+                    self._count(stage, "misses")
+                    return None
+                conn.execute("UPDATE artifacts SET last_used = ?, hits = hits + 1 WHERE sha256 = ? AND stage = ? AND variant = ?",
+                             (self._clock(), sha, stage, vkey))
+                conn.commit()
+                self._count(stage, "hits")
+                self.stats["saved_ms"] += float(row[3] or 0.0)
+                return ArtifactEntry(json.loads(row[0]), files, row[2] or "")
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[artifact-cache] lookup failed for {stage}: {type(e).__name__}: {e}")
+                return None
+
+    def put(self, stage: str, sha: Optional[str], value: Any, variant: Any = None, files: Iterable[str] = (),
+            compute_ms: Optional[float] = None) -> bool:
+        if not sha or not artifact_cache_enabled():
+            return False
+        vkey = variant_key(variant)
+        try:
+            blob = json.dumps(value, ensure_ascii=False, default=str)
+        except Exception:
+            return False
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return False
+            files_dir = self._dir_for(sha, stage, vkey)
+            try:
+                stored: List[Dict[str, str]] = []
+                size = len(blob.encode("utf-8"))
+                paths = [p for p in files if p and os.path.isfile(p)]
+                if paths:
+                    shutil.rmtree(files_dir, ignore_errors=True)
+                    os.makedirs(files_dir, exist_ok=True)
+                    for i, p in enumerate(paths):
+                        name = f"{i:04d}_{os.path.basename(p)}"
+                        shutil.copyfile(p, os.path.join(files_dir, name))
+                        stored.append({"name": name, "path": p})
+                        size += os.path.getsize(p)
+                old = conn.execute("SELECT size FROM artifacts WHERE sha256 = ? AND stage = ? AND variant = ?", (sha, stage, vkey)).fetchone()
+                now = self._clock()
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (sha256, stage, variant, version, value, files, files_dir, size, compute_ms, created, last_used, hits)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (sha, stage, vkey, self.version(stage), blob, json.dumps(stored) if stored else None,
+                     files_dir if stored else None, size, compute_ms, now, now),
+                )
+                self._bytes += size - (int(old[0]) if old else 0)
+                if self.max_bytes and self._bytes > self.max_bytes:
+                    self._evict(conn)
+                conn.commit()
+                self._count(stage, "stores")
+                return True
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[artifact-cache] store failed for {stage}: {type(e).__name__}: {e}")
+                return False
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used artifacts down to 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        for sha, stage, variant in conn.execute("SELECT sha256, stage, variant FROM artifacts ORDER BY last_used ASC").fetchall():
+            if self._bytes <= target:
+                break
+            self._delete(conn, "sha256 = ? AND stage = ? AND variant = ?", (sha, stage, variant), "evictions")
+
+    def invalidate(self, stage: Optional[str] = None, sha: Optional[str] = None, variant: Any = _ANY_VARIANT) -> int:
+        """Delete artifacts of one stage, one input, one variant, or everything; returns the number deleted."""
+        clauses, params = [], []
+        if stage:
+            clauses.append("stage = ?")
+            params.append(stage)
+        if sha:
+            clauses.append("sha256 = ?")
+            params.append(sha)
+        if variant is not _ANY_VARIANT:
+            clauses.append("variant = ?")
+            params.append(variant_key(variant))
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            n = self._delete(conn, " AND ".join(clauses) or "1 = 1", tuple(params), "invalidated")
+            conn.commit()
+            return n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = json.loads(json.dumps(self.stats))
+            conn = self._db()
+            entries = 0
+            if conn is not None:
+                try:
+                    entries = int(conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0])
+                except Exception:
+                    pass
+            out.update({"entries": entries, "bytes": self._bytes, "max_bytes": self.max_bytes, "root": self.root,
+                        "versions": dict(self.versions), "enabled": artifact_cache_enabled() and not self._broken})
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        out["saved_ms"] = round(out["saved_ms"], 1)
+        return out
+
+
+_cache: Optional[ArtifactCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache()
+        return _cache
+
+
+def get_artifact_entry(stage: str, sha: Optional[str], variant: Any = None) -> Optional[ArtifactEntry]:
+    return get_artifact_cache().get(stage, sha, variant)
+
+
+def get_artifact(stage: str, sha: Optional[str], variant: Any = None) -> Any:
+    """The stored value for (stage, sha, variant), or None."""
+    entry = get_artifact_cache().get(stage, sha, variant)
+    return None if entry is None else entry.value
+
+
+def put_artifact(stage: str, sha: Optional[str], value: Any, variant: Any = None, files: Iterable[str] = (),
+                 compute_ms: Optional[float] = None) -> bool:
+    return get_artifact_cache().put(stage, sha, value, variant, files=files, compute_ms=compute_ms)
+
+
+def cached_artifact(stage: str, sha: Optional[str], compute: Callable[[], Any], variant: Any = None,
+                    should_store: Callable[[Any], bool] = lambda v: v is not None) -> Any:
+    """Stored value for the same input, or compute() and store it."""
+    entry = get_artifact_cache().get(stage, sha, variant)
+    if entry is not None:
+        return entry.value
+    started = time.perf_counter()
+    value = compute()
+    if sha and should_store(value):
+        put_artifact(stage, sha, value, variant, compute_ms=(time.perf_counter() - started) * 1000.0)
+    return value
+
+
+def artifact_cache_stats() -> Dict[str, Any]:
+    return get_artifact_cache().snapshot()
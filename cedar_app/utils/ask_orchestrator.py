@@ -5,9 +5,6 @@ Handles the "Ask" feature with LLM integration and tool execution.
 
 import os
 import json
-import sqlite3
-import contextlib
-import io
 import re
 import base64
 from typing import Dict, Any, List, Optional
@@ -18,7 +15,11 @@ from sqlalchemy.orm import Session
 
 from ..db_utils import _get_project_engine, ensure_project_initialized
 from ..llm_utils import llm_client_config as _llm_client_config
+from ..llm.usage_ledger import llm_usage
 from ..changelog_utils import record_changelog
+from .sql_budget import QueryGuard, QueryCancelled, get_project_sql_budget
+from .query_cache import cached_read
+from .code_sandbox import run_code
 from main_models import (
     Project, Branch, Thread, ThreadMessage, FileEntry, 
     Dataset, Note, ChangelogEntry
@@ -159,7 +160,7 @@ def ask_orchestrator(app, project_id: int, request: Request, query: str, db: Ses
         "Schema: { \"Text Visible To User\": string, \"function_calls\": [ { \"name\": one of [sql, grep, code, img, web, plan, notes, question, final], \"args\": object } ] }\n"
         "Rules:\n"
         "- \"Text Visible To User\" is REQUIRED and MUST be non-empty. It should EITHER (a) state the answer succinctly OR (b) state the concrete steps you are taking to get the answer.\n"
-        "- Use sql to query the project's SQLite database (use sqlite_master/PRAGMA to introspect).\n"
+        "- Use sql to query the project's SQLite database (the current schema is provided in Context.schema).\n"
         "- Use grep with {file_id, pattern, flags?} to search a specific file by id.\n"
         "- Use code with {language:'python', source:'...'}; helpers available: cedar.query(sql), cedar.read(file_id), cedar.list_files(), cedar.open_path(file_id), cedar.note(text,[tags]).\n"
         "- Use img with {image_id, purpose} to analyze an image file; an inline data URL is provided.\n"
@@ -177,8 +178,16 @@ def ask_orchestrator(app, project_id: int, request: Request, query: str, db: Ses
         ]
     }
 
+    def _schema_summary() -> str:
+        try:
+            from .schema_catalog import get_schema_catalog
+            return get_schema_catalog(project.id).describe()
+        except Exception:
+            return ""
+
     context_obj = {
         "files_index": _files_index(),
+        "schema": _schema_summary(),
         "recent_changelog": _recent_changelog(),
         "recent_assistant_messages": _recent_assistant_msgs(),
         "project": {"id": project.id, "title": project.title},
@@ -188,7 +197,8 @@ def ask_orchestrator(app, project_id: int, request: Request, query: str, db: Ses
     def _call_llm(messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         try:
             print(f"[ask-llm] Calling model={model} with {len(messages)} messages")
-            resp = client.chat.completions.create(model=model, messages=messages)
+            with llm_usage("ask", project_id=project_id, thread=f"thread:{thr.id}"):
+                resp = client.chat.completions.create(model=model, messages=messages)
             raw = (resp.choices[0].message.content or "").strip()
             result = json.loads(raw)
             print(f"[ask-llm] Response: {json.dumps(result)[:200]}..." if len(json.dumps(result)) > 200 else f"[ask-llm] Response: {json.dumps(result)}")
@@ -202,17 +212,26 @@ def ask_orchestrator(app, project_id: int, request: Request, query: str, db: Ses
 
     # Tool executors
     def _exec_sql(sql_text: str) -> Dict[str, Any]:
-        try:
-            eng = _get_project_engine(project.id)
-            with eng.begin() as conn:
-                result = conn.exec_driver_sql(sql_text)
-                cols = list(result.keys()) if hasattr(result, 'keys') else []
-                rows = []
-                for r in result.fetchall()[:200]:
-                    rows.append(dict(zip(cols, r)) if cols else list(r))
-            return {"ok": True, "columns": cols, "rows": rows}
-        except Exception as e:
-            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        eng = _get_project_engine(project.id)
+
+        def _load() -> Dict[str, Any]:
+            guard = QueryGuard(get_project_sql_budget(project.id))
+            try:
+                with eng.begin() as conn, guard.active(conn):
+                    result = conn.exec_driver_sql(sql_text)
+                    cols = list(result.keys()) if result.returns_rows else []
+                    rows = []
+                    if result.returns_rows:
+                        for r in result.fetchmany(200):
+                            rows.append(dict(zip(cols, r)))
+                return {"ok": True, "columns": cols, "rows": rows}
+            except QueryCancelled as e:
+                return {"ok": False, "error": str(e), **e.report}
+            except Exception as e:
+                return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+        # Repeated read-only queries across iterations hit the result cache until data changes
+        return dict(cached_read(eng, sql_text, _load, extra="ask_orchestrator", should_store=lambda r: bool(r.get("ok"))))
 
     def _exec_grep(file_id: int, pattern: str, flags: str = "") -> Dict[str, Any]:
         try:
@@ -272,30 +291,21 @@ def ask_orchestrator(app, project_id: int, request: Request, query: str, db: Ses
                 return _exec_notes(text, tags)
         
         cedar = CedarHelper()
-        logs = io.StringIO()
-        safe_globals: Dict[str, Any] = {
-            "__builtins__": {
-                "print": print, "len": len, "range": range, 
-                "str": str, "int": int, "float": float, "bool": bool, 
-                "list": list, "dict": dict, "set": set, "tuple": tuple
-            }, 
-            "cedar": cedar, 
-            "sqlite3": sqlite3, 
-            "json": json, 
-            "re": re, 
-            "io": io
-        }
-        
-        try:
-            with contextlib.redirect_stdout(logs):
-                exec(compile(source, filename="<ask_code>", mode="exec"), safe_globals, safe_globals)
-            log_output = logs.getvalue()
-            print(f"[ask-exec-code] Success! Output: {log_output[:200]}..." if len(log_output) > 200 else f"[ask-exec-code] Success! Output: {log_output}")
-        except Exception as e:
-            print(f"[ask-exec-code] Failed: {type(e).__name__}: {e}")
-            return {"ok": False, "error": f"{type(e).__name__}: {e}", "logs": logs.getvalue()}
+        # Runs in a sandbox worker process; cedar.* calls are answered here over RPC
+        res = run_code(
+            source,
+            helpers={name: getattr(cedar, name) for name in ("query", "list_files", "read", "open_path", "note")},
+            filename="<ask_code>",
+            builtins=["print", "len", "range", "str", "int", "float", "bool", "list", "dict", "set", "tuple"],
+            modules=["sqlite3", "json", "re", "io"],
+        )
+        log_output = res.get("stdout") or ""
+        if not res.get("ok"):
+            print(f"[ask-exec-code] Failed: {res.get('error')}")
+            return {"ok": False, "error": res.get("error"), "logs": log_output}
+        print(f"[ask-exec-code] Success! Output: {log_output[:200]}..." if len(log_output) > 200 else f"[ask-exec-code] Success! Output: {log_output}")
         
-        return {"ok": True, "logs": logs.getvalue()}
+        return {"ok": True, "logs": log_output}
 
     def _exec_web(url: str) -> Dict[str, Any]:
         try:
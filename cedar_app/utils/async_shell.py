@@ -0,0 +1,168 @@
+"""
+Non-blocking shell execution for agents.
+
+run_shell() starts a command with asyncio.create_subprocess_shell and pumps stdout/stderr as they
+arrive, so a long-running command never blocks the event loop (other chats, SQL sessions and health
+checks keep being served). Each chunk is handed to an optional on_output(stream, text) callback
+(sync or async) for live streaming to the client.
+
+The command runs in its own process group. On timeout, or when the awaiting task is cancelled
+(e.g. the chat orchestration was aborted), the whole group is terminated, then killed after a short
+grace period; cancellation is re-raised to the caller.
+
+Captured output is bounded (max_capture characters per stream); once a stream reaches the cap the
+rest is drained and discarded so the child never stalls on a full pipe.
+
+Defaults: CEDARPY_SHELL_AGENT_TIMEOUT (seconds, default 60).
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import codecs
+import signal
+import asyncio
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from cedar_app.utils.tracing import instrument
+from cedar_app.utils.cassette import SHELL_CODEC, tape
+
+DEFAULT_TIMEOUT_S = 60.0
+KILL_GRACE_S = 2.0
+READ_CHUNK = 4096
+
+
+def shell_timeout_from_env(default: float = DEFAULT_TIMEOUT_S) -> float:
+    try:
+        v = float(os.getenv("CEDARPY_SHELL_AGENT_TIMEOUT", str(default)))
+        return v if v > 0 else default
+    except Exception:
+        return default
+
+
+@dataclass
+class ShellRun:
+    command: str
+    stdout: str = ""
+    stderr: str = ""
+    exit_code: Optional[int] = None
+    timed_out: bool = False
+    truncated: bool = False
+    elapsed_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "command": self.command,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "exit_code": self.exit_code,
+            "timed_out": self.timed_out,
+            "truncated": self.truncated,
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+async def _emit(on_output: Optional[Callable], stream: str, text: str) -> None:
+    if on_output is None or not text:
+        return
+    try:
+        res = on_output(stream, text)
+        if inspect.isawaitable(res):
+            await res
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # A broken client must not break the command
+        print(f"[async-shell] on_output failed: {type(e).__name__}: {e}")
+
+
+async def _pump(reader: asyncio.StreamReader, name: str, run: ShellRun, max_capture: int, on_output: Optional[Callable]) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = await reader.read(READ_CHUNK)
+        # The incremental decoder holds back a split multi-byte character until the next chunk
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            current = getattr(run, name)
+            room = max_capture - len(current)
+            if room <= 0:
+                run.truncated = True
+            else:
+                if len(text) > room:
+                    text = text[:room]
+                    run.truncated = True
+                setattr(run, name, current + text)
+                await _emit(on_output, name, text)
+        if not chunk:
+            break
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(os.getpgid(proc.pid), sig)
+    except Exception:
+        try:
+            proc.send_signal(sig)
+        except Exception:
+            pass
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE_S)
+    except (asyncio.TimeoutError, Exception):
+        _signal_group(proc, signal.SIGKILL)
+        try:
+            await asyncio.wait_for(proc.wait(), KILL_GRACE_S)
+        except Exception:
+            pass
+
+
+@instrument("tool.shell", kind="client", attributes=lambda command, *a, **kw: {"command": command},
+            result_attributes=lambda run: {"exit_code": run.exit_code, "timed_out": run.timed_out})
+@tape("tool.shell", key=lambda command, *a, **kw: command, codec=SHELL_CODEC)
+async def run_shell(command: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None, on_output: Optional[Callable] = None,
+                    max_capture: int = 20000) -> ShellRun:
+    """Run a shell command without blocking the event loop. Raises CancelledError if cancelled."""
+    timeout = shell_timeout_from_env() if timeout is None else timeout
+    run = ShellRun(command=command)
+    start = time.monotonic()
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+        start_new_session=True,
+    )
+    pumps = asyncio.gather(
+        _pump(proc.stdout, "stdout", run, max_capture, on_output),
+        _pump(proc.stderr, "stderr", run, max_capture, on_output),
+    )
+
+    async def _finish():
+        await pumps
+        return await proc.wait()
+
+    try:
+        run.exit_code = await asyncio.wait_for(_finish(), timeout if timeout and timeout > 0 else None)
+    except asyncio.TimeoutError:
+        run.timed_out = True
+        await _terminate(proc)
+        run.exit_code = proc.returncode
+    except BaseException:
+        # Cancelled (orchestration aborted) or a pump failed: never leave the process behind
+        pumps.cancel()
+        await asyncio.shield(_terminate(proc))
+        raise
+    finally:
+        run.elapsed_s = time.monotonic() - start
+    return run
@@ -0,0 +1,777 @@
+"""
+Record/replay of websocket chat sessions ("cassettes") for reproducible orchestration benchmarks.
+
+A live run of handle_ws_chat depends on LLM output, shell and Python tool results and downloads, so a
+latency regression in the chat path could not be reproduced run against run. With recording on, a
+chat connection is written to a cassette: every inbound websocket message (with its offset and how many
+outbound messages preceded it), every outbound message type, and the result or error and duration of
+each call made through a tape point:
+
+  llm.chat     LLMGateway.call_sync / call_async (keyed by the response-cache key, which leaves out
+               volatile messages such as the query budget line; streams chunk by chunk, and a stream
+               that is cancelled or closed early keeps the chunks consumed so far)
+  tool.shell   async_shell.run_shell (keyed by command)
+  tool.python  code_sandbox.run_code_async (keyed by source hash)
+  http.get     FileAgent downloads (keyed by url)
+
+replay_cassette() feeds the cassette back into handle_ws_chat with a ReplayWebSocket: nothing touches the
+network, LLM or shell. Calls are answered from the tape, matched by point and key (in recorded order);
+a call whose key no longer matches (the prompt changed) takes the next unused answer of the same point
+and is counted as substituted, and a call with nothing left raises CassetteMiss. Timing is the recorded
+one scaled by `speed`: 1.0 replays the original latencies, 0.1 is ten times faster, 0 replays as fast as
+possible. An inbound message is delivered once its (scaled) offset has passed and the handler has sent
+as many messages as it had before it in the recording, so a mid-run cancel still lands mid-run (if the
+handler stops sending, delivery goes ahead after stall_s).
+
+Both the recording and each replay are summarized by session_report(): per-turn ack / first delta /
+final latency and message counts, calls and time per tape point, and the per-stage split of each turn's
+trace (span totals and critical path by category, see tracing). compare_reports() diffs two reports,
+so an orchestration change can be compared against the recorded baseline or another replay.
+
+Configuration:
+  CEDARPY_WS_RECORD   directory to write cassettes to ("1" for DATA_DIR/cassettes; default off)
+
+Usage:
+    python -m cedar_app.utils.cassette replay DATA_DIR/cassettes/<file>.json --speed 0
+    report = await replay_cassette(load_cassette(path), speed=0)
+    compare_reports(cassette["report"], report)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import inspect
+import weakref
+import functools
+import contextvars
+import collections
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(Exception):
+    """A replayed call found no recorded answer left for its tape point."""
+
+
+class ReplayedError(Exception):
+    """The error a call raised while recording, raised again on replay."""
+
+    def __init__(self, error: Dict[str, Any]):
+        self.error_type = error.get("type") or "Exception"
+        self.status_code = error.get("status_code")
+        super().__init__(f"{self.error_type}: {error.get('message') or ''}")
+
+
+try:
+    from starlette.websockets import WebSocketDisconnect as _Disconnect
+except Exception:  # pragma: no cover - starlette is a FastAPI dependency
+    class _Disconnect(Exception):
+        pass
+
+
+def record_dir() -> Optional[str]:
+    value = str(os.getenv("CEDARPY_WS_RECORD", "")).strip()
+    if not value or value.lower() in {"0", "false", "no", "off"}:
+        return None
+    if value.lower() in {"1", "true", "yes", "on"}:
+        from cedar_app.config import DATA_DIR
+        return os.path.join(DATA_DIR, "cassettes")
+    return value
+
+
+def _json_safe(value: Any) -> Any:
+    return json.loads(json.dumps(value, default=str))
+
+
+def _error_dict(exc: BaseException) -> Dict[str, Any]:
+    status = getattr(exc, "status_code", None)
+    return {"type": type(exc).__name__, "message": str(exc)[:2000], "status_code": status if isinstance(status, int) else None}
+
+
+# ----------------------------------------------------------------------------------
+# Codecs for the tape points
+# ----------------------------------------------------------------------------------
+
+class Codec:
+    """How a tape point's result is stored and rebuilt; output() lists (stream, text) pairs to hand
+    to the caller's on_output callback on replay."""
+
+    def __init__(self, encode: Callable[[Any], Any] = _json_safe, decode: Callable[[Any], Any] = lambda d: d,
+                 output: Optional[Callable[[Any], List[Tuple[str, str]]]] = None):
+        self.encode = encode
+        self.decode = decode
+        self.output = output
+
+
+def _llm_encode(response: Any) -> Any:
+    from cedar_app.llm.response_cache import _plain
+    return _json_safe(_plain(response))
+
+
+def _llm_decode(data: Any) -> Any:
+    from cedar_app.llm.fake_server import chat_object
+    return chat_object(data) if isinstance(data, dict) else data
+
+
+def _shell_decode(data: Dict[str, Any]) -> Any:
+    from cedar_app.utils.async_shell import ShellRun
+    return ShellRun(**data)
+
+
+def _streams(data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [(s, data.get(s) or "") for s in ("stdout", "stderr") if data.get(s)]
+
+
+LLM_CODEC = Codec(_llm_encode, _llm_decode)
+SHELL_CODEC = Codec(lambda run: _json_safe(run.to_dict()), _shell_decode, _streams)
+PYTHON_CODEC = Codec(_json_safe, lambda d: d, _streams)
+BYTES_CODEC = Codec(lambda b: base64.b64encode(bytes(b)).decode("ascii"), lambda s: base64.b64decode(s))
+
+
+def llm_key(gateway: Any, api_key: Any, kwargs: Dict[str, Any]) -> str:
+    """The response-cache key: volatile messages (budget counters) do not change it between runs."""
+    from cedar_app.llm.response_cache import cache_key
+    return cache_key(kwargs)
+
+
+def llm_is_stream(gateway: Any, api_key: Any, kwargs: Dict[str, Any]) -> bool:
+    return bool(kwargs.get("stream"))
+
+
+def source_key(source: str, *args: Any, **kwargs: Any) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+# ----------------------------------------------------------------------------------
+# Sessions
+# ----------------------------------------------------------------------------------
+
+current_cassette: contextvars.ContextVar[Optional["_Session"]] = contextvars.ContextVar("cedar_cassette", default=None)
+
+
+class _Session:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events: List[Dict[str, Any]] = []
+        self.sent = 0
+
+    def now(self) -> float:
+        return round(time.monotonic() - self.started, 6)
+
+    def add(self, kind: str, **data: Any) -> Dict[str, Any]:
+        event = {"seq": len(self.events), "t": data.pop("t", None), "kind": kind, **data}
+        if event["t"] is None:
+            event["t"] = self.now()
+        self.events.append(event)
+        return event
+
+    def ws_out(self, data: Any) -> None:
+        self.sent += 1
+        msg = data if isinstance(data, dict) else {}
+        event = {"type": msg.get("type"), "bytes": len(json.dumps(data, default=str))}
+        if msg.get("type") == "final":
+            event.update(text=str(msg.get("text") or "")[:4000], trace_id=msg.get("trace_id"))
+        self.add("ws.out", **event)
+
+
+class CassetteRecorder(_Session):
+    """Records a live connection: wrap() the websocket; start_recording() makes the tape points record."""
+
+    def __init__(self, meta: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.meta = dict(meta or {})
+        self.meta.setdefault("recorded_at", datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+    def wrap(self, websocket: Any) -> "RecordingWebSocket":
+        return RecordingWebSocket(websocket, self)
+
+    def record_call(self, name: str, key: str, started: float, codec: Codec, result: Any = None,
+                    error: Optional[BaseException] = None, stream: Optional[List[Any]] = None,
+                    partial: bool = False) -> None:
+        data: Dict[str, Any] = {"name": name, "key": key, "t": round(started - self.started, 6),
+                                "duration_s": round(time.monotonic() - started, 6)}
+        if error is not None:
+            data["error"] = _error_dict(error)
+        elif stream is not None:
+            data["stream"] = stream
+            if partial:
+                data["partial"] = True  # cancelled or closed before the end
+        else:
+            try:
+                data["result"] = codec.encode(result)
+            except Exception as e:
+                print(f"[cassette] could not encode {name} result: {type(e).__name__}: {e}")
+                data["error"] = {"type": "Unrecorded", "message": str(e), "status_code": None}
+        self.add("call", **data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        events = sorted(self.events, key=lambda e: (e["t"], e["seq"]))
+        return {"version": CASSETTE_VERSION, "meta": self.meta, "events": events, "report": session_report(events)}
+
+    def save(self, directory: Optional[str] = None) -> Optional[str]:
+        directory = directory or record_dir()
+        if not directory or not any(e["kind"] == "ws.in" for e in self.events):
+            return None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            path = os.path.join(directory, f"{stamp}-p{self.meta.get('project_id') or 0}-{os.getpid()}-{id(self) % 10000}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, default=str)
+            print(f"[cassette] recorded {len(self.events)} events to {path}")
+            return path
+        except Exception as e:
+            print(f"[cassette] could not save recording: {type(e).__name__}: {e}")
+            return None
+
+
+class RecordingWebSocket:
+    def __init__(self, ws: Any, recorder: CassetteRecorder):
+        self._ws = ws
+        self._recorder = recorder
+
+    async def receive_json(self):
+        try:
+            msg = await self._ws.receive_json()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._recorder.add("ws.disconnect")
+            raise
+        self._recorder.add("ws.in", message=_json_safe(msg), after_out=self._recorder.sent)
+        return msg
+
+    async def send_json(self, data):
+        await self._ws.send_json(data)
+        self._recorder.ws_out(data)
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+
+class CassettePlayer(_Session):
+    """Serves a cassette's calls and inbound messages with scaled timing."""
+
+    def __init__(self, cassette: Dict[str, Any], speed: float = 1.0, stall_s: float = 2.0):
+        super().__init__()
+        self.cassette = cassette
+        self.speed = max(0.0, float(speed))
+        self.stall_s = stall_s
+        recorded = cassette.get("events") or []
+        self.inbound = collections.deque(e for e in recorded if e["kind"] == "ws.in")
+        self.recorded_out = sum(1 for e in recorded if e["kind"] == "ws.out")
+        self.disconnect_t = next((e["t"] for e in recorded if e["kind"] == "ws.disconnect"), 0.0)
+        self._by_key: Dict[Tuple[str, str], collections.deque] = collections.defaultdict(collections.deque)
+        self._by_name: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+        for e in recorded:
+            if e["kind"] == "call":
+                self._by_key[(e["name"], e.get("key") or "")].append(e)
+                self._by_name[e["name"]].append(e)
+        self._used: set = set()
+        self.substituted = 0
+        self.misses = 0
+        self.stalls = 0
+        self._last_send = self.started
+        self._progress = asyncio.Event()
+
+    def take(self, name: str, key: str) -> Dict[str, Any]:
+        queue = self._by_key.get((name, key))
+        while queue:
+            event = queue.popleft()
+            if event["seq"] not in self._used:
+                self._used.add(event["seq"])
+                return event
+        for event in self._by_name.get(name, []):
+            if event["seq"] not in self._used:
+                self._used.add(event["seq"])
+                self.substituted += 1
+                return event
+        self.misses += 1
+        raise CassetteMiss(f"No recorded {name} call left for key {key[:16]}")
+
+    def scaled(self, seconds: Any) -> float:
+        try:
+            return max(0.0, float(seconds or 0)) * self.speed
+        except (TypeError, ValueError):
+            return 0.0
+
+    def ws_out(self, data: Any) -> None:
+        super().ws_out(data)
+        self._last_send = time.monotonic()
+        self._progress.set()
+
+    async def _wait_until(self, offset_s: float, after_out: int) -> None:
+        deadline = self.started + self.scaled(offset_s)
+        while self.sent < after_out:
+            idle = time.monotonic() - self._last_send
+            if idle >= self.stall_s:
+                self.stalls += 1
+                break
+            self._progress.clear()
+            try:
+                await asyncio.wait_for(self._progress.wait(), timeout=self.stall_s - idle)
+            except asyncio.TimeoutError:
+                pass
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def next_inbound(self) -> Dict[str, Any]:
+        if not self.inbound:
+            await self._wait_until(self.disconnect_t, self.recorded_out)
+            self.add("ws.disconnect")
+            raise _Disconnect(1000)
+        event = self.inbound[0]
+        await self._wait_until(event["t"], event.get("after_out") or 0)
+        self.inbound.popleft()  # only once delivered: a cancelled receive leaves it queued
+        self._last_send = time.monotonic()
+        self.add("ws.in", message=event["message"], after_out=self.sent)
+        return json.loads(json.dumps(event["message"]))
+
+    def report(self) -> Dict[str, Any]:
+        out = session_report(self.events)
+        out["replay"] = {"speed": self.speed, "substituted": self.substituted, "misses": self.misses,
+                         "stalls": self.stalls, "unused_calls": sum(len(v) for v in self._by_name.values()) - len(self._used)}
+        return out
+
+
+class ReplayWebSocket:
+    """Stands in for the client: receive_json() yields the recorded inbound messages, then disconnects."""
+
+    def __init__(self, player: CassettePlayer):
+        self._player = player
+        self.closed = False
+        self.headers: Dict[str, str] = {}
+        self.sent: List[Any] = []
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        try:
+            return await self._player.next_inbound()
+        except _Disconnect:
+            self.closed = True
+            raise
+
+    async def send_json(self, data):
+        if self.closed:
+            raise RuntimeError("Cannot send on a closed replay websocket")
+        self.sent.append(data)
+        self._player.ws_out(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+# ----------------------------------------------------------------------------------
+# Tape points
+# ----------------------------------------------------------------------------------
+
+def _output_calls(codec: Codec, data: Any, fn: Callable, args: tuple, kwargs: dict) -> Iterator[Any]:
+    """Call the caller's on_output callback with each recorded (stream, text); yields what it returns."""
+    if codec.output is None or not isinstance(data, dict):
+        return
+    try:
+        on_output = inspect.signature(fn).bind_partial(*args, **kwargs).arguments.get("on_output")
+    except TypeError:
+        on_output = None
+    if on_output is None:
+        return
+    for stream, text in codec.output(data):
+        yield on_output(stream, text)
+
+
+async def _deliver_output(codec: Codec, data: Any, fn: Callable, args: tuple, kwargs: dict) -> None:
+    for res in _output_calls(codec, data, fn, args, kwargs):
+        if inspect.isawaitable(res):
+            await res
+
+
+def _deliver_output_sync(codec: Codec, data: Any, fn: Callable, args: tuple, kwargs: dict) -> None:
+    for res in _output_calls(codec, data, fn, args, kwargs):
+        if inspect.iscoroutine(res):
+            res.close()  # a sync function's caller cannot await it either
+
+
+class _RecordingStream:
+    """Passes a live stream through, keeping each chunk and the time since the previous one. The call is
+    recorded exactly once: when the stream ends or fails, or with the chunks so far when it is
+    cancelled, closed or abandoned early."""
+
+    def __init__(self, stream: Any, recorder: CassetteRecorder, name: str, key: str, started: float, codec: Codec):
+        self._stream = stream
+        self._args = (recorder, name, key, started, codec)
+        self._chunks: List[Any] = []
+        self._last = started
+        self._recorded = False
+        self._iterator: Optional[weakref.ref] = None  # weak: a dropped iterator must be collectable to record
+
+    def _keep(self, chunk: Any) -> None:
+        now = time.monotonic()
+        self._chunks.append([round(now - self._last, 6), self._args[4].encode(chunk)])
+        self._last = now
+
+    def _done(self, error: Optional[BaseException] = None, partial: bool = False) -> None:
+        if self._recorded:
+            return
+        self._recorded = True
+        recorder, name, key, started, codec = self._args
+        recorder.record_call(name, key, started, codec, error=error, stream=None if error else self._chunks, partial=partial)
+
+    def _iter(self):
+        finished = False
+        try:
+            for chunk in self._stream:
+                self._keep(chunk)
+                yield chunk
+            finished = True
+        except Exception as e:
+            self._done(e)
+            raise
+        finally:
+            self._done(partial=not finished)
+
+    async def _aiter(self):
+        finished = False
+        try:
+            async for chunk in self._stream:
+                self._keep(chunk)
+                yield chunk
+            finished = True
+        except Exception as e:
+            self._done(e)
+            raise
+        finally:
+            self._done(partial=not finished)
+
+    def __iter__(self):
+        it = self._iter()
+        self._iterator = weakref.ref(it)
+        return it
+
+    def __aiter__(self):
+        it = self._aiter()
+        self._iterator = weakref.ref(it)
+        return it
+
+    def close(self):
+        it = self._iterator() if self._iterator is not None else None
+        if it is not None and hasattr(it, "close"):
+            it.close()
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+        self._done(partial=True)
+
+    async def aclose(self):
+        it = self._iterator() if self._iterator is not None else None
+        if it is not None and hasattr(it, "aclose"):
+            await it.aclose()
+        close = getattr(self._stream, "aclose", None) or getattr(self._stream, "close", None)
+        if close is not None:
+            res = close()
+            if inspect.isawaitable(res):
+                await res
+        self._done(partial=True)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _ReplayStream:
+    def __init__(self, player: CassettePlayer, chunks: List[Any], codec: Codec):
+        self._player = player
+        self._chunks = chunks
+
+    def _chunk(self, data: Any) -> Any:
+        from cedar_app.llm.fake_server import chat_object
+        return chat_object(data, chunk=True) if isinstance(data, dict) else data
+
+    def __iter__(self):
+        for delay, data in self._chunks:
+            time.sleep(self._player.scaled(delay))
+            yield self._chunk(data)
+
+    async def _aiter(self):
+        for delay, data in self._chunks:
+            await asyncio.sleep(self._player.scaled(delay))
+            yield self._chunk(data)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+def _replayed(player: CassettePlayer, event: Dict[str, Any], codec: Codec) -> Any:
+    if "error" in event:
+        raise ReplayedError(event["error"])
+    if "stream" in event:
+        return _ReplayStream(player, event["stream"], codec)
+    return codec.decode(event.get("result"))
+
+
+def tape(name: str, key: Optional[Callable[..., str]] = None, codec: Codec = Codec(),
+         stream: Optional[Callable[..., bool]] = None):
+    """Decorator: record the (sync or async) function's result on a recording cassette, answer it from
+    the cassette on replay, and just call it otherwise. key(*args, **kwargs) identifies the call;
+    stream(*args, **kwargs) says the result is an iterator of chunks."""
+    def _key(*args, **kwargs) -> str:
+        if key is None:
+            return ""
+        try:
+            return str(key(*args, **kwargs))
+        except Exception:
+            return ""
+
+    def _is_stream(*args, **kwargs) -> bool:
+        try:
+            return bool(stream and stream(*args, **kwargs))
+        except Exception:
+            return False
+
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                session = current_cassette.get()
+                if session is None:
+                    return await fn(*args, **kwargs)
+                k = _key(*args, **kwargs)
+                if isinstance(session, CassettePlayer):
+                    event = session.take(name, k)
+                    started = time.monotonic()
+                    await asyncio.sleep(session.scaled(event.get("duration_s")))
+                    result = _replayed(session, event, codec)
+                    await _deliver_output(codec, event.get("result"), fn, args, kwargs)
+                    session.add("call", name=name, key=k, t=round(started - session.started, 6),
+                                duration_s=round(time.monotonic() - started, 6), status="error" if "error" in event else "ok")
+                    return result
+                started = time.monotonic()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    session.record_call(name, k, started, codec, error=e)
+                    raise
+                if _is_stream(*args, **kwargs):
+                    return _RecordingStream(result, session, name, k, started, codec)
+                session.record_call(name, k, started, codec, result=result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = current_cassette.get()
+            if session is None:
+                return fn(*args, **kwargs)
+            k = _key(*args, **kwargs)
+            if isinstance(session, CassettePlayer):
+                event = session.take(name, k)
+                started = time.monotonic()
+                time.sleep(session.scaled(event.get("duration_s")))
+                result = _replayed(session, event, codec)
+                _deliver_output_sync(codec, event.get("result"), fn, args, kwargs)
+                session.add("call", name=name, key=k, t=round(started - session.started, 6),
+                            duration_s=round(time.monotonic() - started, 6), status="error" if "error" in event else "ok")
+                return result
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                session.record_call(name, k, started, codec, error=e)
+                raise
+            if _is_stream(*args, **kwargs):
+                return _RecordingStream(result, session, name, k, started, codec)
+            session.record_call(name, k, started, codec, result=result)
+            return result
+        return wrapper
+    return decorate
+
+
+# ----------------------------------------------------------------------------------
+# Reports
+# ----------------------------------------------------------------------------------
+
+_END_TYPES = {"final", "cancelled", "error"}
+
+
+def _trace_stages(trace_id: Optional[str]) -> Dict[str, Any]:
+    if not trace_id:
+        return {}
+    try:
+        from cedar_app.utils.tracing import get_trace_store, timeline
+        data = get_trace_store().get(trace_id)
+    except Exception:
+        return {}
+    if not data:
+        return {}
+    spans: Dict[str, float] = {}
+    for s in data.get("spans", []):
+        if s.get("parent_id") is None:
+            continue
+        spans[s["name"]] = round(spans.get(s["name"], 0.0) + ((s["end_ns"] or s["start_ns"]) - s["start_ns"]) / 1e6, 3)
+    return {"span_ms": spans, "critical_ms": {k: round(v, 3) for k, v in timeline(data)["critical_ms_by_category"].items()}}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def session_report(events: List[Dict[str, Any]], traces: bool = True) -> Dict[str, Any]:
+    """Per-turn latencies, message counts, per-tape-point calls and per-stage trace split of a session."""
+    events = sorted(events, key=lambda e: (e["t"], e["seq"]))
+    counts = collections.Counter(e["kind"] for e in events)
+    out_types = collections.Counter(e.get("type") for e in events if e["kind"] == "ws.out")
+    calls: Dict[str, Dict[str, Any]] = {}
+    for e in events:
+        if e["kind"] != "call":
+            continue
+        c = calls.setdefault(e["name"], {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        c["count"] += 1
+        c["errors"] += 1 if ("error" in e or e.get("status") == "error") else 0
+        ms = (e.get("duration_s") or 0) * 1000
+        c["total_ms"] = round(c["total_ms"] + ms, 3)
+        c["max_ms"] = round(max(c["max_ms"], ms), 3)
+
+    turns = []
+    current: Optional[Dict[str, Any]] = None
+    for e in events:
+        if e["kind"] == "ws.in":
+            msg = e.get("message") or {}
+            if msg.get("type") == "message" or msg.get("action") == "chat":
+                current = {"message": str(msg.get("content") or "")[:80], "t": e["t"], "ack_ms": None,
+                           "first_delta_ms": None, "end_ms": None, "end": None, "ws_out": 0, "trace_id": None}
+                turns.append(current)
+            continue
+        if e["kind"] != "ws.out" or current is None or current["end"] is not None:
+            continue
+        since = e["t"] - current["t"]
+        current["ws_out"] += 1
+        if current["ack_ms"] is None:
+            current["ack_ms"] = _ms(since)
+        if current["first_delta_ms"] is None and e.get("type") in {"final_delta", "agent_stream"}:
+            current["first_delta_ms"] = _ms(since)
+        if e.get("type") in _END_TYPES:
+            current.update(end_ms=_ms(since), end=e["type"], trace_id=e.get("trace_id"))
+    for turn in turns:
+        turn.pop("t")
+        if traces:
+            turn["stages"] = _trace_stages(turn["trace_id"])
+    ends = [t["end_ms"] for t in turns if t["end_ms"] is not None]
+    return {
+        "duration_ms": _ms(events[-1]["t"]) if events else 0.0,
+        "events": dict(counts),
+        "ws_out_types": {str(k): v for k, v in out_types.items()},
+        "calls": calls,
+        "turns": turns,
+        "total_turn_ms": round(sum(ends), 3),
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Deltas (candidate - baseline) of turn latencies, call counts/time and event counts."""
+    def delta(a: Any, b: Any) -> Optional[float]:
+        return round(b - a, 3) if isinstance(a, (int, float)) and isinstance(b, (int, float)) else None
+
+    turns = []
+    for a, b in zip(baseline.get("turns", []), candidate.get("turns", [])):
+        turns.append({"message": b.get("message"), "end": b.get("end"),
+                      **{f"{k}_delta": delta(a.get(k), b.get(k)) for k in ("ack_ms", "first_delta_ms", "end_ms", "ws_out")}})
+    calls = {}
+    for name in sorted(set(baseline.get("calls", {})) | set(candidate.get("calls", {}))):
+        a, b = baseline.get("calls", {}).get(name, {}), candidate.get("calls", {}).get(name, {})
+        calls[name] = {"count_delta": delta(a.get("count", 0), b.get("count", 0)),
+                       "total_ms_delta": delta(a.get("total_ms", 0.0), b.get("total_ms", 0.0))}
+    kinds = set(baseline.get("events", {})) | set(candidate.get("events", {}))
+    return {
+        "total_turn_ms": {"baseline": baseline.get("total_turn_ms"), "candidate": candidate.get("total_turn_ms"),
+                          "delta": delta(baseline.get("total_turn_ms"), candidate.get("total_turn_ms"))},
+        "turns": turns,
+        "turn_count_delta": len(candidate.get("turns", [])) - len(baseline.get("turns", [])),
+        "calls": calls,
+        "events": {k: delta(baseline.get("events", {}).get(k, 0), candidate.get("events", {}).get(k, 0)) for k in sorted(kinds)},
+    }
+
+
+# ----------------------------------------------------------------------------------
+# Entry points
+# ----------------------------------------------------------------------------------
+
+def load_cassette(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != CASSETTE_VERSION:
+        raise ValueError(f"Unsupported cassette version {data.get('version')!r} in {path}")
+    return data
+
+
+def start_recording(**meta: Any) -> Tuple[CassetteRecorder, contextvars.Token]:
+    recorder = CassetteRecorder(meta)
+    return recorder, current_cassette.set(recorder)
+
+
+def stop_recording(recorder: CassetteRecorder, token: contextvars.Token) -> Optional[str]:
+    current_cassette.reset(token)
+    return recorder.save()
+
+
+async def replay_cassette(cassette: Dict[str, Any], handler: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                          speed: float = 1.0, stall_s: float = 2.0, project_id: Any = "recorded") -> Dict[str, Any]:
+    """Run `handler(websocket)` against the cassette (default: handle_ws_chat with a fresh orchestrator and
+    the recorded project id; chat history is persisted as in a live run) and return its session report."""
+    player = CassettePlayer(cassette, speed=speed, stall_s=stall_s)
+    ws = ReplayWebSocket(player)
+    if handler is None:
+        from cedar_orchestrator.ws_chat import handle_ws_chat
+        from cedar_orchestrator.orchestrator import ThinkerOrchestrator
+        from cedar_app.llm.fake_server import FAKE_API_KEY
+        orchestrator = ThinkerOrchestrator(FAKE_API_KEY)  # every call is answered from the tape
+        pid = cassette.get("meta", {}).get("project_id") if project_id == "recorded" else project_id
+
+        async def handler(websocket):
+            await handle_ws_chat(websocket, orchestrator, pid, None)
+    token = current_cassette.set(player)
+    try:
+        await handler(ws)
+    finally:
+        current_cassette.reset(token)
+    report = player.report()
+    print(f"[cassette] replayed {len(player.events)} events at speed {player.speed:g}: "
+          f"{report['total_turn_ms']:.0f} ms over {len(report['turns'])} turns, {player.misses} misses, {player.substituted} substituted")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay a recorded websocket chat cassette and report its latencies")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay")
+    rp.add_argument("path")
+    rp.add_argument("--speed", type=float, default=1.0, help="1 = recorded timing, 0 = as fast as possible")
+    rp.add_argument("--stall-s", type=float, default=2.0)
+    rp.add_argument("--project-id", type=int)
+    sub.add_parser("report").add_argument("path")
+    args = parser.parse_args(argv)
+    cassette = load_cassette(args.path)
+    if args.command == "report":
+        print(json.dumps(cassette.get("report") or session_report(cassette["events"]), indent=2))
+        return
+    report = asyncio.run(replay_cassette(cassette, speed=args.speed, stall_s=args.stall_s,
+                                         project_id=args.project_id if args.project_id is not None else "recorded"))
+    print(json.dumps({"report": report, "vs_recording": compare_reports(cassette.get("report") or {}, report)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Out-of-process execution of generated Python code.
+
+CodeAgent, tool_code, the ask orchestrator's code tool and the LLM tabular importer all run code
+written by an LLM. Running it in the server process blocks the event loop, shares the GIL and lets a
+runaway loop or allocation take the server down. This module keeps a pool of pre-warmed worker
+subprocesses (cedar_app/utils/sandbox_worker.py, with numpy/pandas already imported) and runs each
+job in one of them:
+
+  - jobs run in parallel, one per worker (CEDARPY_SANDBOX_WORKERS, default min(4, cpus));
+  - per-job CPU and address-space limits via resource.setrlimit inside the worker
+    (CEDARPY_SANDBOX_CPU_S, default 30; CEDARPY_SANDBOX_MEMORY_MB, default 1024);
+  - a wall-clock timeout (CEDARPY_SANDBOX_TIMEOUT_S, default 60) after which the worker is killed
+    and replaced; the server is never affected;
+  - stdout/stderr are streamed back as the code prints (on_output(stream, text));
+  - `cedar.<helper>(...)` calls inside the code are RPCs answered in the calling thread by the
+    project-scoped callables passed in `helpers`, so SQLAlchemy sessions stay on their own thread.
+
+Workers start in a private scratch directory with an allow-listed environment (locale, PATH, temp
+dirs, Python paths, plus any names listed in CEDARPY_SANDBOX_ENV), so API keys and other secrets in
+the server's environment are not visible to generated code. Each job runs in a fresh per-job
+directory under that scratch root, removed after the job, unless the caller passes cwd= (e.g. a
+project directory the code is meant to write into).
+
+Workers are recycled after CEDARPY_SANDBOX_MAX_JOBS jobs (default 100). Where workers cannot be
+started (e.g. frozen builds without a Python interpreter, or CEDARPY_SANDBOX_DISABLED=1), jobs fall
+back to in-process execution with the same globals policy but without limits (and in the server's
+working directory, since chdir is process-wide).
+
+Usage:
+    res = run_code(source, helpers={"query": q}, builtins=[...], modules=["json"])
+    res = await run_code_async(source, on_output=send_chunk)
+    # res: {"ok", "error", "stdout", "stderr", "value", "timed_out", "limit", "elapsed_ms", "sandboxed"}
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import queue
+import select
+import shutil
+import signal
+import asyncio
+import inspect
+import tempfile
+import threading
+import subprocess
+from typing import Any, Callable, Dict, Optional
+
+from cedar_app.utils import sandbox_worker
+from cedar_app.utils.tracing import instrument
+from cedar_app.utils.cassette import PYTHON_CODEC, source_key, tape
+from cedar_app.env_utils import env_int
+
+WORKER_PATH = os.path.abspath(sandbox_worker.__file__)
+# Captured output returned to callers (streamed output is bounded separately per job)
+DEFAULT_MAX_OUTPUT = 200000
+
+
+class SandboxUnavailable(Exception):
+    pass
+
+
+# Environment variables passed through to workers; everything else (API keys, tokens) is dropped
+SANDBOX_ENV_ALLOW = (
+    "PATH", "LANG", "LANGUAGE", "LC_ALL", "LC_CTYPE", "TZ", "TMPDIR", "TEMP", "TMP", "SYSTEMROOT",
+    "PYTHONPATH", "PYTHONHOME", "VIRTUAL_ENV", "CEDARPY_SANDBOX_PREIMPORT",
+)
+
+
+def sandbox_env(home: str) -> Dict[str, str]:
+    """Allow-listed environment for a worker whose HOME is its scratch directory."""
+    extra = [n.strip() for n in (os.getenv("CEDARPY_SANDBOX_ENV") or "").split(",") if n.strip()]
+    env = {k: os.environ[k] for k in (*SANDBOX_ENV_ALLOW, *extra) if k in os.environ}
+    env["HOME"] = home
+    return env
+
+
+class _Worker:
+    """One sandbox subprocess speaking the JSON-lines protocol of sandbox_worker."""
+
+    def __init__(self, python: str, scratch: str):
+        env = sandbox_env(scratch)
+        # Keep the address space of a warm worker small and predictable under RLIMIT_AS
+        env.setdefault("OPENBLAS_NUM_THREADS", "1")
+        env.setdefault("OMP_NUM_THREADS", "1")
+        env.setdefault("MKL_NUM_THREADS", "1")
+        env.setdefault("MALLOC_ARENA_MAX", "2")
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        self.proc = subprocess.Popen(
+            [python, "-u", WORKER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,
+            env=env,
+            cwd=scratch,
+            start_new_session=True,
+        )
+        self._fd = self.proc.stdout.fileno()
+        self._buf = b""
+        self.jobs = 0
+        self.ready = False
+        self.info: Dict[str, Any] = {}
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def send(self, obj: Dict[str, Any]) -> None:
+        self.proc.stdin.write((json.dumps(obj, default=str) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+
+    def read(self, deadline: Optional[float], cancel: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """Next message, None on EOF. Raises TimeoutError past the deadline or when cancelled."""
+        while b"\n" not in self._buf:
+            if cancel is not None and cancel.is_set():
+                raise TimeoutError("cancelled")
+            wait = 0.1
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise TimeoutError("timeout")
+                wait = min(wait, left)
+            r, _, _ = select.select([self._fd], [], [], wait)
+            if not r:
+                continue
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                return None
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        return json.loads(line.decode("utf-8", errors="replace"))
+
+    def wait_ready(self, timeout: float) -> None:
+        if self.ready:
+            return
+        msg = self.read(time.monotonic() + timeout)
+        if not msg or msg.get("type") != "ready":
+            raise SandboxUnavailable("sandbox worker failed to start")
+        self.ready = True
+        self.info = msg
+
+    def kill(self) -> None:
+        try:
+            os.killpg(os.getpgid(self.proc.pid), signal.SIGKILL)
+        except Exception:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+        try:
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+        for f in (self.proc.stdin, self.proc.stdout):
+            try:
+                f.close()
+            except Exception:
+                pass
+
+
+class SandboxPool:
+    def __init__(self, size: Optional[int] = None, python: Optional[str] = None):
+        self.size = size if size is not None else env_int("CEDARPY_SANDBOX_WORKERS", min(4, os.cpu_count() or 2))
+        self.size = max(1, self.size)
+        self.python = python or os.getenv("CEDARPY_SANDBOX_PYTHON") or sys.executable
+        self.timeout_s = env_int("CEDARPY_SANDBOX_TIMEOUT_S", 60)
+        self.cpu_s = env_int("CEDARPY_SANDBOX_CPU_S", 30)
+        self.memory_mb = env_int("CEDARPY_SANDBOX_MEMORY_MB", 1024)
+        self.max_jobs = env_int("CEDARPY_SANDBOX_MAX_JOBS", 100)
+        self.start_timeout_s = env_int("CEDARPY_SANDBOX_START_TIMEOUT_S", 60)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._closed = False
+        self._scratch: Optional[str] = None
+        self.stats = {"jobs": 0, "timeouts": 0, "crashes": 0, "recycled": 0, "spawned": 0, "fallback": 0}
+
+    # -- availability --------------------------------------------------------------
+
+    def available(self) -> bool:
+        if os.getenv("CEDARPY_SANDBOX_DISABLED", "").strip().lower() in ("1", "true", "yes"):
+            return False
+        if getattr(sys, "frozen", False) and not os.getenv("CEDARPY_SANDBOX_PYTHON"):
+            return False
+        return bool(self.python) and os.path.isfile(WORKER_PATH)
+
+    # -- worker lifecycle ----------------------------------------------------------
+
+    def scratch_root(self) -> str:
+        """Private directory workers start in; per-job directories are created below it."""
+        with self._lock:
+            if self._scratch is None or not os.path.isdir(self._scratch):
+                self._scratch = tempfile.mkdtemp(prefix="cedar-sandbox-")
+            return self._scratch
+
+    def _spawn(self) -> _Worker:
+        w = _Worker(self.python, self.scratch_root())
+        with self._lock:
+            self.stats["spawned"] += 1
+        return w
+
+    def warm(self) -> None:
+        """Start idle workers up to the pool size in the background (imports happen in the children)."""
+        if not self.available():
+            return
+        while True:
+            with self._lock:
+                if self._closed or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                self._idle.put(self._spawn())
+            except Exception as e:
+                with self._lock:
+                    self._total -= 1
+                print(f"[sandbox] warm failed: {type(e).__name__}: {e}")
+                return
+
+    def _acquire(self) -> _Worker:
+        while True:
+            try:
+                w = self._idle.get_nowait()
+            except queue.Empty:
+                w = None
+                with self._lock:
+                    grow = self._total < self.size
+                    if grow:
+                        self._total += 1
+                if grow:
+                    try:
+                        w = self._spawn()
+                    except Exception:
+                        with self._lock:
+                            self._total -= 1
+                        raise
+                else:
+                    w = self._idle.get()
+            if w.alive():
+                return w
+            self._discard(w)
+
+    def _discard(self, w: _Worker) -> None:
+        w.kill()
+        with self._lock:
+            self._total -= 1
+
+    def _release(self, w: _Worker, healthy: bool) -> None:
+        if healthy and w.alive() and w.jobs < self.max_jobs and not self._closed:
+            self._idle.put(w)
+            return
+        if healthy:
+            with self._lock:
+                self.stats["recycled"] += 1
+        self._discard(w)
+        # Replace it in the background so the next job finds a warm worker
+        threading.Thread(target=self.warm, daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        if self._scratch:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+
+    # -- jobs ----------------------------------------------------------------------
+
+    def run(self, source: str, helpers: Optional[Dict[str, Callable]] = None, timeout: Optional[float] = None,
+            on_output: Optional[Callable[[str, str], Any]] = None, cancel: Optional[threading.Event] = None,
+            **spec: Any) -> Dict[str, Any]:
+        """Run source in a worker. spec: see sandbox_worker (builtins, modules, allowed_imports, ...)."""
+        helpers = helpers or {}
+        spec = dict(spec)
+        spec.setdefault("cpu_s", self.cpu_s)
+        spec.setdefault("memory_mb", self.memory_mb)
+        spec.setdefault("max_output", DEFAULT_MAX_OUTPUT)
+        job = {"type": "job", "source": source, **spec}
+        if helpers:
+            job["helpers"] = sorted(helpers)
+        timeout = self.timeout_s if timeout is None else timeout
+        out = {"ok": False, "error": None, "stdout": "", "stderr": "", "value": None,
+               "timed_out": False, "limit": None, "elapsed_ms": 0, "sandboxed": True}
+        start = time.monotonic()
+        if not self.available():
+            return self._run_inline(job, helpers, on_output, out, start)
+        w: Optional[_Worker] = None
+        try:
+            w = self._acquire()
+            w.wait_ready(self.start_timeout_s)
+        except Exception as e:
+            print(f"[sandbox] worker unavailable, running in-process: {type(e).__name__}: {e}")
+            if w is not None:
+                self._discard(w)
+            return self._run_inline(job, helpers, on_output, out, start)
+        job_dir = None
+        if not job.get("cwd"):
+            job_dir = tempfile.mkdtemp(prefix="job-", dir=self.scratch_root())
+            job["cwd"] = job_dir
+        healthy = False
+        deadline = start + timeout if timeout and timeout > 0 else None
+        with self._lock:
+            self.stats["jobs"] += 1
+        try:
+            w.jobs += 1
+            w.send(job)
+            while True:
+                msg = w.read(deadline, cancel)
+                if msg is None:
+                    # Worker died mid-job: hard CPU limit, OOM kill or a crash in native code
+                    with self._lock:
+                        self.stats["crashes"] += 1
+                    out["error"] = out["error"] or "SandboxCrashed: worker exited while running the code"
+                    out["limit"] = out["limit"] or "crashed"
+                    break
+                kind = msg.get("type")
+                if kind == "out":
+                    stream = "stderr" if msg.get("stream") == "stderr" else "stdout"
+                    text = msg.get("text") or ""
+                    out[stream] += text
+                    if on_output is not None:
+                        try:
+                            on_output(stream, text)
+                        except Exception as e:
+                            print(f"[sandbox] on_output failed: {type(e).__name__}: {e}")
+                elif kind == "rpc":
+                    w.send(self._dispatch(helpers, msg.get("method"), msg.get("args") or []))
+                elif kind == "done":
+                    out.update(ok=bool(msg.get("ok")), error=msg.get("error"), value=msg.get("value"),
+                               limit=msg.get("limit"), truncated=bool(msg.get("truncated")))
+                    # A worker that hit a limit may be in a bad state; replace it
+                    healthy = not msg.get("limit")
+                    break
+        except TimeoutError as e:
+            cancelled = str(e) == "cancelled"
+            if not cancelled:
+                with self._lock:
+                    self.stats["timeouts"] += 1
+            out.update(ok=False, timed_out=not cancelled, limit="cancelled" if cancelled else "timeout",
+                       error="Cancelled" if cancelled else f"TimeoutError: code did not finish within {timeout:g}s")
+        except Exception as e:
+            out.update(ok=False, error=f"{type(e).__name__}: {e}")
+        finally:
+            out["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+            self._release(w, healthy)
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        return out
+
+    def _dispatch(self, helpers: Dict[str, Callable], method: Optional[str], args: list) -> Dict[str, Any]:
+        fn = helpers.get(method or "")
+        if fn is None:
+            return {"type": "rpc_result", "ok": False, "error": f"cedar.{method} is not available"}
+        try:
+            return {"type": "rpc_result", "ok": True, "value": fn(*args)}
+        except Exception as e:
+            return {"type": "rpc_result", "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def _run_inline(self, job: Dict[str, Any], helpers: Dict[str, Callable], on_output, out: Dict[str, Any], start: float) -> Dict[str, Any]:
+        with self._lock:
+            self.stats["fallback"] += 1
+
+        def rpc(method, args):
+            res = self._dispatch(helpers, method, args)
+            if not res.get("ok"):
+                raise RuntimeError(res.get("error"))
+            # Round-trip through JSON so results look the same as from a worker
+            return json.loads(json.dumps(res.get("value"), default=str))
+
+        def emit(stream, text):
+            out[stream] += text
+            if on_output is not None:
+                try:
+                    on_output(stream, text)
+                except Exception:
+                    pass
+
+        # chdir would move the whole server process; run in place
+        msg = sandbox_worker.execute({k: v for k, v in job.items() if k != "cwd"}, rpc, emit)
+        out.update(ok=bool(msg.get("ok")), error=msg.get("error"), value=msg.get("value"),
+                   limit=msg.get("limit"), truncated=bool(msg.get("truncated")), sandboxed=False,
+                   elapsed_ms=int((time.monotonic() - start) * 1000))
+        return out
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+
+def warm_sandbox_pool() -> None:
+    """Start the shared pool's workers in the background (call at server startup)."""
+    threading.Thread(target=get_sandbox_pool().warm, daemon=True).start()
+
+
+def run_code(source: str, helpers: Optional[Dict[str, Callable]] = None, **kwargs: Any) -> Dict[str, Any]:
+    """Run generated code in the shared sandbox pool (blocking; call from a worker thread)."""
+    return get_sandbox_pool().run(source, helpers=helpers, **kwargs)
+
+
+@instrument("tool.python", kind="client", attributes=lambda source, *a, **kw: {"lines": len(source.splitlines())},
+            result_attributes=lambda out: {"ok": out.get("ok"), "timed_out": out.get("timed_out"), "sandboxed": out.get("sandboxed"), "elapsed_ms": out.get("elapsed_ms")})
+@tape("tool.python", key=source_key, codec=PYTHON_CODEC)
+async def run_code_async(source: str, helpers: Optional[Dict[str, Callable]] = None,
+                         on_output: Optional[Callable[[str, str], Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+    """Async wrapper: runs the job off the event loop, delivers output chunks in order on the loop
+    (on_output may be sync or async) and kills the job if the awaiting task is cancelled."""
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    chunks: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue()
+
+    def _from_thread(stream: str, text: str) -> None:
+        loop.call_soon_threadsafe(chunks.put_nowait, (stream, text))
+
+    async def _deliver():
+        while True:
+            item = await chunks.get()
+            if item is None:
+                return
+            try:
+                res = on_output(*item)
+                if inspect.isawaitable(res):
+                    await res
+            except Exception as e:
+                print(f"[sandbox] on_output failed: {type(e).__name__}: {e}")
+
+    deliver = asyncio.ensure_future(_deliver()) if on_output is not None else None
+    try:
+        return await asyncio.to_thread(run_code, source, helpers,
+                                       on_output=_from_thread if on_output is not None else None,
+                                       cancel=cancel, **kwargs)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+    finally:
+        if deliver is not None:
+            chunks.put_nowait(None)
+            if cancel.is_set():
+                deliver.cancel()
+            else:
+                await deliver
+
+
+def sandbox_stats() -> Dict[str, Any]:
+    p = get_sandbox_pool()
+    with p._lock:
+        return {**p.stats, "workers": p._total, "idle": p._idle.qsize(), "size": p.size}
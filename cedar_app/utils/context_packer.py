@@ -0,0 +1,355 @@
+"""
+Token-aware packing of the Chief Agent review prompt.
+
+The Chief Agent reads every agent result of an iteration plus the results of the previous iteration.
+Cutting each result at a fixed 500 characters dropped the important end of a table while the
+boilerplate around it survived, and there was no limit on the prompt as a whole. ContextPacker
+measures each piece in tokens and fits them into one budget:
+
+  1. dedupe: a result that repeats a higher-value one (word-shingle overlap >= 0.85) is replaced by
+     a one-line reference, and lines already shown by a higher-value result are removed;
+  2. summarize: the lowest-value results are cut down first to an excerpt of whole lines (tables
+     keep their header and first rows, other text its head and tail) of at least min_tokens;
+  3. drop: if the prompt still does not fit, the lowest-value results are replaced by a one-line
+     stub (the best result is always kept);
+  4. anything still over budget is cut down from the lowest value upwards.
+
+Value is the agent's confidence, lowered for errors, timeouts and empty output, and halved for
+results carried over from the previous iteration, so the prompt stays bounded across loops.
+
+Tokens are counted locally with tiktoken when it is installed, otherwise estimated at about four
+characters per token (the same estimate the query budget uses).
+
+    CEDARPY_CHIEF_CONTEXT_TOKENS      token budget for the packed results (default 6000; 0 = no limit)
+    CEDARPY_CHIEF_CONTEXT_MIN_TOKENS  smallest excerpt a result is summarized to (default 80)
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from cedar_app.utils.query_budget import estimate_tokens
+from cedar_app.env_utils import env_int
+
+DEDUPE_SIMILARITY = 0.85
+# Lines shorter than this (after normalizing) are never treated as duplicates
+_MIN_DEDUPE_LINE = 24
+_FAILED_METHODS = ("Agent Exception", "Agent Timeout")
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"calls": 0, "tokens_before": 0, "tokens_after": 0, "deduped": 0, "summarized": 0, "dropped": 0}
+
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken  # type: ignore
+                    _encoder = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoder = None
+                _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: Any) -> int:
+    """Token count of text, exact with tiktoken and estimated without it."""
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None and isinstance(text, str):
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return estimate_tokens(text)
+
+
+@dataclass
+class ContextItem:
+    """One piece of the prompt: header lines that are always kept and a body that may be cut."""
+    label: str
+    header: str
+    body: str
+    value: float = 0.5
+    required: bool = False
+    state: str = "full"  # full | summarized | duplicate | dropped
+    note: str = ""
+
+    def render(self) -> str:
+        if self.state == "dropped":
+            return f"Agent: {self.label} [omitted to fit the context budget: {self.note}]\n"
+        if self.state == "duplicate":
+            return f"Agent: {self.label} [same findings as {self.note}]\n"
+        return f"{self.header}\nResponse: {self.body}\n"
+
+
+@dataclass
+class PackResult:
+    items: List[ContextItem]
+    tokens_before: int
+    tokens_after: int
+    budget: int
+    deduped: int = 0
+    summarized: int = 0
+    dropped: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def text(self, items: Optional[Iterable[ContextItem]] = None) -> str:
+        return "\n".join(item.render() for item in (self.items if items is None else items))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "budget": self.budget,
+            "deduped": self.deduped,
+            "summarized": self.summarized,
+            "dropped": self.dropped,
+        }
+
+
+def _normalize_line(line: str) -> str:
+    return " ".join(line.lower().split())
+
+
+def _shingles(text: str, size: int = 5) -> Set[tuple]:
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard overlap of the word 5-shingles of a and b."""
+    sa, sb = _shingles(a), _shingles(b)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+
+def _is_table_line(line: str) -> bool:
+    s = line.strip()
+    return s.startswith("|") or s.count("\t") >= 1 or s.count(",") >= 2
+
+
+def _cut_line(line: str, max_tokens: int, count: Callable[[str], int]) -> str:
+    if count(line) <= max_tokens:
+        return line
+    lo, hi = 0, len(line)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(line[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = line[:lo]
+    space = cut.rfind(" ")
+    if space > lo // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
+
+
+def excerpt(text: str, max_tokens: int, count: Callable[[str], int] = count_tokens) -> str:
+    """Shorten text to about max_tokens, keeping whole lines.
+
+    Tables (most lines pipe-, tab- or comma-separated) keep their header and first rows; other text
+    keeps its head and, with a quarter of the budget, its tail. A marker says how much was left out.
+    """
+    text = text or ""
+    if count(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    if len(lines) <= 1:
+        return _cut_line(text, max_tokens, count)
+    is_table = sum(1 for l in lines if _is_table_line(l)) >= max(3, len(lines) * 0.6)
+    marker_cost = 12
+    avail = max(1, max_tokens - marker_cost)
+    head_budget = avail if is_table else max(1, (avail * 3) // 4)
+    head: List[str] = []
+    used = 0
+    for line in lines:
+        cost = count(line) + 1
+        if used + cost > head_budget:
+            break
+        head.append(line)
+        used += cost
+    if not head:
+        return _cut_line(lines[0], max_tokens, count)
+    tail: List[str] = []
+    if not is_table:
+        tail_budget = avail - used
+        for line in reversed(lines[len(head):]):
+            cost = count(line) + 1
+            if used + cost > avail or cost > tail_budget:
+                break
+            tail.insert(0, line)
+            used += cost
+            tail_budget -= cost
+    omitted = len(lines) - len(head) - len(tail)
+    marker = f"… [{omitted} more rows]" if is_table else f"… [{omitted} lines omitted] …"
+    return "\n".join(head + [marker] + tail)
+
+
+def result_value(result: Any, carried_over: bool = False) -> float:
+    """How much a result is worth keeping: confidence, lowered for failures and empty output."""
+    try:
+        value = float(getattr(result, "confidence", 0.5) or 0.0)
+    except Exception:
+        value = 0.5
+    text = str(getattr(result, "result", "") or "").strip()
+    if getattr(result, "method", "") in _FAILED_METHODS or getattr(result, "timed_out", False):
+        value *= 0.3
+    if getattr(result, "needs_rerun", False):
+        value *= 0.6
+    if not text:
+        value *= 0.2
+    if carried_over:
+        value *= 0.5
+    return round(value, 4)
+
+
+def items_from_results(results: Iterable[Any], carried_over: bool = False) -> List[ContextItem]:
+    """ContextItems for AgentResult-like objects, with the header the Chief Agent prompt used."""
+    items = []
+    for r in results or []:
+        name = getattr(r, "display_name", None) or getattr(r, "agent_name", "Agent")
+        label = f"{name} (previous iteration)" if carried_over else name
+        header = (
+            f"Agent: {label}\n"
+            f"Summary: {getattr(r, 'summary', '') or 'No summary provided'}\n"
+            f"Confidence: {getattr(r, 'confidence', '')}\n"
+            f"Method: {getattr(r, 'method', '')}"
+        )
+        items.append(ContextItem(label=label, header=header, body=str(getattr(r, "result", "") or ""),
+                                 value=result_value(r, carried_over)))
+    return items
+
+
+class ContextPacker:
+    def __init__(self, budget_tokens: Optional[int] = None, min_tokens: Optional[int] = None,
+                 counter: Callable[[str], int] = count_tokens):
+        self.budget = env_int("CEDARPY_CHIEF_CONTEXT_TOKENS", 6000) if budget_tokens is None else budget_tokens
+        self.min_tokens = env_int("CEDARPY_CHIEF_CONTEXT_MIN_TOKENS", 80) if min_tokens is None else min_tokens
+        self.count = counter
+
+    def _total(self, items: List[ContextItem]) -> int:
+        return sum(self.count(item.render()) for item in items)
+
+    def _dedupe(self, ranked: List[ContextItem]) -> int:
+        deduped = 0
+        kept: List[ContextItem] = []
+        seen_lines: Set[str] = set()
+        for item in ranked:
+            twin = next((k for k in kept if similarity(k.body, item.body) >= DEDUPE_SIMILARITY), None)
+            if twin is not None and not item.required:
+                item.state, item.note = "duplicate", twin.label
+                deduped += 1
+                continue
+            lines = item.body.splitlines()
+            fresh = [l for l in lines
+                     if len(_normalize_line(l)) < _MIN_DEDUPE_LINE or _normalize_line(l) not in seen_lines]
+            if len(fresh) < len(lines) and fresh:
+                removed = len(lines) - len(fresh)
+                item.body = "\n".join(fresh) + f"\n[{removed} lines repeated from results above omitted]"
+            seen_lines.update(_normalize_line(l) for l in lines if len(_normalize_line(l)) >= _MIN_DEDUPE_LINE)
+            kept.append(item)
+        return deduped
+
+    def _shrink(self, item: ContextItem, body_tokens: int) -> int:
+        """Cut item's body to body_tokens; returns the tokens saved."""
+        before = self.count(item.render())
+        shorter = excerpt(item.body, max(1, body_tokens), self.count)
+        if shorter == item.body:
+            return 0
+        item.body = shorter
+        if item.state == "full":
+            item.state = "summarized"
+        return before - self.count(item.render())
+
+    def pack(self, items: List[ContextItem], label: str = "chief") -> PackResult:
+        tokens_before = self._total(items)
+        # Highest value first; the order of the input breaks ties
+        ranked = sorted(items, key=lambda i: -i.value)
+        if ranked:
+            ranked[0].required = True
+        deduped = self._dedupe(ranked)
+        overflow = self._total(items) - self.budget if self.budget > 0 else 0
+        lowest_first = [i for i in reversed(ranked) if i.state == "full"]
+
+        # Summarize the lowest-value results first, down to min_tokens each
+        for item in lowest_first:
+            if overflow <= 0:
+                break
+            body_tokens = self.count(item.body)
+            target = max(self.min_tokens, body_tokens - overflow)
+            if target < body_tokens:
+                overflow -= self._shrink(item, target)
+
+        # Then drop them, still lowest value first
+        for item in lowest_first:
+            if overflow <= 0:
+                break
+            if item.required:
+                continue
+            before = self.count(item.render())
+            item.state, item.note = "dropped", f"confidence {item.value:.2f}"
+            overflow -= before - self.count(item.render())
+
+        # A result that is too big on its own is cut to whatever room is left
+        for item in reversed(ranked):
+            if overflow <= 0:
+                break
+            if item.state in ("dropped", "duplicate"):
+                continue
+            body_tokens = self.count(item.body)
+            overflow -= self._shrink(item, max(1, body_tokens - overflow))
+
+        result = PackResult(
+            items=items,
+            tokens_before=tokens_before,
+            tokens_after=self._total(items),
+            budget=self.budget,
+            deduped=deduped,
+            summarized=sum(1 for i in items if i.state == "summarized"),
+            dropped=sum(1 for i in items if i.state == "dropped"),
+        )
+        with _stats_lock:
+            _stats["calls"] += 1
+            _stats["tokens_before"] += result.tokens_before
+            _stats["tokens_after"] += result.tokens_after
+            _stats["deduped"] += result.deduped
+            _stats["summarized"] += result.summarized
+            _stats["dropped"] += result.dropped
+        print(f"[context-packer] {label}: {result.tokens_before} -> {result.tokens_after} tokens "
+              f"(budget {self.budget or 'none'}, {len(items)} items, deduped {result.deduped}, "
+              f"summarized {result.summarized}, dropped {result.dropped})")
+        return result
+
+
+def pack_chief_context(agent_results: Iterable[Any], previous_results: Optional[Iterable[Any]] = None,
+                       budget_tokens: Optional[int] = None, label: str = "chief") -> PackResult:
+    """Pack this iteration's results and the previous iteration's into one token budget."""
+    current = items_from_results(agent_results)
+    previous = items_from_results(previous_results or [], carried_over=True)
+    result = ContextPacker(budget_tokens=budget_tokens).pack(current + previous, label=label)
+    result.extra["current"] = current
+    result.extra["previous"] = previous
+    return result
+
+
+def context_packer_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["tokenizer"] = "tiktoken" if _get_encoder() is not None else "estimate"
+    stats["saved_tokens"] = stats["tokens_before"] - stats["tokens_after"]
+    return stats
@@ -0,0 +1,128 @@
+"""
+Deadlines for orchestration work.
+
+Every agent run and every orchestration iteration gets a wall-clock budget so one slow LLM call,
+download or command cannot hold the whole chat hostage. Deadlines are enforced by cancelling the
+running coroutine, so the work underneath actually stops: the OpenAI/httpx request is aborted (its
+socket closed), async_shell kills the command's process group and code_sandbox kills the worker.
+
+Configuration (seconds; 0 disables the deadline):
+  CEDARPY_AGENT_TIMEOUT              default per-agent deadline (120)
+  CEDARPY_AGENT_TIMEOUT_<NAME>       override for one agent, e.g. CEDARPY_AGENT_TIMEOUT_SHELL,
+                                     CEDARPY_AGENT_TIMEOUT_RESEARCH (class name without "Agent")
+  CEDARPY_ITERATION_TIMEOUT          all agents of one orchestration iteration (180)
+  CEDARPY_CHIEF_TIMEOUT              the Chief Agent's review call (120)
+
+Early decision (read on every iteration, so it can be changed without a restart):
+  CEDARPY_EARLY_DECISION_CONFIDENCE  stop waiting for slower agents once one result reaches this
+                                     confidence (0, the default, always waits for all of them)
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from cedar_app.env_utils import env_float
+
+DEFAULT_AGENT_TIMEOUT_S = 120.0
+DEFAULT_ITERATION_TIMEOUT_S = 180.0
+DEFAULT_CHIEF_TIMEOUT_S = 120.0
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when work is stopped by its deadline (as opposed to a timeout raised inside the work)."""
+
+    def __init__(self, seconds: float, scope: str = "agent"):
+        self.seconds = seconds
+        self.scope = scope  # "agent" | "iteration" | "chief"
+        super().__init__(f"{scope} deadline of {seconds:g}s exceeded")
+
+
+def agent_timeout_from_env(agent_name: str = "") -> float:
+    """Deadline for one agent run, by agent class name ("ShellAgent" -> CEDARPY_AGENT_TIMEOUT_SHELL)."""
+    default = env_float("CEDARPY_AGENT_TIMEOUT", DEFAULT_AGENT_TIMEOUT_S, minimum=0.0)
+    key = (agent_name or "").upper()
+    if key.endswith("AGENT") and len(key) > len("AGENT"):
+        key = key[: -len("AGENT")]
+    if key:
+        return env_float(f"CEDARPY_AGENT_TIMEOUT_{key}", default, minimum=0.0)
+    return default
+
+
+def iteration_timeout_from_env() -> float:
+    return env_float("CEDARPY_ITERATION_TIMEOUT", DEFAULT_ITERATION_TIMEOUT_S, minimum=0.0)
+
+
+def chief_timeout_from_env() -> float:
+    return env_float("CEDARPY_CHIEF_TIMEOUT", DEFAULT_CHIEF_TIMEOUT_S, minimum=0.0)
+
+
+def early_decision_confidence_from_env() -> float:
+    return env_float("CEDARPY_EARLY_DECISION_CONFIDENCE", 0.0, minimum=0.0)
+
+
+async def run_with_deadline(aw: Awaitable[Any], seconds: Optional[float], scope: str = "agent") -> Any:
+    """Await aw, cancelling it after `seconds` (None/0 = no deadline).
+
+    Raises DeadlineExceeded only when this deadline fired; a TimeoutError raised by the work
+    itself propagates unchanged.
+    """
+    if not seconds or seconds <= 0:
+        return await aw
+    cm = asyncio.timeout(seconds)
+    try:
+        async with cm:
+            return await aw
+    except TimeoutError:
+        if cm.expired():
+            raise DeadlineExceeded(seconds, scope) from None
+        raise
+
+
+async def collect_as_completed(
+    futures: Dict["asyncio.Future[Any]", Any],
+    on_result: Callable[[Any, Any], Awaitable[None]],
+    timeout: Optional[float] = None,
+    stop: Optional[Callable[[], bool]] = None,
+) -> List[Any]:
+    """Wait for futures (future -> key) and `await on_result(key, result)` in completion order.
+
+    A future that raised is reported with its exception as the result. When `timeout` (seconds,
+    None/0 = none) runs out, the stragglers are cancelled and reported as DeadlineExceeded
+    ("iteration" scope). After each batch of completions `stop()` is asked whether the results so far
+    are good enough; if so the remaining futures are cancelled without being reported and their keys
+    are returned (sorted). Futures still running when this returns or is cancelled are cancelled.
+    """
+    pending = dict(futures)
+    deadline = asyncio.get_running_loop().time() + timeout if timeout else None
+    try:
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                for fut in pending:
+                    fut.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                for fut in sorted(pending, key=pending.get):
+                    if fut.cancelled():
+                        result = DeadlineExceeded(timeout, "iteration")
+                    else:
+                        result = fut.exception() or fut.result()
+                    await on_result(pending[fut], result)
+                pending.clear()
+                break
+            for fut in sorted(done, key=pending.get):
+                key = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    result = e
+                await on_result(key, result)
+            if pending and stop is not None and stop():
+                return sorted(pending.values())
+        return []
+    finally:
+        for fut in pending:
+            fut.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
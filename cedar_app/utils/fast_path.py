@@ -0,0 +1,508 @@
+"""
+Deterministic fast path in front of orchestration.
+
+Questions such as "2+2", "convert 5 km to miles", "what day of the week is 2025-07-04" or "how many
+rows are in the orders table" have exact answers that need no LLM, yet each one used to go through
+think(), several agents and a Chief Agent review. solve() recognizes a small set of such questions
+(whole-message matches only) and answers them locally in milliseconds:
+
+  arithmetic  AST-checked evaluator: numbers, + - * / // % ** (also ^, x, ÷), parentheses, "15% of 80",
+              and a few math functions/constants (sqrt, log, sin, pi, ...). No names, attributes,
+              subscripts or keyword arguments are accepted; huge powers are refused.
+  units       "[convert] 5 km to miles", "how many ounces in 2 lb": length, mass, time, volume, data,
+              speed and temperature.
+  dates       today's date, weekday of a date, "30 days from today", "2 weeks after 2025-01-01",
+              "days between <date> and <date>", "how many days until <date>".
+  catalog     table list, columns of a table, row count of a table, answered from the project's
+              schema catalog (see schema_catalog) and the cached SQL path (see query_cache).
+
+Anything else (or anything that fails to evaluate) returns None and the normal pipeline runs.
+
+Bypass:
+  CEDARPY_FAST_PATH=0          disables the fast path globally
+  "full_pipeline": true        per-message flag in the chat websocket payload
+  "/full <question>"           message prefix; the prefix is stripped before orchestration
+
+Telemetry: fast_path_stats() (attempts, hits per kind, misses, bypassed, hit_rate, avg_ms), served
+at /api/fast_path/stats.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import ast
+import math
+import time
+import operator
+import calendar
+import threading
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+BYPASS_PREFIX = re.compile(r"^\s*/full\b\s*", re.IGNORECASE)
+
+
+@dataclass
+class FastAnswer:
+    kind: str          # "arithmetic" | "units" | "dates" | "catalog"
+    answer: str
+    explanation: str
+    elapsed_ms: float = 0.0
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+def fast_path_enabled() -> bool:
+    return os.getenv("CEDARPY_FAST_PATH", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def strip_bypass(message: str) -> Tuple[str, bool]:
+    """("/full what is 2+2") -> ("what is 2+2", True)."""
+    m = BYPASS_PREFIX.match(message or "")
+    if not m:
+        return message, False
+    return message[m.end():], True
+
+
+def _clean(message: str) -> str:
+    return " ".join((message or "").strip().split())
+
+
+def _fmt_number(x: Any) -> str:
+    if isinstance(x, bool):
+        return str(x)
+    if isinstance(x, int):
+        return f"{x:,}" if abs(x) >= 10000 else str(x)
+    if isinstance(x, float):
+        if math.isfinite(x) and x.is_integer() and abs(x) < 1e15:
+            return _fmt_number(int(x))
+        return f"{x:.10g}"
+    return str(x)
+
+
+# ----------------------------------------------------------------------------------
+# Arithmetic
+# ----------------------------------------------------------------------------------
+
+_MAX_EXPR_CHARS = 200
+_MAX_EXPONENT = 1000
+_MAX_INT_BITS = 4096
+
+_BINOPS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARYOPS: Dict[type, Callable[[Any], Any]] = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_FUNCS: Dict[str, Callable[..., Any]] = {
+    "sqrt": math.sqrt, "abs": abs, "round": round, "min": min, "max": max,
+    "log": math.log, "ln": math.log, "log10": math.log10, "log2": math.log2, "exp": math.exp,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "floor": math.floor, "ceil": math.ceil, "factorial": math.factorial,
+}
+_CONSTS: Dict[str, float] = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+_ARITH_PREFIX = re.compile(r"^(what\s+is|what's|whats|calculate|compute|evaluate|eval|solve|how\s+much\s+is)\s+", re.IGNORECASE)
+_PERCENT_OF = re.compile(r"^(-?\d+(?:\.\d+)?)\s*%\s*of\s+(.+)$", re.IGNORECASE)
+
+
+def _check_result(value: Any) -> Any:
+    if isinstance(value, int) and value.bit_length() > _MAX_INT_BITS:
+        raise ValueError("result too large")
+    if not isinstance(value, (int, float)):
+        # e.g. (-8)**0.5 is a complex number; leave such questions to the full pipeline
+        raise ValueError(f"non-real result: {value!r}")
+    return value
+
+
+def _eval_node(node: ast.AST) -> Any:
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        left, right = _eval_node(node.left), _eval_node(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > _MAX_EXPONENT or (isinstance(left, int) and abs(left) > 1 and abs(right) * abs(left).bit_length() > _MAX_INT_BITS):
+                raise ValueError("exponent too large")
+        return _check_result(_BINOPS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARYOPS:
+        return _check_result(_UNARYOPS[type(node.op)](_eval_node(node.operand)))
+    if isinstance(node, ast.Name) and node.id in _CONSTS:
+        return _CONSTS[node.id]
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCS
+            and not node.keywords and 0 < len(node.args) <= 4):
+        args = [_eval_node(a) for a in node.args]
+        if node.func.id == "factorial" and (not isinstance(args[0], int) or args[0] > 500):
+            raise ValueError("factorial argument out of range")
+        return _check_result(_FUNCS[node.func.id](*args))
+    raise ValueError(f"unsupported expression element: {type(node).__name__}")
+
+
+def safe_eval(expr: str) -> Any:
+    """Evaluate an arithmetic expression to an int or float without eval(); raises
+    ValueError/ArithmeticError on anything else, including non-real results."""
+    expr = (expr or "").strip()
+    if not expr or len(expr) > _MAX_EXPR_CHARS:
+        raise ValueError("empty or too long")
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(str(e))
+    return _eval_node(tree)
+
+
+def _normalize_expression(text: str) -> str:
+    s = text.replace("×", "*").replace("÷", "/").replace("−", "-").replace("^", "**")
+    s = re.sub(r"(?<=[\d)])\s*[xX]\s*(?=[\d(])", "*", s)
+    if not re.search(r"[a-z]\(", s):
+        s = re.sub(r"(?<=\d),(?=\d{3}\b)", "", s)  # 1,000 -> 1000 (commas separate arguments in calls)
+    return s
+
+
+def _solve_arithmetic(text: str) -> Optional[FastAnswer]:
+    body = _ARITH_PREFIX.sub("", text).rstrip(" ?=.!")
+    m = _PERCENT_OF.match(body)
+    if m:
+        try:
+            base = safe_eval(_normalize_expression(m.group(2)))
+        except (ValueError, ArithmeticError, TypeError):
+            return None
+        value = float(m.group(1)) / 100.0 * base
+        return FastAnswer("arithmetic", _fmt_number(value), f"{m.group(1)}% of {_fmt_number(base)} = {_fmt_number(value)}")
+    expr = _normalize_expression(body)
+    # Must look like a calculation, not a bare number or a word
+    if not re.fullmatch(r"[\d\s.+\-*/%()a-z0-9_,]+", expr) or not re.search(r"[+\-*/%]|[a-z]\w*\(", expr.lower()):
+        return None
+    try:
+        value = safe_eval(expr)
+    except (ValueError, ArithmeticError, TypeError, OverflowError):
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return FastAnswer("arithmetic", _fmt_number(value), f"Evaluated {body.strip()} = {_fmt_number(value)}", data={"expression": expr})
+
+
+# ----------------------------------------------------------------------------------
+# Units
+# ----------------------------------------------------------------------------------
+
+# dimension -> unit -> factor to the dimension's base unit
+_UNITS: Dict[str, Dict[str, float]] = {
+    "length": {"m": 1.0, "km": 1000.0, "cm": 0.01, "mm": 0.001, "um": 1e-6, "mi": 1609.344, "yd": 0.9144,
+               "ft": 0.3048, "in": 0.0254, "nmi": 1852.0},
+    "mass": {"kg": 1.0, "g": 0.001, "mg": 1e-6, "t": 1000.0, "lb": 0.45359237, "oz": 0.028349523125, "st": 6.35029318},
+    "time": {"s": 1.0, "ms": 0.001, "min": 60.0, "h": 3600.0, "day": 86400.0, "week": 604800.0, "year": 31557600.0},
+    "volume": {"l": 1.0, "ml": 0.001, "m3": 1000.0, "gal": 3.785411784, "qt": 0.946352946, "pt": 0.473176473,
+               "cup": 0.2365882365, "floz": 0.0295735295625, "tbsp": 0.01478676478125, "tsp": 0.00492892159375},
+    "data": {"b": 1.0, "kb": 1e3, "mb": 1e6, "gb": 1e9, "tb": 1e12, "kib": 1024.0, "mib": 1024.0 ** 2,
+             "gib": 1024.0 ** 3, "tib": 1024.0 ** 4, "bit": 0.125},
+    "speed": {"m/s": 1.0, "km/h": 1 / 3.6, "mph": 0.44704, "knot": 0.514444, "ft/s": 0.3048},
+    "temperature": {"c": 1.0, "f": 1.0, "k": 1.0},
+}
+_UNIT_ALIASES: Dict[str, str] = {
+    "meter": "m", "metre": "m", "kilometer": "km", "kilometre": "km", "centimeter": "cm", "centimetre": "cm",
+    "millimeter": "mm", "millimetre": "mm", "micrometer": "um", "micron": "um", "mile": "mi", "yard": "yd",
+    "foot": "ft", "feet": "ft", "inch": "in", "inches": "in", "nautical mile": "nmi",
+    "kilogram": "kg", "kilo": "kg", "gram": "g", "milligram": "mg", "tonne": "t", "metric ton": "t",
+    "pound": "lb", "lbs": "lb", "ounce": "oz", "stone": "st",
+    "second": "s", "sec": "s", "millisecond": "ms", "minute": "min", "hour": "h", "hr": "h", "hrs": "h",
+    "days": "day", "d": "day", "weeks": "week", "wk": "week", "years": "year", "yr": "year",
+    "liter": "l", "litre": "l", "milliliter": "ml", "millilitre": "ml", "cubic meter": "m3", "cubic metre": "m3",
+    "gallon": "gal", "quart": "qt", "pint": "pt", "cups": "cup", "fluid ounce": "floz", "fl oz": "floz",
+    "tablespoon": "tbsp", "teaspoon": "tsp",
+    "byte": "b", "kilobyte": "kb", "megabyte": "mb", "gigabyte": "gb", "terabyte": "tb",
+    "kibibyte": "kib", "mebibyte": "mib", "gibibyte": "gib", "tebibyte": "tib", "bits": "bit",
+    "meters per second": "m/s", "mps": "m/s", "kilometers per hour": "km/h", "kph": "km/h", "kmh": "km/h",
+    "miles per hour": "mph", "knots": "knot", "kt": "knot", "feet per second": "ft/s",
+    "celsius": "c", "centigrade": "c", "°c": "c", "fahrenheit": "f", "°f": "f", "kelvin": "k",
+    "degrees celsius": "c", "degrees fahrenheit": "f", "degrees c": "c", "degrees f": "f",
+}
+
+_NUM = r"(-?\d[\d,]*(?:\.\d+)?(?:e[-+]?\d+)?)"
+_UNIT = r"([a-z°/ ]+?\d?)"
+_CONVERT = re.compile(rf"^(?:convert\s+|what\s+is\s+|what's\s+|how\s+much\s+is\s+)?{_NUM}\s*{_UNIT}\s+(?:to|in|into|as)\s+{_UNIT}$", re.IGNORECASE)
+_HOW_MANY = re.compile(rf"^how\s+many\s+{_UNIT}\s+(?:are\s+|is\s+)?(?:there\s+)?in\s+(?:a\s+|an\s+|one\s+)?{_NUM}?\s*{_UNIT}$", re.IGNORECASE)
+
+
+def _unit_key(name: str) -> Optional[Tuple[str, str]]:
+    n = " ".join((name or "").lower().strip().split())
+    candidates = [n, _UNIT_ALIASES.get(n)]
+    if n.endswith("es"):
+        candidates.append(_UNIT_ALIASES.get(n[:-2]))
+    if n.endswith("s"):
+        candidates += [n[:-1], _UNIT_ALIASES.get(n[:-1])]
+    for c in candidates:
+        if not c:
+            continue
+        for dim, table in _UNITS.items():
+            if c in table:
+                return dim, c
+    return None
+
+
+def _to_kelvin(value: float, unit: str) -> float:
+    return {"c": value + 273.15, "f": (value - 32) * 5 / 9 + 273.15, "k": value}[unit]
+
+
+def _from_kelvin(value: float, unit: str) -> float:
+    return {"c": value - 273.15, "f": (value - 273.15) * 9 / 5 + 32, "k": value}[unit]
+
+
+def convert_units(value: float, src: str, dst: str) -> Optional[Tuple[float, str, str]]:
+    """Convert value between units of the same dimension; (result, src_key, dst_key) or None."""
+    a, b = _unit_key(src), _unit_key(dst)
+    if not a or not b or a[0] != b[0]:
+        return None
+    dim = a[0]
+    if dim == "temperature":
+        return _from_kelvin(_to_kelvin(value, a[1]), b[1]), a[1], b[1]
+    return value * _UNITS[dim][a[1]] / _UNITS[dim][b[1]], a[1], b[1]
+
+
+def _solve_units(text: str) -> Optional[FastAnswer]:
+    body = text.rstrip(" ?.!")
+    m = _CONVERT.match(body)
+    if m:
+        raw, src, dst = m.group(1), m.group(2), m.group(3)
+    else:
+        m = _HOW_MANY.match(body)
+        if not m:
+            return None
+        dst, raw, src = m.group(1), m.group(2) or "1", m.group(3)
+    try:
+        value = float(raw.replace(",", ""))
+    except ValueError:
+        return None
+    out = convert_units(value, src, dst)
+    if out is None:
+        return None
+    result, a, b = out
+    label = {"c": "°C", "f": "°F", "k": "K"}
+    answer = f"{_fmt_number(value)} {label.get(a, a)} = {_fmt_number(round(result, 10))} {label.get(b, b)}"
+    return FastAnswer("units", answer, f"Unit conversion ({_unit_key(a)[0]})", data={"value": result, "from": a, "to": b})
+
+
+# ----------------------------------------------------------------------------------
+# Dates
+# ----------------------------------------------------------------------------------
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y")
+_DATE_WORD = r"(today|tomorrow|yesterday|now|\d{4}[-/]\d{1,2}[-/]\d{1,2}|\d{1,2}/\d{1,2}/\d{4}|[a-z]+\.? \d{1,2}(?:st|nd|rd|th)?,? \d{4}|\d{1,2}(?:st|nd|rd|th)? [a-z]+,? \d{4})"
+_TODAY_Q = re.compile(r"^(?:what\s+is\s+|what's\s+)?(?:today's\s+date|the\s+date\s+today|the\s+date|today)$|^what\s+(?:day|date)\s+is\s+it(?:\s+today)?$", re.IGNORECASE)
+_WEEKDAY_Q = re.compile(rf"^what\s+day(?:\s+of\s+the\s+week)?\s+(?:is|was|will\s+be|falls\s+on)\s+{_DATE_WORD}$", re.IGNORECASE)
+_OFFSET_Q = re.compile(
+    rf"^(?:what\s+is\s+|what's\s+|what\s+date\s+is\s+|what\s+day\s+is\s+)?(?:the\s+date\s+)?(\d+)\s+(day|week|month|year)s?\s+(from|after|before|since|ago)\s*{_DATE_WORD}?$",
+    re.IGNORECASE,
+)
+_BETWEEN_Q = re.compile(rf"^(?:how\s+many\s+)?days\s+(?:are\s+there\s+)?(?:between|from)\s+{_DATE_WORD}\s+(?:and|to|until)\s+{_DATE_WORD}$", re.IGNORECASE)
+_UNTIL_Q = re.compile(rf"^how\s+many\s+days\s+(?:until|till|to|since)\s+{_DATE_WORD}$", re.IGNORECASE)
+
+
+def parse_date(text: str, today: Optional[date] = None) -> Optional[date]:
+    today = today or date.today()
+    s = (text or "").strip().lower().rstrip(".")
+    if s in ("today", "now"):
+        return today
+    if s == "tomorrow":
+        return today + timedelta(days=1)
+    if s == "yesterday":
+        return today - timedelta(days=1)
+    s = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", s).replace(",", "").replace(".", "")
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def add_months(d: date, months: int) -> date:
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def _fmt_date(d: date) -> str:
+    return f"{d.strftime('%A')}, {d.isoformat()}"
+
+
+def _solve_dates(text: str, today: Optional[date] = None) -> Optional[FastAnswer]:
+    today = today or date.today()
+    body = text.rstrip(" ?.!")
+    if _TODAY_Q.match(body):
+        return FastAnswer("dates", _fmt_date(today), "Server's local date")
+    m = _WEEKDAY_Q.match(body)
+    if m:
+        d = parse_date(m.group(1), today)
+        if d is None:
+            return None
+        return FastAnswer("dates", _fmt_date(d), f"{d.isoformat()} falls on a {d.strftime('%A')}")
+    m = _OFFSET_Q.match(body)
+    if m:
+        n, unit, direction, anchor = int(m.group(1)), m.group(2).lower(), m.group(3).lower(), m.group(4) or "today"
+        base = parse_date(anchor, today)
+        if base is None or n > 100000:
+            return None
+        sign = -1 if direction in ("before", "ago") else 1
+        if direction == "ago" and m.group(4):
+            return None
+        try:
+            if unit in ("day", "week"):
+                d = base + timedelta(days=sign * n * (7 if unit == "week" else 1))
+            else:
+                d = add_months(base, sign * n * (12 if unit == "year" else 1))
+        except (ValueError, OverflowError):
+            return None
+        return FastAnswer("dates", _fmt_date(d), f"{base.isoformat()} {'-' if sign < 0 else '+'} {n} {unit}{'s' if n != 1 else ''}")
+    m = _BETWEEN_Q.match(body) or _UNTIL_Q.match(body)
+    if m:
+        dates = [parse_date(g, today) for g in m.groups()]
+        if any(d is None for d in dates):
+            return None
+        start, end = (dates[0], dates[1]) if len(dates) == 2 else (today, dates[0])
+        days = (end - start).days
+        return FastAnswer("dates", f"{abs(days):,} days", f"From {start.isoformat()} to {end.isoformat()}", data={"days": days})
+    return None
+
+
+# ----------------------------------------------------------------------------------
+# Catalog (per-project database)
+# ----------------------------------------------------------------------------------
+
+_IDENT = r"[`\"'\[]?([A-Za-z_][\w]*)[`\"'\]]?"
+_ROW_COUNT_Q = [
+    re.compile(rf"^how\s+many\s+(?:rows|records|entries)\s+(?:are\s+)?(?:there\s+)?(?:in|does)\s+(?:the\s+|my\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?(?:\s+(?:have|contain|has))?$", re.IGNORECASE),
+    re.compile(rf"^(?:count|number\s+of)\s+(?:the\s+)?(?:rows|records|entries)\s+(?:in|of)\s+(?:the\s+|my\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?$", re.IGNORECASE),
+    re.compile(rf"^(?:what\s+is\s+)?(?:the\s+)?row\s+count\s+(?:of|for)\s+(?:the\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?$", re.IGNORECASE),
+]
+_TABLES_Q = re.compile(
+    r"^(?:what|which|list|show)(?:\s+me)?\s+(?:all\s+)?(?:the\s+|my\s+)?tables(?:\s+(?:are\s+there|exist|do\s+i\s+have|are\s+in\s+(?:this|the|my)\s+(?:project|database|db)|in\s+(?:this|the|my)\s+(?:project|database|db)))?$",
+    re.IGNORECASE,
+)
+_COLUMNS_Q = [
+    re.compile(rf"^(?:what|which|list|show)(?:\s+me)?\s+(?:are\s+)?(?:the\s+)?columns\s+(?:are\s+|does\s+)?(?:in|of|for)?\s*(?:the\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?(?:\s+have)?$", re.IGNORECASE),
+    re.compile(rf"^what\s+columns\s+does\s+(?:the\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?\s+have$", re.IGNORECASE),
+    re.compile(rf"^(?:describe|schema\s+(?:of|for))\s+(?:the\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?$", re.IGNORECASE),
+    re.compile(rf"^what\s+is\s+the\s+schema\s+(?:of|for)\s+(?:the\s+)?(?:table\s+)?{_IDENT}(?:\s+table)?$", re.IGNORECASE),
+]
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _solve_catalog(text: str, project_id: Optional[int], branch_id: Optional[int] = None) -> Optional[FastAnswer]:
+    if not project_id:
+        return None
+    body = text.rstrip(" ?.!")
+    table_q = next((m for m in (p.match(body) for p in _ROW_COUNT_Q) if m), None)
+    columns_q = next((m for m in (p.match(body) for p in _COLUMNS_Q) if m), None)
+    tables_q = _TABLES_Q.match(body)
+    if not (table_q or columns_q or tables_q):
+        return None
+
+    from cedar_app.utils.schema_catalog import get_schema_catalog
+    catalog = get_schema_catalog(project_id)
+
+    if tables_q:
+        names = catalog.table_names()
+        if not names:
+            return FastAnswer("catalog", "This project's database has no tables yet.", "Read from the schema catalog")
+        return FastAnswer("catalog", f"{len(names)} table(s): " + ", ".join(names), "Read from the schema catalog", data={"tables": names})
+
+    if columns_q:
+        t = catalog.table(columns_q.group(1))
+        if t is None:
+            return None
+        cols = ", ".join(f"{c.name} ({c.type or 'ANY'})" for c in t.columns)
+        extra = f"; primary key: {', '.join(t.pk_columns)}" if t.pk_columns else ""
+        return FastAnswer("catalog", f"{t.name}: {cols}{extra}", "Read from the schema catalog",
+                          data={"table": t.name, "columns": t.column_names})
+
+    t = catalog.table(table_q.group(1))
+    if t is None:
+        return None
+    from cedar_app.utils.sql_utils import _execute_sql
+    res = _execute_sql(f"SELECT COUNT(*) FROM {_quote_ident(t.name)}", project_id, max_rows=1)
+    if not res.get("success") or not res.get("rows"):
+        return None
+    total = int(res["rows"][0][0] or 0)
+    answer = f"{t.name} has {total:,} row{'s' if total != 1 else ''}"
+    data = {"table": t.name, "rows": total}
+    if t.branch_aware and branch_id:
+        res = _execute_sql(
+            f"SELECT COUNT(*) FROM {_quote_ident(t.name)} WHERE project_id = {int(project_id)} AND branch_id = {int(branch_id)}",
+            project_id, max_rows=1,
+        )
+        if res.get("success") and res.get("rows"):
+            on_branch = int(res["rows"][0][0] or 0)
+            answer += f" ({on_branch:,} on the current branch)"
+            data["branch_rows"] = on_branch
+    return FastAnswer("catalog", answer, f"SELECT COUNT(*) FROM {t.name}", data=data)
+
+
+# ----------------------------------------------------------------------------------
+# Entry point and telemetry
+# ----------------------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {"attempts": 0, "hits": 0, "misses": 0, "bypassed": 0, "errors": 0, "hit_ms": 0.0, "by_kind": {}}
+
+
+def _record(outcome: str, kind: Optional[str] = None, elapsed_ms: float = 0.0) -> None:
+    with _stats_lock:
+        if outcome != "bypassed":
+            _stats["attempts"] += 1
+        _stats[outcome] += 1
+        if kind:
+            _stats["by_kind"][kind] = _stats["by_kind"].get(kind, 0) + 1
+            _stats["hit_ms"] += elapsed_ms
+
+
+def record_bypass() -> None:
+    _record("bypassed")
+
+
+def fast_path_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        attempts, hits = _stats["attempts"], _stats["hits"]
+        return {
+            "enabled": fast_path_enabled(),
+            "attempts": attempts,
+            "hits": hits,
+            "misses": _stats["misses"],
+            "bypassed": _stats["bypassed"],
+            "errors": _stats["errors"],
+            "hit_rate": (hits / attempts) if attempts else 0.0,
+            "avg_ms": round(_stats["hit_ms"] / hits, 3) if hits else 0.0,
+            "by_kind": dict(_stats["by_kind"]),
+        }
+
+
+def solve(message: str, project_id: Optional[int] = None, branch_id: Optional[int] = None) -> Optional[FastAnswer]:
+    """Answer `message` deterministically, or return None to run the full pipeline.
+    Synchronous (catalog lookups touch SQLite); call it via asyncio.to_thread from async code."""
+    start = time.perf_counter()
+    text = _clean(message)
+    if not text or len(text) > 300:
+        _record("misses")
+        return None
+    try:
+        answer = (_solve_arithmetic(text) or _solve_units(text) or _solve_dates(text)
+                  or _solve_catalog(text, project_id, branch_id))
+    except Exception as e:
+        print(f"[fast-path] error solving {text[:80]!r}: {type(e).__name__}: {e}")
+        _record("errors")
+        return None
+    if answer is None:
+        _record("misses")
+        return None
+    answer.elapsed_ms = (time.perf_counter() - start) * 1000.0
+    _record("hits", answer.kind, answer.elapsed_ms)
+    return answer
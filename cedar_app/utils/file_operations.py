@@ -21,6 +21,7 @@ from ..db_utils import (
     _project_dirs
 )
 from ..llm_utils import llm_classify_file as _llm_classify_file
+from ..llm.scheduler import llm_lane
 from ..changelog_utils import record_changelog, add_version
 from ..file_utils import interpret_file
 from main_models import (
@@ -186,7 +187,8 @@ def _run_upload_postprocess_background(project_id: int, branch_id: int, file_id:
                 except Exception as e:
                     print(f"[background] Could not read file content: {e}")
             
-            ai_result = _llm_classify_file(meta_for_llm, file_content)
+            with llm_lane("batch", project_id):
+                ai_result = _llm_classify_file(meta_for_llm, file_content)
             if ai_result:
                 rec.structure = ai_result.get("structure")
                 rec.ai_title = ai_result.get("ai_title")
@@ -437,7 +439,8 @@ def upload_file(project_id: int, request: Request, file: UploadFile = File(...),
             except Exception as e:
                 print(f"[upload] Could not read file content for LLM: {e}")
         
-        ai = _llm_classify_file(meta_for_llm, file_content)
+        with llm_lane("batch", project_id):
+            ai = _llm_classify_file(meta_for_llm, file_content)
         ai_result = ai
         if ai:
             struct = ai.get("structure") if isinstance(ai, dict) else None
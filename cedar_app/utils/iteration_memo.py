@@ -0,0 +1,144 @@
+"""
+Memo of agent results across Chief Agent loop iterations.
+
+When the Chief Agent decides to "loop", the orchestrator runs again with the original request plus
+refinement guidance. Most of the time the guidance is aimed at one or two agents ("Run the Coding
+Agent with ..."), yet every selected agent used to redo its web searches, schema reads and
+downloads. IterationMemo lives for one orchestration (all of its iterations) and maps
+
+    (agent, normalized task, project data generation) -> AgentResult
+
+so an agent is only re-run when its inputs changed:
+  - agents named in the latest guidance are keyed on the full refined message (so they re-run);
+    the others are keyed on the original request and reuse their earlier result;
+  - if the guidance names no agent, every agent is keyed on the full message (nothing is reused);
+  - agents may define memo_key(task) to say what their result depends on (FileAgent: the URLs and
+    paths in the request), or MEMOIZE = False to never be reused (ShellAgent: side effects);
+  - the generation is the project database's PRAGMA data_version, so any committed write between
+    iterations invalidates every entry.
+
+Only usable results are stored (no errors, timeouts or results that ask for a rerun).
+Size: CEDARPY_ITERATION_MEMO_ENTRIES (default 64; 0 disables).
+"""
+
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from cedar_app.env_utils import env_int
+
+# Phrases that mark guidance as aimed at an agent (matched on word boundaries, case-insensitive)
+AGENT_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "CodeAgent": ("coding agent", "code agent", "codeagent", "python code"),
+    "SQLAgent": ("sql agent", "sqlagent", "sql"),
+    "ShellAgent": ("shell executor", "shell agent", "shellagent", "shell", "command"),
+    "MathAgent": ("math agent", "mathagent"),
+    "ResearchAgent": ("research agent", "researchagent", "research", "search"),
+    "StrategyAgent": ("strategy agent", "strategyagent", "plan"),
+    "DataAgent": ("data agent", "dataagent", "schema"),
+    "NotesAgent": ("notes agent", "notesagent"),
+    "FileAgent": ("file agent", "fileagent", "file manager", "download"),
+}
+
+# Results with these methods are never reused
+_UNUSABLE_METHODS = ("Agent Exception", "Agent Timeout")
+
+
+def normalize_task(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def guidance_targets(guidance: Optional[str]) -> Optional[Set[str]]:
+    """Agent class names mentioned in the guidance, or None if it names none."""
+    if not guidance:
+        return None
+    text = guidance.lower()
+    found = set()
+    for agent_name, aliases in AGENT_ALIASES.items():
+        for alias in aliases:
+            if re.search(r"\b" + re.escape(alias) + r"\b", text):
+                found.add(agent_name)
+                break
+    return found or None
+
+
+def is_reusable(result: Any) -> bool:
+    try:
+        return (
+            not getattr(result, "needs_rerun", False)
+            and not getattr(result, "timed_out", False)
+            and not getattr(result, "needs_clarification", False)
+            and float(getattr(result, "confidence", 0.0)) > 0.0
+            and getattr(result, "method", "") not in _UNUSABLE_METHODS
+        )
+    except Exception:
+        return False
+
+
+def project_data_generation(project_id: Optional[int]) -> Optional[Any]:
+    """("none",) without a project; ("db", data_version) for a project; None if it cannot be read."""
+    if not project_id:
+        return ("none",)
+    try:
+        from cedar_app.db_utils import _get_project_engine
+        from cedar_app.utils.query_cache import data_version
+        version = data_version(_get_project_engine(project_id))
+        return None if version is None else ("db", version)
+    except Exception:
+        return None
+
+
+class IterationMemo:
+    def __init__(self, base_query: str, max_entries: Optional[int] = None):
+        self.base_query = base_query
+        self.guidance: Optional[str] = None  # guidance that produced the current iteration's message
+        self.max_entries = env_int("CEDARPY_ITERATION_MEMO_ENTRIES", 64) if max_entries is None else max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[int, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def task_key(self, agent: Any, task: str, targets: Optional[Iterable[str]] = None) -> Optional[str]:
+        """What the agent's result depends on for this task, or None if it must always run."""
+        if not getattr(agent, "MEMOIZE", True):
+            return None
+        custom = getattr(agent, "memo_key", None)
+        if callable(custom):
+            try:
+                return custom(task)
+            except Exception:
+                return None
+        agent_name = agent.__class__.__name__
+        if targets is not None and agent_name not in set(targets):
+            return normalize_task(self.base_query)
+        return normalize_task(task)
+
+    def lookup(self, agent_name: str, task_key: Optional[str], generation: Any) -> Optional[Tuple[int, Any]]:
+        """(iteration, result) from an earlier iteration, or None."""
+        if not self.enabled or task_key is None or generation is None:
+            return None
+        key = (agent_name, task_key, generation)
+        hit = self._entries.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return hit
+
+    def store(self, agent_name: str, task_key: Optional[str], generation: Any, iteration: int, result: Any) -> bool:
+        if not self.enabled or task_key is None or generation is None or not is_reusable(result):
+            return False
+        key = (agent_name, task_key, generation)
+        self._entries[key] = (iteration, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,205 @@
+"""
+Incremental extraction of fields from a JSON object that is still being generated.
+
+The Chief Agent answers with a JSON object ({"decision": ..., "final_answer": ..., ...}). When the
+completion is streamed we want to show final_answer to the user while tokens arrive, long before the
+object is complete and json.loads() can run. JsonFieldExtractor is a small state machine fed with
+arbitrary text chunks:
+
+    ex = JsonFieldExtractor(stream_fields=("final_answer",))
+    for chunk in chunks:
+        for field, delta in ex.feed(chunk):
+            ...                      # decoded text appended to a top-level string field
+    ex.values                        # completed top-level scalar fields, e.g. {"decision": "final"}
+    ex.partial("final_answer")       # decoded text so far (complete or not)
+
+Only top-level keys are tracked; nested objects/arrays are skipped. String escapes (including
+\\uXXXX surrogate pairs) are decoded across chunk boundaries. Leading text such as a ```json fence is
+ignored up to the first "{".
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Parser states
+_PRE, _KEY_OR_END, _KEY, _COLON, _VALUE, _STRING, _LITERAL, _NESTED, _AFTER_VALUE, _DONE = range(10)
+
+
+class JsonFieldExtractor:
+    def __init__(self, stream_fields: Iterable[str] = ()):
+        self.stream_fields = set(stream_fields)
+        self.values: Dict[str, Any] = {}
+        self._partial: Dict[str, List[str]] = {}
+        self._state = _PRE
+        self._key: List[str] = []
+        self._cur_key: Optional[str] = None
+        self._buf: List[str] = []
+        # String-escape state: None, "\\" (after backslash) or "u" + collected hex digits
+        self._esc: Optional[str] = None
+        self._high: Optional[int] = None  # pending high surrogate
+        # Nested value skipping
+        self._depth = 0
+        self._nested_in_str = False
+        self._nested_esc = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def partial(self, field: str) -> Optional[str]:
+        if field in self.values and isinstance(self.values[field], str):
+            return self.values[field]
+        parts = self._partial.get(field)
+        return "".join(parts) if parts is not None else None
+
+    # -- string decoding -------------------------------------------------------------
+
+    def _decode_char(self, ch: str) -> str:
+        """Feed one character of a string body (after the opening quote); returns decoded output."""
+        esc = self._esc
+        if esc is None:
+            if ch == "\\":
+                self._esc = "\\"
+                return ""
+            return self._flush_high() + ch
+        if esc == "\\":
+            if ch == "u":
+                self._esc = "u"
+                return ""
+            self._esc = None
+            return self._flush_high() + _ESCAPES.get(ch, ch)
+        # Collecting \uXXXX
+        esc += ch
+        if len(esc) < 5:
+            self._esc = esc
+            return ""
+        self._esc = None
+        try:
+            code = int(esc[1:], 16)
+        except ValueError:
+            return self._flush_high() + "�"
+        if 0xD800 <= code <= 0xDBFF:
+            out = self._flush_high()
+            self._high = code
+            return out
+        if 0xDC00 <= code <= 0xDFFF and self._high is not None:
+            high, self._high = self._high, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return self._flush_high() + chr(code)
+
+    def _flush_high(self) -> str:
+        if self._high is None:
+            return ""
+        self._high = None
+        return "�"
+
+    # -- main loop -------------------------------------------------------------------
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Consume a chunk; returns [(field, decoded_delta), ...] for streamed fields."""
+        deltas: List[Tuple[str, str]] = []
+        streaming: List[str] = []
+        for ch in text or "":
+            st = self._state
+            if st == _STRING:
+                if self._esc is None and ch == '"':
+                    key = self._cur_key
+                    value = "".join(self._buf)
+                    if streaming and key is not None:
+                        deltas.append((key, "".join(streaming)))
+                        streaming = []
+                    if key is not None:
+                        self.values[key] = value
+                    self._buf = []
+                    self._state = _AFTER_VALUE
+                    continue
+                out = self._decode_char(ch)
+                if out:
+                    self._buf.append(out)
+                    if self._cur_key in self.stream_fields:
+                        self._partial.setdefault(self._cur_key, []).append(out)
+                        streaming.append(out)
+                continue
+            if st == _KEY:
+                if self._esc is None and ch == '"':
+                    self._cur_key = "".join(self._key)
+                    self._key = []
+                    self._state = _COLON
+                    continue
+                out = self._decode_char(ch)
+                if out:
+                    self._key.append(out)
+                continue
+            if st == _NESTED:
+                if self._nested_in_str:
+                    if self._nested_esc:
+                        self._nested_esc = False
+                    elif ch == "\\":
+                        self._nested_esc = True
+                    elif ch == '"':
+                        self._nested_in_str = False
+                elif ch == '"':
+                    self._nested_in_str = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = _AFTER_VALUE
+                continue
+            if st == _LITERAL:
+                if ch in ",}" or ch.isspace():
+                    raw = "".join(self._buf).strip()
+                    self._buf = []
+                    try:
+                        self.values[self._cur_key] = json.loads(raw)
+                    except Exception:
+                        self.values[self._cur_key] = raw
+                    self._state = _AFTER_VALUE
+                    if not ch.isspace():
+                        self._after_value(ch)
+                else:
+                    self._buf.append(ch)
+                continue
+            if ch.isspace():
+                continue
+            if st == _PRE:
+                if ch == "{":
+                    self._state = _KEY_OR_END
+            elif st == _KEY_OR_END:
+                if ch == '"':
+                    self._state = _KEY
+                elif ch == "}":
+                    self._state = _DONE
+            elif st == _COLON:
+                if ch == ":":
+                    self._state = _VALUE
+            elif st == _VALUE:
+                if ch == '"':
+                    self._state = _STRING
+                    self._buf = []
+                    if self._cur_key in self.stream_fields:
+                        self._partial[self._cur_key] = []
+                elif ch in "{[":
+                    self._state = _NESTED
+                    self._depth = 1
+                    self._nested_in_str = False
+                    self._nested_esc = False
+                else:
+                    self._state = _LITERAL
+                    self._buf = [ch]
+            elif st == _AFTER_VALUE:
+                self._after_value(ch)
+        if streaming and self._cur_key is not None:
+            deltas.append((self._cur_key, "".join(streaming)))
+        return deltas
+
+    def _after_value(self, ch: str) -> None:
+        if ch == ",":
+            self._state = _KEY_OR_END
+        elif ch == "}":
+            self._state = _DONE
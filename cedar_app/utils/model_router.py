@@ -0,0 +1,338 @@
+"""
+Tiered model routing for orchestrator LLM calls.
+
+Every agent and the Chief Agent ask for CEDARPY_OPENAI_MODEL (a large model) even for "2+2" or
+"hi". RoutedLLMClient wraps the shared AsyncOpenAI client and, per chat.completions.create() call,
+classifies the request and may dispatch it to a fast/cheap model instead:
+
+  - intent:     greetings, thanks and plain arithmetic are "simple";
+  - input size: long inputs (CEDARPY_ROUTER_LARGE_INPUT_TOKENS, default 4000) stay on the large model;
+  - reasoning:  derivations, proofs, planning, debugging, research etc. stay on the large model.
+
+The large model is always the one the caller asked for, so routing only ever downgrades. The calling
+agent is taken from a context variable set by the orchestrator (run_as_agent), and each agent has a
+tier policy: "small", "large" or "auto" (classify). An agent's latency SLO (ms) also pushes "auto"
+calls to the small model while the large model's observed latency (EWMA) exceeds it.
+
+Escalation: a non-streamed small-model answer is validated (non-empty, not cut off by max tokens,
+parseable JSON when the prompt asks for JSON); if validation fails the call is repeated on the
+large model. Streamed calls cannot be re-issued after tokens reach the user, so they are only
+routed to the small model for clearly simple requests.
+
+Configuration:
+  CEDARPY_MODEL_ROUTING     0 = off (every call uses the caller's model)
+  CEDARPY_SMALL_MODEL       small tier model (default gpt-5-mini)
+  CEDARPY_MODEL_POLICY      JSON per-agent overrides, e.g.
+                            {"ChiefAgent": {"tier": "auto", "slo_ms": 8000}, "ResearchAgent": {"tier": "large"}}
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import threading
+import contextvars
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from cedar_app.env_utils import env_int
+
+DEFAULT_POLICY: Dict[str, Dict[str, Any]] = {
+    "ChiefAgent": {"tier": "auto"},
+    "CodeAgent": {"tier": "auto"},
+    "SQLAgent": {"tier": "auto"},
+    "DataAgent": {"tier": "auto"},
+    "ShellAgent": {"tier": "small"},   # command extraction and output summaries
+    "NotesAgent": {"tier": "small"},
+    "FileAgent": {"tier": "small"},    # short file descriptions
+    "MathAgent": {"tier": "large"},
+    "ResearchAgent": {"tier": "large"},
+    "StrategyAgent": {"tier": "large"},
+}
+
+_GREETING = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|good (morning|afternoon|evening))\b[\s!.?]*$", re.IGNORECASE)
+_ARITHMETIC = re.compile(r"^\s*(what\s+is|what's|calculate|compute)?\s*[-+*/().\d\s^%]+\s*[?=]?\s*$", re.IGNORECASE)
+_REASONING = re.compile(
+    r"\b(derive|derivation|prove|proof|theorem|step[- ]by[- ]step|explain why|analy[sz]e|optimi[sz]e|debug|"
+    r"refactor|architecture|strategy|plan|research|literature|compare|trade-?offs?|simulate|design)\b",
+    re.IGNORECASE,
+)
+_WANTS_JSON = re.compile(r"\bJSON\b")
+
+current_agent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("cedar_llm_agent", default=None)
+
+
+async def run_as_agent(agent_name: str, aw):
+    """Await aw with LLM calls attributed to agent_name (for routing policy and stats)."""
+    token = current_agent.set(agent_name)
+    try:
+        return await aw
+    finally:
+        current_agent.reset(token)
+
+
+def routing_enabled() -> bool:
+    return os.getenv("CEDARPY_MODEL_ROUTING", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def small_model() -> str:
+    return os.getenv("CEDARPY_SMALL_MODEL") or "gpt-5-mini"
+
+
+def agent_policy(agent_name: Optional[str]) -> Dict[str, Any]:
+    policy = dict(DEFAULT_POLICY.get(agent_name or "", {"tier": "auto"}))
+    raw = os.getenv("CEDARPY_MODEL_POLICY")
+    if raw:
+        try:
+            override = json.loads(raw).get(agent_name or "")
+            if isinstance(override, dict):
+                policy.update(override)
+        except Exception as e:
+            print(f"[model-router] ignoring invalid CEDARPY_MODEL_POLICY: {e}")
+    return policy
+
+
+# ----------------------------------------------------------------------------------
+# Classification
+# ----------------------------------------------------------------------------------
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):  # multi-part content
+        return " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict))
+    return str(content or "")
+
+
+def _user_query(text: str) -> str:
+    """The user's question inside an agent prompt ("User Query: ...", "Task: ...") or the whole text."""
+    m = re.search(r"(?:User Query|Task|Query):\s*(.+)", text)
+    return (m.group(1) if m else text).strip()
+
+
+def is_simple_query(query: str) -> bool:
+    q = (query or "").strip()
+    if not q or len(q) > 120:
+        return False
+    return bool(_GREETING.match(q) or (_ARITHMETIC.match(q) and re.search(r"\d", q)))
+
+
+@dataclass
+class Classification:
+    tier: str            # "small" | "large"
+    reason: str
+    input_tokens: int
+    simple_intent: bool
+    needs_reasoning: bool
+
+
+def classify(messages: List[Dict[str, Any]], has_images: bool = False) -> Classification:
+    texts = [_content_text(m.get("content")) for m in messages or [] if isinstance(m, dict)]
+    user_texts = [_content_text(m.get("content")) for m in messages or [] if isinstance(m, dict) and m.get("role") == "user"]
+    input_tokens = sum(len(t) for t in texts) // 4
+    query = _user_query(user_texts[-1]) if user_texts else ""
+    simple = is_simple_query(query)
+    reasoning = bool(_REASONING.search(query))
+    if has_images:
+        return Classification("large", "image input", input_tokens, simple, reasoning)
+    if input_tokens > env_int("CEDARPY_ROUTER_LARGE_INPUT_TOKENS", 4000):
+        return Classification("large", f"large input (~{input_tokens} tokens)", input_tokens, simple, reasoning)
+    if reasoning:
+        return Classification("large", "requires reasoning", input_tokens, simple, reasoning)
+    if simple:
+        return Classification("small", "simple intent", input_tokens, simple, reasoning)
+    if len(query) <= 200 and input_tokens <= 1500:
+        return Classification("small", "short request without reasoning cues", input_tokens, simple, reasoning)
+    return Classification("large", "default", input_tokens, simple, reasoning)
+
+
+# ----------------------------------------------------------------------------------
+# Validation and parameter adaptation
+# ----------------------------------------------------------------------------------
+
+def _is_reasoning_family(model: str) -> bool:
+    m = (model or "").lower()
+    return m.startswith(("gpt-5", "o1", "o3", "o4"))
+
+
+def adapt_params(kwargs: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Copy of the create() kwargs for `model`, translating token-limit/temperature parameters."""
+    out = dict(kwargs)
+    out["model"] = model
+    if _is_reasoning_family(model):
+        if "max_tokens" in out:
+            out["max_completion_tokens"] = out.pop("max_tokens")
+        out.pop("temperature", None)
+    elif "max_completion_tokens" in out:
+        out["max_tokens"] = out.pop("max_completion_tokens")
+    return out
+
+
+def _expects_json(kwargs: Dict[str, Any]) -> bool:
+    rf = kwargs.get("response_format")
+    if isinstance(rf, dict) and "json" in str(rf.get("type", "")):
+        return True
+    return any(_WANTS_JSON.search(_content_text(m.get("content"))) for m in kwargs.get("messages") or [] if isinstance(m, dict) and m.get("role") == "system")
+
+
+def _parses_as_json(text: str) -> bool:
+    t = text.strip()
+    if t.startswith("```"):
+        t = re.sub(r"^```[a-zA-Z]*\s*|\s*```\s*$", "", t)
+    try:
+        json.loads(t)
+        return True
+    except Exception:
+        pass
+    start, end = t.find("{"), t.rfind("}")
+    if 0 <= start < end:
+        try:
+            json.loads(t[start:end + 1])
+            return True
+        except Exception:
+            return False
+    return False
+
+
+def validate_response(response: Any, kwargs: Dict[str, Any]) -> Optional[str]:
+    """Why a small-model answer is unusable, or None if it passes."""
+    try:
+        choice = response.choices[0]
+        text = choice.message.content or ""
+    except Exception:
+        return "no message in response"
+    if not text.strip():
+        return "empty answer"
+    if getattr(choice, "finish_reason", None) == "length":
+        return "answer cut off at max tokens"
+    if _expects_json(kwargs) and not _parses_as_json(text):
+        return "invalid JSON"
+    return None
+
+
+# ----------------------------------------------------------------------------------
+# Stats
+# ----------------------------------------------------------------------------------
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency_ms: Dict[str, float] = {}  # EWMA per model
+        self.calls: Dict[str, int] = {}
+        self.routed_small = 0
+        self.kept_large = 0
+        self.escalations = 0
+        self.slo_downgrades = 0
+
+    def observe(self, model: str, elapsed_ms: float) -> None:
+        with self._lock:
+            prev = self.latency_ms.get(model)
+            self.latency_ms[model] = elapsed_ms if prev is None else 0.8 * prev + 0.2 * elapsed_ms
+            self.calls[model] = self.calls.get(model, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "routed_small": self.routed_small,
+                "kept_large": self.kept_large,
+                "escalations": self.escalations,
+                "slo_downgrades": self.slo_downgrades,
+                "calls": dict(self.calls),
+                "latency_ms": {m: round(v, 1) for m, v in self.latency_ms.items()},
+            }
+
+
+_stats = _Stats()
+
+
+def model_router_stats() -> Dict[str, Any]:
+    return _stats.snapshot()
+
+
+def choose_model(kwargs: Dict[str, Any], agent_name: Optional[str] = None) -> Dict[str, Any]:
+    """Routing decision for one create() call: {"model", "tier", "reason", "can_escalate"}."""
+    requested = str(kwargs.get("model") or "")
+    small = small_model()
+    if not routing_enabled() or not requested or requested == small:
+        return {"model": requested, "tier": "large", "reason": "routing off", "can_escalate": False}
+    policy = agent_policy(agent_name)
+    tier = policy.get("tier", "auto")
+    stream = bool(kwargs.get("stream"))
+    messages = kwargs.get("messages") or []
+    has_images = any(isinstance(m, dict) and isinstance(m.get("content"), list) and any(
+        isinstance(p, dict) and p.get("type") == "image_url" for p in m["content"]) for m in messages)
+    c = classify(messages, has_images)
+    if tier == "large" or has_images:
+        return {"model": requested, "tier": "large", "reason": f"policy {tier}" if tier == "large" else c.reason, "can_escalate": False}
+    if tier == "small":
+        return {"model": small, "tier": "small", "reason": "policy small", "can_escalate": not stream}
+    if c.tier == "small" and (not stream or c.simple_intent):
+        return {"model": small, "tier": "small", "reason": c.reason, "can_escalate": not stream}
+    slo = policy.get("slo_ms")
+    large_latency = _stats.latency_ms.get(requested)
+    if slo and large_latency and large_latency > float(slo) and c.input_tokens <= 8000:
+        with _stats._lock:
+            _stats.slo_downgrades += 1
+        return {"model": small, "tier": "small", "reason": f"{requested} ~{large_latency:.0f}ms exceeds SLO {slo}ms", "can_escalate": not stream}
+    return {"model": requested, "tier": "large", "reason": c.reason, "can_escalate": False}
+
+
+# ----------------------------------------------------------------------------------
+# Client wrapper
+# ----------------------------------------------------------------------------------
+
+class _RoutedCompletions:
+    def __init__(self, completions):
+        self._completions = completions
+
+    async def create(self, **kwargs):
+        agent_name = current_agent.get()
+        decision = choose_model(kwargs, agent_name)
+        requested = kwargs.get("model")
+        if decision["tier"] != "small":
+            with _stats._lock:
+                _stats.kept_large += 1
+            return await self._timed(kwargs)
+        with _stats._lock:
+            _stats.routed_small += 1
+        response = await self._timed(adapt_params(kwargs, decision["model"]))
+        if not decision["can_escalate"]:
+            return response
+        problem = validate_response(response, kwargs)
+        if problem is None:
+            return response
+        print(f"[model-router] {agent_name or 'call'}: {decision['model']} answer rejected ({problem}); escalating to {requested}")
+        with _stats._lock:
+            _stats.escalations += 1
+        return await self._timed(kwargs)
+
+    async def _timed(self, kwargs):
+        start = time.monotonic()
+        response = await self._completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            _stats.observe(str(kwargs.get("model") or ""), (time.monotonic() - start) * 1000.0)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _RoutedChat:
+    def __init__(self, chat):
+        self.completions = _RoutedCompletions(chat.completions)
+        self._chat = chat
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class RoutedLLMClient:
+    """Drop-in wrapper for an AsyncOpenAI-style client that routes each call to a model tier."""
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = _RoutedChat(client.chat)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
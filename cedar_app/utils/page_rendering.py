@@ -716,6 +716,9 @@ def project_page_html(
       var thinkWrap = null; // planning bubble wrapper
       var thinkText = null; // planning text node to stream tokens into
       var thinkSpin = null; // spinner inside planning bubble
+      // Provisional final-answer bubble filled from 'final_delta' tokens; replaced by the 'final' bubble
+      var finalStreamWrap = null;
+      var finalStreamText = null;
 
       // Subscribe to client console logs while this WS session is active (appended to procPre when available)
       var logSub = function(pl){
@@ -1181,6 +1184,25 @@ def project_page_html(
               thinkText.textContent = (thinkText.textContent ? thinkText.textContent : '') + String(m.delta);
             }
           } catch(_) {}
+        } else if (m.type === 'final_delta' && m.reset) {
+          // The streamed answer was not the final one (loop, clarification, fallback): drop the provisional bubble
+          try { if (finalStreamWrap && finalStreamWrap.parentNode) finalStreamWrap.remove(); } catch(_){}
+          finalStreamWrap = null; finalStreamText = null;
+        } else if (m.type === 'final_delta' && m.delta) {
+          try {
+            if (!finalStreamText) {
+              clearSpinner();
+              finalStreamWrap = document.createElement('div'); finalStreamWrap.className = 'msg assistant';
+              var metaFD = document.createElement('div'); metaFD.className = 'meta small'; metaFD.innerHTML = "<span class='pill'>Chief Agent</span> <span class='title' style='font-weight:600'>Final</span>";
+              var bubFD = document.createElement('div'); bubFD.className = 'bubble assistant';
+              finalStreamText = document.createElement('div'); finalStreamText.className = 'content'; finalStreamText.style.whiteSpace = 'pre-wrap';
+              bubFD.appendChild(finalStreamText);
+              finalStreamWrap.appendChild(metaFD); finalStreamWrap.appendChild(bubFD);
+              if (msgs) msgs.appendChild(finalStreamWrap);
+            }
+            finalStreamText.textContent = (finalStreamText.textContent || '') + String(m.delta);
+          } catch(_) {}
+          refreshTimeout();
         } else if (m.type === 'thinking') { ackEvent(m);
           try {
             // Ensure bubble exists
@@ -1247,6 +1269,8 @@ def project_page_html(
           } catch(_){ }
         } else if (m.type === 'final' && m.text) {
           finalOrError = true;
+          try { if (finalStreamWrap && finalStreamWrap.parentNode) finalStreamWrap.remove(); } catch(_){}
+          finalStreamWrap = null; finalStreamText = null;
           try { 
             if (timeoutId) {
               clearTimeout(timeoutId);
@@ -1260,6 +1284,10 @@ def project_page_html(
             var wrapF = document.createElement('div'); wrapF.className = 'msg assistant';
             var fnF = (m && m.json && m.json.function) ? String(m.json.function) : 'final';
             var metaF = document.createElement('div'); metaF.className = 'meta small'; metaF.innerHTML = "<span class='pill'>Chief Agent</span> <span class='title' style='font-weight:600'>" + (fnF === 'final' ? 'Final' : fnF) + "</span>";
+            if (m.trace_id) {
+              var tlF = document.createElement('a'); tlF.href = '/traces/' + encodeURIComponent(String(m.trace_id)); tlF.target = '_blank';
+              tlF.className = 'small muted'; tlF.style.marginLeft = '8px'; tlF.textContent = '(timeline)'; metaF.appendChild(tlF);
+            }
             var bubF = document.createElement('div'); bubF.className = 'bubble assistant'; if (detIdF) bubF.setAttribute('data-details-id', detIdF);
             var contF = document.createElement('div'); contF.className='content'; contF.style.whiteSpace='pre-wrap'; contF.textContent = (fnF ? (fnF + ' ') : '') + (m.text||'');
             // Add edit prompt link if we have a stored prompt for this thread
@@ -1398,6 +1426,8 @@ def project_page_html(
           ackEvent(m);
         } else if (m.type === 'error') {
           finalOrError = true;
+          try { if (finalStreamWrap && finalStreamWrap.parentNode) finalStreamWrap.remove(); } catch(_){}
+          finalStreamWrap = null; finalStreamText = null;
           try { 
             if (timeoutId) {
               clearTimeout(timeoutId);
@@ -1930,6 +1960,10 @@ def project_page_html(
                   .msg.assistant {{ align-self:flex-start; }}
                   .msg.system {{ align-self:flex-start; }}
                   .msg .meta {{ display:flex; gap:8px; align-items:center; margin-bottom:4px; }}
+                  /* Results arrive as soon as each agent finishes; the entrance animation does the pacing */
+                  #msgs > .msg {{ animation: msgIn 0.25s ease-out both; }}
+                  @keyframes msgIn {{ from {{ opacity:0; transform: translateY(6px); }} to {{ opacity:1; transform: translateY(0); }} }}
+                  @media (prefers-reduced-motion: reduce) {{ #msgs > .msg {{ animation: none; }} }}
                   .bubble {{ border:1px solid var(--border); border-radius:18px; padding:12px 14px; font-size:14px; line-height:1.45; box-shadow: 0 1px 1px rgba(0,0,0,0.04); }}
                   .bubble.user {{ background:#d9fdd3; border-color:#b2e59a; }}
                   .bubble.assistant {{ background:#ffffff; border-color:#e6e6e6; }}
@@ -280,6 +280,8 @@ def delete_project(app, project_id: int):
             eng = _project_engines.pop(project_id, None)
         if eng is not None:
             try:
+                from .query_cache import forget_database
+                forget_database(eng)
                 eng.dispose()
                 logger.info(f"Disposed database engine for project {project_id}")
             except Exception as e:
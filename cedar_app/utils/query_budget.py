@@ -0,0 +1,328 @@
+"""
+Per-query cost and latency budget for orchestration.
+
+One user question can fan out to many agents and loop up to MAX_ITERATIONS times, with a Chief Agent
+prompt that grows every iteration. QueryBudget bounds a single orchestration:
+
+    max_llm_calls   CEDARPY_QUERY_MAX_LLM_CALLS   (default 40)
+    max_tokens      CEDARPY_QUERY_MAX_TOKENS      (default 200000, prompt + completion)
+    max_wall_s      CEDARPY_QUERY_MAX_WALL_S      (default 300)
+    max_cost_usd    CEDARPY_QUERY_MAX_COST_USD    (default 2.0)
+    (0 disables a limit)
+
+The budget for the running orchestration is held in a context variable, so agent tasks spawned from
+it see the same budget while concurrent chats each get their own. BudgetedLLMClient wraps the
+AsyncOpenAI client shared by all agents: every chat.completions.create() call is refused with
+BudgetExceeded once the budget is exhausted, and its token usage (response.usage, or an estimate of
+about four characters per token for streams without usage) is charged afterwards. Answers served by
+the LLM response cache (response.cedar_cache_hit) are counted as cached_calls and cost nothing.
+
+Prices are USD per million tokens (input, output). Unknown models are charged at the "default"
+entry. Override with CEDARPY_LLM_PRICES, a JSON object such as {"my-model": [0.5, 1.5]}.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+import contextvars
+from typing import Any, Dict, Optional
+from cedar_app.env_utils import env_float
+
+DEFAULT_PRICES: Dict[str, tuple] = {
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5": (1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "default": (1.25, 10.00),
+}
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, reason: str, budget: Optional["QueryBudget"] = None):
+        self.reason = reason
+        self.budget = budget
+        super().__init__(f"query budget exhausted ({reason})")
+
+
+def _prices() -> Dict[str, tuple]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.getenv("CEDARPY_LLM_PRICES")
+    if raw:
+        try:
+            for model, pair in json.loads(raw).items():
+                prices[str(model)] = (float(pair[0]), float(pair[1]))
+        except Exception as e:
+            print(f"[budget] ignoring invalid CEDARPY_LLM_PRICES: {e}")
+    return prices
+
+
+def price_for(model: str) -> tuple:
+    """(input, output) USD per million tokens; longest matching model prefix wins."""
+    prices = _prices()
+    name = (model or "").lower()
+    best = None
+    for key in prices:
+        if key != "default" and name.startswith(key) and (best is None or len(key) > len(best)):
+            best = key
+    return prices[best or "default"]
+
+
+def estimate_tokens(text: Any) -> int:
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        try:
+            text = json.dumps(text, default=str)
+        except Exception:
+            text = str(text)
+    return max(1, len(text) // 4)
+
+
+class QueryBudget:
+    def __init__(self, max_llm_calls: Optional[int] = None, max_tokens: Optional[int] = None,
+                 max_wall_s: Optional[float] = None, max_cost_usd: Optional[float] = None):
+        self.max_llm_calls = int(env_float("CEDARPY_QUERY_MAX_LLM_CALLS", 40, minimum=0.0)) if max_llm_calls is None else max_llm_calls
+        self.max_tokens = int(env_float("CEDARPY_QUERY_MAX_TOKENS", 200000, minimum=0.0)) if max_tokens is None else max_tokens
+        self.max_wall_s = env_float("CEDARPY_QUERY_MAX_WALL_S", 300, minimum=0.0) if max_wall_s is None else max_wall_s
+        self.max_cost_usd = env_float("CEDARPY_QUERY_MAX_COST_USD", 2.0, minimum=0.0) if max_cost_usd is None else max_cost_usd
+        self.started = time.monotonic()
+        self.llm_calls = 0
+        self.refused_calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_tokens = 0  # part of the totals that was estimated rather than reported
+        self.cost_usd = 0.0
+        self.forced_final: Optional[str] = None
+        self._lock = threading.Lock()
+
+    # -- state ---------------------------------------------------------------------
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def remaining_s(self) -> Optional[float]:
+        """Wall time left (None = unlimited)."""
+        if not self.max_wall_s:
+            return None
+        return max(0.0, self.max_wall_s - self.elapsed_s)
+
+    def exhausted_reason(self) -> Optional[str]:
+        if self.max_llm_calls and self.llm_calls >= self.max_llm_calls:
+            return "llm_calls"
+        if self.max_tokens and self.total_tokens >= self.max_tokens:
+            return "tokens"
+        if self.max_cost_usd and self.cost_usd >= self.max_cost_usd:
+            return "cost"
+        if self.max_wall_s and self.elapsed_s >= self.max_wall_s:
+            return "wall_time"
+        return None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.exhausted_reason() is not None
+
+    def nearly_exhausted(self, fraction: float = 0.8) -> bool:
+        """True once any limit is at least `fraction` used (time to stop looping)."""
+        checks = [
+            (self.llm_calls, self.max_llm_calls),
+            (self.total_tokens, self.max_tokens),
+            (self.cost_usd, self.max_cost_usd),
+            (self.elapsed_s, self.max_wall_s),
+        ]
+        return any(limit and used >= fraction * limit for used, limit in checks)
+
+    # -- accounting ------------------------------------------------------------------
+
+    def begin_call(self) -> None:
+        """Reserve one LLM call; raises BudgetExceeded if the budget is spent."""
+        with self._lock:
+            reason = self.exhausted_reason()
+            if reason:
+                self.refused_calls += 1
+                raise BudgetExceeded(reason, self)
+            self.llm_calls += 1
+
+    def refund_cached_call(self) -> None:
+        """The reserved call was answered by the response cache: it does not count against the budget."""
+        with self._lock:
+            self.llm_calls = max(0, self.llm_calls - 1)
+            self.cached_calls += 1
+
+    def charge(self, model: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False) -> None:
+        price_in, price_out = price_for(model)
+        with self._lock:
+            self.prompt_tokens += int(prompt_tokens or 0)
+            self.completion_tokens += int(completion_tokens or 0)
+            if estimated:
+                self.estimated_tokens += int(prompt_tokens or 0) + int(completion_tokens or 0)
+            self.cost_usd += (prompt_tokens or 0) * price_in / 1e6 + (completion_tokens or 0) * price_out / 1e6
+
+    def status_line(self) -> str:
+        """Short description for prompts and logs."""
+        parts = [f"{self.llm_calls}/{self.max_llm_calls or '∞'} LLM calls",
+                 f"{self.total_tokens}/{self.max_tokens or '∞'} tokens",
+                 f"${self.cost_usd:.3f}/{('$%.2f' % self.max_cost_usd) if self.max_cost_usd else '∞'}",
+                 f"{self.elapsed_s:.0f}/{('%gs' % self.max_wall_s) if self.max_wall_s else '∞'}"]
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": self.llm_calls,
+            "refused_calls": self.refused_calls,
+            "cached_calls": self.cached_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "estimated_tokens": self.estimated_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "elapsed_s": round(self.elapsed_s, 3),
+            "limits": {
+                "max_llm_calls": self.max_llm_calls,
+                "max_tokens": self.max_tokens,
+                "max_wall_s": self.max_wall_s,
+                "max_cost_usd": self.max_cost_usd,
+            },
+            "exhausted": self.exhausted_reason(),
+            "forced_final": self.forced_final,
+        }
+
+
+current_budget: contextvars.ContextVar[Optional[QueryBudget]] = contextvars.ContextVar("cedar_query_budget", default=None)
+
+
+def get_current_budget() -> Optional[QueryBudget]:
+    return current_budget.get()
+
+
+# ----------------------------------------------------------------------------------
+# LLM client wrapper
+# ----------------------------------------------------------------------------------
+
+def _usage_counts(usage: Any) -> Optional[tuple]:
+    if usage is None:
+        return None
+    p = getattr(usage, "prompt_tokens", None)
+    c = getattr(usage, "completion_tokens", None)
+    if p is None and isinstance(usage, dict):
+        p, c = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    if p is None and c is None:
+        return None
+    return int(p or 0), int(c or 0)
+
+
+class _BudgetedStream:
+    """Async iterator over a streamed completion that charges the budget when it ends."""
+
+    def __init__(self, stream, budget: QueryBudget, model: str, prompt_estimate: int):
+        self._stream = stream
+        self._budget = budget
+        self._model = model
+        self._prompt_estimate = prompt_estimate
+        self._chars = 0
+        self._usage = None
+        self._charged = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for chunk in self._stream:
+                usage = _usage_counts(getattr(chunk, "usage", None))
+                if usage:
+                    self._usage = usage
+                try:
+                    for choice in getattr(chunk, "choices", None) or []:
+                        self._chars += len(getattr(choice.delta, "content", None) or "")
+                except Exception:
+                    pass
+                yield chunk
+        finally:
+            self._charge()
+
+    def _charge(self):
+        if self._charged:
+            return
+        self._charged = True
+        if self._usage:
+            self._budget.charge(self._model, *self._usage)
+        else:
+            self._budget.charge(self._model, self._prompt_estimate, max(0, self._chars // 4), estimated=True)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _BudgetedCompletions:
+    def __init__(self, completions):
+        self._completions = completions
+
+    async def create(self, **kwargs):
+        budget = current_budget.get()
+        if budget is None:
+            return await self._completions.create(**kwargs)
+        budget.begin_call()
+        model = str(kwargs.get("model") or "")
+        prompt_estimate = estimate_tokens(kwargs.get("messages"))
+        response = await self._completions.create(**kwargs)
+        if getattr(response, "cedar_cache_hit", False):
+            budget.refund_cached_call()
+            return response
+        if kwargs.get("stream"):
+            return _BudgetedStream(response, budget, model, prompt_estimate)
+        usage = _usage_counts(getattr(response, "usage", None))
+        if usage:
+            budget.charge(model, *usage)
+        else:
+            text = ""
+            try:
+                text = response.choices[0].message.content or ""
+            except Exception:
+                pass
+            budget.charge(model, prompt_estimate, estimate_tokens(text), estimated=True)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _BudgetedChat:
+    def __init__(self, chat):
+        self.completions = _BudgetedCompletions(chat.completions)
+        self._chat = chat
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class BudgetedLLMClient:
+    """Drop-in wrapper for AsyncOpenAI that enforces and records the current query budget."""
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = _BudgetedChat(client.chat)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def cap_timeout(seconds: Optional[float], budget: Optional[QueryBudget]) -> Optional[float]:
+    """Shorten a deadline (None/0 = none) to the budget's remaining wall time."""
+    remaining = budget.remaining_s() if budget is not None else None
+    if remaining is None:
+        return seconds
+    remaining = max(remaining, 0.001)
+    return min(seconds, remaining) if seconds else remaining
@@ -0,0 +1,230 @@
+"""
+Read-only query result cache for per-project SQLite databases.
+
+Agents and the UI re-run identical SELECTs across orchestration iterations and page reloads. This
+cache keys results by (database, normalized SQL, parameters, paging) and tags each entry with the
+database's PRAGMA data_version at the time it was read. data_version is read from a dedicated probe
+connection per database file; because every other connection (the engine pool, other processes) is
+"another connection" from the probe's point of view, any committed write or schema change bumps it
+and all entries for that database become stale. A probe read costs a few microseconds.
+
+Probe connections are themselves an LRU (CEDARPY_SQL_CACHE_PROBES, default 32); evicted probes are closed, and
+forget_database(engine) closes the probe and drops the entries for a database that is going away (project delete).
+
+Bounded LRU (CEDARPY_SQL_CACHE_ENTRIES, default 256; 0 disables). Results larger than
+CEDARPY_SQL_CACHE_MAX_ROWS rows (default 5000) are not cached. Statements that use non-deterministic
+functions (random(), 'now', CURRENT_TIMESTAMP, changes(), ...) are never cached.
+
+Usage:
+    out = cached_read(engine, sql_text, loader, extra=(max_rows, offset))
+    query_cache_stats()  # hits, misses, stale, evictions, hit_rate
+"""
+
+from __future__ import annotations
+
+import re
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from cedar_app.env_utils import env_int
+
+_NONDETERMINISTIC = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid|current_(timestamp|date|time))\b|'now'",
+    re.IGNORECASE,
+)
+_CACHEABLE_FIRST = ("select", "with", "values")
+
+
+def normalize_sql(sql_text: str) -> str:
+    """Collapse whitespace outside string literals and drop trailing semicolons."""
+    out = []
+    quote = None
+    pending_space = False
+    for ch in (sql_text or "").strip().rstrip(";").strip():
+        if quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch.isspace():
+            pending_space = True
+            continue
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(ch)
+        if ch in ("'", '"', "`"):
+            quote = ch
+    return "".join(out)
+
+
+def is_cacheable(sql_text: str) -> bool:
+    s = (sql_text or "").strip()
+    parts = s.split(None, 1)
+    if not parts or parts[0].lower().lstrip("(") not in _CACHEABLE_FIRST:
+        return False
+    if re.search(r"\b(insert|update|delete|replace)\b", s, re.IGNORECASE):
+        return False
+    return not _NONDETERMINISTIC.search(s)
+
+
+class QueryResultCache:
+    def __init__(self, max_entries: Optional[int] = None, max_rows: Optional[int] = None, max_probes: Optional[int] = None):
+        self.max_entries = env_int("CEDARPY_SQL_CACHE_ENTRIES", 256) if max_entries is None else max_entries
+        self.max_rows = env_int("CEDARPY_SQL_CACHE_MAX_ROWS", 5000) if max_rows is None else max_rows
+        self.max_probes = max(1, env_int("CEDARPY_SQL_CACHE_PROBES", 32) if max_probes is None else max_probes)
+        self._entries: "OrderedDict[Tuple, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # path -> (probe connection, lock serializing its use); least recently used first
+        self._probes: "OrderedDict[str, Tuple[sqlite3.Connection, threading.Lock]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    # -- data_version probe -------------------------------------------------------
+
+    def data_version(self, engine) -> Optional[int]:
+        """Current PRAGMA data_version for the engine's SQLite file, or None if unavailable."""
+        try:
+            if engine.dialect.name != "sqlite":
+                return None
+            path = engine.url.database
+            if not path or path == ":memory:":
+                return None
+            evicted = []
+            with self._lock:
+                entry = self._probes.get(path)
+                if entry is None:
+                    entry = (sqlite3.connect(path, check_same_thread=False), threading.Lock())
+                    self._probes[path] = entry
+                    while len(self._probes) > self.max_probes:
+                        evicted.append(self._probes.popitem(last=False)[1])
+                else:
+                    self._probes.move_to_end(path)
+            for old in evicted:
+                self._close_probe(old)
+            probe, plock = entry
+            with plock:
+                return int(probe.execute("PRAGMA data_version").fetchone()[0])
+        except Exception:
+            return None
+
+    @staticmethod
+    def _close_probe(entry: Tuple[sqlite3.Connection, threading.Lock]) -> None:
+        probe, plock = entry
+        with plock:
+            try:
+                probe.close()
+            except Exception:
+                pass
+
+    def forget(self, engine) -> None:
+        """Close the probe and drop cached results for the engine's database (e.g. before the file is deleted)."""
+        try:
+            path = engine.url.database
+            url = str(engine.url)
+        except Exception:
+            return
+        with self._lock:
+            entry = self._probes.pop(path, None) if path else None
+            for key in [k for k in self._entries if k[0] == url]:
+                del self._entries[key]
+        if entry is not None:
+            self._close_probe(entry)
+
+    def close(self) -> None:
+        """Close every probe connection (process shutdown)."""
+        with self._lock:
+            entries = list(self._probes.values())
+            self._probes.clear()
+        for entry in entries:
+            self._close_probe(entry)
+
+    # -- cache ---------------------------------------------------------------------
+
+    def get_or_load(self, engine, sql_text: str, loader: Callable[[], Any], params: Any = None, extra: Any = None,
+                    size_of: Callable[[Any], int] = lambda v: len(v.get("rows") or []) if isinstance(v, dict) else 0,
+                    should_store: Callable[[Any], bool] = lambda v: True) -> Any:
+        """Return a cached result or call loader() and cache its value."""
+        if self.max_entries <= 0 or not is_cacheable(sql_text):
+            with self._lock:
+                self.bypassed += 1
+            return loader()
+        version = self.data_version(engine)
+        if version is None:
+            with self._lock:
+                self.bypassed += 1
+            return loader()
+        try:
+            key = (str(engine.url), normalize_sql(sql_text), json.dumps(params, sort_keys=True, default=str), json.dumps(extra, default=str))
+        except Exception:
+            return loader()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                if hit[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return hit[1]
+                self.stale += 1
+                del self._entries[key]
+            self.misses += 1
+        value = loader()
+        # Only store if nothing was committed while we were reading
+        if should_store(value) and size_of(value) <= self.max_rows and self.data_version(engine) == version:
+            with self._lock:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "bypassed": self.bypassed,
+                "probes": len(self._probes),
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = QueryResultCache()
+
+
+def cached_read(engine, sql_text: str, loader: Callable[[], Any], params: Any = None, extra: Any = None, **kwargs) -> Any:
+    """Module-level cache shared by the SQL tool, agents and UI."""
+    return _cache.get_or_load(engine, sql_text, loader, params=params, extra=extra, **kwargs)
+
+
+def data_version(engine) -> Optional[int]:
+    """PRAGMA data_version of the engine's database (changes on every committed write), or None."""
+    return _cache.data_version(engine)
+
+
+def forget_database(engine) -> None:
+    """Release the probe connection and cached results for a database that is being disposed or deleted."""
+    _cache.forget(engine)
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def clear_query_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,313 @@
+"""
+Sandbox worker for generated Python code.
+
+Started as a standalone script by cedar_app.utils.code_sandbox (it must not import cedar_app, so
+startup stays cheap and server state never leaks into the sandbox). The worker pre-imports heavy
+libraries once (numpy/pandas by default), then runs jobs one at a time.
+
+Protocol, one JSON object per line:
+  parent -> worker (stdin):   {"type": "job", ...spec}  |  {"type": "rpc_result", "ok": .., "value": .., "error": ..}
+  worker -> parent (stdout*): {"type": "ready", "pid": .., "preloaded": [..]}
+                              {"type": "out", "stream": "stdout"|"stderr", "text": ..}
+                              {"type": "rpc", "method": .., "args": [..]}
+                              {"type": "done", "ok": .., "error": .., "value": .., "truncated": ..}
+  (*) the original stdout is kept for the protocol; fd 1 is pointed at stderr so C-level writes by
+      user code cannot corrupt it.
+
+Job spec (all optional except source):
+  source, filename     code to exec
+  builtins             "full" or a list of builtin names to expose
+  modules              module names injected as globals (e.g. ["json", "re"])
+  allowed_imports      None = unrestricted (only with full builtins); list = import whitelist
+  readable_paths       None = open() unrestricted; list = read-only open() of those paths only
+  helpers              method names exposed on the `cedar` object; calls are RPCs to the parent
+  entry, args          call entry(*args) after exec and return its value
+  cpu_s, memory_mb     per-job RLIMIT_CPU seconds / extra RLIMIT_AS address space (0 = none)
+  max_output           characters of stdout+stderr streamed back before truncating
+  cwd                  working directory for the job (restored afterwards)
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import signal
+import builtins
+
+_MB = 1024 * 1024
+
+
+class CpuLimitExceeded(BaseException):
+    """Raised in the job when RLIMIT_CPU fires. BaseException so `except Exception` cannot swallow it."""
+
+
+class _Stream(io.TextIOBase):
+    """File-like object that forwards writes to a callback in coalesced chunks."""
+
+    def __init__(self, name, emit, budget):
+        self.name = name
+        self._emit = emit
+        self._budget = budget
+        self._buf = []
+        self._size = 0
+        self._last = time.monotonic()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if not isinstance(s, str):
+            s = str(s)
+        self._buf.append(s)
+        self._size += len(s)
+        if self._size >= 8192 or ("\n" in s and time.monotonic() - self._last >= 0.05):
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if not self._buf:
+            return
+        text = "".join(self._buf)
+        self._buf = []
+        self._size = 0
+        self._last = time.monotonic()
+        text = self._budget.take(text)
+        if text:
+            self._emit(self.name, text)
+
+
+class _OutputBudget:
+    def __init__(self, limit):
+        self.left = limit if limit and limit > 0 else None
+        self.truncated = False
+
+    def take(self, text):
+        if self.left is None:
+            return text
+        if len(text) > self.left:
+            text = text[: self.left]
+            self.truncated = True
+        self.left -= len(text)
+        return text
+
+
+class _Helpers:
+    """The `cedar` object: each allowed method call is forwarded to rpc(method, args)."""
+
+    def __init__(self, names, rpc):
+        self._names = set(names or [])
+        self._rpc = rpc
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self._names:
+            raise AttributeError(f"cedar.{name} is not available here")
+        return lambda *args: self._rpc(name, list(args))
+
+    def __dir__(self):
+        return sorted(self._names)
+
+
+def build_globals(spec, cedar):
+    """Globals dict for one job, following the spec's builtins/modules/import/open policy."""
+    allowed_imports = spec.get("allowed_imports")
+    readable = spec.get("readable_paths")
+    names = spec.get("builtins") or "full"
+    if names == "full":
+        b = dict(vars(builtins))
+    else:
+        b = {n: getattr(builtins, n) for n in names if hasattr(builtins, n)}
+    if allowed_imports is not None:
+        allowed = set(allowed_imports)
+
+        def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level == 0 and name.split(".")[0] in allowed:
+                return builtins.__import__(name, globals, locals, fromlist, level)
+            raise ImportError(f"disallowed import: {name}")
+
+        b["__import__"] = _safe_import
+    if readable is not None:
+        paths = {os.path.abspath(p) for p in readable}
+
+        def _safe_open(p, mode="r", *args, **kwargs):
+            if any(c in mode for c in "wax+"):
+                raise PermissionError("open() write modes are not allowed")
+            if os.path.abspath(p) not in paths:
+                raise PermissionError("open() denied for this path")
+            return builtins.open(p, mode, *args, **kwargs)
+
+        b["open"] = _safe_open
+    g = {"__builtins__": b, "__name__": "__cedar_sandbox__"}
+    for m in spec.get("modules") or []:
+        try:
+            g[m.split(".")[-1]] = __import__(m, fromlist=["_"])
+        except Exception:
+            pass
+    if spec.get("helpers") is not None:
+        g["cedar"] = cedar
+    return g
+
+
+def execute(spec, rpc, emit):
+    """Run one job in this process. Returns the "done" message."""
+    budget = _OutputBudget(spec.get("max_output") or 0)
+    out = _Stream("stdout", emit, budget)
+    err = _Stream("stderr", emit, budget)
+    cedar = _Helpers(spec.get("helpers"), rpc)
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = out, err
+    result = {"type": "done", "ok": True, "error": None, "value": None}
+    saved_cwd = None
+    try:
+        if spec.get("cwd"):
+            saved_cwd = os.getcwd()
+            os.chdir(spec["cwd"])
+        g = build_globals(spec, cedar)
+        exec(compile(spec.get("source") or "", spec.get("filename") or "<sandbox>", "exec"), g, g)
+        entry = spec.get("entry")
+        if entry:
+            fn = g.get(entry)
+            if not callable(fn):
+                raise RuntimeError(f"Generated code did not define {entry}()")
+            result["value"] = fn(*(spec.get("args") or []))
+    except CpuLimitExceeded:
+        result.update(ok=False, error="CpuLimitExceeded: CPU time limit exceeded", limit="cpu")
+    except MemoryError:
+        result.update(ok=False, error="MemoryError: memory limit exceeded", limit="memory")
+    except BaseException as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    finally:
+        try:
+            out.flush()
+            err.flush()
+        except Exception:
+            pass
+        sys.stdout, sys.stderr = saved
+        if saved_cwd is not None:
+            try:
+                os.chdir(saved_cwd)
+            except Exception:
+                pass
+    result["truncated"] = budget.truncated
+    return result
+
+
+# ----------------------------------------------------------------------------------
+# Resource limits (POSIX only; silently skipped elsewhere)
+# ----------------------------------------------------------------------------------
+
+def _vm_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+def _apply_limits(spec):
+    try:
+        import resource
+    except Exception:
+        return lambda: None
+    saved = []
+    cpu_s = int(spec.get("cpu_s") or 0)
+    if cpu_s > 0:
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            ru = resource.getrusage(resource.RUSAGE_SELF)
+            want = int(ru.ru_utime + ru.ru_stime) + 1 + cpu_s
+            if hard != resource.RLIM_INFINITY:
+                want = min(want, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (want, hard))
+            saved.append((resource.RLIMIT_CPU, soft, hard))
+        except Exception:
+            pass
+    memory_mb = int(spec.get("memory_mb") or 0)
+    vm = _vm_bytes()
+    if memory_mb > 0 and vm is not None:
+        # Linux does not enforce RLIMIT_RSS; RLIMIT_AS is the enforceable cap on address space.
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            want = vm + memory_mb * _MB
+            if hard != resource.RLIM_INFINITY:
+                want = min(want, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (want, hard))
+            saved.append((resource.RLIMIT_AS, soft, hard))
+        except Exception:
+            pass
+
+    def restore():
+        for which, soft, hard in saved:
+            try:
+                resource.setrlimit(which, (soft, hard))
+            except Exception:
+                pass
+
+    return restore
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def main():
+    proto = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    stdin = sys.stdin
+
+    def send(obj):
+        proto.write(json.dumps(obj, default=str) + "\n")
+        proto.flush()
+
+    def emit(stream, text):
+        send({"type": "out", "stream": stream, "text": text})
+
+    def rpc(method, args):
+        send({"type": "rpc", "method": method, "args": args})
+        line = stdin.readline()
+        if not line:
+            raise SystemExit(0)
+        msg = json.loads(line)
+        if not msg.get("ok"):
+            raise RuntimeError(msg.get("error") or f"cedar.{method} failed")
+        return msg.get("value")
+
+    try:
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    except Exception:
+        pass
+
+    preloaded = []
+    for name in [m.strip() for m in (os.getenv("CEDARPY_SANDBOX_PREIMPORT", "numpy,pandas") or "").split(",") if m.strip()]:
+        try:
+            __import__(name)
+            preloaded.append(name)
+        except Exception:
+            pass
+    send({"type": "ready", "pid": os.getpid(), "preloaded": preloaded})
+
+    while True:
+        line = stdin.readline()
+        if not line:
+            return
+        try:
+            spec = json.loads(line)
+        except Exception:
+            continue
+        if spec.get("type") != "job":
+            continue
+        restore = _apply_limits(spec)
+        try:
+            result = execute(spec, rpc, emit)
+        finally:
+            restore()
+        try:
+            send(result)
+        except (TypeError, ValueError):
+            result["value"] = repr(result.get("value"))
+            send(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Schema catalog for per-project SQLite databases.
+
+Introspecting tables with PRAGMA table_info / sqlite_master on every SQL statement or agent
+call is wasteful: the schema rarely changes while data changes constantly. This module keeps an
+in-memory catalog (tables, columns, primary keys, branch-awareness, indexes) per database and
+rebuilds it only when SQLite's PRAGMA schema_version moves, which SQLite bumps on every DDL change.
+
+Usage:
+    cat = catalog_for_connection(conn)      # inside an existing transaction
+    cat = get_schema_catalog(project_id)    # standalone (agents, prompts)
+    cat.table("notes").branch_aware
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    notnull: bool = False
+    default: Any = None
+    pk: int = 0  # position in the primary key (0 = not part of PK)
+
+
+@dataclass
+class IndexInfo:
+    name: str
+    unique: bool
+    columns: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TableInfo:
+    name: str
+    kind: str  # "table" | "view"
+    columns: List[ColumnInfo] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+    without_rowid: bool = False
+    virtual: bool = False
+
+    @property
+    def column_names(self) -> List[str]:
+        return [c.name for c in self.columns]
+
+    @property
+    def pk_columns(self) -> List[str]:
+        return [c.name for c in sorted((c for c in self.columns if c.pk), key=lambda c: c.pk)]
+
+    @property
+    def rowid_alias(self) -> Optional[str]:
+        """The INTEGER PRIMARY KEY column that aliases rowid, if any."""
+        pk = [c for c in self.columns if c.pk]
+        if self.without_rowid or len(pk) != 1 or (pk[0].type or "").upper() != "INTEGER":
+            return None
+        return pk[0].name
+
+    @property
+    def branch_aware(self) -> bool:
+        cols = {c.name for c in self.columns}
+        return "project_id" in cols and "branch_id" in cols
+
+
+@dataclass
+class SchemaCatalog:
+    schema_version: int
+    tables: Dict[str, TableInfo] = field(default_factory=dict)
+
+    def table(self, name: str) -> Optional[TableInfo]:
+        t = self.tables.get(name)
+        if t is not None:
+            return t
+        # SQLite identifiers are case-insensitive
+        low = (name or "").lower()
+        for k, v in self.tables.items():
+            if k.lower() == low:
+                return v
+        return None
+
+    def table_names(self, include_views: bool = True) -> List[str]:
+        return [n for n, t in self.tables.items() if include_views or t.kind == "table"]
+
+    def describe(self, max_tables: int = 200) -> str:
+        """Compact, prompt-friendly description of the schema."""
+        if not self.tables:
+            return "No tables found"
+        lines = ["Available tables:"]
+        for name in list(self.tables.keys())[:max_tables]:
+            t = self.tables[name]
+            cols = ", ".join(f"{c.name} ({c.type or 'ANY'})" for c in t.columns)
+            flags = []
+            if t.kind == "view":
+                flags.append("view")
+            if t.branch_aware:
+                flags.append("branch-aware")
+            if t.pk_columns:
+                flags.append("pk=" + ",".join(t.pk_columns))
+            suffix = f" [{'; '.join(flags)}]" if flags else ""
+            lines.append(f"- {name}: {cols}{suffix}")
+        if len(self.tables) > max_tables:
+            lines.append(f"... and {len(self.tables) - max_tables} more")
+        return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------------------
+# Cache keyed by database URL (one SQLite file per project)
+# ----------------------------------------------------------------------------------
+
+_catalogs: Dict[str, SchemaCatalog] = {}
+_catalogs_lock = threading.Lock()
+_stats = {"hits": 0, "rebuilds": 0}
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _schema_version(conn) -> int:
+    try:
+        return int(conn.exec_driver_sql("PRAGMA schema_version").scalar() or 0)
+    except Exception:
+        return -1
+
+
+def _build_catalog(conn, version: int) -> SchemaCatalog:
+    cat = SchemaCatalog(schema_version=version)
+    rows = conn.exec_driver_sql(
+        "SELECT name, type, sql FROM sqlite_master WHERE type IN ('table','view') AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    for name, kind, ddl in rows:
+        ddl_norm = " ".join((ddl or "").upper().split())
+        t = TableInfo(name=name, kind=kind, without_rowid="WITHOUT ROWID" in ddl_norm, virtual=ddl_norm.startswith("CREATE VIRTUAL TABLE"))
+        try:
+            for r in conn.exec_driver_sql(f"PRAGMA table_info({_quote_ident(name)})").fetchall():
+                # cid, name, type, notnull, dflt_value, pk
+                t.columns.append(ColumnInfo(name=r[1], type=r[2] or "", notnull=bool(r[3]), default=r[4], pk=int(r[5] or 0)))
+        except Exception:
+            pass
+        if kind == "table":
+            try:
+                for ir in conn.exec_driver_sql(f"PRAGMA index_list({_quote_ident(name)})").fetchall():
+                    # seq, name, unique, origin, partial
+                    idx = IndexInfo(name=ir[1], unique=bool(ir[2]))
+                    try:
+                        idx.columns = [c[2] for c in conn.exec_driver_sql(f"PRAGMA index_info({_quote_ident(ir[1])})").fetchall()]
+                    except Exception:
+                        pass
+                    t.indexes.append(idx)
+            except Exception:
+                pass
+        cat.tables[name] = t
+    return cat
+
+
+def catalog_for_connection(conn) -> SchemaCatalog:
+    """Return the cached catalog for the database behind `conn`, rebuilding only if the schema changed.
+    Costs a single PRAGMA schema_version read on a cache hit. Works inside an open transaction.
+    """
+    key = str(conn.engine.url)
+    version = _schema_version(conn)
+    with _catalogs_lock:
+        cached = _catalogs.get(key)
+        if cached is not None and version >= 0 and cached.schema_version == version:
+            _stats["hits"] += 1
+            return cached
+    cat = _build_catalog(conn, version)
+    with _catalogs_lock:
+        if version >= 0:
+            _catalogs[key] = cat
+        _stats["rebuilds"] += 1
+    return cat
+
+
+def get_schema_catalog(project_id: int) -> SchemaCatalog:
+    """Catalog for a project's database (opens a short-lived connection)."""
+    from cedar_app.db_utils import _get_project_engine
+    with _get_project_engine(project_id).connect() as conn:
+        return catalog_for_connection(conn)
+
+
+def invalidate_schema_catalog(project_id: Optional[int] = None) -> None:
+    """Drop cached catalogs (all, or a single project's). Normally not needed: schema_version handles it."""
+    with _catalogs_lock:
+        if project_id is None:
+            _catalogs.clear()
+            return
+        from cedar_app.db_utils import _get_project_engine
+        _catalogs.pop(str(_get_project_engine(project_id).url), None)
+
+
+def schema_catalog_stats() -> Dict[str, int]:
+    with _catalogs_lock:
+        return {"hits": _stats["hits"], "rebuilds": _stats["rebuilds"], "cached": len(_catalogs)}
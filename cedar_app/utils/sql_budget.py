@@ -0,0 +1,199 @@
+"""
+Time and VM-step budgets for SQL statements.
+
+SQLite calls a progress handler every N virtual-machine instructions; returning non-zero from it
+aborts the running statement with "interrupted". QueryGuard installs such a handler for the
+duration of a statement (and of each fetch from a streaming cursor) and aborts when:
+  - the statement's active time exceeds timeout_ms,
+  - the VM step count exceeds max_steps,
+  - cancel() is called from another thread (also calls sqlite3.Connection.interrupt()).
+
+An aborted statement raises QueryCancelled carrying a report:
+    {"cancelled": true, "reason": "timeout" | "max_steps" | "client",
+     "elapsed_ms": 30012, "vm_steps": 81230000, "rows_returned": 0}
+
+SQLite does not expose a rows-scanned counter to Python, so vm_steps is the measure of scan work;
+rows_returned counts rows already handed to the caller.
+
+Defaults come from CEDARPY_SQL_TIMEOUT_MS (30000) and CEDARPY_SQL_MAX_STEPS (0 = unlimited), and can
+be overridden per project (stored in the project's settings table under "sql_budget").
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from cedar_app.env_utils import env_int
+
+# Progress handler granularity (VM instructions between checks)
+PROGRESS_OPS = 1000
+SETTINGS_KEY = "sql_budget"
+
+
+class QueryBudget:
+    def __init__(self, timeout_ms: Optional[int] = None, max_steps: Optional[int] = None):
+        self.timeout_ms = int(timeout_ms) if timeout_ms else 0
+        self.max_steps = int(max_steps) if max_steps else 0
+
+    @classmethod
+    def from_env(cls) -> "QueryBudget":
+        return cls(env_int("CEDARPY_SQL_TIMEOUT_MS", 30000), env_int("CEDARPY_SQL_MAX_STEPS", 0))
+
+    def override(self, msg: Optional[Dict[str, Any]]) -> "QueryBudget":
+        """Apply per-request overrides ({"timeout_ms": .., "max_steps": ..}) on top of this budget."""
+        if not isinstance(msg, dict):
+            return self
+        out = QueryBudget(self.timeout_ms, self.max_steps)
+        for k in ("timeout_ms", "max_steps"):
+            try:
+                if msg.get(k) is not None:
+                    setattr(out, k, max(0, int(msg.get(k))))
+            except Exception:
+                pass
+        return out
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"timeout_ms": self.timeout_ms, "max_steps": self.max_steps}
+
+
+class QueryCancelled(Exception):
+    def __init__(self, report: Dict[str, Any]):
+        self.report = report
+        super().__init__(f"Query cancelled ({report.get('reason')}) after {report.get('elapsed_ms')} ms")
+
+
+class QueryGuard:
+    """Enforces a QueryBudget on one DB-API sqlite3 connection. No-op for other dialects."""
+
+    def __init__(self, budget: Optional[QueryBudget] = None):
+        self.budget = budget or QueryBudget.from_env()
+        self.steps = 0
+        self.rows = 0
+        self.active_s = 0.0
+        self.reason: Optional[str] = None
+        self._deadline: Optional[float] = None
+        self._dbapi = None
+        self._cancel = threading.Event()
+
+    def _handler(self) -> int:
+        self.steps += PROGRESS_OPS
+        if self._cancel.is_set():
+            self.reason = self.reason or "client"
+            return 1
+        if self.budget.max_steps and self.steps > self.budget.max_steps:
+            self.reason = "max_steps"
+            return 1
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self.reason = "timeout"
+            return 1
+        return 0
+
+    @contextmanager
+    def active(self, conn):
+        """Enforce the budget while the block runs. Time is cumulative across blocks, so idle time
+        between pages of a streaming cursor does not count against the statement."""
+        dbapi = _sqlite_dbapi(conn)
+        if dbapi is None:
+            yield self
+            return
+        if self._cancel.is_set():
+            raise QueryCancelled(self.report(reason="client"))
+        start = time.monotonic()
+        if self.budget.timeout_ms:
+            self._deadline = start + max(0.0, self.budget.timeout_ms / 1000.0 - self.active_s)
+        self._dbapi = dbapi
+        dbapi.set_progress_handler(self._handler, PROGRESS_OPS)
+        error: Optional[Exception] = None
+        try:
+            yield self
+        except Exception as e:
+            error = e
+        finally:
+            self.active_s += time.monotonic() - start
+            self._deadline = None
+            self._dbapi = None
+            try:
+                dbapi.set_progress_handler(None, 0)
+            except Exception:
+                pass
+        if error is not None:
+            if self.reason and "interrupt" in str(error).lower():
+                raise QueryCancelled(self.report()) from error
+            raise error
+
+    def cancel(self) -> None:
+        """Thread-safe: abort the running statement as soon as possible."""
+        self.reason = self.reason or "client"
+        self._cancel.set()
+        dbapi = self._dbapi
+        if dbapi is not None:
+            try:
+                dbapi.interrupt()
+            except Exception:
+                pass
+
+    def report(self, reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "cancelled": True,
+            "reason": reason or self.reason,
+            "elapsed_ms": int(self.active_s * 1000),
+            "vm_steps": self.steps,
+            "rows_returned": self.rows,
+            "budget": self.budget.to_dict(),
+        }
+
+
+def _sqlite_dbapi(conn):
+    try:
+        if conn.dialect.name != "sqlite":
+            return None
+        return conn.connection.dbapi_connection
+    except Exception:
+        return None
+
+
+# ----------------------------------------------------------------------------------
+# Per-project defaults (project settings table)
+# ----------------------------------------------------------------------------------
+
+_project_budgets: Dict[int, QueryBudget] = {}
+_project_budgets_lock = threading.Lock()
+
+
+def get_project_sql_budget(project_id: Optional[int]) -> QueryBudget:
+    """Project budget from the project's settings table, falling back to the env defaults."""
+    if project_id is None:
+        return QueryBudget.from_env()
+    with _project_budgets_lock:
+        cached = _project_budgets.get(project_id)
+    if cached is not None:
+        return cached
+    budget = QueryBudget.from_env()
+    try:
+        from cedar_app.db_utils import _get_project_engine
+        with _get_project_engine(project_id).connect() as conn:
+            row = conn.exec_driver_sql("SELECT value FROM settings WHERE key = ?", (SETTINGS_KEY,)).fetchone()
+        if row and row[0]:
+            budget = budget.override(json.loads(row[0]))
+    except Exception:
+        pass
+    with _project_budgets_lock:
+        _project_budgets[project_id] = budget
+    return budget
+
+
+def set_project_sql_budget(project_id: int, timeout_ms: Optional[int] = None, max_steps: Optional[int] = None) -> QueryBudget:
+    """Persist a per-project default budget. None leaves a field at its current value."""
+    budget = get_project_sql_budget(project_id).override({"timeout_ms": timeout_ms, "max_steps": max_steps})
+    from cedar_app.db_utils import _get_project_engine
+    from main_models import Setting
+    from sqlalchemy.orm import Session
+    with Session(_get_project_engine(project_id)) as db:
+        db.merge(Setting(key=SETTINGS_KEY, value=json.dumps(budget.to_dict())))
+        db.commit()
+    with _project_budgets_lock:
+        _project_budgets[project_id] = budget
+    return budget
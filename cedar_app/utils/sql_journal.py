@@ -0,0 +1,286 @@
+"""
+Trigger-based undo journal for per-project SQLite databases.
+
+Instead of regex-parsing a mutation and snapshotting its target rows with an extra SELECT before
+(and after) running it, every user table gets TEMP audit triggers on the executing connection.
+While a statement runs "armed", the triggers append one compact change record per affected row to
+a TEMP table; the records are then written to sql_undo_log in the same transaction. This captures
+any DML (multi-table, CTEs, UPSERT, trigger side effects) from any entry point with no pre-scan.
+
+REPLACE (and INSERT OR REPLACE) deletes the conflicting row without firing DELETE triggers unless
+PRAGMA recursive_triggers is on, which would lose the replaced row's pre-image; the pragma is
+therefore switched on while a statement runs armed and restored afterwards. UPSERT
+(ON CONFLICT DO UPDATE) fires the UPDATE trigger and needs nothing extra.
+
+Changeset format (SQLUndoLog.op == "changeset", stored in rows_before, applied in reverse):
+    [table, op, old_key, new_key, old_row]
+      op:      "i" (insert) | "u" (update) | "d" (delete)
+      key:     rowid (int), or {pk: value} for WITHOUT ROWID tables
+      old_row: full pre-image for "u"/"d", None for "i"
+
+Triggers are gated by a row in a TEMP table, so writes outside run_journaled (ORM sessions sharing
+the pooled connection) only pay a lookup in that one-row table and are not recorded. Triggers are
+created once per connection and rebuilt when PRAGMA schema_version changes.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from main_models import SQLUndoLog
+from .schema_catalog import catalog_for_connection, TableInfo
+
+CHANGES_TABLE = "_cedar_undo_changes"
+ARMED_TABLE = "_cedar_undo_armed"
+BLOB_PREFIX = "__blob__:"
+# Tables never journaled (the journal itself)
+EXCLUDED_TABLES = {"sql_undo_log"}
+# Keep json_object() calls under SQLite's default function-argument limit
+_JSON_ARGS_PER_CALL = 60
+_DML_RE = re.compile(r"\b(insert|update|delete|replace)\b", re.IGNORECASE)
+
+
+def _q(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _lit(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def undo_max_rows() -> int:
+    try:
+        return int(os.getenv("CEDARPY_SQL_UNDO_MAX_ROWS", "1000"))
+    except Exception:
+        return 1000
+
+
+def is_journaled_statement(sql_text: str) -> bool:
+    """DML that triggers can capture. DDL (CREATE/ALTER/DROP) is not journaled."""
+    parts = (sql_text or "").strip().split(None, 1)
+    if not parts:
+        return False
+    first = parts[0].lower()
+    if first == "with":
+        return bool(_DML_RE.search(sql_text))
+    return first in ("insert", "update", "delete", "replace")
+
+
+def _row_json(t: TableInfo, ref: str) -> str:
+    """SQL expression building a JSON object of all columns of OLD/NEW. BLOBs are hex-encoded."""
+    parts = []
+    for c in t.columns:
+        col = f"{ref}.{_q(c.name)}"
+        parts.append(f"{_lit(c.name)}, CASE typeof({col}) WHEN 'blob' THEN {_lit(BLOB_PREFIX)} || hex({col}) ELSE {col} END")
+    chunks = [parts[i:i + _JSON_ARGS_PER_CALL // 2] for i in range(0, len(parts), _JSON_ARGS_PER_CALL // 2)] or [[]]
+    expr = f"json_object({', '.join(chunks[0])})"
+    for ch in chunks[1:]:
+        expr = f"json_patch({expr}, json_object({', '.join(ch)}))"
+    return expr
+
+
+def _key_expr(t: TableInfo, ref: str) -> str:
+    if not t.without_rowid:
+        return f"{ref}.rowid"
+    return "json_object(" + ", ".join(f"{_lit(c)}, {ref}.{_q(c)}" for c in t.pk_columns) + ")"
+
+
+def _trigger_sql(t: TableInfo) -> List[str]:
+    tbl = _lit(t.name)
+    target = f"main.{_q(t.name)}"
+    when = f"WHEN EXISTS (SELECT 1 FROM {ARMED_TABLE})"
+    ins = f"INSERT INTO {CHANGES_TABLE} (tbl, op, old_key, new_key, old_row) VALUES"
+    stmts = []
+    for op, event, values in (
+        ("i", "INSERT", f"({tbl}, 'i', NULL, {_key_expr(t, 'NEW')}, NULL)"),
+        ("u", "UPDATE", f"({tbl}, 'u', {_key_expr(t, 'OLD')}, {_key_expr(t, 'NEW')}, {_row_json(t, 'OLD')})"),
+        ("d", "DELETE", f"({tbl}, 'd', {_key_expr(t, 'OLD')}, NULL, {_row_json(t, 'OLD')})"),
+    ):
+        name = _q(f"cedar_undo_{op}_{t.name}")
+        stmts.append(f"DROP TRIGGER IF EXISTS temp.{name}")
+        stmts.append(f"CREATE TEMP TRIGGER {name} AFTER {event} ON {target} {when} BEGIN {ins} {values}; END")
+    return stmts
+
+
+def _ensure_triggers(conn) -> None:
+    """Create the TEMP change table and audit triggers on this connection (once per schema version)."""
+    cat = catalog_for_connection(conn)
+    info = conn.connection.info
+    if info.get("cedar_undo_schema_version") == cat.schema_version:
+        return
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {CHANGES_TABLE} "
+        "(seq INTEGER PRIMARY KEY, tbl TEXT, op TEXT, old_key, new_key, old_row TEXT)"
+    )
+    conn.exec_driver_sql(f"CREATE TEMP TABLE IF NOT EXISTS {ARMED_TABLE} (x INTEGER)")
+    # Virtual tables (FTS) cannot carry triggers; their shadow tables are maintained by the module
+    virtual = [t.name + "_" for t in cat.tables.values() if t.virtual]
+    for t in cat.tables.values():
+        if t.kind != "table" or t.virtual or t.name in EXCLUDED_TABLES or not t.columns:
+            continue
+        if any(t.name.startswith(prefix) for prefix in virtual):
+            continue
+        try:
+            for stmt in _trigger_sql(t):
+                conn.exec_driver_sql(stmt)
+        except Exception as e:
+            print(f"[undo-journal] not journaling '{t.name}': {type(e).__name__}: {e}")
+    info["cedar_undo_schema_version"] = cat.schema_version
+
+
+def _decode_key(raw: Any) -> Any:
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except Exception:
+            return raw
+    return raw
+
+
+def _collect_changes(conn) -> List[list]:
+    rows = conn.exec_driver_sql(f"SELECT tbl, op, old_key, new_key, old_row FROM {CHANGES_TABLE} ORDER BY seq").fetchall()
+    return [[r[0], r[1], _decode_key(r[2]), _decode_key(r[3]), json.loads(r[4]) if r[4] else None] for r in rows]
+
+
+def run_journaled(conn, sql_text: str, *, project_id: int, branch_id: int, max_rows: int = 200) -> Dict[str, Any]:
+    """Execute one DML statement on `conn` (inside its transaction) and record its changeset in
+    sql_undo_log in the same transaction.
+
+    Returns {"rowcount", "columns", "rows" (RETURNING only), "changes", "undo_log_id"}. undo_log_id is
+    None when nothing changed, when the changeset exceeds CEDARPY_SQL_UNDO_MAX_ROWS, or when the
+    journal could not be set up (the statement still runs).
+    """
+    out: Dict[str, Any] = {"rowcount": None, "columns": [], "rows": [], "changes": 0, "undo_log_id": None}
+    journal = conn.dialect.name == "sqlite"
+    recursive = None
+    if journal:
+        try:
+            _ensure_triggers(conn)
+            conn.exec_driver_sql(f"DELETE FROM {CHANGES_TABLE}")
+            conn.exec_driver_sql(f"INSERT INTO {ARMED_TABLE} (x) VALUES (1)")
+            # Rows removed by REPLACE conflict resolution only fire DELETE triggers with this on
+            recursive = conn.exec_driver_sql("PRAGMA recursive_triggers").scalar()
+            if not recursive:
+                conn.exec_driver_sql("PRAGMA recursive_triggers = ON")
+        except Exception as e:
+            print(f"[undo-journal] setup failed, running without undo: {type(e).__name__}: {e}")
+            journal = False
+    try:
+        res = conn.exec_driver_sql(sql_text)
+        if res.returns_rows:
+            out["columns"] = list(res.keys())
+            out["rows"] = [list(r) for r in res.fetchmany(max_rows)]
+            # Drain RETURNING so every row's change is applied and journaled
+            while res.fetchmany(1000):
+                pass
+        out["rowcount"] = res.rowcount
+    except Exception:
+        # The caller rolls back; TEMP DDL done in this transaction may be rolled back with it
+        conn.connection.info.pop("cedar_undo_schema_version", None)
+        raise
+    finally:
+        if journal:
+            try:
+                conn.exec_driver_sql(f"DELETE FROM {ARMED_TABLE}")
+                if not recursive:
+                    conn.exec_driver_sql("PRAGMA recursive_triggers = OFF")
+            except Exception:
+                pass
+    if not journal:
+        return out
+
+    changes = _collect_changes(conn)
+    conn.exec_driver_sql(f"DELETE FROM {CHANGES_TABLE}")
+    out["changes"] = len(changes)
+    if not changes:
+        return out
+    cap = undo_max_rows()
+    if cap and len(changes) > cap:
+        print(f"[undo-journal] {len(changes)} changes exceed CEDARPY_SQL_UNDO_MAX_ROWS={cap}; not undoable")
+        out["undo_skipped"] = f"{len(changes)} changes exceed undo limit {cap}"
+        return out
+    tables = list(dict.fromkeys(c[0] for c in changes))
+    ops = {c[1] for c in changes}
+    res = conn.execute(SQLUndoLog.__table__.insert().values(
+        project_id=project_id,
+        branch_id=branch_id,
+        table_name=",".join(tables)[:255],
+        op="changeset",
+        sql_text=sql_text,
+        pk_columns={"ops": sorted(ops), "tables": tables},
+        rows_before=changes,
+        rows_after=None,
+    ))
+    out["undo_log_id"] = res.inserted_primary_key[0]
+    return out
+
+
+def _restore_value(v: Any) -> Any:
+    if isinstance(v, str) and v.startswith(BLOB_PREFIX):
+        try:
+            return bytes.fromhex(v[len(BLOB_PREFIX):])
+        except Exception:
+            return v
+    return v
+
+
+def _key_where(t: TableInfo, key: Any) -> Tuple[str, list]:
+    if isinstance(key, dict):
+        cols = list(key.keys())
+        return " AND ".join(f"{_q(c)} = ?" for c in cols), [key[c] for c in cols]
+    return "rowid = ?", [key]
+
+
+def apply_changeset(conn, changes: List[list]) -> int:
+    """Revert a changeset (newest change first). Runs unarmed, so the revert is not journaled."""
+    cat = catalog_for_connection(conn)
+    reverted = 0
+    for tbl, op, old_key, new_key, old_row in reversed(changes):
+        t = cat.table(tbl)
+        if t is None:
+            raise RuntimeError(f"Cannot undo: table '{tbl}' no longer exists")
+        old_row = {k: _restore_value(v) for k, v in (old_row or {}).items()}
+        if op == "i":
+            where, params = _key_where(t, new_key)
+            conn.exec_driver_sql(f"DELETE FROM {_q(tbl)} WHERE {where}", tuple(params))
+        elif op == "d":
+            cols = list(old_row.keys())
+            vals = [old_row[c] for c in cols]
+            if not t.without_rowid and not t.rowid_alias:
+                cols.append("rowid"); vals.append(old_key)
+            conn.exec_driver_sql(
+                f"INSERT INTO {_q(tbl)} ({', '.join(_q(c) if c != 'rowid' else c for c in cols)}) VALUES ({', '.join('?' for _ in cols)})",
+                tuple(vals),
+            )
+        elif op == "u":
+            sets = [f"{_q(c)} = ?" for c in old_row.keys()]
+            vals = list(old_row.values())
+            if not t.without_rowid and not t.rowid_alias:
+                sets.append("rowid = ?"); vals.append(old_key)
+            where, params = _key_where(t, new_key)
+            conn.exec_driver_sql(f"UPDATE {_q(tbl)} SET {', '.join(sets)} WHERE {where}", tuple(vals + params))
+        reverted += 1
+    return reverted
+
+
+def undo_changeset_log(conn, log_row) -> int:
+    """Revert a changeset SQLUndoLog row and delete it, in `conn`'s transaction."""
+    if log_row.op != "changeset":
+        raise ValueError(f"Undo log {log_row.id} is a legacy '{log_row.op}' entry")
+    n = apply_changeset(conn, log_row.rows_before or [])
+    conn.execute(SQLUndoLog.__table__.delete().where(SQLUndoLog.__table__.c.id == log_row.id))
+    return n
+
+
+def find_undo_log(conn, project_id: int, log_id: Optional[int] = None, branch_id: Optional[int] = None):
+    """The requested undo log row, or the most recent one for the project (and branch, if given)."""
+    tbl = SQLUndoLog.__table__
+    q = tbl.select().where(tbl.c.project_id == project_id)
+    if log_id is not None:
+        q = q.where(tbl.c.id == int(log_id))
+    elif branch_id is not None:
+        q = q.where(tbl.c.branch_id == int(branch_id))
+    return conn.execute(q.order_by(tbl.c.created_at.desc(), tbl.c.id.desc()).limit(1)).first()
@@ -0,0 +1,218 @@
+"""
+Server-side SQL cursors for streaming query results.
+
+Instead of materializing a full result (fetchall) and truncating it afterwards, a read statement is
+executed on a dedicated connection and rows are pulled in fetchmany() batches. Only one batch is
+held in memory at a time, so memory stays bounded regardless of result size. Each batch becomes a
+websocket frame; the client asks for the next page or cancels the cursor.
+
+Page payload (columnar):
+    {"cursor_id": "c1", "columns": ["id", "name"], "data": [[1, 2], ["a", "b"]],
+     "row_count": 2, "rows_sent": 2, "has_more": false}
+
+`data` holds one array per column, aligned with `columns`. Row-major `rows` is available via
+format="rows" for older clients.
+
+Note: with SQLite's default journal mode an open cursor holds a read lock on the database, so
+cursors are closed as soon as they are exhausted, when idle too long, and before the owning socket
+executes a write.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import itertools
+import contextlib
+from typing import Any, Dict, List, Optional
+from cedar_app.env_utils import env_int
+
+READ_KEYWORDS = ("select", "with", "pragma", "explain", "values", "show")
+
+
+def is_read_statement(sql_text: str) -> bool:
+    parts = (sql_text or "").strip().split(None, 1)
+    if not parts:
+        return False
+    first = parts[0].lower().lstrip("(")
+    if first == "with":
+        # WITH ... INSERT/UPDATE/DELETE is a write
+        return not re.search(r"\b(insert|update|delete|replace)\b", sql_text, re.IGNORECASE)
+    return first in READ_KEYWORDS
+
+
+def columnar(columns: List[str], rows: List[Any]) -> List[List[Any]]:
+    """Transpose row-major rows into one list per column."""
+    if not rows:
+        return [[] for _ in columns]
+    return [list(col) for col in zip(*rows)]
+
+
+def json_safe(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str, bool)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(bytes(value))} bytes>"
+    return str(value)
+
+
+_cursor_ids = itertools.count(1)
+
+
+class SQLCursor:
+    """A single open result set on its own connection."""
+
+    def __init__(self, engine, sql_text: str, page_size: int = 200, fmt: str = "columnar", guard=None):
+        self.id = f"c{next(_cursor_ids)}"
+        self.sql_text = sql_text
+        self.page_size = max(1, int(page_size or 200))
+        self.fmt = fmt
+        # Optional sql_budget.QueryGuard; enforced while executing and while fetching each page
+        self.guard = guard
+        self.columns: List[str] = []
+        self.rows_sent = 0
+        self.rowcount: Optional[int] = None
+        self.exhausted = False
+        self.closed = False
+        self.opened_at = time.time()
+        self.last_used = self.opened_at
+        self._conn = engine.connect()
+        self._result = None
+        self._peek: Optional[List[Any]] = None
+        try:
+            with self._active():
+                self._result = self._conn.exec_driver_sql(sql_text)
+            if self._result.returns_rows:
+                self.columns = list(self._result.keys())
+            else:
+                self.rowcount = self._result.rowcount
+                self.exhausted = True
+                self.close()
+        except Exception:
+            self.close(commit=False)
+            raise
+
+    def _active(self):
+        return self.guard.active(self._conn) if self.guard is not None else contextlib.nullcontext()
+
+    @property
+    def returns_rows(self) -> bool:
+        return bool(self.columns)
+
+    def fetch_page(self, page_size: Optional[int] = None, fmt: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch the next batch. Reads one row ahead so has_more is exact."""
+        fmt = fmt or self.fmt
+        if self.closed and self._peek is None:
+            return self._page([], fmt)
+        n = max(1, int(page_size or self.page_size))
+        self.last_used = time.time()
+        rows: List[Any] = []
+        if self._peek is not None:
+            rows.append(self._peek)
+            self._peek = None
+        if not self.closed:
+            try:
+                with self._active():
+                    batch = self._result.fetchmany(n + 1 - len(rows))
+            except Exception:
+                self.close(commit=False)
+                raise
+            rows.extend(batch)
+            if self.guard is not None:
+                self.guard.rows += len(batch)
+            if len(rows) > n:
+                self._peek = rows.pop()
+            else:
+                self.exhausted = True
+                self.close()
+        rows = [[json_safe(v) for v in r] for r in rows]
+        self.rows_sent += len(rows)
+        return self._page(rows, fmt)
+
+    def _page(self, rows: List[List[Any]], fmt: str) -> Dict[str, Any]:
+        page: Dict[str, Any] = {
+            "cursor_id": self.id,
+            "columns": self.columns,
+            "row_count": len(rows),
+            "rows_sent": self.rows_sent,
+            "has_more": self._peek is not None,
+        }
+        if fmt == "rows":
+            page["rows"] = rows
+        else:
+            page["data"] = columnar(self.columns, rows)
+        return page
+
+    def close(self, commit: bool = True) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._result is not None:
+                self._result.close()
+        except Exception:
+            pass
+        try:
+            if commit:
+                self._conn.commit()
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+
+class CursorRegistry:
+    """Open cursors owned by one websocket. Bounded in count and idle time."""
+
+    def __init__(self, max_open: Optional[int] = None, idle_seconds: Optional[int] = None):
+        self.max_open = max_open or env_int("CEDARPY_SQL_MAX_CURSORS", 4)
+        self.idle_seconds = idle_seconds or env_int("CEDARPY_SQL_CURSOR_IDLE_SECONDS", 120)
+        self._cursors: Dict[str, SQLCursor] = {}
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+    def add(self, cur: SQLCursor) -> None:
+        if cur.closed and cur._peek is None:
+            return
+        while len(self._cursors) >= self.max_open:
+            oldest = min(self._cursors.values(), key=lambda c: c.last_used)
+            self.close(oldest.id)
+        self._cursors[cur.id] = cur
+
+    def get(self, cursor_id: str) -> Optional[SQLCursor]:
+        return self._cursors.get(cursor_id)
+
+    def release_if_done(self, cur: SQLCursor) -> None:
+        if cur.closed and cur._peek is None:
+            self._cursors.pop(cur.id, None)
+
+    def close(self, cursor_id: str) -> bool:
+        cur = self._cursors.pop(cursor_id, None)
+        if cur is None:
+            return False
+        cur._peek = None
+        cur.close()
+        return True
+
+    def close_idle(self) -> List[str]:
+        now = time.time()
+        stale = [cid for cid, c in self._cursors.items() if now - c.last_used > self.idle_seconds]
+        for cid in stale:
+            self.close(cid)
+        return stale
+
+    def close_all(self) -> None:
+        for cid in list(self._cursors.keys()):
+            self.close(cid)
+
+
+def page_size_from(msg: Dict[str, Any], default: int = 200) -> int:
+    """Resolve the requested page size, capped by CEDARPY_SQL_MAX_PAGE_ROWS."""
+    try:
+        n = int(msg.get("page_size") or msg.get("max_rows") or default)
+    except Exception:
+        n = default
+    return max(1, min(n, env_int("CEDARPY_SQL_MAX_PAGE_ROWS", 5000)))
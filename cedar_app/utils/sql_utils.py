@@ -20,6 +20,10 @@ from ..database import registry_engine
 from main_models import SQLUndoLog, Project, Branch
 from ..ui_utils import escape
 from ..config import SHELL_API_ENABLED, SHELL_API_TOKEN
+from .schema_catalog import catalog_for_connection
+from .sql_budget import QueryBudget, QueryGuard, QueryCancelled, get_project_sql_budget
+from .sql_journal import is_journaled_statement, run_journaled
+from .query_cache import cached_read
 
 # SQL Helper Functions
 def _dialect(engine_obj=None) -> str:
@@ -41,12 +45,13 @@ def _sql_quote(val: Any) -> str:
     return "'" + s + "'"
 
 def _table_has_branch_columns(conn, table: str) -> bool:
-    """Check if table has project_id and branch_id columns."""
+    """Check if table has project_id and branch_id columns.
+    SQLite lookups go through the cached schema catalog (see schema_catalog.py).
+    """
     try:
-        if _dialect() == "sqlite":
-            rows = conn.exec_driver_sql(f"PRAGMA table_info({table})").fetchall()
-            cols = {r[1] for r in rows}
-            return "project_id" in cols and "branch_id" in cols
+        if conn.dialect.name == "sqlite":
+            t = catalog_for_connection(conn).table(table)
+            return bool(t and t.branch_aware)
         elif _dialect() == "mysql":
             rows = conn.exec_driver_sql(
                 "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
@@ -59,11 +64,11 @@ def _table_has_branch_columns(conn, table: str) -> bool:
     return False
 
 def _get_pk_columns(conn, table: str) -> List[str]:
-    """Get primary key column names for a table."""
+    """Get primary key column names for a table (cached for SQLite)."""
     try:
-        if _dialect() == "sqlite":
-            rows = conn.exec_driver_sql(f"PRAGMA table_info({table})").fetchall()
-            return [r[1] for r in rows if r[5]]  # r[5] is pk flag
+        if conn.dialect.name == "sqlite":
+            t = catalog_for_connection(conn).table(table)
+            return t.pk_columns if t else []
         elif _dialect() == "mysql":
             rows = conn.exec_driver_sql(
                 "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_KEY='PRI'",
@@ -95,33 +100,57 @@ def _preprocess_sql_branch_aware(conn, sql_text: str, project_id: int, branch_id
     return (s, False)
 
 # SQL Execution Functions
-def _execute_sql(sql_text: str, project_id: int, max_rows: int = 200) -> dict:
-    """Execute SQL against the per-project database."""
+def _execute_sql(sql_text: str, project_id: int, max_rows: int = 200, offset: int = 0, budget: Optional[QueryBudget] = None) -> dict:
+    """Execute SQL against the per-project database.
+
+    Rows are pulled with fetchmany so at most one page (plus a look-ahead row) is held in memory.
+    Pass the returned next_offset back as `offset` to read the following page.
+    The statement runs under the project's time/VM-step budget (see sql_budget); a cancelled
+    statement returns success=False with cancelled/reason/elapsed_ms/vm_steps.
+    Successful read-only results are served from the data_version-keyed cache (see query_cache).
+    """
     sql_text = (sql_text or "").strip()
     if not sql_text:
         return {"success": False, "error": "Empty SQL"}
+    result = cached_read(
+        _get_project_engine(project_id), sql_text,
+        lambda: _execute_sql_uncached(sql_text, project_id, max_rows=max_rows, offset=offset, budget=budget),
+        extra=("execute_sql", max_rows, offset),
+        should_store=lambda r: bool(r.get("success")),
+    )
+    return dict(result)
+
+def _execute_sql_uncached(sql_text: str, project_id: int, max_rows: int = 200, offset: int = 0, budget: Optional[QueryBudget] = None) -> dict:
     first = sql_text.split()[0].lower() if sql_text.split() else ""
     stype = first
     result: dict = {"success": False, "statement_type": stype}
+    guard = QueryGuard(budget or get_project_sql_budget(project_id))
     try:
-        with _get_project_engine(project_id).begin() as conn:
+        with _get_project_engine(project_id).begin() as conn, guard.active(conn):
             if first in ("select", "pragma", "show"):
                 res = conn.exec_driver_sql(sql_text)
                 cols = list(res.keys()) if res.returns_rows else []
                 rows = []
-                count = 0
+                truncated = False
                 if res.returns_rows:
-                    for r in res:
-                        rows.append([r[c] if isinstance(r, dict) else r[idx] for idx, c in enumerate(cols)])
-                        count += 1
-                        if count >= max_rows:
+                    skip = max(0, int(offset or 0))
+                    while skip > 0:
+                        batch = res.fetchmany(min(skip, 1000))
+                        if not batch:
                             break
+                        skip -= len(batch)
+                    rows = [list(r) for r in res.fetchmany(max_rows + 1)]
+                    guard.rows = len(rows)
+                    truncated = len(rows) > max_rows
+                    rows = rows[:max_rows]
+                    res.close()
                 result.update({
                     "success": True,
                     "columns": cols,
                     "rows": rows,
                     "rowcount": None,
-                    "truncated": res.returns_rows and (count >= max_rows),
+                    "truncated": truncated,
+                    "next_offset": (int(offset or 0) + len(rows)) if truncated else None,
                 })
             else:
                 res = conn.exec_driver_sql(sql_text)
@@ -129,190 +158,96 @@ def _execute_sql(sql_text: str, project_id: int, max_rows: int = 200) -> dict:
                     "success": True,
                     "rowcount": res.rowcount,
                 })
+    except QueryCancelled as e:
+        result.update({"success": False, "error": str(e), **e.report})
     except Exception as e:
         result.update({"success": False, "error": str(e)})
     return result
 
 def _execute_sql_with_undo(db: Session, sql_text: str, project_id: int, branch_id: int, max_rows: int = 200) -> dict:
-    """Execute SQL with undo logging for mutations."""
+    """Execute SQL with undo logging for mutations.
+
+    DML runs under the trigger-based journal (see sql_journal): its changeset is written to
+    sql_undo_log in the same transaction, with no pre-image SELECTs. Other statements go through
+    _execute_sql unchanged.
+    """
     s = (sql_text or "").strip()
     if not s:
         return {"success": False, "error": "Empty SQL"}
     first = s.split()[0].lower() if s.split() else ""
-    if first in ("select", "pragma", "show", "create"):
+    if not is_journaled_statement(s):
         return _execute_sql(s, project_id, max_rows=max_rows)
 
-    # Simple parse
+    # Simple parse (only used for the strict branch policy below)
     m_ins = re.match(r"insert\s+into\s+([a-zA-Z0-9_]+)\s*\(([^\)]+)\)\s*values\s*\((.+)\)\s*;?$", s, flags=re.IGNORECASE | re.DOTALL)
     m_upd = re.match(r"update\s+([a-zA-Z0-9_]+)\s+set\s+(.+?)\s*(where\s+(.+))?;?$", s, flags=re.IGNORECASE | re.DOTALL)
     m_del = re.match(r"delete\s+from\s+([a-zA-Z0-9_]+)\s*(where\s+(.+))?;?$", s, flags=re.IGNORECASE | re.DOTALL)
 
     op = None
-    table = None
     where_sql = None
     cols_list = []
-    vals_list = []
-
     if m_ins:
-        op = "insert"; table = _safe_identifier(m_ins.group(1))
+        op = "insert"
         cols_list = [c.strip() for c in m_ins.group(2).split(",")]
-        vals_list = [v.strip() for v in m_ins.group(3).split(",")]
     elif m_upd:
-        op = "update"; table = _safe_identifier(m_upd.group(1))
+        op = "update"
         where_sql = m_upd.group(4)
     elif m_del:
-        op = "delete"; table = _safe_identifier(m_del.group(1))
+        op = "delete"
         where_sql = m_del.group(3)
 
-    if not op or not table:
-        # Fallback
-        return _execute_sql(s, project_id, max_rows=max_rows)
-
-    # Only capture for manageable row counts
+    result: dict = {"success": False, "statement_type": first}
+    guard = QueryGuard(get_project_sql_budget(project_id))
     try:
-        undo_cap = int(os.getenv("CEDARPY_SQL_UNDO_MAX_ROWS", "1000"))
-    except Exception:
-        undo_cap = 1000
-
-    with _get_project_engine(project_id).begin() as conn:
-        # Strict explicit-only enforcement for branch-aware tables
-        try:
-            table_for_check = None
-            if m_ins:
-                table_for_check = _safe_identifier(m_ins.group(1))
-            elif m_upd:
-                table_for_check = _safe_identifier(m_upd.group(1))
-            elif m_del:
-                table_for_check = _safe_identifier(m_del.group(1))
-            if table_for_check:
-                if _table_has_branch_columns(conn, table_for_check):
-                    # INSERT must list both project_id and branch_id columns explicitly
-                    if m_ins:
-                        cols_ci = [c.strip().lower() for c in cols_list]
-                        missing = [c for c in ("project_id","branch_id") if c not in cols_ci]
-                        if missing:
-                            return {"success": False, "error": f"Strict branch policy: INSERT into '{table_for_check}' must explicitly include columns: {', '.join(missing)}. See BRANCH_SQL_POLICY.md"}
-                    # UPDATE/DELETE must have WHERE that references both project_id and branch_id
-                    if m_upd or m_del:
-                        where_lc = (where_sql or "").lower()
-                        if ("project_id" not in where_lc) or ("branch_id" not in where_lc):
-                            return {"success": False, "error": f"Strict branch policy: {op.upper()} on '{table_for_check}' must include WHERE with both project_id and branch_id. See BRANCH_SQL_POLICY.md"}
-        except Exception as _enf_err:
-            # Be safe: if enforcement itself errors, block the write
-            return {"success": False, "error": f"Strict branch policy check failed: {_enf_err}"}
-
-        # Determine PK columns if any
-        pk_cols = _get_pk_columns(conn, table)
-        rows_before = []
-        rows_after = []
-        created_log_id = None
-
-        if op in ("update", "delete"):
-            w = _extract_where_clause(s)
-            if w:
-                sel_sql = f"SELECT * FROM {table} WHERE {w}"
-                res = conn.exec_driver_sql(sel_sql)
-                cols = list(res.keys()) if res.returns_rows else []
-                count = 0
-                for r in res:
-                    row = {cols[i]: r[i] for i in range(len(cols))}
-                    rows_before.append(row)
-                    count += 1
-                    if count >= undo_cap: break
-
-        # Execute original statement
-        conn.exec_driver_sql(s)
-
-        if op == "insert":
-            # Try to identify inserted row
-            if pk_cols:
-                # Construct a WHERE from provided PK values if present
-                provided = {c.lower(): vals_list[i] for i, c in enumerate(cols_list)} if cols_list and vals_list else {}
-                have_pk_vals = all(pc.lower() in provided for pc in pk_cols)
-                if have_pk_vals:
-                    conds = []
-                    for pc in pk_cols:
-                        raw = provided[pc.lower()]
-                        conds.append(f"{pc} = {raw}")
-                    conds.append(f"project_id = {project_id}")
-                    conds.append(f"branch_id = {branch_id}")
-                    sel = f"SELECT * FROM {table} WHERE " + " AND ".join(conds)
-                    res2 = conn.exec_driver_sql(sel)
-                    cols2 = list(res2.keys()) if res2.returns_rows else []
-                    for r in res2:
-                        rows_after.append({cols2[i]: r[i] for i in range(len(cols2))})
-                else:
-                    # SQLite last_insert_rowid for single integer PK
-                    if _dialect(_get_project_engine(project_id)) == "sqlite" and len(pk_cols) == 1:
-                        pk = pk_cols[0]
-                        rid = conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
-                        res2 = conn.exec_driver_sql(f"SELECT * FROM {table} WHERE {pk} = {rid}")
-                        cols2 = list(res2.keys()) if res2.returns_rows else []
-                        for r in res2:
-                            rows_after.append({cols2[i]: r[i] for i in range(len(cols2))})
-        elif op == "update":
-            if where_sql:
-                res3 = conn.exec_driver_sql(f"SELECT * FROM {table} WHERE {where_sql}")
-                cols3 = list(res3.keys()) if res3.returns_rows else []
-                count = 0
-                for r in res3:
-                    rows_after.append({cols3[i]: r[i] for i in range(len(cols3))})
-                    count += 1
-                    if count >= undo_cap: break
-
-        # Done with data mutations; log insertion happens outside this transaction to avoid SQLite locking
+        with _get_project_engine(project_id).begin() as conn:
+            # Strict explicit-only enforcement for branch-aware tables
+            try:
+                table_for_check = None
+                if m_ins:
+                    table_for_check = _safe_identifier(m_ins.group(1))
+                elif m_upd:
+                    table_for_check = _safe_identifier(m_upd.group(1))
+                elif m_del:
+                    table_for_check = _safe_identifier(m_del.group(1))
+                if table_for_check:
+                    if _table_has_branch_columns(conn, table_for_check):
+                        # INSERT must list both project_id and branch_id columns explicitly
+                        if m_ins:
+                            cols_ci = [c.strip().lower() for c in cols_list]
+                            missing = [c for c in ("project_id","branch_id") if c not in cols_ci]
+                            if missing:
+                                return {"success": False, "error": f"Strict branch policy: INSERT into '{table_for_check}' must explicitly include columns: {', '.join(missing)}. See BRANCH_SQL_POLICY.md"}
+                        # UPDATE/DELETE must have WHERE that references both project_id and branch_id
+                        if m_upd or m_del:
+                            where_lc = (where_sql or "").lower()
+                            if ("project_id" not in where_lc) or ("branch_id" not in where_lc):
+                                return {"success": False, "error": f"Strict branch policy: {op.upper()} on '{table_for_check}' must include WHERE with both project_id and branch_id. See BRANCH_SQL_POLICY.md"}
+            except Exception as _enf_err:
+                # Be safe: if enforcement itself errors, block the write
+                return {"success": False, "error": f"Strict branch policy check failed: {_enf_err}"}
 
-    # Store undo log using the ORM session (separate transaction)
-    try:
-        log = SQLUndoLog(
-            project_id=project_id,
-            branch_id=branch_id,
-            table_name=table,
-            op=op,
-            sql_text=s,
-            pk_columns=pk_cols,
-            rows_before=rows_before,
-            rows_after=rows_after,
-        )
-        db.add(log)
-        # Ensure PK is assigned before commit even if expire_on_commit=True
-        db.flush()
-        try:
-            created_log_id = log.id
-        except Exception:
-            created_log_id = None
-        db.commit()
+            with guard.active(conn):
+                j = run_journaled(conn, s, project_id=project_id, branch_id=branch_id, max_rows=max_rows)
+    except QueryCancelled as e:
+        result.update({"success": False, "error": str(e), **e.report})
+        return result
     except Exception as e:
-        try:
-            print(f"[undo-log-error] {type(e).__name__}: {e}")
-        except Exception:
-            pass
-        db.rollback()
-
-    # Best-effort fallback: if we did not capture an explicit created_log_id, query the latest log for this project+branch
-    if created_log_id is None:
-        try:
-            _last = db.query(SQLUndoLog).filter(SQLUndoLog.project_id==project_id, SQLUndoLog.branch_id==branch_id).order_by(SQLUndoLog.created_at.desc(), SQLUndoLog.id.desc()).first()
-            if not _last:
-                _last = db.query(SQLUndoLog).filter(SQLUndoLog.project_id==project_id).order_by(SQLUndoLog.created_at.desc(), SQLUndoLog.id.desc()).first()
-            if _last:
-                created_log_id = _last.id
-        except Exception:
-            created_log_id = None
+        result.update({"success": False, "error": str(e)})
+        return result
 
-    # Return a generic result (we can run a SELECT for UPDATE/DELETE to show rowcount)
-    _res = _execute_sql(
-        f"SELECT changes() as affected" if _dialect(_get_project_engine(project_id)) == "sqlite" else s,
-        project_id,
-        max_rows=max_rows,
-    )
-    # Include undo_log_id when we created one
-    if created_log_id is not None:
-        try:
-            _res["undo_log_id"] = created_log_id
-        except Exception:
-            pass
-    return _res
+    affected = j["rowcount"] if j["rowcount"] is not None and j["rowcount"] >= 0 else j["changes"]
+    result.update({
+        "success": True,
+        "columns": j["columns"] or ["affected"],
+        "rows": j["rows"] if j["columns"] else [[affected]],
+        "rowcount": affected,
+        "truncated": False,
+    })
+    if j.get("undo_log_id") is not None:
+        result["undo_log_id"] = j["undo_log_id"]
+    if j.get("undo_skipped"):
+        result["undo_skipped"] = j["undo_skipped"]
+    return result
 
 # Result rendering
 def _render_sql_result_html(result: dict) -> str:
@@ -407,7 +342,12 @@ async def handle_sql_websocket(websocket: WebSocket, project_id: int):
                 max_rows = int(payload.get("max_rows", int(os.getenv("CEDARPY_SQL_MAX_ROWS", "200")))) if isinstance(payload, dict) else int(os.getenv("CEDARPY_SQL_MAX_ROWS", "200"))
             except Exception:
                 max_rows = 200
-            result = _execute_sql(sql_text, project_id, max_rows=max_rows)
+            try:
+                offset = int(payload.get("offset") or 0) if isinstance(payload, dict) else 0
+            except Exception:
+                offset = 0
+            budget = get_project_sql_budget(project_id).override(payload if isinstance(payload, dict) else None)
+            result = _execute_sql(sql_text, project_id, max_rows=max_rows, offset=offset, budget=budget)
             out = {
                 "ok": bool(result.get("success")),
                 "statement_type": result.get("statement_type"),
@@ -415,6 +355,9 @@ async def handle_sql_websocket(websocket: WebSocket, project_id: int):
                 "rows": result.get("rows"),
                 "rowcount": result.get("rowcount"),
                 "truncated": result.get("truncated"),
+                "next_offset": result.get("next_offset"),
+                "cancelled": result.get("cancelled"),
+                "elapsed_ms": result.get("elapsed_ms"),
                 "error": None if result.get("success") else result.get("error"),
             }
         except Exception as e:
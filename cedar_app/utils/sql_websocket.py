@@ -13,7 +13,10 @@ from sqlalchemy.orm import sessionmaker, Session
 
 from ..db_utils import ensure_project_initialized, _get_project_engine
 from ..changelog_utils import record_changelog
-from main_models import Branch
+from .sql_stream import SQLCursor, CursorRegistry, is_read_statement, page_size_from
+from .sql_budget import QueryGuard, QueryCancelled, get_project_sql_budget
+from .sql_journal import is_journaled_statement, run_journaled, find_undo_log, undo_changeset_log
+from main_models import Branch, ChangelogEntry
 from main_helpers import add_version
 
 
@@ -21,8 +24,18 @@ async def ws_sqlx(websocket: WebSocket, project_id: int):
     """
     WebSocket SQL with undo and branch context.
     Message format:
-     - { "action": "exec", "sql": "...", "branch_id": 2 | null, "branch_name": "Main" | null, "max_rows": 200 }
-     - { "action": "undo_last", "branch_id": 2 | null, "branch_name": "Main" | null }
+     - { "action": "exec", "sql": "...", "branch_id": 2 | null, "branch_name": "Main" | null, "max_rows": 200,
+         "page_size": 200, "format": "rows" | "columnar" }
+     - { "action": "next", "cursor_id": "c1", "page_size": 500 }
+     - { "action": "cancel", "cursor_id": "c1" | null }   (no cursor_id: interrupt the running statement)
+     - { "action": "undo_last", "log_id": 17 | null, "branch_id": 2 | null }
+
+    exec accepts "timeout_ms" / "max_steps" to override the project's default budget (see sql_budget).
+    Statements run on a worker thread so cancel is handled while a query is executing.
+
+    DML is captured by the trigger-based undo journal (sql_journal); the exec reply carries last_log_id.
+    Read statements run on a server-side cursor: the exec reply carries the first page and, when more
+    rows remain, a cursor_id with has_more=true. Further pages are pulled with "next" (see sql_stream).
     """
     # Check if shell API is enabled (security check)
     SHELL_API_ENABLED = os.getenv("CEDARPY_SHELL_API_ENABLED", "").strip() == "1"
@@ -80,122 +93,244 @@ async def ws_sqlx(websocket: WebSocket, project_id: int):
         add_version(db, "branch", main.id, {"project_id": project_id, "name": "Main", "is_default": True})
         return main.id
 
-    # Track undo stack
-    undo_stack = []
+    # Undo log ids written by this socket (most recent last)
+    last_log_ids: list = []
+    # Open result cursors for this socket (bounded; closed on disconnect)
+    cursors = CursorRegistry()
+    default_budget = get_project_sql_budget(project_id)
+    # Statement currently running on the worker thread, so "cancel" can interrupt it out of band
+    running: Dict[str, Any] = {"guard": None, "cursor_id": None}
+    pending: asyncio.Queue = asyncio.Queue()
 
-    while True:
+    def _cancelled_response(e: QueryCancelled, **extra) -> Dict[str, Any]:
+        return {"ok": False, "error": str(e), **e.report, **extra}
+
+    def _handle_next(msg: Dict[str, Any]) -> Dict[str, Any]:
+        cur = cursors.get(str(msg.get("cursor_id") or ""))
+        if cur is None:
+            return {"ok": False, "error": "Unknown or closed cursor"}
+        running.update(guard=cur.guard, cursor_id=cur.id)
         try:
-            raw = await websocket.receive_text()
-            try:
-                msg = json.loads(raw)
-            except Exception:
-                await websocket.send_text(json.dumps({"error": "Invalid JSON"}))
-                continue
+            page = cur.fetch_page(msg.get("page_size"))
+            response = {"ok": True, "type": "sql.page", **page, "truncated": page["has_more"]}
+        except QueryCancelled as e:
+            cursors.close(cur.id)
+            response = _cancelled_response(e, cursor_id=cur.id, rows_sent=cur.rows_sent)
+        except Exception as e:
+            cursors.close(cur.id)
+            response = {"ok": False, "cursor_id": cur.id, "error": f"{type(e).__name__}: {str(e)}"}
+        cursors.release_if_done(cur)
+        return response
 
-            action = msg.get("action", "exec")
-            
-            if action == "exec":
-                sql_text = msg.get("sql", "").strip()
-                if not sql_text:
-                    await websocket.send_text(json.dumps({"error": "SQL is required"}))
-                    continue
+    def _handle_cancel_cursor(msg: Dict[str, Any]) -> Dict[str, Any]:
+        cid = str(msg.get("cursor_id") or "")
+        cur = cursors.get(cid)
+        rows_sent = cur.rows_sent if cur is not None else None
+        closed = cursors.close(cid)
+        return {"ok": closed, "type": "sql.cancelled", "cursor_id": cid, "rows_sent": rows_sent}
 
-                max_rows = msg.get("max_rows", 200)
-                branch_id_input = msg.get("branch_id")
-                branch_name_input = msg.get("branch_name")
+    def _handle_exec(msg: Dict[str, Any]) -> Dict[str, Any]:
+        sql_text = msg.get("sql", "").strip()
+        if not sql_text:
+            return {"error": "SQL is required"}
 
-                db = SessionLocal()
+        page_size = page_size_from(msg)
+        fmt = "columnar" if msg.get("format") == "columnar" else "rows"
+        branch_id_input = msg.get("branch_id")
+        branch_name_input = msg.get("branch_name")
+        guard = QueryGuard(default_budget.override(msg))
+        running.update(guard=guard, cursor_id=None)
+
+        db = SessionLocal()
+        try:
+            branch_id = _resolve_branch_id(db, branch_id_input, branch_name_input)
+            
+            # Execute SQL
+            eng = _get_project_engine(project_id)
+            if is_read_statement(sql_text):
+                # Stream from a server-side cursor; only one page is held in memory
+                cur = SQLCursor(eng, sql_text, page_size=page_size, fmt=fmt, guard=guard)
+                if cur.returns_rows:
+                    running["cursor_id"] = cur.id
+                    page = cur.fetch_page()
+                    cursors.add(cur)
+                    response = {"ok": True, "type": "sql.page", **page, "truncated": page["has_more"]}
+                else:
+                    response = {"ok": True, "rowcount": cur.rowcount, "message": "Query executed successfully."}
+                # Reads are logged once per exec with the first page; "next" pages are not logged
                 try:
-                    branch_id = _resolve_branch_id(db, branch_id_input, branch_name_input)
-                    
-                    # Execute SQL
-                    eng = _get_project_engine(project_id)
-                    with eng.begin() as conn:
+                    record_changelog(db, project_id, branch_id, "sql.exec", {"sql": sql_text}, response, ChangelogEntry=ChangelogEntry)
+                except Exception:
+                    pass
+                return response
+
+            # Our own open cursors hold read locks; release them before writing
+            cursors.close_all()
+            with eng.begin() as conn:
+                with guard.active(conn):
+                    if is_journaled_statement(sql_text):
+                        # DML: changeset captured by the undo journal in this same transaction
+                        j = run_journaled(conn, sql_text, project_id=project_id, branch_id=branch_id, max_rows=page_size)
+                        result_cols, result_rows, rowcount = j["columns"], j["rows"], j["rowcount"]
+                        if j.get("undo_log_id") is not None:
+                            last_log_ids.append(j["undo_log_id"])
+                    else:
                         result = conn.exec_driver_sql(sql_text)
-                        
-                        # Check if this is a query that returns rows
-                        if hasattr(result, 'returns_rows') and result.returns_rows:
-                            cols = list(result.keys()) if hasattr(result, 'keys') else []
-                            rows = []
-                            for i, row in enumerate(result.fetchall()):
-                                if i >= max_rows:
-                                    break
-                                rows.append(list(row))
-                            
-                            response = {
-                                "ok": True,
-                                "columns": cols,
-                                "rows": rows,
-                                "row_count": len(rows),
-                                "truncated": len(rows) >= max_rows
-                            }
-                        else:
-                            # For non-SELECT queries
-                            rowcount = result.rowcount if hasattr(result, 'rowcount') else 0
-                            response = {
-                                "ok": True,
-                                "rowcount": rowcount,
-                                "message": f"Query executed successfully. {rowcount} row(s) affected."
-                            }
-                    
-                    # Track for undo if it's a modifying statement
-                    if sql_text.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER')):
-                        undo_stack.append({
-                            "sql": sql_text,
-                            "branch_id": branch_id,
-                            "timestamp": datetime.utcnow().isoformat()
-                        })
-                        # Keep only last 20 operations
-                        if len(undo_stack) > 20:
-                            undo_stack.pop(0)
-                    
-                    # Record in changelog
-                    try:
-                        record_changelog(db, project_id, branch_id, "sql.exec", {"sql": sql_text}, response)
-                    except Exception:
-                        pass
+                        result_cols = list(result.keys()) if result.returns_rows else []
+                        result_rows = [list(row) for row in result.fetchmany(page_size)] if result_cols else []
+                        rowcount = result.rowcount
+                        j = {}
                     
-                    await websocket.send_text(json.dumps(response))
-                
-                except Exception as e:
-                    await websocket.send_text(json.dumps({
-                        "ok": False,
-                        "error": f"{type(e).__name__}: {str(e)}"
-                    }))
-                
-                finally:
-                    db.close()
+                    # Check if this is a query that returns rows (e.g. RETURNING)
+                    if result_cols:
+                        response = {
+                            "ok": True,
+                            "columns": result_cols,
+                            "rows": result_rows,
+                            "row_count": len(result_rows),
+                            "truncated": len(result_rows) >= page_size
+                        }
+                    else:
+                        # For non-SELECT queries
+                        response = {
+                            "ok": True,
+                            "rowcount": rowcount,
+                            "message": f"Query executed successfully. {rowcount} row(s) affected."
+                        }
+                    if j.get("undo_log_id") is not None:
+                        response["last_log_id"] = j["undo_log_id"]
+                    if j.get("undo_skipped"):
+                        response["undo_skipped"] = j["undo_skipped"]
+            
+            # Record in changelog
+            try:
+                record_changelog(db, project_id, branch_id, "sql.exec", {"sql": sql_text}, response, ChangelogEntry=ChangelogEntry)
+            except Exception:
+                pass
             
-            elif action == "undo_last":
-                if not undo_stack:
-                    await websocket.send_text(json.dumps({
+            return response
+
+        except QueryCancelled as e:
+            print(f"[ws-sqlx] cancelled reason={e.report.get('reason')} elapsed_ms={e.report.get('elapsed_ms')} steps={e.report.get('vm_steps')}")
+            return _cancelled_response(e)
+        except Exception as e:
+            return {
+                "ok": False,
+                "error": f"{type(e).__name__}: {str(e)}"
+            }
+        finally:
+            db.close()
+
+    def _handle_undo(msg: Dict[str, Any]) -> Dict[str, Any]:
+        # Undo a journaled statement: the given log_id, else this socket's last write,
+        # else the most recent one on the branch
+        log_id = msg.get("log_id") or (last_log_ids[-1] if last_log_ids else None)
+        branch_id = msg.get("branch_id")
+        cursors.close_all()
+        try:
+            with _get_project_engine(project_id).begin() as conn:
+                log_row = find_undo_log(conn, project_id, log_id=log_id, branch_id=branch_id)
+                if log_row is None:
+                    return {
                         "ok": False,
                         "error": "No operations to undo"
-                    }))
+                    }
+                reverted = undo_changeset_log(conn, log_row)
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {str(e)}"}
+        if log_row.id in last_log_ids:
+            last_log_ids.remove(log_row.id)
+        db = SessionLocal()
+        try:
+            record_changelog(db, project_id, log_row.branch_id, "sql.undo", {"log_id": log_row.id, "sql": log_row.sql_text}, {"reverted": reverted},
+                             ChangelogEntry=ChangelogEntry)
+        except Exception:
+            pass
+        finally:
+            db.close()
+        return {
+            "ok": True,
+            "log_id": log_row.id,
+            "reverted": reverted,
+            "message": f"Undid {reverted} row change(s) on {log_row.table_name}"
+        }
+
+    def _handle(msg: Dict[str, Any]) -> Dict[str, Any]:
+        action = msg.get("action", "exec")
+        for cid in cursors.close_idle():
+            print(f"[ws-sqlx] closed idle cursor {cid}")
+        try:
+            if action == "exec":
+                return _handle_exec(msg)
+            if action == "next":
+                return _handle_next(msg)
+            if action == "cancel":
+                return _handle_cancel_cursor(msg)
+            if action == "undo_last":
+                return _handle_undo(msg)
+            return {
+                "ok": False,
+                "error": f"Unknown action: {action}"
+            }
+        finally:
+            running.update(guard=None, cursor_id=None)
+
+    async def _worker():
+        # Statements run one at a time, in order, off the event loop
+        while True:
+            msg = await pending.get()
+            if msg is None:
+                return
+            try:
+                response = await asyncio.to_thread(_handle, msg)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {str(e)}"}
+            try:
+                await websocket.send_text(json.dumps(response))
+            except Exception:
+                return
+
+    worker = asyncio.create_task(_worker())
+
+    while True:
+        try:
+            raw = await websocket.receive_text()
+            try:
+                msg = json.loads(raw)
+            except Exception:
+                await websocket.send_text(json.dumps({"error": "Invalid JSON"}))
+                continue
+
+            if msg.get("action") == "cancel":
+                # Interrupt the running statement now; the statement's own reply reports the cancellation
+                cid = msg.get("cursor_id")
+                guard = running["guard"]
+                if guard is not None and (not cid or cid == running["cursor_id"]):
+                    guard.cancel()
+                    if not cid:
+                        continue
+                if not cid:
+                    await websocket.send_text(json.dumps({"ok": False, "error": "Nothing to cancel"}))
                     continue
-                
-                # Pop the last operation
-                last_op = undo_stack.pop()
-                
-                # For now, just acknowledge the undo
-                # A real implementation would need to track inverse operations
-                await websocket.send_text(json.dumps({
-                    "ok": True,
-                    "message": f"Undo not implemented. Would undo: {last_op['sql'][:50]}...",
-                    "undone_operation": last_op
-                }))
-            
-            else:
-                await websocket.send_text(json.dumps({
-                    "ok": False,
-                    "error": f"Unknown action: {action}"
-                }))
+            pending.put_nowait(msg)
         
         except Exception as e:
             # Connection closed or other error
             break
     
+    # Drop queued statements, interrupt the running one, then let the worker exit
+    while not pending.empty():
+        pending.get_nowait()
+    guard = running["guard"]
+    if guard is not None:
+        guard.cancel()
+    pending.put_nowait(None)
+    try:
+        await worker
+    except Exception:
+        pass
+    cursors.close_all()
     try:
         await websocket.close()
     except Exception:
-        pass
\ No newline at end of file
+        pass
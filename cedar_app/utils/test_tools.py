@@ -5,10 +5,8 @@ Handles API endpoints for testing tool execution.
 
 import json
 import base64
-import io
 import sqlite3
 import re
-import contextlib
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from fastapi import Request, Depends
@@ -16,6 +14,7 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from ..db_utils import ensure_project_initialized, _get_project_engine, get_project_db
+from .code_sandbox import run_code
 from main_models import (
     Project, Branch, FileEntry, Note
 )
@@ -223,48 +222,26 @@ def _exec_code_tool(project_id: int, branch: Any, args: dict, db: Session) -> JS
             except:
                 return None
     
-    # Execute code
+    # Execute code in a sandbox worker process; cedar.* calls are answered here over RPC
     cedar = CedarHelper()
-    output_buffer = io.StringIO()
-    
-    # Restricted globals
-    safe_globals = {
-        "__builtins__": {
-            "print": lambda *args, **kwargs: print(*args, file=output_buffer, **kwargs),
-            "len": len,
-            "range": range,
-            "str": str,
-            "int": int,
-            "float": float,
-            "bool": bool,
-            "list": list,
-            "dict": dict,
-            "set": set,
-            "tuple": tuple,
-        },
-        "cedar": cedar,
-        "json": json,
-        "re": re,
-        "io": io,
-    }
-    
-    try:
-        with contextlib.redirect_stdout(output_buffer):
-            exec(compile(source, "<test_code>", "exec"), safe_globals, safe_globals)
-        
-        output = output_buffer.getvalue()
+    res = run_code(
+        source,
+        helpers={"query": cedar.query, "list_files": cedar.list_files, "read": cedar.read},
+        filename="<test_code>",
+        builtins=["print", "len", "range", "str", "int", "float", "bool", "list", "dict", "set", "tuple"],
+        modules=["json", "re", "io"],
+    )
+    if res.get("ok"):
         return JSONResponse({
             "ok": True,
-            "output": output,
+            "output": res.get("stdout") or "",
             "language": language
         })
-    
-    except Exception as e:
-        return JSONResponse({
-            "ok": False,
-            "error": f"{type(e).__name__}: {str(e)}",
-            "output": output_buffer.getvalue()
-        })
+    return JSONResponse({
+        "ok": False,
+        "error": res.get("error"),
+        "output": res.get("stdout") or ""
+    })
 
 
 def _exec_notes_tool(project_id: int, branch: Any, args: dict, db: Session) -> JSONResponse:
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 
 from ..db_utils import ensure_project_initialized
 from ..llm_utils import llm_client_config as _llm_client_config
+from ..llm.usage_ledger import llm_usage
 from ..changelog_utils import record_changelog
 from main_models import (
     Project, Branch, Thread, ThreadMessage, FileEntry, 
@@ -261,7 +262,8 @@ print('imported rows:', len(df))'''
             messages.append({"role": "user", "content": "Functions and examples:"})
             messages.append({"role": "user", "content": json.dumps(examples_json, ensure_ascii=False)})
             messages.append({"role": "user", "content": content})
-            resp = client.chat.completions.create(model=model, messages=messages)
+            with llm_usage("thread_chat", project_id=project.id, thread=f"thread:{thr.id}"):
+                resp = client.chat.completions.create(model=model, messages=messages)
             raw = (resp.choices[0].message.content or "").strip()
             try:
                 parsed = json.loads(raw)
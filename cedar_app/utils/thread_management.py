@@ -107,6 +107,7 @@ def api_chat_cancel_summary(app, payload: Dict[str, Any]):
     from ..llm_utils import llm_client_config as _llm_client_config
     from ..changelog_utils import record_changelog as _record_changelog_base
     from ..llm_utils import llm_summarize_action as _llm_summarize_action
+    from ..llm.usage_ledger import llm_usage
     
     try:
         project_id = int(payload.get("project_id"))
@@ -161,10 +162,11 @@ def api_chat_cancel_summary(app, payload: Dict[str, Any]):
                     {"role": "user", "content": _json.dumps(prompt_messages, ensure_ascii=False)},
                     {"role": "user", "content": "Output STRICT plain text, each bullet starting with •"},
                 ]
-                resp = client.chat.completions.create(
-                    model=(os.getenv("CEDARPY_SUMMARY_MODEL", "gpt-4-mini")), 
-                    messages=messages
-                )
+                with llm_usage("cancel_summary", project_id=project_id, thread=f"thread:{thread_id}"):
+                    resp = client.chat.completions.create(
+                        model=(os.getenv("CEDARPY_SUMMARY_MODEL", "gpt-4-mini")), 
+                        messages=messages
+                    )
                 summary_text = (resp.choices[0].message.content or "").strip()
             except Exception as e:
                 try:
@@ -0,0 +1,720 @@
+"""
+Structured tracing of chat orchestrations.
+
+A question that takes 40 seconds used to leave only free-form log lines behind. Every chat message now
+gets a trace (one trace id per query) made of nested spans:
+
+    chat.message                      ws_chat: project, branch, chat number
+      orchestrate                     fast path, budget totals
+        iteration                     one per Chief Agent loop
+          think
+          agent.<Name>                one per agent task (deadline, memo reuse)
+            llm.chat                  every gateway call: model, tokens, cache hit
+            tool.shell / tool.python  subprocess and sandbox runs
+            http.get                  downloads
+            db.query                  SQLAlchemy statements (any engine)
+          chief.review
+          ws.send                     websocket messages (streamed deltas are only counted)
+
+Spans are kept in memory while the trace runs. When the root span ends the trace is queued, and a
+background writer thread stores the queued traces in one transaction each to a local SQLite store
+and prunes the oldest ones beyond CEDARPY_TRACE_MAX_TRACES, so the event loop never waits on the
+disk. Reads (get, list, snapshot) write the queue first, so a trace is visible as soon as it ends. With
+CEDARPY_TRACE_OTLP_DIR set, each finished trace is also written as an OTLP/JSON file
+(<trace_id>.json, the ExportTraceServiceRequest format that OpenTelemetry collectors accept).
+
+Code outside a trace (background file processing, plain HTTP requests) records nothing, so the
+instrumentation costs a context variable lookup there. For streamed LLM calls the llm.chat span
+ends when the stream is returned; the consuming span (chief.review) covers the rest.
+
+timeline(trace) lays the spans out for the waterfall view (/traces/<trace_id>) and marks the critical
+path: starting at the root, the child that ends last is on the path, then the child that ends last
+before that one started, and so on recursively. Critical-path time is broken down by span category.
+
+Configuration:
+  CEDARPY_TRACING             (default 1; 0 disables tracing)
+  CEDARPY_TRACE_PATH          (default DATA_DIR/cache/traces.sqlite)
+  CEDARPY_TRACE_MAX_TRACES    (default 500)
+  CEDARPY_TRACE_MAX_SPANS     (default 5000 per trace; further spans are counted, not kept)
+  CEDARPY_TRACE_FLUSH_S       (default 1.0; how often the writer stores queued traces; 0 = synchronously)
+  CEDARPY_TRACE_OTLP_DIR      (unset: no OTLP export)
+
+Usage:
+    with trace("chat.message", project_id=3):
+        with span("think"):
+            ...
+        await traced("agent.SQLAgent", agent.process(task))
+
+    @instrument("tool.shell", kind="client", attributes=lambda command, **kw: {"command": command})
+    async def run_shell(command, ...): ...
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import atexit
+import uuid
+import sqlite3
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from cedar_app.env_utils import env_float, env_int
+
+# Websocket message types that are sent many times per answer; they are counted on the enclosing
+# span instead of getting a span each
+_COUNTED_WS_TYPES = {"final_delta", "agent_stream", "pong"}
+_MAX_ATTR_CHARS = 500
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+
+def tracing_enabled() -> bool:
+    return str(os.getenv("CEDARPY_TRACING", "1")).strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _attr(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str) if isinstance(value, (dict, list, tuple)) else str(value)
+    return text if len(text) <= _MAX_ATTR_CHARS else text[:_MAX_ATTR_CHARS] + "…"
+
+
+@dataclass
+class Span:
+    trace: "Trace"
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    kind: str = "internal"
+    start_ns: int = 0
+    end_ns: Optional[int] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes: Any) -> "Span":
+        for k, v in attributes.items():
+            if v is not None:
+                self.attributes[k] = _attr(v)
+        return self
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.attributes[name] = int(self.attributes.get(name) or 0) + n
+
+    def fail(self, exc: BaseException) -> None:
+        self.status = "cancelled" if isinstance(exc, asyncio.CancelledError) else "error"
+        self.attributes["error"] = _attr(f"{type(exc).__name__}: {exc}")
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            self.trace.finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name, "kind": self.kind,
+            "start_ns": self.start_ns, "end_ns": self.end_ns, "status": self.status, "attributes": dict(self.attributes),
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes: Any) -> "_NoopSpan":
+        return self
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def fail(self, exc: BaseException) -> None:
+        pass
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, max_spans: Optional[int] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.max_spans = env_int("CEDARPY_TRACE_MAX_SPANS", 5000) if max_spans is None else max_spans
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def start(self, name: str, parent: Optional[Span], kind: str = "internal", start_ns: Optional[int] = None,
+              attributes: Optional[Dict[str, Any]] = None) -> Span:
+        s = Span(trace=self, name=name, span_id=uuid.uuid4().hex[:16], parent_id=parent.span_id if parent else None,
+                 kind=kind, start_ns=start_ns or time.time_ns())
+        s.set(**(attributes or {}))
+        if self.root is None:
+            self.root = s
+        return s
+
+    def finish(self, s: Span) -> None:
+        with self._lock:
+            if len(self.spans) < self.max_spans or s is self.root:
+                self.spans.append(s)
+            else:
+                self.dropped += 1
+        if s is self.root:
+            if self.dropped:
+                s.attributes["dropped_spans"] = self.dropped
+            _on_trace_end(self)
+
+
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("cedar_trace_span", default=None)
+
+
+def get_current_span():
+    return current_span.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    s = current_span.get()
+    return s.trace_id if s is not None else None
+
+
+@contextmanager
+def _activate(s: Span) -> Iterator[Span]:
+    token = current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            s.fail(e)
+        raise
+    finally:
+        current_span.reset(token)
+        s.end()
+
+
+@contextmanager
+def trace(name: str, kind: str = "server", **attributes: Any):
+    """Start a trace (or, inside one, a span) that covers this block."""
+    parent = current_span.get()
+    if parent is not None:
+        with _activate(parent.trace.start(name, parent, "internal", attributes=attributes)) as s:
+            yield s
+        return
+    if not tracing_enabled():
+        yield NOOP_SPAN
+        return
+    with _activate(Trace().start(name, None, kind, attributes=attributes)) as s:
+        yield s
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any):
+    """A child span of the current one; records nothing outside a trace."""
+    parent = current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _activate(parent.trace.start(name, parent, kind, attributes=attributes)) as s:
+        yield s
+
+
+async def traced(name: str, aw, kind: str = "internal", **attributes: Any):
+    """Await aw inside a span. Use it around coroutines handed to ensure_future/gather, so the span
+    is opened inside the task and covers exactly its run time."""
+    with span(name, kind, **attributes):
+        return await aw
+
+
+def record_span(name: str, start_ns: int, end_ns: int, kind: str = "internal", status: str = "ok", **attributes: Any) -> None:
+    """Record an already finished span under the current one (used by callbacks such as SQLAlchemy events)."""
+    parent = current_span.get()
+    if parent is None:
+        return
+    s = parent.trace.start(name, parent, kind, start_ns=start_ns, attributes=attributes)
+    s.status = status
+    s.end(end_ns)
+
+
+def instrument(name: str, kind: str = "internal", attributes: Optional[Callable[..., Dict[str, Any]]] = None,
+               result_attributes: Optional[Callable[[Any], Dict[str, Any]]] = None):
+    """Decorator: run the (sync or async) function in a span. attributes(*args, **kwargs) and
+    result_attributes(result) add span attributes; they are only called inside a trace."""
+    def _attrs(fn_attrs, *args, **kwargs):
+        try:
+            return fn_attrs(*args, **kwargs) or {}
+        except Exception:
+            return {}
+
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if current_span.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name, kind, **(_attrs(attributes, *args, **kwargs) if attributes else {})) as s:
+                    result = await fn(*args, **kwargs)
+                    if result_attributes:
+                        s.set(**_attrs(result_attributes, result))
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, kind, **(_attrs(attributes, *args, **kwargs) if attributes else {})) as s:
+                result = fn(*args, **kwargs)
+                if result_attributes:
+                    s.set(**_attrs(result_attributes, result))
+                return result
+        return wrapper
+    return decorate
+
+
+class TracedWebSocket:
+    """Websocket proxy: each send_json becomes a ws.send span (streamed deltas are counted on the
+    current span) and the final answer carries the trace id, so the UI can link to its timeline."""
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    async def send_json(self, data):
+        msg_type = data.get("type") if isinstance(data, dict) else None
+        trace_id = current_trace_id()
+        if trace_id is None:
+            return await self._ws.send_json(data)
+        if msg_type == "final":
+            data = dict(data, trace_id=trace_id)
+        if msg_type in _COUNTED_WS_TYPES:
+            current_span.get().count(f"ws.{msg_type}")
+            return await self._ws.send_json(data)
+        with span("ws.send", "producer", type=msg_type):
+            return await self._ws.send_json(data)
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+
+# ----------------------------------------------------------------------------------
+# SQLAlchemy
+# ----------------------------------------------------------------------------------
+
+_sqlalchemy_instrumented = False
+
+
+def instrument_sqlalchemy() -> bool:
+    """Record a db.query span for every statement executed inside a trace, on any engine."""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return True
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+    except Exception:
+        return False
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if current_span.get() is not None:
+            conn.info.setdefault("cedar_trace_starts", []).append(time.time_ns())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("cedar_trace_starts")
+        if current_span.get() is None or not starts:
+            return
+        start = starts.pop()
+        rows = getattr(cursor, "rowcount", None)
+        record_span("db.query", start, time.time_ns(), kind="client", statement=" ".join(str(statement).split()),
+                    database=str(conn.engine.url.database or "").rsplit(os.sep, 1)[-1],
+                    rows=rows if isinstance(rows, int) and rows >= 0 else None)
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(exception_context):
+        try:
+            starts = exception_context.connection.info.get("cedar_trace_starts") if exception_context.connection is not None else None
+            if starts and current_span.get() is not None:
+                record_span("db.query", starts.pop(), time.time_ns(), kind="client", status="error",
+                            statement=" ".join(str(exception_context.statement or "").split()),
+                            error=f"{type(exception_context.original_exception).__name__}: {exception_context.original_exception}")
+        except Exception:
+            pass
+
+    _sqlalchemy_instrumented = True
+    return True
+
+
+# ----------------------------------------------------------------------------------
+# Export and timeline
+# ----------------------------------------------------------------------------------
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for a stored trace (see TraceStore.get)."""
+    spans = []
+    for s in trace_dict.get("spans", []):
+        item = {
+            "traceId": trace_dict["trace_id"],
+            "spanId": s["span_id"],
+            "name": s["name"],
+            "kind": _OTLP_KINDS.get(s.get("kind") or "internal", 1),
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["end_ns"] or s["start_ns"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in (s.get("attributes") or {}).items() if v is not None],
+            "status": {"code": 2, "message": str((s.get("attributes") or {}).get("error", ""))} if s.get("status") == "error" else {"code": 1},
+        }
+        if s.get("parent_id"):
+            item["parentSpanId"] = s["parent_id"]
+        spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "cedarpy"}}]},
+        "scopeSpans": [{"scope": {"name": "cedar_app.utils.tracing"}, "spans": spans}],
+    }]}
+
+
+def _category(name: str) -> str:
+    head = name.split(".", 1)[0]
+    return {"llm": "llm", "tool": "tool", "http": "http", "db": "db", "ws": "websocket", "agent": "agent",
+            "chief": "chief"}.get(head, "other")
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[str]:
+    """Span ids on the critical path of the trace, root first."""
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        parent = s.get("parent_id") if s.get("parent_id") in by_id else None
+        children.setdefault(parent, []).append(s)
+    roots = children.get(None, [])
+    if not roots:
+        return []
+    path: List[str] = []
+
+    def walk(s: Dict[str, Any]) -> None:
+        path.append(s["span_id"])
+        cursor = s["end_ns"] or s["start_ns"]
+        chosen = []
+        for child in sorted(children.get(s["span_id"], []), key=lambda c: c["end_ns"] or c["start_ns"], reverse=True):
+            if (child["end_ns"] or child["start_ns"]) <= cursor:
+                chosen.append(child)
+                cursor = child["start_ns"]
+        for child in reversed(chosen):
+            walk(child)
+
+    walk(min(roots, key=lambda s: s["start_ns"]))
+    return path
+
+
+def timeline(trace_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Spans in waterfall order (depth-first by start time) with offsets, depth, the critical path
+    and how the critical path's time splits across span categories."""
+    spans = trace_dict.get("spans", [])
+    if not spans:
+        return {"duration_ms": 0.0, "rows": [], "critical_path": [], "critical_ms_by_category": {}}
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        parent = s.get("parent_id") if s.get("parent_id") in by_id else None
+        children.setdefault(parent, []).append(s)
+    t0 = min(s["start_ns"] for s in spans)
+    t1 = max(s["end_ns"] or s["start_ns"] for s in spans)
+    crit = critical_path(spans)
+    on_path = set(crit)
+
+    # Self time on the path: a span's duration minus the time covered by its children on the path
+    by_category: Dict[str, float] = {}
+    for sid in crit:
+        s = by_id[sid]
+        dur = (s["end_ns"] or s["start_ns"]) - s["start_ns"]
+        covered = sum((c["end_ns"] or c["start_ns"]) - c["start_ns"] for c in children.get(sid, []) if c["span_id"] in on_path)
+        cat = _category(s["name"])
+        by_category[cat] = by_category.get(cat, 0.0) + max(0, dur - covered) / 1e6
+
+    rows = []
+
+    def walk(s: Dict[str, Any], depth: int) -> None:
+        end = s["end_ns"] or s["start_ns"]
+        rows.append({
+            "span_id": s["span_id"], "name": s["name"], "depth": depth, "kind": s.get("kind"), "status": s.get("status"),
+            "offset_ms": round((s["start_ns"] - t0) / 1e6, 3), "duration_ms": round((end - s["start_ns"]) / 1e6, 3),
+            "critical": s["span_id"] in on_path, "category": _category(s["name"]), "attributes": s.get("attributes") or {},
+        })
+        for child in sorted(children.get(s["span_id"], []), key=lambda c: c["start_ns"]):
+            walk(child, depth + 1)
+
+    for root in sorted(children.get(None, []), key=lambda s: s["start_ns"]):
+        walk(root, 0)
+    return {
+        "duration_ms": round((t1 - t0) / 1e6, 3),
+        "rows": rows,
+        "critical_path": crit,
+        "critical_ms_by_category": {k: round(v, 3) for k, v in sorted(by_category.items(), key=lambda kv: -kv[1])},
+    }
+
+
+# ----------------------------------------------------------------------------------
+# Store
+# ----------------------------------------------------------------------------------
+
+def _default_path() -> str:
+    from cedar_app.config import DATA_DIR
+    return os.path.join(DATA_DIR, "cache", "traces.sqlite")
+
+
+class TraceStore:
+    def __init__(self, path: Optional[str] = None, max_traces: Optional[int] = None, otlp_dir: Optional[str] = None,
+                 flush_s: Optional[float] = None):
+        self._path = path
+        self.max_traces = env_int("CEDARPY_TRACE_MAX_TRACES", 500) if max_traces is None else max_traces
+        self._otlp_dir = otlp_dir
+        self.flush_s = env_float("CEDARPY_TRACE_FLUSH_S", 1.0) if flush_s is None else flush_s
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        self._flush_lock = threading.RLock()  # readers wait for a flush in progress (re-entered by export_otlp)
+        self._pending: List[Trace] = []
+        self._writer: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._broken = False
+        self.stats = {"traces": 0, "spans": 0, "exported": 0, "pruned": 0, "errors": 0, "queued": 0}
+
+    @property
+    def path(self) -> str:
+        return self._path or os.getenv("CEDARPY_TRACE_PATH") or _default_path()
+
+    @property
+    def otlp_dir(self) -> Optional[str]:
+        return self._otlp_dir or os.getenv("CEDARPY_TRACE_OTLP_DIR") or None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Open lazily; caller holds the lock. After an open failure the store stays off."""
+        if self._conn is not None or self._broken:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS traces ("
+                " trace_id TEXT PRIMARY KEY, name TEXT, start_ns INTEGER NOT NULL, duration_ms REAL, status TEXT,"
+                " project_id INTEGER, branch_id INTEGER, chat_number INTEGER, span_count INTEGER, attributes TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS spans ("
+                " trace_id TEXT NOT NULL, span_id TEXT NOT NULL, parent_id TEXT, name TEXT NOT NULL, kind TEXT,"
+                " start_ns INTEGER NOT NULL, end_ns INTEGER, status TEXT, attributes TEXT, PRIMARY KEY (trace_id, span_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_traces_start ON traces(start_ns)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_traces_chat ON traces(project_id, chat_number)")
+            self._conn = conn
+        except Exception as e:
+            self._broken = True
+            self.stats["errors"] += 1
+            print(f"[tracing] trace store unavailable at {self.path}: {type(e).__name__}: {e}")
+        return self._conn
+
+    # -- writing ---------------------------------------------------------------------
+
+    def enqueue(self, t: Trace) -> None:
+        """Queue a finished trace for the writer thread (stored right away when flush_s <= 0)."""
+        with self._queue_lock:
+            self._pending.append(t)
+            self.stats["queued"] += 1
+        if self.flush_s <= 0:
+            self.flush()
+        else:
+            self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._queue_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="cedar-trace-store", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Store the queued traces; returns how many were taken off the queue."""
+        with self._flush_lock:
+            with self._queue_lock:
+                traces, self._pending = self._pending, []
+            for t in traces:
+                self.save(t)
+            return len(traces)
+
+    def save(self, t: Trace) -> None:
+        root = t.root
+        if root is None:
+            return
+        spans = sorted(t.spans, key=lambda s: s.start_ns)
+        attrs = root.attributes
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO traces (trace_id, name, start_ns, duration_ms, status, project_id, branch_id,"
+                        " chat_number, span_count, attributes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (t.trace_id, root.name, root.start_ns, ((root.end_ns or root.start_ns) - root.start_ns) / 1e6,
+                         root.status, _int_or_none(attrs.get("project_id")), _int_or_none(attrs.get("branch_id")),
+                         _int_or_none(attrs.get("chat_number")), len(spans), json.dumps(attrs, default=str)),
+                    )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO spans (trace_id, span_id, parent_id, name, kind, start_ns, end_ns, status, attributes)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(t.trace_id, s.span_id, s.parent_id, s.name, s.kind, s.start_ns, s.end_ns, s.status,
+                          json.dumps(s.attributes, default=str)) for s in spans],
+                    )
+                    self._prune(conn)
+                self.stats["traces"] += 1
+                self.stats["spans"] += len(spans)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[tracing] could not store trace {t.trace_id}: {type(e).__name__}: {e}")
+                return
+        if self.otlp_dir:
+            self.export_otlp(t.trace_id)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        if self.max_traces <= 0:
+            return
+        old = [r[0] for r in conn.execute("SELECT trace_id FROM traces ORDER BY start_ns DESC LIMIT -1 OFFSET ?", (self.max_traces,))]
+        if old:
+            conn.executemany("DELETE FROM spans WHERE trace_id = ?", [(tid,) for tid in old])
+            conn.executemany("DELETE FROM traces WHERE trace_id = ?", [(tid,) for tid in old])
+            self.stats["pruned"] += len(old)
+
+    def export_otlp(self, trace_id: str) -> Optional[str]:
+        data = self.get(trace_id)
+        if data is None or not self.otlp_dir:
+            return None
+        try:
+            os.makedirs(self.otlp_dir, exist_ok=True)
+            path = os.path.join(self.otlp_dir, f"{trace_id}.json")
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(to_otlp(data), f)
+            os.replace(tmp, path)
+            self.stats["exported"] += 1
+            return path
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[tracing] OTLP export of {trace_id} failed: {type(e).__name__}: {e}")
+            return None
+
+    # -- reading ---------------------------------------------------------------------
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT trace_id, name, start_ns, duration_ms, status, project_id, branch_id, chat_number,"
+                               " span_count, attributes FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+            if row is None:
+                return None
+            spans = conn.execute("SELECT span_id, parent_id, name, kind, start_ns, end_ns, status, attributes FROM spans"
+                                 " WHERE trace_id = ? ORDER BY start_ns", (trace_id,)).fetchall()
+        out = _trace_row(row)
+        out["spans"] = [{"span_id": s[0], "parent_id": s[1], "name": s[2], "kind": s[3], "start_ns": s[4], "end_ns": s[5],
+                         "status": s[6], "attributes": json.loads(s[7] or "{}")} for s in spans]
+        return out
+
+    def list(self, project_id: Optional[int] = None, chat_number: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        where, args = [], []
+        if project_id is not None:
+            where.append("project_id = ?")
+            args.append(int(project_id))
+        if chat_number is not None:
+            where.append("chat_number = ?")
+            args.append(int(chat_number))
+        sql = ("SELECT trace_id, name, start_ns, duration_ms, status, project_id, branch_id, chat_number, span_count, attributes"
+               " FROM traces" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY start_ns DESC LIMIT ?")
+        self.flush()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return []
+            rows = conn.execute(sql, args + [max(1, int(limit))]).fetchall()
+        return [_trace_row(r) for r in rows]
+
+    def snapshot(self) -> Dict[str, Any]:
+        self.flush()
+        with self._lock:
+            out = dict(self.stats)
+            conn = self._db()
+            stored = 0
+            if conn is not None:
+                try:
+                    stored = int(conn.execute("SELECT COUNT(*) FROM traces").fetchone()[0])
+                except Exception:
+                    pass
+        out.update({"stored": stored, "max_traces": self.max_traces, "path": self.path, "otlp_dir": self.otlp_dir,
+                    "enabled": tracing_enabled() and not self._broken})
+        return out
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except Exception:
+        return None
+
+
+def _trace_row(row) -> Dict[str, Any]:
+    return {"trace_id": row[0], "name": row[1], "start_ns": row[2], "duration_ms": row[3], "status": row[4],
+            "project_id": row[5], "branch_id": row[6], "chat_number": row[7], "span_count": row[8],
+            "attributes": json.loads(row[9] or "{}")}
+
+
+_store: Optional[TraceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_trace_store() -> TraceStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TraceStore()
+            atexit.register(_store.flush)
+        return _store
+
+
+def _on_trace_end(t: Trace) -> None:
+    try:
+        get_trace_store().enqueue(t)
+    except Exception as e:
+        print(f"[tracing] {type(e).__name__}: {e}")
+
+
+def trace_stats() -> Dict[str, Any]:
+    return get_trace_store().snapshot()
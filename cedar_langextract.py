@@ -13,6 +13,7 @@ from __future__ import annotations
 
 import os
 import json
+import importlib.util
 from typing import Optional, Iterable, Tuple
 
 from sqlalchemy.engine import Engine
@@ -112,9 +113,24 @@ def file_to_text(path: str, display_name: Optional[str], meta: Optional[dict]) -
   Supported out-of-the-box: .txt/.md/.json/.ndjson/.csv/.tsv/.ipynb
   Optional (best-effort): .pdf via pypdf, .docx via python-docx
   Fallbacks: if file looks text-like, read as UTF-8; otherwise use sample_text from meta.
+  The text is reused for files with the same sha256 (cedar_app.utils.artifact_cache).
   """
   display_name = display_name or os.path.basename(path)
   ext = os.path.splitext(display_name)[1].lower().lstrip(".")
+  try:
+    from cedar_app.utils.artifact_cache import cached_artifact, file_sha256
+  except Exception:  # pragma: no cover
+    return _file_to_text(path, ext, meta)
+  sha = (meta or {}).get("sha256") if isinstance(meta, dict) else None
+  sha = sha or file_sha256(path)
+  # Whether the optional converter is installed changes the result for PDF/DOCX
+  converter = {"pdf": "pypdf", "docx": "docx"}.get(ext)
+  variant = (ext, bool(converter and importlib.util.find_spec(converter)))
+  return cached_artifact("file_to_text", sha, lambda: _file_to_text(path, ext, meta), variant=variant,
+                         should_store=lambda text: bool(text))
+
+
+def _file_to_text(path: str, ext: str, meta: Optional[dict]) -> str:
 
   # Simple text
   if ext in {"txt", "md", "html", "htm", "xml"}:
@@ -201,23 +217,19 @@ def chunk_document_insert(engine: Engine, file_id: int, text: str, max_char_buff
   if chunking is None:  # pragma: no cover
     return 0
 
-  count = 0
-  try:
-    iterator = chunking.ChunkIterator(text=text, max_char_buffer=max_char_buffer)
-  except Exception:
+  spans = chunk_spans(text, max_char_buffer)
+  if spans is None:
     return 0
 
+  count = 0
   try:
     with engine.begin() as conn:
-      for i, tchunk in enumerate(iterator):
+      for i, (char_start, char_end, chunk_text) in enumerate(spans):
         try:
-          c = tchunk.char_interval
-          char_start = getattr(c, "start_pos", None)
-          char_end = getattr(c, "end_pos", None)
           cid = f"{file_id}:{i:06d}"
           conn.exec_driver_sql(
             "INSERT OR IGNORE INTO doc_chunks (id, file_id, char_start, char_end, text) VALUES (?,?,?,?,?)",
-            (cid, int(file_id), int(char_start or 0), int(char_end or 0), tchunk.chunk_text),
+            (cid, int(file_id), int(char_start or 0), int(char_end or 0), chunk_text),
           )
           count += 1
         except Exception:
@@ -229,6 +241,35 @@ def chunk_document_insert(engine: Engine, file_id: int, text: str, max_char_buff
   return count
 
 
+def _compute_chunk_spans(text: str, max_char_buffer: int) -> Optional[list]:
+  try:
+    iterator = chunking.ChunkIterator(text=text, max_char_buffer=max_char_buffer)
+  except Exception:
+    return None
+  spans = []
+  try:
+    for tchunk in iterator:
+      try:
+        c = tchunk.char_interval
+        spans.append([getattr(c, "start_pos", None), getattr(c, "end_pos", None), tchunk.chunk_text])
+      except Exception:
+        # Skip bad chunks but keep going
+        continue
+  except Exception:
+    return None
+  return spans
+
+
+def chunk_spans(text: str, max_char_buffer: int = 1500) -> Optional[list]:
+  """[start, end, chunk_text] for each chunk; reused for identical text (keyed on its sha256)."""
+  try:
+    from cedar_app.utils.artifact_cache import cached_artifact, text_sha256
+  except Exception:  # pragma: no cover
+    return _compute_chunk_spans(text, max_char_buffer)
+  return cached_artifact("chunks", text_sha256(text), lambda: _compute_chunk_spans(text, max_char_buffer),
+                         variant=int(max_char_buffer))
+
+
 # -------------------------
 # Retrieval (FTS5 BM25)
 # -------------------------
@@ -16,12 +16,13 @@ import re
 import sqlite3
 import logging
 import asyncio
-import subprocess
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 from openai import AsyncOpenAI
 from openai import AsyncOpenAI
 from fastapi import WebSocket
+from cedar_app.utils.async_shell import run_shell, shell_timeout_from_env
+from cedar_app.utils.code_sandbox import run_code_async
 
 # Remove file processing and notes imports - not needed for execution agents
 
@@ -56,20 +57,24 @@ class AgentResult:
     rerun_reason: str = ""  # Why a rerun is needed
     needs_clarification: bool = False  # Whether the agent needs user clarification
     clarification_question: str = ""  # Question to ask the user
+    timed_out: bool = False  # Whether the work was stopped by a time limit
     
 class ShellAgent:
     """Agent that executes shell commands exactly as provided by the Chief Agent"""
     
+    MEMOIZE = False  # Commands have side effects; never reuse a result from an earlier iteration
+    
     def __init__(self, llm_client: Optional[AsyncOpenAI]):
         self.llm_client = llm_client
         self.conversation_history = []  # Store conversation context
         
-    async def process(self, task: str, conversation_context: str = None) -> AgentResult:
+    async def process(self, task: str, conversation_context: str = None, on_output=None) -> AgentResult:
         """Execute shell commands exactly as provided and analyze results
         
         Args:
             task: Either a shell command to execute or a request from Chief Agent with command
             conversation_context: Optional conversation history for context
+            on_output: Optional callback(stream, text) receiving stdout/stderr chunks as they arrive
         """
         start_time = time.time()
         logger.info(f"[ShellAgent] Starting shell execution for: {task[:200]}...")
@@ -140,22 +145,24 @@ Suggested Next Steps: Please provide the exact shell command to execute.""",
         # Execute the shell command
         logger.info(f"[ShellAgent] Executing command: {shell_command}")
         
+        timeout_s = shell_timeout_from_env()
         try:
-            # Use subprocess for actual shell execution
-            result = subprocess.run(
+            # Run without blocking the event loop; output streams to on_output as it arrives.
+            # Cancelling this task (orchestration aborted) kills the command's process group.
+            result = await run_shell(
                 shell_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=60,  # 60 second timeout for longer operations
                 cwd=os.path.expanduser("~/Projects/cedarpy"),  # Set working directory
-                env={**os.environ}  # Pass current environment
+                env={**os.environ},  # Pass current environment
+                timeout=timeout_s,
+                on_output=on_output
             )
+            if result.timed_out:
+                raise asyncio.TimeoutError()
             
             # Get output (keep more for analysis)
             output = result.stdout[:5000] if result.stdout else ""
             error = result.stderr[:2000] if result.stderr else ""
-            exit_code = result.returncode
+            exit_code = result.exit_code
             
             # Build execution report
             execution_report = f"""Shell Command Execution Report
@@ -300,12 +307,12 @@ Format follow-up commands exactly as they should be run."""
                 summary=summary if 'summary' in locals() else f"Executed shell command '{shell_command[:50]}{'...' if len(shell_command) > 50 else ''}' with {'success' if exit_code == 0 else f'exit code {exit_code}'}"
             )
             
-        except subprocess.TimeoutExpired:
-            logger.error(f"[ShellAgent] Command timed out: {shell_command}")
+        except asyncio.TimeoutError:
+            logger.error(f"[ShellAgent] Command timed out after {timeout_s:g}s: {shell_command}")
             return AgentResult(
                 agent_name="ShellAgent",
                 display_name="Shell Executor",
-                result=f"""Answer: ⏱️ Command timed out after 60 seconds
+                result=f"""Answer: ⏱️ Command timed out after {timeout_s:g} seconds
 
 **Command:** `{shell_command}`
 
@@ -318,7 +325,8 @@ Format follow-up commands exactly as they should be run."""
                 confidence=0.3,
                 method="Timeout",
                 explanation="Command timed out",
-                summary=f"Command '{shell_command[:50]}{'...' if len(shell_command) > 50 else ''}' timed out after 60 seconds"
+                timed_out=True,
+                summary=f"Command '{shell_command[:50]}{'...' if len(shell_command) > 50 else ''}' timed out after {timeout_s:g} seconds"
             )
         except Exception as e:
             logger.error(f"[ShellAgent] Execution error: {e}")
@@ -390,8 +398,13 @@ class CodeAgent:
     def __init__(self, llm_client: Optional[AsyncOpenAI]):
         self.llm_client = llm_client
         
-    async def process(self, task: str) -> AgentResult:
-        """Use LLM to generate Python code, execute it, and return results"""
+    async def process(self, task: str, on_output=None) -> AgentResult:
+        """Use LLM to generate Python code, execute it, and return results
+        
+        Args:
+            task: The computation requested by the Chief Agent
+            on_output: Optional callback(stream, text) receiving the code's output as it prints
+        """
         start_time = time.time()
         logger.info(f"[CodeAgent] Starting processing for task: {task[:100]}...")
         
@@ -506,28 +519,20 @@ Suggested Fix: Ensure OPENAI_API_KEY is set in environment and LLM client is pro
             # Show the code that will be executed
             code_preview = f"**Code to execute:**\n```python\n{generated_code}\n```\n\n"
             
-            # Execute the generated code
-            import io
-            import contextlib
-            
-            output_buffer = io.StringIO()
-            error_buffer = io.StringIO()
-            
+            # Execute the generated code in a sandbox worker process (off the event loop, with
+            # CPU/memory/time limits); common libraries are pre-injected as before
             try:
-                # Create a safe execution environment with common libraries
-                exec_globals = {
-                    "__builtins__": __builtins__,
-                    "math": math,
-                    "json": json,
-                    "time": time,
-                    "os": os,
-                }
-                
-                with contextlib.redirect_stdout(output_buffer), contextlib.redirect_stderr(error_buffer):
-                    exec(generated_code, exec_globals)
+                run = await run_code_async(
+                    generated_code,
+                    on_output=on_output,
+                    filename="<code_agent>",
+                    modules=["math", "json", "time", "os"],
+                )
+                if not run["ok"]:
+                    raise RuntimeError(run["error"] or "code execution failed")
                 
-                output = output_buffer.getvalue()
-                errors = error_buffer.getvalue()
+                output = run["stdout"]
+                errors = run["stderr"]
                 
                 if errors:
                     logger.warning(f"[CodeAgent] Code execution had warnings: {errors}")
@@ -576,7 +581,8 @@ Suggested Next Steps: Review the code and error, then provide a more specific qu
                     explanation=f"Code execution error",
                     summary=summary if 'summary' in locals() else f"Failed to execute generated code: {str(exec_error)[:100]}",
                     needs_rerun=True,
-                    rerun_reason=f"Execution error: {str(exec_error)[:100]}"
+                    rerun_reason=f"Execution error: {str(exec_error)[:100]}",
+                    timed_out=bool('run' in locals() and run.get("timed_out"))
                 )
                 
         except Exception as e:
@@ -9,8 +9,9 @@ import asyncio
 import logging
 import hashlib
 import sqlite3
-from typing import Any, Dict, List, Optional, Tuple, BinaryIO
-from dataclasses import dataclass
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, BinaryIO
+from dataclasses import dataclass, asdict
 from pathlib import Path
 import tempfile
 import shutil
@@ -44,6 +45,10 @@ except ImportError:
 
 from openai import AsyncOpenAI
 from fastapi import WebSocket
+from cedar_app.llm.scheduler import llm_lane
+from cedar_app.llm.response_cache import llm_cache
+from cedar_app.llm.usage_ledger import llm_usage
+from cedar_app.utils.artifact_cache import file_sha256, text_sha256, get_artifact_entry, put_artifact, remap_paths
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -435,7 +440,10 @@ class ImageAnalysisAgent:
                     completion_params["max_tokens"] = 500
                 
                 try:
-                    response = await self.llm_client.chat.completions.create(**completion_params)
+                    # Image analysis is background work: chat calls are admitted first. The same image
+                    # and prompt always get the same description, so repeats come from the response cache
+                    with llm_lane("nearline"), llm_cache():
+                        response = await self.llm_client.chat.completions.create(**completion_params)
                     analysis = response.choices[0].message.content
                     
                     image_analyses.append({
@@ -625,7 +633,12 @@ class SQLMetadataAgent:
             )
 
 class FileProcessingOrchestrator:
-    """Orchestrator for coordinating all file processing agents"""
+    """Orchestrator for coordinating all file processing agents.
+
+    Successful stage results are stored in the artifact cache under the sha256 of the stage input
+    (the file, or the extracted text for language detection), so processing the same bytes again
+    reuses them; files a stage wrote are restored into this upload's output directory.
+    """
     
     def __init__(self, llm_client: Optional[AsyncOpenAI]):
         self.llm_client = llm_client
@@ -635,6 +648,29 @@ class FileProcessingOrchestrator:
         self.lang_extractor = LangExtractAgent()
         self.image_analyzer = ImageAnalysisAgent(llm_client)
         self.sql_metadata = SQLMetadataAgent()
+
+    async def _run_stage(self, stage: str, sha: Optional[str], run: Callable[[], Awaitable[FileProcessingResult]],
+                         variant: Any = None, output_dir: Optional[Path] = None) -> FileProcessingResult:
+        """Reuse the stage's artifact for the same input, or run it and store a successful result."""
+        entry = await asyncio.to_thread(get_artifact_entry, stage, sha, variant)
+        if entry is not None:
+            try:
+                mapping = {}
+                if entry.files and output_dir is not None:
+                    mapping = await asyncio.to_thread(entry.restore, str(output_dir))
+                result = FileProcessingResult(**remap_paths(entry.value, mapping))
+                result.metadata = {**(result.metadata or {}), "artifact_cache": "hit"}
+                logger.info(f"[FileProcessingOrchestrator] {stage}: reused artifact for {(sha or '')[:12]}")
+                return result
+            except Exception as e:
+                logger.warning(f"[FileProcessingOrchestrator] {stage}: could not reuse artifact: {e}")
+        started = time.perf_counter()
+        with llm_usage(f"file_processing.{stage}"):
+            result = await run()
+        if result.success and sha:
+            await asyncio.to_thread(put_artifact, stage, sha, asdict(result), variant,
+                                    result.extracted_files or [], (time.perf_counter() - started) * 1000.0)
+        return result
         
     async def process_file(self, file_path: str, file_type: str, websocket: Optional[WebSocket] = None) -> Dict[str, Any]:
         """Process uploaded file through all relevant agents"""
@@ -660,7 +696,10 @@ class FileProcessingOrchestrator:
                 "text": "Analyzing file content with AI..."
             })
         
-        file_result = await self.file_reader.process(file_path, file_type)
+        sha = await asyncio.to_thread(file_sha256, file_path)
+        model = os.getenv("CEDARPY_OPENAI_MODEL") or "gpt-5"
+        file_result = await self._run_stage("file_reader", sha, lambda: self.file_reader.process(file_path, file_type),
+                                            variant=(file_type, model))
         results.append(file_result)
         
         # 2. PDF-specific processing
@@ -672,7 +711,8 @@ class FileProcessingOrchestrator:
                     "text": "Extracting PDF content and images..."
                 })
             
-            pdf_result = await self.pdf_extractor.process(file_path)
+            pdf_result = await self._run_stage("pdf_extract", sha, lambda: self.pdf_extractor.process(file_path),
+                                               output_dir=Path(file_path).parent / f"{Path(file_path).stem}_extracted")
             results.append(pdf_result)
             
             if pdf_result.success:
@@ -690,7 +730,8 @@ class FileProcessingOrchestrator:
                             "text": "Performing OCR on scanned document..."
                         })
                     
-                    ocr_result = await self.ocr_agent.process(file_path)
+                    ocr_result = await self._run_stage("ocr", sha, lambda: self.ocr_agent.process(file_path),
+                                                       output_dir=Path(file_path).parent / f"{Path(file_path).stem}_ocr")
                     results.append(ocr_result)
                     if ocr_result.success and ocr_result.data:
                         extracted_text = ocr_result.data
@@ -704,7 +745,8 @@ class FileProcessingOrchestrator:
                     "text": "Detecting language..."
                 })
             
-            lang_result = await self.lang_extractor.process(extracted_text)
+            lang_result = await self._run_stage("langdetect", text_sha256(extracted_text),
+                                                lambda: self.lang_extractor.process(extracted_text))
             results.append(lang_result)
         
         # 4. Image analysis
@@ -716,7 +758,9 @@ class FileProcessingOrchestrator:
                     "text": f"Analyzing {len(extracted_images)} extracted images..."
                 })
             
-            image_result = await self.image_analyzer.process(extracted_images)
+            # The images were extracted from this file, so its sha256 identifies them
+            image_result = await self._run_stage("image_analysis", sha, lambda: self.image_analyzer.process(extracted_images),
+                                                 variant=(model, [os.path.basename(p) for p in extracted_images]))
             results.append(image_result)
         
         # 5. Store in SQL metadata
@@ -19,6 +19,23 @@ from fastapi import WebSocket
 
 # Import execution agents
 from .execution_agents import AgentResult, ShellAgent, CodeAgent, SQLAgent
+from cedar_app.utils.json_stream import JsonFieldExtractor
+from cedar_app.utils.deadlines import (
+    DeadlineExceeded, run_with_deadline, agent_timeout_from_env,
+    iteration_timeout_from_env, chief_timeout_from_env,
+    early_decision_confidence_from_env, collect_as_completed,
+)
+from cedar_app.utils.iteration_memo import IterationMemo, guidance_targets, project_data_generation
+from cedar_app.utils.agent_router import get_agent_router
+from cedar_app.utils.query_budget import QueryBudget, BudgetedLLMClient, current_budget, get_current_budget, cap_timeout
+from cedar_app.utils.model_router import RoutedLLMClient, run_as_agent
+from cedar_app.utils.context_packer import pack_chief_context
+from cedar_app.utils.tracing import trace, span, traced, TracedWebSocket
+from cedar_app.utils import fast_path
+from cedar_app.llm.gateway import get_llm_gateway
+from cedar_app.llm.scheduler import llm_lane
+from cedar_app.llm.response_cache import chat_cache, volatile_message
+from cedar_app.llm.usage_ledger import llm_usage
 
 # Import specialized agents
 from .specialized_agents import MathAgent, ResearchAgent, StrategyAgent, DataAgent, NotesAgent, FileAgent
@@ -63,12 +80,34 @@ class ChiefAgent:
         self.llm_client = llm_client
 
         
-    async def review_and_decide(self, user_query: str, agent_results: List[AgentResult], iteration: int = 0, max_iterations: int = 10, previous_context: str = "") -> Dict[str, Any]:
-        """Review all agent results and make the final decision on what to do next"""
+    async def review_and_decide(self, user_query: str, agent_results: List[AgentResult], iteration: int = 0, max_iterations: int = 10, previous_context: str = "", on_final_delta=None, previous_results: Optional[List[AgentResult]] = None) -> Dict[str, Any]:
+        """Review all agent results and make the final decision on what to do next
+        
+        If on_final_delta is given, the completion is streamed and each new piece of the
+        final_answer field is passed to it (awaited) as soon as the decision is known to be "final".
+        Agent results (and previous_results, if given) are packed into the token budget of
+        CEDARPY_CHIEF_CONTEXT_TOKENS; see cedar_app.utils.context_packer.
+        """
         start_time = time.time()
         remaining_loops = max_iterations - iteration - 1
         logger.info(f"[ChiefAgent] Starting review of {len(agent_results)} agent results (iteration {iteration}/{max_iterations}, {remaining_loops} loops remaining)")
         
+        budget = get_current_budget()
+        if budget is not None and budget.exhausted:
+            # Forced finalization: no budget left for another review call
+            reason = budget.exhausted_reason()
+            budget.forced_final = reason
+            logger.warning(f"[ChiefAgent] Query budget exhausted ({reason}); finalizing with best available result")
+            best_result = max(agent_results, key=lambda r: r.confidence) if agent_results else None
+            return {
+                "decision": "final",
+                "final_answer": best_result.result if best_result else "No results available",
+                "additional_guidance": None,
+                "selected_agent": best_result.display_name if best_result else "None",
+                "reasoning": f"Query budget exhausted ({reason}) - using best available result",
+                "fallback": True
+            }
+        
         if not self.llm_client:
             # Fallback: use best available result
             best_result = max(agent_results, key=lambda r: r.confidence) if agent_results else None
@@ -77,20 +116,18 @@ class ChiefAgent:
                 "final_answer": best_result.result if best_result else "No results available",
                 "additional_guidance": None,
                 "selected_agent": best_result.display_name if best_result else "None",
-                "reasoning": "No LLM available - using best available result"
+                "reasoning": "No LLM available - using best available result",
+                "fallback": True
             }
         
         try:
-            # Prepare agent results summary for Chief Agent review
-            results_summary = []
-            for result in agent_results:
-                results_summary.append(f"""
-                Agent: {result.display_name}
-                Summary: {result.summary if result.summary else 'No summary provided'}
-                Confidence: {result.confidence}
-                Method: {result.method}
-                Response: {result.result[:500]}
-                """)
+            # Pack agent results (and the previous iteration's) into the Chief Agent's token budget
+            packed = pack_chief_context(agent_results, previous_results, label=f"chief iteration {iteration + 1}")
+            results_summary = [packed.text(packed.extra["current"])]
+            if packed.extra["previous"]:
+                previous_context = "Previous iteration results:\n" + packed.text(packed.extra["previous"])
+            logger.info(f"[ChiefAgent] Packed context: {packed.tokens_before} -> {packed.tokens_after} tokens "
+                        f"(budget {packed.budget}, deduped {packed.deduped}, summarized {packed.summarized}, dropped {packed.dropped})")
             
             # Get model from environment
             model = os.getenv("CEDARPY_OPENAI_MODEL") or os.getenv("OPENAI_API_KEY_MODEL") or "gpt-5"
@@ -140,7 +177,9 @@ Agent Responses from this iteration:
 
 Be SPECIFIC about THIS query, not generic!
 Only loop if you have a SPECIFIC thing you need to get."""
-                    }
+                    },
+                    # Changes on every call, so it is kept out of the response cache key
+                    volatile_message(f"Query Budget Used: {budget.status_line() if budget is not None else 'unlimited'} (when close to any limit, decide \"final\")")
                 ]
             }
             
@@ -151,9 +190,22 @@ Only loop if you have a SPECIFIC thing you need to get."""
                 completion_params["max_tokens"] = 800
                 completion_params["temperature"] = 0.3
                 
-            response = await self.llm_client.chat.completions.create(**completion_params)
-            
-            chief_response = response.choices[0].message.content
+            # Deadline for the whole review call; on expiry the request is cancelled and the best
+            # agent result is used (see the fallback below)
+            chief_deadline = chief_timeout_from_env()
+            chief_timer = asyncio.timeout(chief_deadline or None)
+            async with chief_timer:
+                chief_response = None
+                if on_final_delta is not None and _chief_streaming_enabled():
+                    try:
+                        chief_response = await self._stream_completion(completion_params, on_final_delta)
+                    except Exception as e:
+                        # e.g. the account is not allowed to stream this model
+                        logger.warning(f"[ChiefAgent] Streaming failed, retrying without streaming: {e}")
+                        chief_response = None
+                if chief_response is None:
+                    response = await self.llm_client.chat.completions.create(**completion_params)
+                    chief_response = response.choices[0].message.content
             # Log full response for debugging JSON issues
             if len(chief_response) <= 500:
                 logger.info(f"[ChiefAgent] Response: {chief_response}")
@@ -162,7 +214,7 @@ Only loop if you have a SPECIFIC thing you need to get."""
             
             # Parse JSON response
             try:
-                decision_data = json.loads(chief_response)
+                decision_data = _parse_decision(chief_response)
                 # Validate required fields
                 if "decision" not in decision_data:
                     decision_data["decision"] = "final"
@@ -193,7 +245,8 @@ Only loop if you have a SPECIFIC thing you need to get."""
                     "final_answer": best_result.result if best_result else "No results available",
                     "additional_guidance": None,
                     "selected_agent": best_result.display_name if best_result else "None",
-                    "reasoning": "JSON parsing failed - using best available result"
+                    "reasoning": "JSON parsing failed - using best available result",
+                    "fallback": True
                 }
             
             logger.info(f"[ChiefAgent] Decision: {decision_data.get('decision')}, Selected: {decision_data.get('selected_agent')}")
@@ -202,7 +255,11 @@ Only loop if you have a SPECIFIC thing you need to get."""
             return decision_data
             
         except Exception as e:
-            logger.error(f"[ChiefAgent] Error: {e}")
+            timed_out = isinstance(e, TimeoutError) and 'chief_timer' in locals() and chief_timer.expired()
+            if timed_out:
+                logger.error(f"[ChiefAgent] Review timed out after {chief_deadline:g}s")
+            else:
+                logger.error(f"[ChiefAgent] Error: {e}")
             # Fallback: use best available result
             best_result = max(agent_results, key=lambda r: r.confidence) if agent_results else None
             return {
@@ -210,17 +267,73 @@ Only loop if you have a SPECIFIC thing you need to get."""
                 "final_answer": best_result.result if best_result else "No results available",
                 "additional_guidance": None,
                 "selected_agent": best_result.display_name if best_result else "None",
-                "reasoning": f"Chief Agent error: {str(e)[:100]}"
+                "reasoning": f"Chief Agent review timed out after {chief_deadline:g}s - using best available result" if timed_out else f"Chief Agent error: {str(e)[:100]}",
+                "timed_out": timed_out,
+                "fallback": True
             }
 
 
+    async def _stream_completion(self, completion_params: Dict[str, Any], on_final_delta) -> str:
+        """Stream the completion, forwarding final_answer text as it is generated. Returns the full text."""
+        extractor = JsonFieldExtractor(stream_fields=("final_answer",))
+        parts: List[str] = []
+        held: List[str] = []  # final_answer text that arrived before the decision field
+        started = time.time()
+        first_token = None
+        stream = await self.llm_client.chat.completions.create(**completion_params, stream=True)
+        async for chunk in stream:
+            if not getattr(chunk, "choices", None):
+                continue
+            text = getattr(chunk.choices[0].delta, "content", None)
+            if not text:
+                continue
+            if first_token is None:
+                first_token = time.time()
+                logger.info(f"[ChiefAgent] First token after {first_token - started:.3f}s")
+            parts.append(text)
+            for _field, delta in extractor.feed(text):
+                held.append(delta)
+            decision = extractor.values.get("decision")
+            if held and decision == "final":
+                await on_final_delta("".join(held))
+                held = []
+            elif decision is not None and decision != "final":
+                held = []
+        logger.info(f"[ChiefAgent] Stream completed in {time.time() - started:.3f}s")
+        return "".join(parts)
+
+
+def _chief_streaming_enabled() -> bool:
+    return os.getenv("CEDARPY_CHIEF_STREAM", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _parse_decision(chief_response: str) -> Dict[str, Any]:
+    """json.loads the Chief Agent response; if that fails (code fences, a truncated object), recover
+    the top-level fields with the incremental extractor. Raises JSONDecodeError if nothing usable."""
+    try:
+        return json.loads(chief_response)
+    except json.JSONDecodeError:
+        extractor = JsonFieldExtractor(stream_fields=("final_answer",))
+        extractor.feed(chief_response or "")
+        recovered = dict(extractor.values)
+        if "final_answer" not in recovered and extractor.partial("final_answer"):
+            recovered["final_answer"] = extractor.partial("final_answer")
+        if "decision" in recovered or "final_answer" in recovered:
+            logger.warning(f"[ChiefAgent] Response was not valid JSON; recovered fields: {sorted(recovered)}")
+            return recovered
+        raise
+
+
 class ThinkerOrchestrator:
     """The main orchestrator that coordinates all agents"""
     
     MAX_ITERATIONS = 10  # Maximum number of Chief Agent loop iterations
     
     def __init__(self, api_key: str):
-        self.llm_client = AsyncOpenAI(api_key=api_key) if api_key else None
+        # All agents share this client: each call is routed to a small or large model tier, then
+        # checked against and charged to the per-query budget, and sent through the process-wide
+        # gateway (pooled connections, retries with backoff, circuit breaker)
+        self.llm_client = RoutedLLMClient(BudgetedLLMClient(get_llm_gateway().async_client(api_key))) if api_key else None
         self.chief_agent = ChiefAgent(self.llm_client)  # Chief Agent is primary
         
         # Core execution agents
@@ -255,7 +368,24 @@ class ThinkerOrchestrator:
         return await self.file_processor.process_file(file_path, file_type, websocket)
     
     async def think(self, message: str) -> Dict[str, Any]:
-        """Thinker phase: Intelligently assess query complexity and choose minimal agent strategy"""
+        """Thinker phase: keyword assessment, with agent choice overridden by the learned router when it is confident"""
+        thinking_process = await self._keyword_think(message)
+        try:
+            routed = get_agent_router().route(message)
+        except Exception as e:
+            logger.warning(f"[ORCHESTRATOR] Agent router failed, using keyword rules: {e}")
+            routed = None
+        if routed:
+            agents_to_use, probs = routed
+            logger.info(f"[ORCHESTRATOR] Router chose {agents_to_use} (keyword rules: {thinking_process['agents_to_use']})")
+            thinking_process["keyword_agents"] = thinking_process["agents_to_use"]
+            thinking_process["agents_to_use"] = agents_to_use
+            thinking_process["selection_reasoning"] = "Learned from past queries: " + ", ".join(f"{a} ({probs[a]:.0%})" for a in agents_to_use)
+            thinking_process["routed_by"] = "learned_router"
+        return thinking_process
+    
+    async def _keyword_think(self, message: str) -> Dict[str, Any]:
+        """Keyword rules: Intelligently assess query complexity and choose minimal agent strategy"""
         thinking_process = {
             "input": message,
             "analysis": "",
@@ -359,8 +489,63 @@ class ThinkerOrchestrator:
             
         return thinking_process
         
-    async def orchestrate(self, message: str, websocket, iteration: int = 0, previous_results: List[AgentResult] = None, project_id: int = None, branch_id: int = None, db_session = None):
-        """Full orchestration process controlled by Chief Agent decisions with optional notes persistence"""
+    async def orchestrate(self, message: str, websocket, iteration: int = 0, previous_results: List[AgentResult] = None, project_id: int = None, branch_id: int = None, db_session = None, memo: Optional[IterationMemo] = None, use_fast_path: bool = True, use_llm_cache: bool = True):
+        """Full orchestration process controlled by Chief Agent decisions with optional notes persistence.
+        The top-level call opens a QueryBudget that all iterations, agents and Chief Agent reviews share.
+        Deterministic questions (arithmetic, units, dates, catalog lookups) are answered by the fast path
+        first unless use_fast_path is False, CEDARPY_FAST_PATH=0 or the message starts with /full.
+        LLM calls are served from the response cache when the same question was asked on unchanged
+        project data, unless use_llm_cache is False.
+        The whole query is one trace (a span of the caller's trace, if any); each loop iteration is a span."""
+        if get_current_budget() is not None:
+            with span("iteration", iteration=iteration):
+                return await self._orchestrate(message, websocket, iteration, previous_results, project_id, branch_id, db_session, memo)
+        with trace("orchestrate", project_id=project_id, branch_id=branch_id, message=message[:200]) as root_span:
+            websocket = TracedWebSocket(websocket)
+            if iteration == 0 and not previous_results:
+                message, bypass = fast_path.strip_bypass(message)
+                if bypass or not use_fast_path or not fast_path.fast_path_enabled():
+                    fast_path.record_bypass()
+                elif await self._try_fast_path(message, websocket, project_id, branch_id):
+                    root_span.set(fast_path=True)
+                    return
+            budget = QueryBudget()
+            token = current_budget.set(budget)
+            try:
+                # Chat is the interactive lane of the LLM scheduler; agent tasks inherit the lane, the project
+                # and the response cache policy
+                with llm_lane("interactive", project_id), chat_cache(project_id, branch_id, bypass=not use_llm_cache), \
+                        llm_usage("chat", project_id=project_id), span("iteration", iteration=iteration):
+                    return await self._orchestrate(message, websocket, iteration, previous_results, project_id, branch_id, db_session, memo)
+            finally:
+                current_budget.reset(token)
+                root_span.set(llm_calls=budget.llm_calls, cached_calls=budget.cached_calls, prompt_tokens=budget.prompt_tokens,
+                              completion_tokens=budget.completion_tokens, cost_usd=round(budget.cost_usd, 6), forced_final=budget.forced_final)
+                logger.info(f"[ORCHESTRATOR] Query budget used: {budget.status_line()}")
+    
+    async def _try_fast_path(self, message: str, websocket, project_id: int = None, branch_id: int = None) -> bool:
+        """Answer deterministically without any LLM call; returns False to run the full pipeline."""
+        answer = await asyncio.to_thread(fast_path.solve, message, project_id, branch_id)
+        if answer is None:
+            return False
+        logger.info(f"[ORCHESTRATOR] Fast path ({answer.kind}) answered in {answer.elapsed_ms:.1f}ms: {answer.answer[:100]}")
+        await websocket.send_json({
+            "type": "final",
+            "text": f"**Answer:** {answer.answer}\n\n**Why:** {answer.explanation}\n\n_⚡ Answered locally in {answer.elapsed_ms:.0f}ms (no LLM calls; prefix with /full to run the agents)_",
+            "json": {
+                "role": 'The Chief Agent',
+                "selected_agent": "FastPath",
+                "chief_reasoning": f"Deterministic {answer.kind} question answered without the agent pipeline",
+                "confidence": 1.0,
+                "method": "Fast Path",
+                "orchestration_time": answer.elapsed_ms / 1000.0,
+                "budget": None,
+                "metadata": {"fast_path": {"kind": answer.kind, "elapsed_ms": round(answer.elapsed_ms, 3), **answer.data}},
+            }
+        })
+        return True
+    
+    async def _orchestrate(self, message: str, websocket, iteration: int = 0, previous_results: List[AgentResult] = None, project_id: int = None, branch_id: int = None, db_session = None, memo: Optional[IterationMemo] = None):
         orchestration_start = time.time()
         logger.info("="*80)
         logger.info(f"[ORCHESTRATOR] Starting orchestration for message: {message} (iteration: {iteration})")
@@ -385,7 +570,8 @@ class ThinkerOrchestrator:
         
         # Phase 1: Thinking
         logger.info("[ORCHESTRATOR] PHASE 1: Thinker Analysis")
-        thinking = await self.think(message)
+        with span("think"):
+            thinking = await self.think(message)
         logger.info(f"[ORCHESTRATOR] Thinking result: Type={thinking['identified_type']}, Agents={thinking['agents_to_use']}")
         
         # Build detailed explanation of what each agent will do
@@ -430,7 +616,6 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
 
 ⏳ Now coordinating these agents to solve your request..."""
         })
-        await asyncio.sleep(0.5)  # Allow UI to set up streaming
         
         # No need for redundant streaming update
         
@@ -471,6 +656,16 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
             agents.append(self.file_agent)
             logger.info("[ORCHESTRATOR] Added FileAgent to processing queue")
             
+        # Out of budget: launch nothing new and let the Chief Agent finalize with what we have
+        budget = get_current_budget()
+        if budget is not None and budget.exhausted and agents:
+            logger.warning(f"[ORCHESTRATOR] Query budget exhausted ({budget.exhausted_reason()}); skipping {len(agents)} agent(s)")
+            await websocket.send_json({
+                "type": "info",
+                "stage": f"Query budget exhausted ({budget.exhausted_reason()}); finalizing with the results so far"
+            })
+            agents = []
+        
         # Process all agents in parallel
         logger.info(f"[ORCHESTRATOR] Starting parallel processing with {len(agents)} agents")
         parallel_start = time.time()
@@ -478,9 +673,24 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
         # Don't send stream updates that would overwrite the Chief Agent analysis
         # The detailed analysis message is complete and should stand on its own
         
+        # Agents whose inputs are unchanged since an earlier iteration reuse that result
+        if memo is None:
+            memo = IterationMemo(message)
+        memo_generation = project_data_generation(project_id) if memo.enabled else None
+        memo_targets = guidance_targets(memo.guidance)
+        memo_keys = []
+        reused = {}
+        
         # Create agent tasks - pass conversation context to Shell Agent
         agent_tasks = []
         for agent in agents:
+            memo_key = memo.task_key(agent, message, memo_targets)
+            memo_keys.append(memo_key)
+            hit = memo.lookup(agent.__class__.__name__, memo_key, memo_generation)
+            if hit is not None:
+                reused[len(agent_tasks)] = hit
+                agent_tasks.append(None)
+                continue
             if isinstance(agent, ShellAgent):
                 # Pass conversation context to Shell Agent for better analysis
                 conversation_context = f"User Query: {message}\nIteration: {iteration + 1}"
@@ -488,18 +698,38 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
                     conversation_context += "\nPrevious Results:\n"
                     for prev in previous_results[:3]:
                         conversation_context += f"- {prev.display_name}: {prev.result[:100]}...\n"
-                agent_tasks.append(agent.process(message, conversation_context=conversation_context))
+                # Stream command output to the client while it runs
+                async def shell_output(stream, text, _ws=websocket):
+                    await _ws.send_json({
+                        "type": "agent_stream",
+                        "agent_name": "Shell Executor",
+                        "stream": stream,
+                        "text": text
+                    })
+                agent_tasks.append(agent.process(message, conversation_context=conversation_context, on_output=shell_output))
+            elif isinstance(agent, CodeAgent):
+                # Stream the generated code's output while it runs in the sandbox
+                async def code_output(stream, text, _ws=websocket):
+                    await _ws.send_json({
+                        "type": "agent_stream",
+                        "agent_name": "Coding Agent",
+                        "stream": stream,
+                        "text": text
+                    })
+                agent_tasks.append(agent.process(message, on_output=code_output))
+            elif isinstance(agent, DataAgent):
+                # DataAgent describes the project schema from the cached schema catalog
+                agent_tasks.append(agent.process(message, project_id=project_id))
             else:
                 agent_tasks.append(agent.process(message))
         
-        results = await asyncio.gather(*agent_tasks, return_exceptions=True)
-        logger.info(f"[ORCHESTRATOR] Parallel processing completed in {time.time() - parallel_start:.3f}s")
-        
-        # Send agent results
-        logger.info("[ORCHESTRATOR] Processing agent results")
+        # Send each agent's result to the UI as soon as that agent finishes
         valid_results = []
-        for i, result in enumerate(results):
+        
+        async def report_result(i, result, reused_from=None):
             if isinstance(result, AgentResult):
+                if reused_from is None and i < len(agents):
+                    memo.store(agents[i].__class__.__name__, memo_keys[i], memo_generation, iteration, result)
                 logger.info(f"[ORCHESTRATOR] Result {i+1}: {result.agent_name} - Confidence: {result.confidence:.2f}, Method: {result.method}")
                 logger.info(f"[ORCHESTRATOR] Result {i+1} UI label: {result.display_name}")
                 logger.info(f"[ORCHESTRATOR] Result {i+1} content: {result.result[:200]}...")
@@ -517,11 +747,11 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
                         "confidence": result.confidence,
                         "method": result.method,
                         "needs_rerun": result.needs_rerun,
+                        "reused_from_iteration": None if reused_from is None else reused_from + 1,
                         "summary": result.summary  # Also include in metadata
                     }
                 })
                 valid_results.append(result)
-                await asyncio.sleep(0.2)
             elif isinstance(result, Exception):
                 logger.error(f"[ORCHESTRATOR] Agent {i+1} failed with exception: {result}")
                 
@@ -545,6 +775,41 @@ I've analyzed your request as a {thinking['identified_type'].replace('_', ' ')}.
                     }
                     display_name = agent_display_names.get(agent_name, agent_name)
                 
+                if isinstance(result, DeadlineExceeded):
+                    # Stopped by a deadline: record a structured timeout result rather than a crash report
+                    logger.warning(f"[ORCHESTRATOR] {agent_name} stopped by {result.scope} deadline ({result.seconds:g}s)")
+                    timeout_result = AgentResult(
+                        agent_name=agent_name,
+                        display_name=display_name,
+                        result=f"""Answer: ⏱️ {display_name} did not finish within the {result.scope} time limit ({result.seconds:g} seconds)
+
+Why: The agent's work was cancelled when its deadline passed, so no result is available from it
+
+Suggested Next Steps: Use the other agents' results, or retry with a narrower request""",
+                        confidence=0.0,
+                        method="Agent Timeout",
+                        explanation=f"Stopped after {result.seconds:g}s ({result.scope} deadline)",
+                        summary=f"{display_name} timed out after {result.seconds:g}s and was cancelled",
+                        timed_out=True
+                    )
+                    await websocket.send_json({
+                        "type": "agent_result",
+                        "agent_name": display_name,
+                        "text": timeout_result.result,
+                        "summary": timeout_result.summary,
+                        "metadata": {
+                            "agent": agent_name,
+                            "confidence": 0.0,
+                            "method": "Agent Timeout",
+                            "timed_out": True,
+                            "deadline": result.scope,
+                            "timeout_s": result.seconds,
+                            "summary": timeout_result.summary
+                        }
+                    })
+                    valid_results.append(timeout_result)
+                    return
+                
                 # Create error report with detailed information
                 error_type = type(result).__name__
                 error_msg = str(result)
@@ -599,30 +864,84 @@ Task: {message[:200]}{'...' if len(message) > 200 else ''}"""
                     }
                 })
                 valid_results.append(error_result)
-                await asyncio.sleep(0.2)
-                
+        
+        if reused:
+            names = [agents[i].__class__.__name__ for i in sorted(reused)]
+            logger.info(f"[ORCHESTRATOR] Reusing earlier results for {names} (memo {memo.stats()})")
+            await websocket.send_json({
+                "type": "info",
+                "stage": f"Reusing unchanged results from earlier iterations: {', '.join(names)}"
+            })
+            for i in sorted(reused):
+                from_iteration, result = reused[i]
+                await report_result(i, result, reused_from=from_iteration)
+        
+        logger.info("[ORCHESTRATOR] Processing agent results as they complete")
+        # Each agent runs under its own deadline, and the iteration as a whole under another; a
+        # deadline cancels the agent's task, which aborts its LLM request/download/subprocess
+        pending = {
+            asyncio.ensure_future(run_with_deadline(
+                traced(f"agent.{agents[i].__class__.__name__}", run_as_agent(agents[i].__class__.__name__, task)),
+                cap_timeout(agent_timeout_from_env(agents[i].__class__.__name__), budget)
+            )): i
+            for i, task in enumerate(agent_tasks) if task is not None
+        }
+        iteration_timeout = cap_timeout(iteration_timeout_from_env(), budget)
+        
+        # Optional "good enough" early decision: stop waiting for stragglers once a
+        # high-confidence result is in
+        threshold = early_decision_confidence_from_env()
+        def good_enough():
+            best = max(valid_results, key=lambda r: r.confidence, default=None)
+            return threshold > 0 and best is not None and best.confidence >= threshold and not best.needs_rerun
+        
+        skipped = await collect_as_completed(pending, report_result, timeout=iteration_timeout, stop=good_enough)
+        if skipped:
+            best = max(valid_results, key=lambda r: r.confidence)
+            skipped = [agents[j].__class__.__name__ for j in skipped]
+            logger.info(f"[ORCHESTRATOR] Early decision on {best.agent_name} (confidence {best.confidence:.2f}); cancelling {skipped}")
+            await websocket.send_json({
+                "type": "info",
+                "stage": f"Early decision: {best.display_name} answered with confidence {best.confidence:.2f}; skipped {', '.join(skipped)}"
+            })
+        logger.info(f"[ORCHESTRATOR] Parallel processing completed in {time.time() - parallel_start:.3f}s")
+        
         # Phase 3: Chief Agent Review and Decision
         logger.info("[ORCHESTRATOR] PHASE 3: Chief Agent Review and Decision")
         logger.info(f"[ORCHESTRATOR] Chief Agent reviewing {len(valid_results)} valid results")
         
         # Don't send stream updates - let agent results speak for themselves
         
-        # Build context from previous iterations
-        previous_context = ""
-        if previous_results:
-            previous_context = "Previous iteration results:\n"
-            for prev_result in previous_results[:3]:  # Include top 3 from previous
-                previous_context += f"- {prev_result.display_name}: {prev_result.result[:200]}...\n"
+        # Stream the final answer to the client while the Chief Agent is still generating it
+        streamed = []
+        async def final_delta(delta, _ws=websocket):
+            streamed.append(len(delta))
+            await _ws.send_json({
+                "type": "final_delta",
+                "delta": delta,
+                "iteration": iteration + 1
+            })
+        
+        # Tell the client to drop the provisional answer bubble when no 'final' message will replace it
+        async def reset_final_delta(_ws=websocket):
+            if streamed:
+                streamed.clear()
+                await _ws.send_json({"type": "final_delta", "reset": True, "iteration": iteration + 1})
         
         # Have Chief Agent review all results and make a decision
-        chief_decision = await self.chief_agent.review_and_decide(
-            user_query=message, 
-            agent_results=valid_results, 
-            iteration=iteration,
-            max_iterations=self.MAX_ITERATIONS,
-            previous_context=previous_context
-        )
+        with span("chief.review", results=len(valid_results)) as chief_span:
+            chief_decision = await run_as_agent("ChiefAgent", self.chief_agent.review_and_decide(
+                user_query=message, 
+                agent_results=valid_results, 
+                iteration=iteration,
+                max_iterations=self.MAX_ITERATIONS,
+                previous_results=previous_results,
+                on_final_delta=final_delta
+            ))
+            chief_span.set(decision=chief_decision.get('decision'))
         logger.info(f"[ORCHESTRATOR] Chief Agent decision: {chief_decision.get('decision')}")
+        if chief_decision.get('decision') != 'final' or chief_decision.get('fallback'):
+            await reset_final_delta()
         
         # Log thinking process if available
         if chief_decision.get('thinking_process'):
@@ -666,6 +985,7 @@ Task: {message[:200]}{'...' if len(message) > 200 else ''}"""
         needs_clarification = any(r.needs_clarification for r in valid_results)
         
         if needs_clarification:
+            await reset_final_delta()
             # Find the agent needing clarification and format the question
             for result in valid_results:
                 if result.needs_clarification:
@@ -702,11 +1022,20 @@ Please provide this information so I can better assist you."""
             })
             return
         
+        # Forced finalization: do not start another iteration that the budget cannot pay for
+        if chief_decision.get('decision') == 'loop' and budget is not None and budget.nearly_exhausted():
+            reason = budget.exhausted_reason() or "nearly_exhausted"
+            budget.forced_final = reason
+            logger.warning(f"[ORCHESTRATOR] Query budget {reason} ({budget.status_line()}); finalizing instead of looping")
+            chief_decision['decision'] = 'final'
+            if not str(chief_decision.get('final_answer') or '').strip() and valid_results:
+                chief_decision['final_answer'] = max(valid_results, key=lambda r: r.confidence).result
+        
         # Chief Agent makes the final decision
         if chief_decision.get('decision') == 'loop' and iteration < self.MAX_ITERATIONS - 1:
             # Chief Agent wants another iteration
             guidance = chief_decision.get('additional_guidance', '')
-            thinking = chief_decision.get('thinking_process', 'Analyzing how to improve the answer...')
+            chief_thinking = chief_decision.get('thinking_process', 'Analyzing how to improve the answer...')
             logger.info(f"[ORCHESTRATOR] Chief Agent requesting iteration {iteration + 1} with guidance: {guidance}")
             
             await websocket.send_json({
@@ -715,7 +1044,7 @@ Please provide this information so I can better assist you."""
                 "text": f"""🔄 Refining Answer (Iteration {iteration + 2}/{self.MAX_ITERATIONS}, {self.MAX_ITERATIONS - iteration - 2} loops remaining)
 
 🤔 Chief Agent's Analysis:
-{thinking}
+{chief_thinking}
 
 🎯 Next Approach:
 {guidance}
@@ -736,11 +1065,9 @@ Please provide this information so I can better assist you."""
             else:
                 enhanced_message = f"{message}\n\nRefinement guidance: {guidance}"
             
-            # Brief delay for UI
-            await asyncio.sleep(0.3)
-            
-            # Start next iteration with Chief Agent's guidance
-            return await self.orchestrate(enhanced_message, websocket, iteration + 1, valid_results, project_id, branch_id, db_session)
+            # Start next iteration with Chief Agent's guidance; agents it does not address reuse their results
+            memo.guidance = guidance
+            return await self.orchestrate(enhanced_message, websocket, iteration + 1, valid_results, project_id, branch_id, db_session, memo)
         
         # Chief Agent has made final decision - prepare the response
         final_answer = chief_decision.get('final_answer', '')
@@ -751,6 +1078,14 @@ Please provide this information so I can better assist you."""
         logger.info(f"[ORCHESTRATOR] Selected approach: {selected_agent}")
         logger.info(f"[ORCHESTRATOR] Reasoning: {reasoning}")
         
+        # Log (query, agents launched, agents the Chief Agent used) to train the agent router
+        if not chief_decision.get('fallback'):
+            chosen = [a.__class__.__name__ for a in agents]
+            selected = chosen if 'combined' in str(selected_agent).lower() else guidance_targets(str(selected_agent))
+            selected = [a for a in chosen if a in set(selected or ())]
+            if chosen and selected:
+                await asyncio.to_thread(get_agent_router().record, memo.base_query, chosen, selected)
+        
         # Don't send stream update that would overwrite the bubble
         # Just proceed directly to the final message
         
@@ -843,6 +1178,7 @@ Please provide this information so I can better assist you."""
                 "confidence": max([r.confidence for r in valid_results]) if valid_results else 0.0,
                 "method": "Chief Agent Decision",
                 "orchestration_time": total_time,
+                "budget": budget.to_dict() if budget is not None else None,
                 "metadata": {
                     "all_results": [
                         {
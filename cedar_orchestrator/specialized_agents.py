@@ -17,6 +17,7 @@ import json
 import re
 import sqlite3
 import logging
+import asyncio
 import urllib.request
 import tempfile
 import mimetypes
@@ -25,6 +26,8 @@ from openai import AsyncOpenAI
 
 # Import AgentResult from execution_agents
 from .execution_agents import AgentResult
+from cedar_app.utils.tracing import instrument
+from cedar_app.utils.cassette import BYTES_CODEC, tape
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -339,25 +342,12 @@ Suggested Fix: Ensure OPENAI_API_KEY is set in environment and LLM client is pro
             db_metadata = "No specific database context available"
             if project_id:
                 try:
-                    from cedar_app.db_utils import _project_dirs, _get_project_engine
+                    from cedar_app.db_utils import _project_dirs
+                    from cedar_app.utils.schema_catalog import get_schema_catalog
                     db_path = _project_dirs(project_id)["db_path"]
                     if os.path.exists(db_path):
-                        conn = sqlite3.connect(db_path)
-                        cursor = conn.cursor()
-                        
-                        # Get all tables
-                        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                        tables = cursor.fetchall()
-                        
-                        db_metadata = "Available tables:\n"
-                        for table in tables:
-                            table_name = table[0]
-                            cursor.execute(f"PRAGMA table_info({table_name})")
-                            columns = cursor.fetchall()
-                            db_metadata += f"\n- {table_name}: "
-                            db_metadata += ", ".join([f"{col[1]} ({col[2]})" for col in columns])
-                        
-                        conn.close()
+                        # Cached catalog; only re-introspected when the schema_version changes
+                        db_metadata = get_schema_catalog(project_id).describe()
                 except Exception as e:
                     logger.warning(f"[DataAgent] Could not get database metadata: {e}")
             
@@ -425,11 +415,45 @@ Why: Analyzed available databases and suggested relevant SQL queries"""
 class FileAgent:
     """Agent that downloads files from the web or manages user-provided files"""
     
+    URL_PATTERN = r'https?://[^\s]+'
+    FILE_PATH_PATTERN = r'(/[^\s]+|[A-Za-z]:\\[^\s]+|\./[^\s]+)'
+    
     def __init__(self, llm_client: Optional[AsyncOpenAI], project_id: int = None, branch_id: int = None, db_session = None):
         self.llm_client = llm_client
         self.project_id = project_id
         self.branch_id = branch_id
         self.db_session = db_session
+    
+    def memo_key(self, task: str) -> str:
+        """The result depends only on the URLs/paths in the request (and the files' current state)"""
+        urls = re.findall(self.URL_PATTERN, task)
+        if urls:
+            return json.dumps(["urls", sorted(set(urls))])
+        paths = []
+        for path in sorted(set(re.findall(self.FILE_PATH_PATTERN, task))):
+            try:
+                st = os.stat(path)
+                paths.append([path, st.st_mtime_ns, st.st_size])
+            except OSError:
+                paths.append([path, None, None])
+        return json.dumps(["paths", paths])
+    
+    @instrument("http.get", kind="client", attributes=lambda self, url: {"url": url}, result_attributes=lambda body: {"bytes": len(body)})
+    @tape("http.get", key=lambda self, url: url, codec=BYTES_CODEC)
+    async def _download(self, url: str) -> bytes:
+        """Fetch url without blocking the event loop; cancelling the agent aborts the transfer."""
+        try:
+            import httpx
+        except ImportError:
+            # Fall back to urllib in a worker thread (not interruptible, but off the event loop)
+            def _fetch():
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    return response.read()
+            return await asyncio.to_thread(_fetch)
+        async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+            return response.content
         
     async def process(self, task: str) -> AgentResult:
         """Download files or process file paths and save with metadata"""
@@ -443,8 +467,8 @@ class FileAgent:
         import mimetypes
         
         # Check if task contains URLs or file paths
-        url_pattern = r'https?://[^\s]+'
-        file_path_pattern = r'(/[^\s]+|[A-Za-z]:\\[^\s]+|\./[^\s]+)'
+        url_pattern = self.URL_PATTERN
+        file_path_pattern = self.FILE_PATH_PATTERN
         
         urls = re.findall(url_pattern, task)
         file_paths = re.findall(file_path_pattern, task)
@@ -466,8 +490,7 @@ class FileAgent:
                     
                     # Download file
                     logger.info(f"[FileAgent] Downloading from {url}")
-                    with urllib.request.urlopen(url, timeout=30) as response:
-                        content = response.read()
+                    content = await self._download(url)
                         
                     # Save file
                     timestamp = time.strftime('%Y%m%d_%H%M%S')
@@ -515,7 +538,7 @@ class FileAgent:
                                     
                                     response = await self.llm_client.chat.completions.create(**completion_params)
                                     ai_description = response.choices[0].message.content.strip()
-                                except:
+                                except Exception:
                                     pass
                             
                             file_entry = FileEntry(
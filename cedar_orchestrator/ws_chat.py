@@ -7,10 +7,17 @@ import os
 import logging
 import json
 import time
+import asyncio
 import traceback
+from collections import deque
 from typing import Optional
 from fastapi import WebSocket, FastAPI
 from cedar_orchestrator.orchestrator import ThinkerOrchestrator
+from cedar_app.llm.response_cache import bypass_requested
+from cedar_app.utils.tracing import trace
+from cedar_app.llm.usage_ledger import llm_usage
+from cedar_app.llm.fake_server import fake_llm_enabled, FAKE_API_KEY
+from cedar_app.utils.cassette import record_dir, start_recording, stop_recording
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +44,8 @@ def register_ws_chat(app: FastAPI, deps: WSDeps, route_path: str = "/ws/chat/{pr
     
     # Get API key from environment
     api_key = os.getenv("OPENAI_API_KEY") or os.getenv("CEDARPY_OPENAI_API_KEY") or ""
+    if not api_key and fake_llm_enabled():
+        api_key = FAKE_API_KEY
     
     if not api_key:
         logger.warning("No OpenAI API key found. Some features will be limited.")
@@ -66,6 +75,54 @@ def register_ws_chat(app: FastAPI, deps: WSDeps, route_path: str = "/ws/chat/{pr
     print(f"[startup]   - {route_path} (with project context)")
     print(f"[startup]   - {simple_path} (general chat)")
 
+async def _run_abortable(websocket: WebSocket, coro, pending: deque) -> bool:
+    """
+    Run an orchestration while still listening to the client.
+    
+    A {"type": "cancel"} (or "abort") message, or the client disconnecting, cancels the
+    orchestration; running agents (e.g. shell commands) are cancelled with it. Pings are answered;
+    any other message is queued in `pending` and handled once the orchestration ends.
+    
+    Returns True if the orchestration ran to completion, False if it was cancelled.
+    """
+    task = asyncio.create_task(coro)
+    recv = None
+    try:
+        while not task.done():
+            recv = asyncio.ensure_future(websocket.receive_json())
+            done, _ = await asyncio.wait({task, recv}, return_when=asyncio.FIRST_COMPLETED)
+            if recv not in done:
+                recv.cancel()
+                recv = None
+                break
+            msg = recv.result()  # raises on disconnect; the finally block cancels the task
+            recv = None
+            kind = msg.get("type") if isinstance(msg, dict) else None
+            if kind in ("cancel", "abort"):
+                logger.info("[WebSocket] Client cancelled the running orchestration")
+                task.cancel()
+            elif kind == "ping":
+                await websocket.send_json({"type": "pong"})
+            else:
+                pending.append(msg)
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            await websocket.send_json({"type": "cancelled", "text": "Processing cancelled."})
+            return False
+        return True
+    finally:
+        if recv is not None:
+            recv.cancel()
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+
 async def handle_ws_chat(
     websocket: WebSocket, 
     orchestrator: ThinkerOrchestrator, 
@@ -81,6 +138,10 @@ async def handle_ws_chat(
         project_id: Optional project ID for context
         deps: Dependencies container
     """
+    # With CEDARPY_WS_RECORD set the connection is recorded as a replayable cassette (see cassette)
+    recording = start_recording(project_id=project_id) if record_dir() else None
+    if recording:
+        websocket = recording[0].wrap(websocket)
     try:
         await websocket.accept()
         
@@ -88,6 +149,8 @@ async def handle_ws_chat(
         from cedar_app.utils.chat_persistence import get_chat_manager
         chat_manager = get_chat_manager()
         current_chat_number = None
+        # Messages that arrived while an orchestration was running
+        pending = deque()
         
         logger.info(f"WebSocket connected: project_id={project_id}")
         
@@ -95,7 +158,7 @@ async def handle_ws_chat(
         while True:
             try:
                 # Receive message from client
-                data = await websocket.receive_json()
+                data = pending.popleft() if pending else await websocket.receive_json()
                 
                 # Support both formats: {"type": "message"} and {"action": "chat"}
                 message_type = data.get("type")
@@ -186,7 +249,7 @@ async def handle_ws_chat(
                                         self.proj_id, self.br_id, self.chat_num,
                                         role='Chief Agent',
                                         content=data.get('text', ''),
-                                        metadata={'type': 'final_answer'}
+                                        metadata={'type': 'final_answer', 'trace_id': data.get('trace_id')}
                                     )
                                     self.chat_mgr.set_chat_status(self.proj_id, self.br_id, self.chat_num, "complete")
                                 elif msg_type == 'error':
@@ -205,15 +268,21 @@ async def handle_ws_chat(
                         except Exception as e:
                             logger.warning(f"Could not get database session for notes: {e}")
                     
-                    # Process with advanced orchestrator (with optional notes persistence)
+                    # Process with advanced orchestrator (with optional notes persistence); the message is
+                    # one trace, viewable at /traces/<trace_id>
                     try:
-                        await orchestrator.orchestrate(
-                            content, 
-                            ws_to_use,
-                            project_id=project_id,
-                            branch_id=branch_id,
-                            db_session=db_session
-                        )
+                        with trace("chat.message", project_id=project_id, branch_id=branch_id, chat_number=chat_number) as message_span, \
+                                llm_usage(thread=f"chat:{chat_number}" if chat_number else None):
+                            completed = await _run_abortable(websocket, orchestrator.orchestrate(
+                                content, 
+                                ws_to_use,
+                                project_id=project_id,
+                                branch_id=branch_id,
+                                db_session=db_session,
+                                use_fast_path=not data.get("full_pipeline", False),
+                                use_llm_cache=not (str(data.get("llm_cache") or "").lower() == "bypass" or bypass_requested(websocket.headers))
+                            ), pending)
+                            message_span.set(completed=completed)
                     finally:
                         # Clean up database session
                         if db_session:
@@ -222,6 +291,11 @@ async def handle_ws_chat(
                             except:
                                 pass
                     
+                    if not completed:
+                        if project_id and chat_number:
+                            chat_manager.set_chat_status(project_id, branch_id, chat_number, "cancelled")
+                        continue
+                    
                     orchestration_time = time.time() - orchestration_start
                     logger.info("*"*80)
                     logger.info(f"[WebSocket] Orchestration completed in {orchestration_time:.3f}s")
@@ -252,6 +326,10 @@ async def handle_ws_chat(
                     # Handle ping/pong for connection keepalive
                     await websocket.send_json({"type": "pong"})
                     
+                elif data.get("type") in ("cancel", "abort"):
+                    # Nothing is running
+                    await websocket.send_json({"type": "cancelled", "text": "Nothing to cancel."})
+                    
                 elif data.get("type") == "close":
                     # Clean close requested
                     break
@@ -284,6 +362,8 @@ async def handle_ws_chat(
             logger.info(f"WebSocket disconnected: project_id={project_id}")
         except:
             pass
+        if recording:
+            stop_recording(*recording)
 
 # Export public interface
 __all__ = ['register_ws_chat', 'WSDeps']
\ No newline at end of file
@@ -1,10 +1,6 @@
 from __future__ import annotations
 
 import os
-import io
-import json
-import re
-import contextlib
 from typing import Any, Callable, List
 
 # Keys & Troubleshooting: see README
@@ -12,7 +8,6 @@ from typing import Any, Callable, List
 def tool_code(*, language: str, source: str, project_id: int, branch_id: int, SessionLocal: Callable[[], Any], FileEntry: Any, branch_filter_ids: Callable[[Any, int, int], List[int]], query_sql: Callable[[str], dict]) -> dict:
     if language.lower() != 'python':
         return {"ok": False, "error": "only python supported"}
-    logs = io.StringIO()
     def _cedar_query(sql_text: str):
         try:
             return query_sql(sql_text)
@@ -43,17 +38,16 @@ def tool_code(*, language: str, source: str, project_id: int, branch_id: int, Se
         finally:
             try: db.close()
             except Exception: pass
-    safe_globals: dict[str, Any] = {
-        "__builtins__": {"print": print, "len": len, "range": range, "str": str, "int": int, "float": float, "bool": bool, "list": list, "dict": dict, "set": set, "tuple": tuple},
-        "cedar": type("CedarHelpers", (), {"query": _cedar_query, "list_files": _cedar_list_files, "read": _cedar_read})(),
-        "sqlite3": __import__('sqlite3'),
-        "json": json,
-        "re": re,
-        "io": io,
-    }
-    try:
-        with contextlib.redirect_stdout(logs):
-            exec(compile(source, filename="<cedar_code>", mode="exec"), safe_globals, safe_globals)
-    except Exception as e:
-        return {"ok": False, "error": f"{type(e).__name__}: {e}", "logs": logs.getvalue()}
-    return {"ok": True, "logs": logs.getvalue()}
\ No newline at end of file
+    # Runs in a sandbox worker process; cedar.* calls come back to this thread as RPCs
+    from cedar_app.utils.code_sandbox import run_code
+    res = run_code(
+        source,
+        helpers={"query": _cedar_query, "list_files": _cedar_list_files, "read": _cedar_read},
+        filename="<cedar_code>",
+        builtins=["print", "len", "range", "str", "int", "float", "bool", "list", "dict", "set", "tuple"],
+        modules=["sqlite3", "json", "re", "io"],
+    )
+    logs = res.get("stdout") or ""
+    if not res.get("ok"):
+        return {"ok": False, "error": res.get("error"), "logs": logs}
+    return {"ok": True, "logs": logs}
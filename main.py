@@ -418,6 +418,15 @@ async def catch_exceptions_middleware(request: Request, call_next):
         # Re-raise to let FastAPI handle it
         raise
 
+# Requests with "X-Cedar-LLM-Cache: bypass" never get LLM answers from the response cache
+@app.middleware("http")
+async def _cedar_llm_cache_bypass_mw(request: Request, call_next):
+    from cedar_app.llm.response_cache import bypass_requested, llm_cache_bypass
+    if not bypass_requested(request.headers):
+        return await call_next(request)
+    with llm_cache_bypass():
+        return await call_next(request)
+
 # Register HTTP middleware for request logs
 @app.middleware("http")
 async def _cedar_logging_mw(request: Request, call_next):
@@ -1005,10 +1014,168 @@ async def ws_health(websocket: WebSocket):
 async def ws_sql(websocket: WebSocket, project_id: int):
     await handle_sql_websocket(websocket, project_id)
 
-# WebSocket SQL with undo and branch context
+# WebSocket SQL with undo, branch context and streaming cursors
 # Message format:
 #  - { "action": "exec", "sql": "...", "branch_id": 2 | null, "branch_name": "Main" | null, "max_rows": 200 }
-#  - { "action": "undo_last", "branch_id": 2 | null, "branch_name": "Main" | null }
+#  - { "action": "next" | "cancel", "cursor_id": "c1" }
+#  - { "action": "undo_last", "log_id": 17 | null, "branch_id": 2 | null }
+@app.websocket("/ws/sqlx/{project_id}")
+async def ws_sqlx(websocket: WebSocket, project_id: int):
+    await _ws_sqlx_impl(websocket, project_id)
+
+# Per-project SQL time/VM-step budget (defaults: CEDARPY_SQL_TIMEOUT_MS, CEDARPY_SQL_MAX_STEPS)
+@app.get("/api/project/{project_id}/sql/budget")
+def api_get_sql_budget(project_id: int):
+    from cedar_app.utils.sql_budget import get_project_sql_budget
+    ensure_project_initialized(project_id)
+    return get_project_sql_budget(project_id).to_dict()
+
+@app.get("/api/sql/cache/stats")
+def api_sql_cache_stats():
+    from cedar_app.utils.query_cache import query_cache_stats
+    from cedar_app.utils.schema_catalog import schema_catalog_stats
+    return {"query_cache": query_cache_stats(), "schema_catalog": schema_catalog_stats()}
+
+# Shared LLM gateway: pooled clients, retries and circuit breaker state (see cedar_app/llm/gateway.py)
+@app.get("/api/llm/gateway/stats")
+def api_llm_gateway_stats():
+    from cedar_app.llm.gateway import llm_gateway_stats
+    return llm_gateway_stats()
+
+# Persistent LLM response cache: hits, misses, size (see cedar_app/llm/response_cache.py)
+@app.get("/api/llm/cache/stats")
+def api_llm_cache_stats():
+    from cedar_app.llm.response_cache import llm_response_cache_stats
+    return llm_response_cache_stats()
+
+# LLM usage ledger: token/cost rollups by project, thread, agent, feature, model or day (see cedar_app/llm/usage_ledger.py)
+@app.get("/api/llm/usage")
+def api_llm_usage(group_by: str = "project", days: Optional[float] = 7, project_id: Optional[int] = None,
+                  agent: Optional[str] = None, feature: Optional[str] = None, thread: Optional[str] = None):
+    from cedar_app.llm.usage_ledger import GROUP_COLUMNS, usage_rollup, get_usage_ledger
+    keys = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in keys if g not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown group_by {unknown}; use {sorted(GROUP_COLUMNS)}")
+    rows = usage_rollup(group_by=keys, days=days, project=project_id, agent=agent, feature=feature, thread=thread)
+    return {"group_by": keys, "days": days, "rows": rows, "ledger": get_usage_ledger().snapshot()}
+
+@app.get("/api/llm/usage/recent")
+def api_llm_usage_recent(limit: int = 100, project_id: Optional[int] = None, feature: Optional[str] = None):
+    from cedar_app.llm.usage_ledger import get_usage_ledger
+    return {"calls": get_usage_ledger().recent(limit=limit, project=project_id, feature=feature)}
+
+# Budget overruns for alerting: 200 with ok=false when any CEDARPY_USAGE_BUDGETS limit is exceeded
+@app.get("/api/llm/usage/alerts")
+def api_llm_usage_alerts():
+    from cedar_app.llm.usage_ledger import check_budgets
+    return check_budgets()
+
+# Content-hash keyed artifacts of the file pipeline (see cedar_app/utils/artifact_cache.py)
+@app.get("/api/artifacts/stats")
+def api_artifact_cache_stats():
+    from cedar_app.utils.artifact_cache import artifact_cache_stats
+    return artifact_cache_stats()
+
+# Deterministic fast path hit rate (see cedar_app/utils/fast_path.py)
+@app.get("/api/fast_path/stats")
+def api_fast_path_stats():
+    from cedar_app.utils.fast_path import fast_path_stats
+    return fast_path_stats()
+
+@app.get("/api/sandbox/stats")
+def api_sandbox_stats():
+    from cedar_app.utils.code_sandbox import sandbox_stats
+    return sandbox_stats()
+
+# Orchestration traces: one per chat message, spans per agent/LLM/tool/DB call (see cedar_app/utils/tracing.py)
+@app.get("/api/traces")
+def api_traces(project_id: Optional[int] = None, chat_number: Optional[int] = None, limit: int = 50):
+    from cedar_app.utils.tracing import get_trace_store, trace_stats
+    return {"traces": get_trace_store().list(project_id=project_id, chat_number=chat_number, limit=limit), "stats": trace_stats()}
+
+@app.get("/api/traces/{trace_id}")
+def api_trace(trace_id: str, format: Optional[str] = None):
+    from cedar_app.utils.tracing import get_trace_store, timeline, to_otlp
+    data = get_trace_store().get(trace_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="trace not found")
+    if format == "otlp":
+        return to_otlp(data)
+    data["timeline"] = timeline(data)
+    return data
+
+@app.get("/traces/{trace_id}", response_class=HTMLResponse)
+def view_trace(trace_id: str):
+    # Waterfall of one chat message's spans; the critical path is highlighted
+    from cedar_app.utils.tracing import get_trace_store, timeline
+    data = get_trace_store().get(trace_id)
+    if data is None:
+        return layout("Trace", "<h1>Trace</h1><div class='card muted'>Trace not found (it may have been pruned).</div>")
+    tl = timeline(data)
+    total = max(tl["duration_ms"], 0.001)
+    colors = {"llm": "#6366f1", "agent": "#0ea5e9", "tool": "#f59e0b", "http": "#14b8a6", "db": "#84cc16",
+              "websocket": "#a3a3a3", "chief": "#ec4899", "other": "#64748b"}
+    rows = []
+    for r in tl["rows"]:
+        left = 100.0 * r["offset_ms"] / total
+        width = max(0.2, 100.0 * r["duration_ms"] / total)
+        attrs = ", ".join(f"{k}={v}" for k, v in r["attributes"].items() if k not in ("message",))
+        bar_style = f"margin-left:{left:.3f}%;width:{width:.3f}%;background:{colors.get(r['category'], '#64748b')};height:10px;border-radius:2px"
+        if r["critical"]:
+            bar_style += ";outline:2px solid #dc2626"
+        status = "" if r["status"] == "ok" else f" <span class='pill'>{escape(str(r['status']))}</span>"
+        rows.append(
+            f"<tr><td class='small' style='padding-left:{8 + 14 * r['depth']}px;white-space:nowrap'>{'<b>' if r['critical'] else ''}{escape(r['name'])}{'</b>' if r['critical'] else ''}{status}</td>"
+            f"<td class='small' style='text-align:right'>{r['duration_ms']:.1f} ms</td>"
+            f"<td style='width:55%'><div title='{escape(attrs)}' style='{bar_style}'></div></td></tr>"
+        )
+    breakdown = ", ".join(f"{escape(k)} {v:.0f} ms" for k, v in tl["critical_ms_by_category"].items()) or "n/a"
+    message = escape(str((data.get("attributes") or {}).get("message") or ""))
+    body = f"""
+      <h1>Trace {escape(trace_id[:12])}</h1>
+      <div class='card'>
+        <div class='small muted'>{escape(str(data.get('name')))} · {tl['duration_ms']:.0f} ms · {len(tl['rows'])} spans · status {escape(str(data.get('status')))}
+          · <a href='/api/traces/{escape(trace_id)}'>JSON</a> · <a href='/api/traces/{escape(trace_id)}?format=otlp'>OTLP</a></div>
+        {f"<div class='small'>{message}</div>" if message else ''}
+        <div class='small' style='margin-top:6px'><b>Critical path:</b> {breakdown} (outlined in red)</div>
+        <table class='table' style='margin-top:8px'>
+          <thead><tr><th>Span</th><th>Duration</th><th>Timeline</th></tr></thead>
+          <tbody>{''.join(rows) or "<tr><td colspan='3' class='muted'>(no spans)</td></tr>"}</tbody>
+        </table>
+      </div>
+    """
+    return layout("Trace", body)
+
+@app.on_event("startup")
+def _instrument_tracing():
+    # Database statements run inside a chat trace become db.query spans
+    try:
+        from cedar_app.utils.tracing import instrument_sqlalchemy
+        instrument_sqlalchemy()
+    except Exception as e:
+        print(f"[startup] tracing instrumentation skipped: {type(e).__name__}: {e}")
+
+@app.on_event("startup")
+def _warm_code_sandbox():
+    # Pre-start sandbox workers so the first generated-code job does not pay the numpy/pandas import
+    if os.getenv("CEDARPY_SANDBOX_PREWARM", "1").strip().lower() in ("0", "false", "no"):
+        return
+    try:
+        from cedar_app.utils.code_sandbox import warm_sandbox_pool
+        warm_sandbox_pool()
+    except Exception as e:
+        print(f"[startup] sandbox prewarm skipped: {type(e).__name__}: {e}")
+
+@app.post("/api/project/{project_id}/sql/budget")
+def api_set_sql_budget(project_id: int, payload: Dict[str, Any]):
+    from cedar_app.utils.sql_budget import set_project_sql_budget
+    ensure_project_initialized(project_id)
+    try:
+        budget = set_project_sql_budget(project_id, timeout_ms=payload.get("timeout_ms"), max_steps=payload.get("max_steps"))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"{type(e).__name__}: {e}")
+    return budget.to_dict()
 
 # Client log ingestion API (merges into _LOG_BUFFER)
 class ClientLogEntry(BaseModel):
@@ -1100,7 +1267,7 @@ def delete_project(project_id: int, db: Session = Depends(get_registry_db)):
 @app.post("/project/{project_id}/sql/undo_last")
 def undo_last_sql(project_id: int, request: Request, db: Session = Depends(get_project_db)):
     """Undo last SQL operation. Delegates to extracted module."""
-    return undo_last_sql_impl(project_id, request, db)
+    return sql_routes.undo_last_sql_impl(project_id, request, db)
 def execute_sql(project_id: int, request: Request, sql: str = Form(...), db: Session = Depends(get_project_db)):
     ensure_project_initialized(project_id)
     # resolve current project and branch
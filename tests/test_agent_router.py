@@ -0,0 +1,115 @@
+import os
+import sys
+import random
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+pytest.importorskip("numpy")
+
+from cedar_app.utils.agent_router import AgentRouter
+
+TOPICS = {
+    "SQLAgent": ["how many rows are in the orders table", "show revenue per customer from the sales table",
+                 "count distinct users in the events table", "list the top products by units sold in the table"],
+    "ShellAgent": ["find all python files under my projects folder", "grep for TODO in the repo",
+                   "list files in my downloads folder", "search my computer for files about taxes"],
+    "ResearchAgent": ["find papers on protein folding", "literature review of transformer scaling",
+                      "recent studies about sleep and memory", "cite sources on climate sensitivity"],
+}
+
+
+def _log(router, n, rng):
+    for _ in range(n):
+        agent = rng.choice(sorted(TOPICS))
+        query = rng.choice(TOPICS[agent]) + rng.choice(["", " please", " quickly", " for me"])
+        # The keyword rules launched extra agents; the Chief used only one of them
+        router.record(query, ["CodeAgent", "DataAgent", agent], [agent])
+
+
+def test_router_learns_from_logged_selections(tmp_path, monkeypatch):
+    monkeypatch.setenv("CEDARPY_ROUTER_MIN_EXAMPLES", "30")
+    monkeypatch.setenv("CEDARPY_ROUTER_EXPLORE", "0")
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"), background=False)
+    rng = random.Random(3)
+    _log(router, 10, rng)
+    # Not enough examples yet: fall back to the keyword rules
+    assert router.route("how many rows are in the invoices table") is None
+
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"), background=False)
+    _log(router, 80, rng)
+    agents, probs = router.route("how many rows are in the invoices table")
+    assert agents == ["SQLAgent"]
+    assert probs["CodeAgent"] < 0.5 and probs["DataAgent"] < 0.5
+    assert router.route("grep for FIXME in the repo")[0] == ["ShellAgent"]
+    assert router.route("papers on protein design")[0] == ["ResearchAgent"]
+
+
+def test_low_confidence_falls_back(tmp_path, monkeypatch):
+    monkeypatch.setenv("CEDARPY_ROUTER_MIN_EXAMPLES", "30")
+    monkeypatch.setenv("CEDARPY_ROUTER_EXPLORE", "0")
+    monkeypatch.setenv("CEDARPY_ROUTER_THRESHOLD", "0.99")
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"), background=False)
+    _log(router, 60, random.Random(5))
+    assert router.route("tell me a joke") is None
+    monkeypatch.setenv("CEDARPY_ROUTER_DISABLED", "1")
+    assert router.predict("grep for TODO in the repo") == {}
+
+
+def test_unlaunched_agents_are_not_negatives(tmp_path, monkeypatch):
+    monkeypatch.setenv("CEDARPY_ROUTER_MIN_EXAMPLES", "30")
+    monkeypatch.setenv("CEDARPY_ROUTER_EXPLORE", "0")
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"), background=False)
+    rng = random.Random(7)
+    for n in range(80):
+        query = rng.choice(TOPICS["SQLAgent"]) + rng.choice(["", " please", " for me"])
+        if n % 3 == 0:
+            # The keyword rules did not launch SQLAgent, so the Chief could only pick CodeAgent
+            router.record(query, ["CodeAgent"], ["CodeAgent"])
+        else:
+            # Selections outside the launched agents are not kept
+            router.record(query, ["CodeAgent", "SQLAgent"], ["SQLAgent", "ResearchAgent"])
+    assert all("ResearchAgent" not in ex["selected"] for ex in router.load_examples())
+    agents, probs = router.route("how many rows are in the invoices table")
+    assert agents == ["SQLAgent"] and probs["SQLAgent"] > 0.9
+    # Never launched for these queries: no evidence either way, so it stays at the floor instead of
+    # being learned as a negative
+    assert probs["ResearchAgent"] < 0.1
+
+
+def test_exploration_leaves_some_queries_to_the_keyword_rules(tmp_path, monkeypatch):
+    monkeypatch.setenv("CEDARPY_ROUTER_MIN_EXAMPLES", "30")
+    monkeypatch.setenv("CEDARPY_ROUTER_EXPLORE", "0.5")
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"), background=False)
+    _log(router, 60, random.Random(9))
+    router._rng = random.Random(1)
+    routed = [router.route("grep for TODO in the repo") for _ in range(200)]
+    fallbacks = sum(r is None for r in routed)
+    assert 60 < fallbacks < 140
+    assert all(r[0] == ["ShellAgent"] for r in routed if r is not None)
+
+
+def test_refit_runs_in_the_background(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    monkeypatch.setenv("CEDARPY_ROUTER_MIN_EXAMPLES", "30")
+    monkeypatch.setenv("CEDARPY_ROUTER_EXPLORE", "0")
+    router = AgentRouter(log_path=str(tmp_path / "routing.jsonl"))
+    _log(router, 60, random.Random(3))
+    release = threading.Event()
+    fit = router.fit
+    def slow_fit(examples):
+        release.wait(5)
+        return fit(examples)
+    monkeypatch.setattr(router, "fit", slow_fit)
+
+    started = time.monotonic()
+    assert router.route("grep for TODO in the repo") is None  # no model yet: keyword rules, no waiting
+    assert time.monotonic() - started < 1.0
+    release.set()
+    router._fitter.join(5)
+    assert router.route("grep for TODO in the repo")[0] == ["ShellAgent"]
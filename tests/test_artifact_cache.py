@@ -0,0 +1,114 @@
+import os
+import sys
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils import artifact_cache
+from cedar_app.utils.artifact_cache import ArtifactCache, file_sha256, remap_paths
+
+
+def test_stage_files_are_restored_and_versions_invalidate(tmp_path):
+    root = str(tmp_path / "artifacts")
+    out = tmp_path / "upload1" / "doc_extracted"
+    out.mkdir(parents=True)
+    (out / "page1_img1.png").write_bytes(b"png-bytes")
+    value = {"metadata": {"output_directory": str(out)}, "extracted_files": [str(out / "page1_img1.png")]}
+
+    cache = ArtifactCache(root=root, versions={"pdf_extract": 1, "ocr": 1})
+    assert cache.get("pdf_extract", "ab" * 32) is None
+    assert cache.put("pdf_extract", "ab" * 32, value, files=value["extracted_files"], compute_ms=250)
+    cache.put("ocr", "ab" * 32, "text", variant=("eng",))
+
+    entry = cache.get("pdf_extract", "ab" * 32)
+    dest = tmp_path / "upload2" / "doc_extracted"
+    restored = remap_paths(entry.value, entry.restore(str(dest)))
+    assert restored["extracted_files"] == [str(dest / "page1_img1.png")]
+    assert restored["metadata"]["output_directory"] == str(dest)
+    assert (dest / "page1_img1.png").read_bytes() == b"png-bytes"
+    assert cache.get("ocr", "ab" * 32) is None and cache.get("ocr", "ab" * 32, variant=("eng",)).value == "text"
+    stats = cache.snapshot()
+    assert stats["hits"] == 2 and stats["saved_ms"] == 250 and stats["by_stage"]["pdf_extract"]["stores"] == 1
+
+    # A new code version of pdf_extract drops its artifacts (and their files) on open; ocr is untouched
+    bumped = ArtifactCache(root=root, versions={"pdf_extract": 2, "ocr": 1})
+    assert bumped.get("pdf_extract", "ab" * 32) is None
+    assert bumped.snapshot()["invalidated"] == 1 and not os.path.exists(entry.files_dir)
+    assert bumped.get("ocr", "ab" * 32, variant=("eng",)).value == "text"
+    assert bumped.invalidate(sha="ab" * 32) == 1
+
+
+def test_restore_keeps_layout_and_invalidate_by_variant(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "artifacts"))
+    out = tmp_path / "upload1" / "doc_extracted"
+    files = [out / "page1" / "img1.png", out / "page2" / "img1.png", out / "ocr.txt"]
+    for i, p in enumerate(files):
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(b"file %d" % i)
+    value = {"output_directory": str(out), "pages": [str(out / "page1"), str(out / "page2")], "files": [str(p) for p in files]}
+    assert cache.put("pdf_extract", "cd" * 32, value, files=value["files"])
+
+    entry = cache.get("pdf_extract", "cd" * 32)
+    dest = tmp_path / "upload2" / "doc_extracted"
+    restored = remap_paths(entry.value, entry.restore(str(dest)))
+    # Files with the same name in different directories do not overwrite each other
+    assert restored["files"] == [str(dest / "page1" / "img1.png"), str(dest / "page2" / "img1.png"), str(dest / "ocr.txt")]
+    assert [open(p, "rb").read() for p in restored["files"]] == [b"file 0", b"file 1", b"file 2"]
+    assert restored["pages"] == [str(dest / "page1"), str(dest / "page2")] and restored["output_directory"] == str(dest)
+
+    cache.put("tabular_codegen", "cd" * 32, "code a", variant=("gpt-5", "a.csv"))
+    cache.put("tabular_codegen", "cd" * 32, "code b", variant=("gpt-5", "b.csv"))
+    assert cache.invalidate("tabular_codegen", "cd" * 32, variant=("gpt-5", "a.csv")) == 1
+    assert cache.get("tabular_codegen", "cd" * 32, variant=("gpt-5", "a.csv")) is None
+    assert cache.get("tabular_codegen", "cd" * 32, variant=("gpt-5", "b.csv")).value == "code b"
+    assert cache.invalidate("tabular_codegen", "cd" * 32) == 1
+
+
+def test_reupload_reuses_interpretation_text_and_classification(tmp_path, monkeypatch):
+    cache = ArtifactCache(root=str(tmp_path / "artifacts"))
+    monkeypatch.setattr(artifact_cache, "_cache", cache)
+    from cedar_app.file_utils import interpret_file
+    import cedar_langextract as lx
+
+    first = tmp_path / "p1" / "orders.csv"
+    second = tmp_path / "p2" / "copy.csv"
+    for p in (first, second):
+        p.parent.mkdir()
+        p.write_text("id,total\n1,2.5\n2,3.0\n")
+
+    m1 = interpret_file(str(first), "orders.csv")
+    m2 = interpret_file(str(second), "copy.csv")
+    assert m1["sha256"] == m2["sha256"] == file_sha256(str(second))
+    assert m2["line_count"] == 3 and m2["csv_dialect"]["delimiter"] == ","
+    assert cache.snapshot()["by_stage"]["interpret_file"] == {"hits": 1, "misses": 1, "stores": 1}
+
+    calls = []
+    monkeypatch.setattr(lx, "_file_to_text", lambda path, ext, meta: calls.append(path) or "converted")
+    assert lx.file_to_text(str(first), "orders.csv", m1) == "converted"
+    assert lx.file_to_text(str(second), "copy.csv", m2) == "converted"
+    assert calls == [str(first)]
+
+    # Classification is keyed on the bytes, display name and model
+    import cedar_app.llm_utils as llm_utils
+
+    class Client:
+        def __init__(self):
+            self.chat = self
+            self.completions = self
+            self.calls = 0
+
+        def create(self, **kwargs):
+            self.calls += 1
+            msg = type("M", (), {"content": '{"structure": "tabular", "ai_title": "Orders", "ai_description": "d", "ai_category": "c"}'})
+            return type("R", (), {"choices": [type("C", (), {"message": msg})]})
+
+    client = Client()
+    monkeypatch.setattr(llm_utils, "llm_client_config", lambda: (client, "m"))
+    monkeypatch.setenv("CEDARPY_LLM_CACHE", "0")
+    meta = dict(m1, display_name="orders.csv")
+    assert llm_utils.llm_classify_file(meta)["structure"] == "tabular"
+    assert llm_utils.llm_classify_file(dict(m2, display_name="orders.csv"))["ai_title"] == "Orders"
+    llm_utils.llm_classify_file(dict(m2, display_name="other.csv"))
+    assert client.calls == 2
+
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.async_shell import run_shell
+
+
+def _alive(pid):
+    # Orphaned children may linger as zombies until init reaps them; those count as dead
+    if os.path.isdir("/proc/self"):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().rsplit(")", 1)[-1].split()[0] != "Z"
+        except FileNotFoundError:
+            return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+def test_streams_both_pipes_and_exit_code():
+    chunks = []
+
+    async def on_output(stream, text):
+        chunks.append((stream, text))
+
+    run = asyncio.run(run_shell("echo out; echo err >&2; printf 'é'; exit 3", on_output=on_output, timeout=10))
+    assert run.exit_code == 3 and not run.timed_out
+    assert run.stdout == "out\né" and run.stderr == "err\n"
+    assert "".join(t for s, t in chunks if s == "stdout") == run.stdout
+
+
+def test_event_loop_stays_responsive_and_commands_overlap():
+    async def main():
+        ticks = []
+
+        async def ticker():
+            for _ in range(10):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        start = time.monotonic()
+        runs = await asyncio.gather(run_shell("sleep 0.5; echo a", timeout=10), run_shell("sleep 0.5; echo b", timeout=10), ticker())
+        return time.monotonic() - start, runs, ticks
+
+    elapsed, runs, ticks = asyncio.run(main())
+    assert [r.stdout for r in runs[:2]] == ["a\n", "b\n"]
+    assert elapsed < 0.95  # two half-second commands ran concurrently
+    assert len(ticks) == 10 and max(b - a for a, b in zip(ticks, ticks[1:])) < 0.3
+
+
+def test_timeout_kills_process_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    run = asyncio.run(run_shell(f"sleep 30 & echo $! > {pid_file}; echo started; wait", timeout=0.5))
+    assert run.timed_out and run.stdout == "started\n" and run.elapsed_s < 5
+    time.sleep(0.1)
+    assert not _alive(int(pid_file.read_text()))
+
+
+def test_cancel_kills_process_and_propagates(tmp_path):
+    pid_file = tmp_path / "pid"
+
+    async def main():
+        task = asyncio.create_task(run_shell(f"echo $$ > {pid_file}; sleep 30", timeout=60))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    time.sleep(0.1)
+    assert not _alive(int(pid_file.read_text()))
+
+
+def test_capture_is_bounded():
+    run = asyncio.run(run_shell("head -c 100000 /dev/zero | tr '\\0' x", max_capture=1000, timeout=10))
+    assert run.exit_code == 0 and run.truncated and len(run.stdout) == 1000
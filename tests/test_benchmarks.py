@@ -0,0 +1,67 @@
+import os
+import re
+import sys
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from benchmarks import compare_results, load_results, run_benchmarks, save_results
+from benchmarks import datagen
+
+
+def test_synthetic_data_is_deterministic(tmp_path):
+    assert datagen.synthetic_text(500, seed=4) == datagen.synthetic_text(500, seed=4)
+    assert len(datagen.synthetic_text(500).split()) == 500
+    assert len(datagen.csv_rows(100)) == 101 and datagen.json_records(10, seed=1) == datagen.json_records(10, seed=1)
+
+    pdf = datagen.pdf_bytes(3)
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    offsets = [int(o) for o in re.findall(rb"(\d{10}) 00000 n", pdf[xref:])]
+    assert len(offsets) == 3 + 2 * 3  # catalog, pages, font + (page, content) per page
+    for n, offset in enumerate(offsets, start=1):
+        assert pdf[offset:].startswith(b"%d 0 obj" % n)
+
+
+def test_quick_run_and_json_results(tmp_path, monkeypatch):
+    monkeypatch.delenv("CEDARPY_FAKE_LLM", raising=False)
+    doc = run_benchmarks(only=["interpret_file.csv", "retrieve_top_chunks", "sql_with_undo.insert", "tabular_import"],
+                         mode="quick", repeat=2, workdir=str(tmp_path / "work"))
+    results = doc["results"]
+    assert list(results) == ["interpret_file.csv", "retrieve_top_chunks", "sql_with_undo.insert", "tabular_import"]
+    for name in ("interpret_file.csv", "retrieve_top_chunks", "sql_with_undo.insert"):
+        r = results[name]
+        assert r["status"] == "ok" and r["repeat"] == 2, r
+        assert 0 < r["min_ms"] <= r["median_ms"] <= r["p95_ms"] <= r["max_ms"]
+    assert results["retrieve_top_chunks"]["metrics"]["hits"] == 20
+    assert results["tabular_import"]["status"] == "skipped" and "CEDARPY_FAKE_LLM" in results["tabular_import"]["reason"]
+
+    path = save_results(doc, str(tmp_path / "out" / "results.json"))
+    assert load_results(path) == doc
+    assert compare_results(doc, load_results(path))["ok"]
+
+
+def _doc(**medians):
+    return {"results": {name: ({"status": "ok", "params": {"n": 1}, "median_ms": ms, "threshold_pct": 25}
+                               if isinstance(ms, float) else {"status": ms, "params": {"n": 1}})
+                        for name, ms in medians.items()}}
+
+
+def test_compare_with_thresholds():
+    base = _doc(a=100.0, b=100.0, tiny=0.2, c=10.0, gone=5.0, d=50.0)
+    cur = _doc(a=130.0, b=110.0, tiny=0.4, c="error", d=20.0, new=1.0)
+    cmp = compare_results(base, cur)
+    status = {r["name"]: r["status"] for r in cmp["rows"]}
+    assert status == {"a": "regressed", "b": "ok", "tiny": "ok", "c": "broken", "gone": "missing", "d": "improved", "new": "new"}
+    assert not cmp["ok"]
+
+    relaxed = compare_results(base, _doc(a=130.0), thresholds={"a": 40})
+    assert relaxed["ok"] and relaxed["rows"][0]["threshold_pct"] == 40
+    assert not compare_results(base, _doc(a=130.0, b=120.0), threshold_pct=15)["ok"]
+
+    other_size = _doc(a=500.0)
+    other_size["results"]["a"]["params"] = {"n": 2}
+    assert compare_results(base, other_size)["rows"][0]["status"] == "incomparable"
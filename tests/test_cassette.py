@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from starlette.websockets import WebSocketDisconnect
+
+from cedar_app.llm.gateway import LLMGateway, RetryPolicy
+from cedar_app.llm.response_cache import LLMResponseCache
+from cedar_app.llm.scheduler import LLMScheduler
+from cedar_app.llm.usage_ledger import UsageLedger
+from cedar_app.llm.fake_server import FakeLLM, Rule
+from cedar_app.utils import async_shell, tracing
+from cedar_app.utils.async_shell import run_shell
+from cedar_app.utils.cassette import (
+    PYTHON_CODEC, CassettePlayer, compare_reports, llm_key, replay_cassette, start_recording, stop_recording, tape,
+)
+from cedar_app.utils import cassette as cassette_mod
+from cedar_app.utils.tracing import TraceStore, TracedWebSocket, trace
+
+
+class ClientWebSocket:
+    """The browser side of a live connection: sends the scripted messages, then disconnects."""
+
+    def __init__(self, inbound):
+        self.inbound = list(inbound)
+        self.sent = []
+        self.headers = {}
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        if not self.inbound:
+            raise WebSocketDisconnect(1000)
+        await asyncio.sleep(0.01)
+        return self.inbound.pop(0)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        pass
+
+
+def _chat_handler(fake, tmp_path, prompt_prefix=""):
+    gw = LLMGateway(policy=RetryPolicy(max_retries=0, base_s=0, max_s=0), async_factory=fake.async_factory,
+                    scheduler=LLMScheduler(rpm=0, tpm=0), cache=LLMResponseCache(path=str(tmp_path / "llm.sqlite")),
+                    ledger=UsageLedger(path=str(tmp_path / "usage.sqlite"), flush_s=0))
+    client = gw.async_client("sk-test")
+    shell_output = []
+
+    async def handler(ws):
+        await ws.accept()
+        while True:
+            try:
+                msg = await ws.receive_json()
+            except Exception:
+                return
+            if msg.get("type") == "ping":
+                await ws.send_json({"type": "pong"})
+                continue
+            with trace("chat.message"):
+                out = TracedWebSocket(ws)
+                await out.send_json({"type": "processing"})
+                plan = await client.chat.completions.create(
+                    model="gpt-5-mini", messages=[{"role": "user", "content": prompt_prefix + "plan: " + msg["content"]}])
+                stream = await client.chat.completions.create(
+                    model="gpt-5", messages=[{"role": "user", "content": "answer: " + msg["content"]}], stream=True)
+                parts = []
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        await out.send_json({"type": "final_delta", "delta": parts[-1]})
+                run = await run_shell("echo tool-output", on_output=lambda s, t: shell_output.append(t))
+                await out.send_json({"type": "final", "text": f"{plan.choices[0].message.content}|{''.join(parts)}|{run.stdout.strip()}"})
+    return handler, shell_output
+
+
+def test_record_then_replay_deterministically(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "_store", TraceStore(path=str(tmp_path / "traces.sqlite")))
+    live = FakeLLM(rules=[Rule(match="plan:", reply="PLAN-A", latency_ms=80),
+                          Rule(match="answer:", reply="the recorded answer", latency_ms=40)], token_ms=5, chunk_chars=4)
+    handler, _ = _chat_handler(live, tmp_path)
+    client = ClientWebSocket([{"type": "message", "content": "first"}, {"type": "ping"}, {"type": "message", "content": "second"}])
+
+    recorder, token = start_recording(project_id=3)
+    try:
+        asyncio.run(handler(recorder.wrap(client)))
+    finally:
+        assert stop_recording(recorder, token) is None  # CEDARPY_WS_RECORD is not set: nothing written
+    cassette = json.loads(json.dumps(recorder.to_dict()))
+    recorded = cassette["report"]
+    assert [t["end"] for t in recorded["turns"]] == ["final", "final"]
+    assert recorded["calls"]["llm.chat"]["count"] == 4 and recorded["calls"]["tool.shell"]["count"] == 2
+    assert recorded["events"]["ws.in"] == 3 and recorded["ws_out_types"]["pong"] == 1
+    assert recorded["turns"][0]["end_ms"] >= 80 and recorded["turns"][0]["stages"]["span_ms"]["llm.chat"] >= 80
+    finals = [m["text"] for m in client.sent if m["type"] == "final"]
+
+    # Replay against an LLM that would answer differently and a shell that must not run
+    other = FakeLLM(rules=[Rule(reply="SOMETHING ELSE")])
+    replay_handler, shell_output = _chat_handler(other, tmp_path)
+
+    async def no_shell(*args, **kwargs):
+        raise AssertionError("replay must not run commands")
+    monkeypatch.setattr(async_shell.asyncio, "create_subprocess_shell", no_shell)
+
+    sent = []
+    async def capture(ws):
+        original = ws.send_json
+
+        async def send_json(data):
+            sent.append(data)
+            await original(data)
+        ws.send_json = send_json
+        await replay_handler(ws)
+
+    started = time.monotonic()
+    report = asyncio.run(replay_cassette(cassette, handler=capture, speed=0))
+    assert time.monotonic() - started < recorded["duration_ms"] / 1000
+    assert [m["text"] for m in sent if m["type"] == "final"] == finals == ["PLAN-A|the recorded answer|tool-output"] * 2
+    assert shell_output == ["tool-output\n"] * 2  # on_output callbacks get the recorded output
+    assert other.snapshot()["calls"] == 0
+    assert report["replay"] == {"speed": 0.0, "substituted": 0, "misses": 0, "stalls": 0, "unused_calls": 0}
+    assert report["ws_out_types"] == recorded["ws_out_types"]
+    assert report["turns"][0]["stages"]["span_ms"]["llm.chat"] < 80  # compressed timing
+
+    diff = compare_reports(recorded, report)
+    assert diff["total_turn_ms"]["delta"] < 0 and diff["calls"]["llm.chat"]["count_delta"] == 0 and diff["turn_count_delta"] == 0
+
+    # Original timing, and a changed prompt still gets the recorded answers (counted as substituted)
+    changed_handler, _ = _chat_handler(other, tmp_path, prompt_prefix="v2 ")
+    report = asyncio.run(replay_cassette(cassette, handler=changed_handler, speed=1))
+    assert report["replay"]["substituted"] == 2 and report["replay"]["misses"] == 0
+    assert report["turns"][0]["end_ms"] >= 80
+
+
+def test_llm_key_ignores_the_budget_line():
+    from cedar_app.llm.response_cache import volatile_message
+    messages = [{"role": "user", "content": "User Query: what is 2+2"}]
+    first = llm_key(None, None, {"model": "gpt-5", "messages": messages + [volatile_message("Query Budget Used: 1/40 LLM calls")]})
+    later = llm_key(None, None, {"model": "gpt-5", "messages": messages + [volatile_message("Query Budget Used: 9/40 LLM calls")]})
+    assert first == later == llm_key(None, None, {"model": "gpt-5", "messages": messages})
+
+
+def test_streams_closed_or_cancelled_early_are_still_recorded():
+    @tape("test.stream", key=lambda n: str(n), stream=lambda n: True)
+    async def numbers(n):
+        async def gen():
+            for i in range(n):
+                await asyncio.sleep(0.01)
+                yield {"i": i}
+        return gen()
+
+    @tape("test.sync_stream", key=lambda n: str(n), stream=lambda n: True)
+    def sync_numbers(n):
+        return iter([{"i": i} for i in range(n)])
+
+    async def main():
+        stream = await numbers(5)
+        async for chunk in stream:
+            if chunk["i"] == 1:
+                break
+        await stream.aclose()  # consumer stops early
+
+        stream = await numbers(50)
+        async def consume():
+            async for _ in stream:
+                pass
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.035)
+        task.cancel()  # e.g. the user pressed stop
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        for chunk in sync_numbers(4):
+            if chunk["i"] == 0:
+                break
+
+    recorder, token = start_recording()
+    try:
+        asyncio.run(main())
+    finally:
+        stop_recording(recorder, token)
+    calls = [e for e in recorder.events if e["kind"] == "call"]
+    assert [c["name"] for c in calls] == ["test.stream", "test.stream", "test.sync_stream"]
+    assert all(c["partial"] for c in calls)
+    assert [c[1] for c in calls[0]["stream"]] == [{"i": 0}, {"i": 1}]
+    assert 1 <= len(calls[1]["stream"]) < 50
+    assert [c[1] for c in calls[2]["stream"]] == [{"i": 0}]
+
+
+def test_sync_replay_delivers_recorded_output():
+    seen = []
+
+    @tape("tool.python", key=lambda source, on_output=None: source, codec=PYTHON_CODEC)
+    def run(source, on_output=None):
+        raise AssertionError("replay must not run code")
+
+    player = CassettePlayer({"events": [{"seq": 0, "t": 0.0, "kind": "call", "name": "tool.python", "key": "print(1)",
+                                         "duration_s": 0.0, "result": {"ok": True, "stdout": "1\n", "stderr": ""}}]}, speed=0)
+    token = cassette_mod.current_cassette.set(player)
+    try:
+        result = run("print(1)", on_output=lambda stream, text: seen.append((stream, text)))
+    finally:
+        cassette_mod.current_cassette.reset(token)
+    assert result["stdout"] == "1\n" and seen == [("stdout", "1\n")]
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.code_sandbox import SandboxPool, run_code_async
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("CEDARPY_SANDBOX_PREIMPORT", "")
+    p = SandboxPool(size=2)
+    yield p
+    p.shutdown()
+
+
+def test_runs_out_of_process_with_rpc_helpers(pool):
+    calls = []
+
+    def query(sql):
+        calls.append(threading.get_ident())
+        return {"ok": True, "rows": [[42]], "sql": sql}
+
+    chunks = []
+    res = pool.run(
+        "import os\nprint(os.getpid())\nprint(cedar.query('SELECT 42')['rows'][0][0])",
+        helpers={"query": query},
+        on_output=lambda stream, text: chunks.append((stream, text)),
+    )
+    assert res["ok"] and res["sandboxed"]
+    pid, answer = res["stdout"].split()
+    assert int(pid) != os.getpid() and answer == "42"
+    assert "".join(t for _, t in chunks) == res["stdout"]
+    # Helpers run in the calling thread
+    assert calls == [threading.get_ident()]
+
+
+def test_restricted_builtins_imports_and_entry(pool):
+    res = pool.run("import os", builtins=["print"], allowed_imports=["json"])
+    assert not res["ok"] and "disallowed import: os" in res["error"]
+    res = pool.run("open('/etc/hosts')", builtins=["print"], readable_paths=[])
+    assert not res["ok"] and "PermissionError" in res["error"]
+    res = pool.run("def run(a, b):\n    return {'sum': a + b}", entry="run", args=[2, 3])
+    assert res["ok"] and res["value"] == {"sum": 5}
+
+
+def test_runaway_code_is_stopped_and_pool_recovers(pool):
+    start = time.monotonic()
+    res = pool.run("while True:\n    pass", timeout=1)
+    assert res["timed_out"] and not res["ok"] and time.monotonic() - start < 5
+    res = pool.run("while True:\n    pass", timeout=30, cpu_s=1)
+    assert res["limit"] == "cpu" and "CPU time limit" in res["error"]
+    assert pool.run("print('still fine')")["stdout"] == "still fine\n"
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="RLIMIT_AS is only enforced on Linux")
+def test_memory_limit(pool):
+    res = pool.run("x = bytearray(4 * 1024 ** 3)", memory_mb=256)
+    assert res["limit"] == "memory"
+
+
+def test_jobs_run_in_parallel(pool):
+    pool.warm()
+    results = []
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: results.append(pool.run("import time\ntime.sleep(0.6)"))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(r["ok"] for r in results) and time.monotonic() - start < 1.15
+
+
+def test_async_streams_in_order_and_cancel_kills_job(monkeypatch):
+    monkeypatch.setenv("CEDARPY_SANDBOX_PREIMPORT", "")
+    import cedar_app.utils.code_sandbox as cs
+    monkeypatch.setattr(cs, "_pool", SandboxPool(size=1))
+
+    async def main():
+        got = []
+
+        async def on_output(stream, text):
+            got.append(text)
+
+        res = await run_code_async("import time\nfor i in range(3):\n    print(i)\n    time.sleep(0.06)", on_output=on_output)
+        assert "".join(got) == res["stdout"] == "0\n1\n2\n"
+
+        task = asyncio.create_task(run_code_async("while True:\n    pass"))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # The cancelled worker is replaced and the pool keeps working
+    assert cs._pool.run("print(1)")["stdout"] == "1\n"
+    cs._pool.shutdown()
+
+
+def test_jobs_get_a_scratch_cwd_and_no_secrets(pool, tmp_path, monkeypatch):
+    from cedar_app.utils.code_sandbox import WORKER_PATH
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-secret")  # set before the pool spawns its workers
+    src = "import os\nopen('out.csv', 'w').write('x')\nprint(os.getcwd())\nprint(os.environ.get('OPENAI_API_KEY'))"
+    res = pool.run(src)
+    assert res["ok"] and res["sandboxed"], res
+    cwd, key = res["stdout"].split()
+    assert key == "None"
+    assert cwd.startswith(pool.scratch_root()) and not os.path.exists(cwd)  # per-job dir is removed
+    assert not os.path.exists(os.path.join(os.path.dirname(WORKER_PATH), "out.csv"))
+
+    res = pool.run(src, cwd=str(tmp_path))
+    assert res["ok"] and (tmp_path / "out.csv").read_text() == "x"
@@ -0,0 +1,66 @@
+import os
+import sys
+import types
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.context_packer import ContextPacker, excerpt, items_from_results, pack_chief_context
+
+
+def _result(name, text, confidence=0.8, method="LLM", summary=""):
+    return types.SimpleNamespace(display_name=name, result=text, confidence=confidence, method=method,
+                                 summary=summary, timed_out=False, needs_rerun=False)
+
+
+def _count(text):
+    return len((text or "").split())
+
+
+def test_tables_keep_header_and_text_keeps_head_and_tail():
+    table = "\n".join(["| id | total |", "|----|-------|"] + [f"| {i} | {i * 2.5} |" for i in range(200)])
+    short = excerpt(table, 40, _count)
+    assert short.startswith("| id | total |\n|----|-------|\n| 0 |") and short.endswith("more rows]")
+    assert _count(short) <= 40
+
+    prose = "\n".join(f"step {i} of the analysis produced nothing unusual" for i in range(50)) + "\nAnswer: 42"
+    short = excerpt(prose, 60, _count)
+    assert short.startswith("step 0") and short.endswith("Answer: 42") and "lines omitted" in short
+
+
+def test_lowest_value_results_are_summarized_then_dropped_and_duplicates_collapsed():
+    table = "\n".join(["name,region,revenue"] + [f"store {i},north,{i * 100}" for i in range(300)])
+    results = [
+        _result("SQL Agent", table, confidence=0.95),
+        _result("Research Agent", "Revenue figures are in the stores table, see store listing. " * 40, confidence=0.4),
+        _result("Coding Agent", "Error: NameError in cell 3", confidence=0.9, method="Agent Exception"),
+        _result("Data Agent", table, confidence=0.7),
+    ]
+    previous = [_result("SQL Agent", "earlier attempt " * 300, confidence=0.9)]
+
+    unbounded = pack_chief_context(results, previous, budget_tokens=0)
+    assert unbounded.tokens_after <= unbounded.tokens_before and unbounded.dropped == 0
+
+    packed = pack_chief_context(results, previous, budget_tokens=1500)
+    assert packed.tokens_before > 1500 >= packed.tokens_after
+    assert packed.deduped == 1  # Data Agent repeats the SQL table
+    states = {i.label: i.state for i in packed.items}
+    assert states["SQL Agent"] in ("full", "summarized")
+    assert states["Data Agent"] == "duplicate"
+    text = packed.text(packed.extra["current"])
+    assert "name,region,revenue" in text and "store 0,north,0" in text
+    assert "[same findings as SQL Agent]" in text
+    # The carried-over result is worth the least, so it went first
+    assert packed.extra["previous"][0].state in ("summarized", "dropped")
+
+
+def test_repeated_lines_are_removed_from_lower_value_results():
+    shared = "Found 3 CSV files in the project: orders.csv, stores.csv, returns.csv"
+    items = items_from_results([
+        _result("File Agent", shared + "\norders.csv has 1200 rows", confidence=0.9),
+        _result("Notes Agent", "Notes so far\n" + shared + "\nNothing else to add here for now", confidence=0.5),
+    ])
+    ContextPacker(budget_tokens=10000, counter=_count).pack(items)
+    assert shared in items[0].body and shared not in items[1].body
+    assert "1 lines repeated from results above omitted" in items[1].body
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.async_shell import run_shell
+from cedar_app.utils.deadlines import (
+    DeadlineExceeded, run_with_deadline, agent_timeout_from_env,
+    collect_as_completed, early_decision_confidence_from_env,
+)
+
+
+def test_deadline_cancels_the_work_underneath(tmp_path):
+    marker = tmp_path / "marker"
+
+    async def main():
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as info:
+            await run_with_deadline(run_shell(f"sleep 1.5 && touch {marker}", timeout=30), 0.3, scope="iteration")
+        assert info.value.scope == "iteration" and info.value.seconds == 0.3
+        assert time.monotonic() - start < 1.0
+        await asyncio.sleep(2.0)
+
+    asyncio.run(main())
+    # The command's process group was killed, so it never got to touch the marker
+    assert not marker.exists()
+
+
+def test_inner_timeouts_and_results_pass_through():
+    async def inner_timeout():
+        raise asyncio.TimeoutError("inner")
+
+    async def main():
+        assert await run_with_deadline(asyncio.sleep(0, result=7), 5) == 7
+        assert await run_with_deadline(asyncio.sleep(0, result=8), 0) == 8
+        with pytest.raises(asyncio.TimeoutError) as info:
+            await run_with_deadline(inner_timeout(), 5)
+        assert not isinstance(info.value, DeadlineExceeded)
+
+    asyncio.run(main())
+
+
+def test_agent_timeout_env(monkeypatch):
+    monkeypatch.setenv("CEDARPY_AGENT_TIMEOUT", "45")
+    monkeypatch.setenv("CEDARPY_AGENT_TIMEOUT_SHELL", "5")
+    monkeypatch.setenv("CEDARPY_AGENT_TIMEOUT_CODE", "not a number")
+    assert agent_timeout_from_env("ShellAgent") == 5
+    assert agent_timeout_from_env("CodeAgent") == 45
+    assert agent_timeout_from_env("MathAgent") == 45
+
+
+async def _stub_agent(delay, confidence, log):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        log.append(("cancelled", confidence))
+        raise
+    if confidence is None:
+        raise RuntimeError("agent failed")
+    return confidence
+
+
+def test_results_are_reported_in_completion_order():
+    async def main():
+        log, seen = [], []
+
+        async def on_result(key, result):
+            seen.append((key, result if not isinstance(result, Exception) else type(result).__name__))
+
+        futures = {
+            asyncio.ensure_future(_stub_agent(0.3, 0.5, log)): 0,
+            asyncio.ensure_future(_stub_agent(0.0, 0.6, log)): 1,
+            asyncio.ensure_future(_stub_agent(0.1, None, log)): 2,
+            asyncio.ensure_future(_stub_agent(5.0, 0.9, log)): 3,
+        }
+        skipped = await collect_as_completed(futures, on_result, timeout=0.6)
+        assert skipped == []
+        assert seen == [(1, 0.6), (2, "RuntimeError"), (0, 0.5), (3, "DeadlineExceeded")]
+        assert log == [("cancelled", 0.9)]
+
+    asyncio.run(main())
+
+
+def test_early_decision_once_a_result_crosses_the_threshold(monkeypatch):
+    monkeypatch.setenv("CEDARPY_EARLY_DECISION_CONFIDENCE", "0.8")
+    threshold = early_decision_confidence_from_env()
+    assert threshold == 0.8
+
+    async def main():
+        log, seen = [], []
+
+        async def on_result(key, result):
+            seen.append((key, result))
+
+        futures = {
+            asyncio.ensure_future(_stub_agent(2.0, 0.4, log)): 0,
+            asyncio.ensure_future(_stub_agent(0.1, 0.5, log)): 1,
+            asyncio.ensure_future(_stub_agent(0.2, 0.85, log)): 2,
+            asyncio.ensure_future(_stub_agent(2.0, 0.99, log)): 3,
+        }
+        start = time.monotonic()
+        skipped = await collect_as_completed(futures, on_result, stop=lambda: max(r for _, r in seen) >= threshold)
+        assert time.monotonic() - start < 1.0
+        # The result below the threshold did not stop the wait; the one above it did
+        assert seen == [(1, 0.5), (2, 0.85)]
+        assert skipped == [0, 3]
+        assert sorted(log) == [("cancelled", 0.4), ("cancelled", 0.99)]
+
+    asyncio.run(main())
+
+    monkeypatch.setenv("CEDARPY_EARLY_DECISION_CONFIDENCE", "0")
+    assert early_decision_confidence_from_env() == 0
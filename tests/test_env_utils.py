@@ -0,0 +1,27 @@
+import os
+import sys
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.env_utils import env_float, env_int
+
+
+def test_bad_or_blank_values_fall_back_to_the_default(monkeypatch):
+    monkeypatch.setenv("CEDARPY_TEST_KNOB", "lots")
+    assert env_int("CEDARPY_TEST_KNOB", 7) == 7
+    assert env_float("CEDARPY_TEST_KNOB", None) is None
+    monkeypatch.setenv("CEDARPY_TEST_KNOB", "  ")
+    assert env_float("CEDARPY_TEST_KNOB", 1.5) == 1.5
+    monkeypatch.delenv("CEDARPY_TEST_KNOB")
+    assert env_int("CEDARPY_TEST_KNOB", 3) == 3
+
+
+def test_minimum_clamps_parsed_values(monkeypatch):
+    monkeypatch.setenv("CEDARPY_TEST_KNOB", "-5")
+    assert env_int("CEDARPY_TEST_KNOB", 3) == -5
+    assert env_int("CEDARPY_TEST_KNOB", 3, minimum=0) == 0
+    assert env_float("CEDARPY_TEST_KNOB", 1.0, minimum=0.0) == 0.0
+    monkeypatch.setenv("CEDARPY_TEST_KNOB", "2.5")
+    assert env_float("CEDARPY_TEST_KNOB", 1.0, minimum=0.0) == 2.5
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.llm.gateway import LLMGateway, RetryPolicy, _retry_after, classify_error
+from cedar_app.llm.response_cache import LLMResponseCache
+from cedar_app.llm.scheduler import LLMScheduler
+from cedar_app.llm.usage_ledger import UsageLedger
+from cedar_app.llm.fake_server import FakeAPIError, FakeLLM, FakeLLMServer, Rule, parse_latency
+
+CHIEF = [{"role": "system", "content": "You are the Chief Agent - an intelligent orchestrator"},
+         {"role": "user", "content": "User Query: what is 2+2\n\nCurrent Iteration: 1 of 10"}]
+
+
+def _gateway(fake, tmp_path, retries=0):
+    return LLMGateway(policy=RetryPolicy(max_retries=retries, base_s=0, max_s=0), sync_factory=fake.sync_factory,
+                      async_factory=fake.async_factory, scheduler=LLMScheduler(rpm=0, tpm=0),
+                      cache=LLMResponseCache(path=str(tmp_path / "llm.sqlite")),
+                      ledger=UsageLedger(path=str(tmp_path / "usage.sqlite"), flush_s=0))
+
+
+def test_async_agents_through_the_gateway(tmp_path):
+    fake = FakeLLM(rules=[Rule(name="flaky-sql", match="SQL expert", error=503, times=1)], latency_ms="fixed:50", seed=1)
+    gw = _gateway(fake, tmp_path, retries=1)
+    client = gw.async_client("sk-test")
+
+    async def main():
+        started = time.monotonic()
+        answers = await asyncio.gather(*[client.chat.completions.create(model="gpt-5", messages=CHIEF) for _ in range(8)])
+        elapsed = time.monotonic() - started
+        sql = await client.chat.completions.create(model="gpt-5-mini", messages=[{"role": "system", "content": "You are a SQL expert."}])
+        as_json = await client.chat.completions.create(model="gpt-5-mini", messages=[{"role": "user", "content": "hi"}],
+                                                       response_format={"type": "json_object"})
+        stream = await client.chat.completions.create(model="gpt-5", messages=CHIEF, stream=True,
+                                                      stream_options={"include_usage": True})
+        chunks = [c async for c in stream]
+        return answers, elapsed, sql, as_json, chunks
+
+    answers, elapsed, sql, as_json, chunks = asyncio.run(main())
+    decision = json.loads(answers[0].choices[0].message.content)
+    assert decision["decision"] == "final" and "what is 2+2" in decision["final_answer"]
+    assert answers[0].usage.prompt_tokens > 0 and answers[0].model == "gpt-5"
+    assert elapsed < 0.3  # eight 50 ms calls ran concurrently
+    assert sql.choices[0].message.content == "SELECT 1 AS result;"  # the scripted 503 was retried
+    assert json.loads(as_json.choices[0].message.content)["ok"] is True
+    text = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert json.loads(text) == decision and chunks[-1].usage.total_tokens > 0
+
+    stats = fake.snapshot()
+    assert stats["max_in_flight"] == 8 and stats["errors"] == {"503": 1} and stats["streams"] == 1
+    assert stats["rules"]["chief"] == 9 and stats["rules"]["flaky-sql"] == 1
+    assert gw.snapshot()["retries"] == 1
+    assert [r["calls"] for r in gw.ledger.rollup(group_by=["status"])] == [11]
+
+
+def test_errors_timeouts_and_rate_limits():
+    now = [0.0]
+    fake = FakeLLM(rpm=2, clock=lambda: now[0])
+    for _ in range(2):
+        fake.complete_sync({"model": "m", "messages": CHIEF})
+    with pytest.raises(FakeAPIError) as info:
+        fake.complete_sync({"model": "m", "messages": CHIEF})
+    assert info.value.status_code == 429 and classify_error(info.value) == (True, False)
+    assert _retry_after(info.value) == pytest.approx(60.0)
+    assert info.value.response.headers["x-ratelimit-remaining-requests"] == "0"
+    now[0] += 60
+    assert fake.complete_sync({"model": "m", "messages": CHIEF}).choices[0].message.content
+
+    injected = FakeLLM(errors="500:0.5,timeout:0.5", seed=3)
+    kinds = set()
+    for _ in range(20):
+        try:
+            injected.complete_sync({"model": "m", "messages": CHIEF})
+        except Exception as e:
+            kinds.add(type(e).__name__)
+            assert classify_error(e) == (True, True)
+    assert kinds == {"FakeAPIError", "FakeTimeoutError"}
+
+    slow = FakeLLM(latency_ms=5000)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        slow.complete_sync({"model": "m", "messages": CHIEF, "timeout": 0.05})
+    assert time.monotonic() - started < 1
+
+    rng = random.Random(0)
+    assert 50 <= parse_latency("uniform:50:60")(rng) * 1000 <= 60
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+def test_loopback_server_with_the_openai_sdk():
+    openai = pytest.importorskip("openai")
+    fake = FakeLLM(rules=[{"match": "rate me", "error": 429, "times": 1}], chunk_chars=8)
+    with FakeLLMServer(fake) as server:
+        async def main():
+            client = openai.AsyncOpenAI(api_key="sk-fake", base_url=server.base_url, max_retries=0)
+            answer = await client.chat.completions.create(model="gpt-5", messages=CHIEF)
+            stream = await client.chat.completions.create(model="gpt-5", messages=CHIEF, stream=True)
+            text = "".join([c.choices[0].delta.content or "" async for c in stream if c.choices])
+            with pytest.raises(openai.RateLimitError):
+                await client.chat.completions.create(model="gpt-5", messages=[{"role": "user", "content": "rate me"}])
+            await client.close()
+            return answer, text
+
+        answer, text = asyncio.run(main())
+    assert json.loads(answer.choices[0].message.content)["decision"] == "final"
+    assert text == answer.choices[0].message.content
+    assert fake.snapshot()["completed"] == 2
+
+
+def test_chief_review_is_cached_across_budget_changes(tmp_path):
+    try:
+        from cedar_orchestrator.orchestrator import ChiefAgent
+        from cedar_orchestrator.execution_agents import AgentResult
+    except SyntaxError as e:  # the orchestrator uses f-string syntax from Python 3.12
+        pytest.skip(f"orchestrator not importable here: {e}")
+    from cedar_app.llm.response_cache import llm_cache
+    from cedar_app.utils.query_budget import BudgetedLLMClient, QueryBudget, current_budget
+
+    fake = FakeLLM(latency_ms="fixed:0", seed=1)
+    chief = ChiefAgent(BudgetedLLMClient(_gateway(fake, tmp_path).async_client("sk-test")))
+    results = [AgentResult(agent_name="CodeAgent", display_name="Coding Agent", result="Answer: 4", confidence=0.9, method="python")]
+
+    async def ask(budget):
+        token = current_budget.set(budget)
+        try:
+            with llm_cache():
+                return await chief.review_and_decide("what is 2+2", results)
+        finally:
+            current_budget.reset(token)
+
+    first, second = QueryBudget(), QueryBudget()
+    second.llm_calls, second.cost_usd = 7, 0.25  # a different budget line in the prompt
+    assert asyncio.run(ask(first)) == asyncio.run(ask(second))
+    assert fake.snapshot()["calls"] == 1
+    assert first.llm_calls == 1 and second.cached_calls == 1
@@ -0,0 +1,78 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils import fast_path
+from cedar_app.utils.fast_path import solve, safe_eval, strip_bypass, fast_path_stats
+
+
+def _answer(q, **kw):
+    a = solve(q, **kw)
+    return a.answer if a else None
+
+
+def test_safe_arithmetic():
+    assert _answer("2+2") == "4"
+    assert _answer("what is 2^10?") == "1024"
+    assert _answer("15% of 80") == "12"
+    assert _answer("sqrt(16) * 3") == "12"
+    assert _answer("max(3,400)") == "400"
+    assert _answer("1,000 x 3") == "3000"
+    for q in ("what is love", "2 + 2 and explain why", "10 / 0", "9**99999", "42", "__import__('os').getcwd()",
+              "(-8)**0.5", "what is (-8)^0.5 * 0?"):
+        assert solve(q) is None, q
+    for expr in ("().__class__", "open('x')", "[1, 2]", "sqrt(x=4)", "2 if 1 else 3", "(-8)**0.5", "-(-1)**0.5"):
+        with pytest.raises(ValueError):
+            safe_eval(expr)
+
+
+def test_units_and_dates():
+    assert _answer("convert 5 km to miles") == "5 km = 3.106855961 mi"
+    assert _answer("how many ounces in 2 lb") == "2 lb = 32 oz"
+    assert _answer("100 fahrenheit to celsius") == "100 °F = 37.77777778 °C"
+    assert solve("convert 5 kg to meters") is None
+    assert _answer("what day of the week is July 4th, 2025") == "Friday, 2025-07-04"
+    assert _answer("1 month after 2024-01-31") == "Thursday, 2024-02-29"
+    assert _answer("how many days between 2024-01-01 and 2024-03-01") == "60 days"
+    today = date.today().isoformat()
+    assert today in _answer("what is today's date?")
+
+
+def test_catalog_lookups(tmp_path, monkeypatch):
+    eng = create_engine(f"sqlite:///{tmp_path / 'fp.db'}", future=True)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE orders (id INTEGER PRIMARY KEY, project_id INTEGER, branch_id INTEGER, total REAL)")
+        for i in range(7):
+            conn.exec_driver_sql("INSERT INTO orders (project_id, branch_id, total) VALUES (1, ?, 1.0)", (1 if i < 5 else 2,))
+    import cedar_app.db_utils as db_utils
+    import cedar_app.utils.sql_utils as sql_utils
+    monkeypatch.setattr(db_utils, "_get_project_engine", lambda pid: eng)
+    monkeypatch.setattr(sql_utils, "_get_project_engine", lambda pid: eng)
+
+    assert _answer("how many rows are in the orders table?", project_id=1, branch_id=2) == "orders has 7 rows (2 on the current branch)"
+    assert _answer("what columns does orders have", project_id=1) == "orders: id (INTEGER), project_id (INTEGER), branch_id (INTEGER), total (REAL); primary key: id"
+    assert _answer("list tables", project_id=1) == "1 table(s): orders"
+    # Unknown tables and questions without a project go to the full pipeline
+    assert solve("how many rows are in the customers table", project_id=1) is None
+    assert solve("how many rows are in the orders table") is None
+
+
+def test_bypass_and_stats(monkeypatch):
+    monkeypatch.setattr(fast_path, "_stats", {"attempts": 0, "hits": 0, "misses": 0, "bypassed": 0, "errors": 0, "hit_ms": 0.0, "by_kind": {}})
+    assert strip_bypass("/full what is 2+2") == ("what is 2+2", True)
+    assert strip_bypass("what is 2+2") == ("what is 2+2", False)
+    solve("2+2")
+    solve("write me a poem")
+    fast_path.record_bypass()
+    stats = fast_path_stats()
+    assert stats["attempts"] == 2 and stats["hits"] == 1 and stats["bypassed"] == 1
+    assert stats["hit_rate"] == 0.5 and stats["by_kind"] == {"arithmetic": 1}
+    monkeypatch.setenv("CEDARPY_FAST_PATH", "0")
+    assert fast_path_stats()["enabled"] is False
@@ -0,0 +1,83 @@
+import os
+import sys
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, text
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.iteration_memo import IterationMemo, guidance_targets
+from cedar_app.utils.query_cache import data_version
+
+
+@dataclass
+class Result:
+    confidence: float = 0.9
+    method: str = "LLM"
+    needs_rerun: bool = False
+    timed_out: bool = False
+
+
+class ResearchAgent:
+    pass
+
+
+class CodeAgent:
+    pass
+
+
+class ShellAgent:
+    MEMOIZE = False
+
+
+class FileAgent:
+    def memo_key(self, task):
+        return "paths:" + ",".join(sorted(w for w in task.split() if w.startswith("/")))
+
+
+def test_only_agents_named_in_guidance_rerun():
+    memo = IterationMemo("Compare sales by region")
+    research, code = ResearchAgent(), CodeAgent()
+    gen = ("db", 1)
+    for agent in (research, code):
+        key = memo.task_key(agent, memo.base_query)
+        assert memo.lookup(agent.__class__.__name__, key, gen) is None
+        assert memo.store(agent.__class__.__name__, key, gen, 0, Result())
+
+    memo.guidance = "Run the Coding Agent with a groupby on region"
+    refined = f"{memo.base_query}\n\nRefinement guidance: {memo.guidance}"
+    targets = guidance_targets(memo.guidance)
+    assert targets == {"CodeAgent"}
+    hit = memo.lookup("ResearchAgent", memo.task_key(research, refined, targets), gen)
+    assert hit is not None and hit[0] == 0
+    assert memo.lookup("CodeAgent", memo.task_key(code, refined, targets), gen) is None
+    # A committed write (new generation) invalidates everything
+    assert memo.lookup("ResearchAgent", memo.task_key(research, refined, targets), ("db", 2)) is None
+    # Guidance naming no agent reruns every agent
+    assert guidance_targets("Be more precise") is None
+    assert memo.lookup("ResearchAgent", memo.task_key(research, refined, None), gen) is None
+
+
+def test_agent_overrides_and_unusable_results():
+    memo = IterationMemo("q")
+    assert memo.task_key(ShellAgent(), "ls /tmp") is None
+    assert memo.task_key(FileAgent(), "read /a and /b please") == memo.task_key(FileAgent(), "now /b /a")
+    key = memo.task_key(CodeAgent(), "q")
+    for bad in (Result(needs_rerun=True), Result(timed_out=True), Result(confidence=0.0), Result(method="Agent Exception")):
+        assert not memo.store("CodeAgent", key, ("none",), 0, bad)
+    assert not memo.store("CodeAgent", key, None, 0, Result())
+    assert IterationMemo("q", max_entries=0).lookup("CodeAgent", key, ("none",)) is None
+
+
+def test_data_version_changes_on_commit(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'p.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    before = data_version(engine)
+    assert data_version(engine) == before
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+    assert data_version(engine) != before
+    engine.dispose()
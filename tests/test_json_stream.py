@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import random
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.json_stream import JsonFieldExtractor
+
+
+DOC = {
+    "decision": "final",
+    "query_assessment": "simple {not: nested} \"quoted\"",
+    "nested": {"a": [1, {"b": "}]"}], "c": "\\"},
+    "confidence": 0.75,
+    "ok": True,
+    "missing": None,
+    "final_answer": "Answer: 4\n\nWhy: 2+2 — easy ✅ 𝛑 \"done\"\t\\ end",
+    "reasoning": "r",
+}
+
+
+def _chunks(text, rng):
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 7)
+        yield text[i:i + n]
+        i += n
+
+
+def test_random_chunking_matches_json_loads():
+    rng = random.Random(7)
+    for ensure_ascii in (True, False):
+        raw = "```json\n" + json.dumps(DOC, ensure_ascii=ensure_ascii, indent=2) + "\n```"
+        for _ in range(30):
+            ex = JsonFieldExtractor(stream_fields=("final_answer",))
+            streamed = []
+            for chunk in _chunks(raw, rng):
+                for field, delta in ex.feed(chunk):
+                    assert field == "final_answer"
+                    streamed.append(delta)
+            assert ex.done
+            assert "".join(streamed) == DOC["final_answer"]
+            for k in ("decision", "query_assessment", "confidence", "ok", "missing", "final_answer", "reasoning"):
+                assert ex.values[k] == DOC[k]
+            assert "nested" not in ex.values
+
+
+def test_partial_values_before_the_object_completes():
+    ex = JsonFieldExtractor(stream_fields=("final_answer",))
+    ex.feed('{"decision": "fin')
+    assert "decision" not in ex.values
+    ex.feed('al", "final_answer": "The ans')
+    assert ex.values["decision"] == "final"
+    assert ex.partial("final_answer") == "The ans"
+    assert not ex.done
+    assert ex.feed("wer\\u00e9") == [("final_answer", "weré")]
@@ -0,0 +1,136 @@
+import os
+import sys
+import types
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.llm.gateway import (
+    LLMGateway, RetryPolicy, CircuitBreaker, LLMCircuitOpen, classify_error, settings_values, setting,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        super().__init__(f"HTTP {status_code}")
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+class FakeCompletions:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self, kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"model": kwargs["model"], "timeout": kwargs.get("timeout")}
+
+    def create(self, **kwargs):
+        return self._next(kwargs)
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        return self._next(kwargs)
+
+
+def _gateway(completions, is_async=False):
+    made = []
+
+    def factory(api_key):
+        made.append(api_key)
+        return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), models="models-api")
+
+    policy = RetryPolicy(max_retries=3, base_s=0, max_s=0)
+    if is_async:
+        return LLMGateway(policy=policy, async_factory=factory), made
+    return LLMGateway(policy=policy, sync_factory=factory), made
+
+
+def test_retries_transient_errors_and_reuses_pooled_client():
+    fake = FakeCompletions([StatusError(503), APITimeoutError(), "ok"])
+    gw, made = _gateway(fake)
+    client = gw.sync_client("sk-test")
+    out = client.chat.completions.create(model="m", messages=[])
+    assert out["model"] == "m" and out["timeout"] == gw.timeout_s
+    assert fake.calls == 3 and gw.stats["retries"] == 2
+    client.chat.completions.create(model="m", messages=[])
+    assert gw.sync_client("sk-test").models == "models-api"
+    assert made == ["sk-test"]
+
+    fake.outcomes = [StatusError(400)]
+    with pytest.raises(StatusError):
+        client.chat.completions.create(model="m", messages=[])
+    assert gw.stats["failures"] == 1
+    assert classify_error(StatusError(429)) == (True, False)
+    assert classify_error(ValueError()) == (False, False)
+
+
+def test_circuit_breaker_opens_and_half_opens(monkeypatch):
+    now = [0.0]
+    breaker = CircuitBreaker(failures=2, cooldown_s=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.before_call("m")
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(LLMCircuitOpen):
+        breaker.before_call("m")
+    now[0] = 11
+    breaker.before_call("m")  # the single half-open trial
+    with pytest.raises(LLMCircuitOpen):
+        breaker.before_call("m")
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+    monkeypatch.setenv("CEDARPY_LLM_BREAKER_FAILURES", "2")
+    fake = FakeCompletions([StatusError(502)] * 10)
+    gw, _ = _gateway(fake)
+    with pytest.raises(StatusError):
+        gw.sync_client("sk-test").chat.completions.create(model="m", messages=[])
+    # Tripped after two failures instead of exhausting all retries; now fails fast
+    assert fake.calls == 2
+    with pytest.raises(LLMCircuitOpen):
+        gw.sync_client("sk-test").chat.completions.create(model="m", messages=[])
+    assert fake.calls == 2 and gw.stats["circuit_rejections"] == 1
+    assert gw.snapshot()["breakers"]["m"]["state"] == "open"
+
+
+def test_async_face_pools_per_event_loop():
+    fake = AsyncFakeCompletions([StatusError(500), "ok"])
+    gw, made = _gateway(fake, is_async=True)
+    client = gw.async_client("sk-test")
+
+    async def main():
+        a = await client.chat.completions.create(model="m", messages=[])
+        b = await client.chat.completions.create(model="m", messages=[], timeout=5)
+        return a, b
+
+    a, b = asyncio.run(main())
+    assert fake.calls == 3 and b["timeout"] == 5
+    asyncio.run(main())
+    assert len(made) == 2  # one pooled client per event loop
+    assert gw.snapshot()["pooled_clients"]["async"] == 1
+
+
+def test_settings_file_cached_until_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    path.write_text("CEDARPY_TEST_SETTING=one\n# comment\n")
+    monkeypatch.delenv("CEDARPY_TEST_SETTING", raising=False)
+    first = settings_values(str(path))
+    assert first == {"CEDARPY_TEST_SETTING": "one"}
+    assert settings_values(str(path)) is first
+    path.write_text("CEDARPY_TEST_SETTING='two'\n")
+    assert setting("CEDARPY_TEST_SETTING", str(path)) == "two"
+    monkeypatch.setenv("CEDARPY_TEST_SETTING", "env")
+    assert setting("CEDARPY_TEST_SETTING", str(path)) == "env"
@@ -0,0 +1,142 @@
+import os
+import sys
+import types
+import asyncio
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.llm.gateway import LLMGateway, RetryPolicy
+from cedar_app.llm.response_cache import (
+    LLMResponseCache, llm_cache, llm_cache_bypass, cache_key, is_cache_hit, bypass_requested,
+    volatile_message,
+)
+from cedar_app.utils.query_budget import QueryBudget, BudgetedLLMClient, current_budget
+
+
+def _completion(text, model="m"):
+    msg = types.SimpleNamespace(role="assistant", content=text, tool_calls=None)
+    usage = types.SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    return types.SimpleNamespace(id="c1", object="chat.completion", created=1, model=model,
+                                 choices=[types.SimpleNamespace(index=0, finish_reason="stop", message=msg)], usage=usage)
+
+
+def _chunk(text=None, finish=None):
+    delta = types.SimpleNamespace(content=text, tool_calls=None)
+    return types.SimpleNamespace(id="s1", created=1, model="m", usage=None,
+                                 choices=[types.SimpleNamespace(index=0, delta=delta, finish_reason=finish)])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return _completion(f"answer {len(self.calls)}", kwargs["model"])
+
+
+class AsyncStreamingCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if not kwargs.get("stream"):
+            return _completion("fresh", kwargs["model"])
+
+        async def stream():
+            for piece in ("Hello", ", ", "world"):
+                yield _chunk(piece)
+            yield _chunk(finish="stop")
+        return stream()
+
+
+def _gateway(completions, cache, is_async=False):
+    factory = lambda key: types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    policy = RetryPolicy(max_retries=0, base_s=0, max_s=0)
+    if is_async:
+        return LLMGateway(policy=policy, async_factory=factory, cache=cache)
+    return LLMGateway(policy=policy, sync_factory=factory, cache=cache)
+
+
+def test_cacheable_calls_are_served_from_disk(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "llm.sqlite"))
+    fake = FakeCompletions()
+    client = _gateway(fake, cache).sync_client("sk-test")
+    messages = [{"role": "user", "content": "Classify this file\r\n"}]
+
+    client.chat.completions.create(model="m", messages=messages)  # not marked cacheable
+    with llm_cache():
+        first = client.chat.completions.create(model="m", messages=messages)
+        again = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "Classify this file"}])
+        warmer = client.chat.completions.create(model="m", messages=messages, temperature=0.9)
+    assert len(fake.calls) == 3 and not is_cache_hit(first)
+    assert is_cache_hit(again) and again.choices[0].message.content == "answer 2"
+    assert warmer.choices[0].message.content == "answer 3"
+
+    # A second process sees the same file; the bypass header refreshes without being sent upstream
+    client = _gateway(fake, LLMResponseCache(path=str(tmp_path / "llm.sqlite"))).sync_client("sk-test")
+    with llm_cache():
+        assert client.chat.completions.create(model="m", messages=messages).choices[0].message.content == "answer 2"
+        fresh = client.chat.completions.create(model="m", messages=messages, extra_headers={"X-Cedar-LLM-Cache": "bypass"})
+        with llm_cache_bypass():
+            client.chat.completions.create(model="m", messages=messages)
+    assert fresh.choices[0].message.content == "answer 4" and "extra_headers" not in fake.calls[-2]
+    assert len(fake.calls) == 5
+    assert bypass_requested({"x-cedar-llm-cache": "Bypass"}) and not bypass_requested({})
+    assert cache_key({"model": "m", "messages": messages, "stream": True}) == cache_key({"model": "m", "messages": messages})
+    assert cache_key({"model": "m", "messages": messages}, scope="a") != cache_key({"model": "m", "messages": messages}, scope="b")
+    budget_line = [volatile_message("Query Budget Used: 3/40 LLM calls")]
+    assert cache_key({"model": "m", "messages": messages + budget_line}) == cache_key({"model": "m", "messages": messages})
+
+
+def test_streams_are_recorded_and_replayed_and_not_charged(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "llm.sqlite"))
+    fake = AsyncStreamingCompletions()
+    client = BudgetedLLMClient(_gateway(fake, cache, is_async=True).async_client("sk-test"))
+    messages = [{"role": "user", "content": "What changed?"}]
+
+    async def read(stream):
+        return "".join([c.choices[0].delta.content or "" async for c in stream])
+
+    async def main():
+        with llm_cache(scope="project:1"):
+            live = await read(await client.chat.completions.create(model="m", messages=messages, stream=True))
+            replay = await read(await client.chat.completions.create(model="m", messages=messages, stream=True))
+            plain = await client.chat.completions.create(model="m", messages=messages)
+        return live, replay, plain
+
+    budget = QueryBudget(max_llm_calls=10)
+    token = current_budget.set(budget)
+    try:
+        live, replay, plain = asyncio.run(main())
+    finally:
+        current_budget.reset(token)
+    assert live == replay == "Hello, world" and plain.choices[0].message.content == "Hello, world"
+    assert len(fake.calls) == 1
+    assert budget.llm_calls == 1 and budget.cached_calls == 2
+    assert cache.snapshot()["hits"] == 2
+
+
+def test_ttl_size_limit_and_stats(tmp_path):
+    now = [1000.0]
+    cache = LLMResponseCache(path=str(tmp_path / "llm.sqlite"), max_bytes=2000, default_ttl_s=60,
+                             max_entry_bytes=1500, clock=lambda: now[0])
+    small = {"model": "m", "choices": [{"message": {"content": "x" * 400}}], "usage": {"total_tokens": 7}}
+    assert cache.put("a", small)
+    assert cache.get("a")["usage"]["total_tokens"] == 7
+    now[0] += 61
+    assert cache.get("a") is None  # expired
+
+    for key in "bcde":
+        now[0] += 1
+        assert cache.put(key, small, ttl_s=3600)
+    now[0] += 1
+    cache.get("b")  # recently used, survives eviction
+    cache.put("g", small, ttl_s=3600)
+    assert not cache.put("huge", {"model": "m", "choices": [{"message": {"content": "y" * 2000}}]})
+
+    stats = cache.snapshot()
+    assert stats["bytes"] <= 2000 and stats["evictions"] >= 1 and stats["too_large"] == 1
+    assert cache.get("b") is not None and cache.get("c") is None
+    assert stats["expired"] == 1 and stats["saved_tokens"] == 14
+    assert 0 < stats["hit_rate"] < 1
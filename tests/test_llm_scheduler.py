@@ -0,0 +1,85 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.llm.scheduler import LLMScheduler, LLMQueueTimeout, llm_lane, current_lane
+
+
+def test_interactive_overtakes_batch_when_rate_limited():
+    sched = LLMScheduler(rpm=120, tpm=0)
+    sched.requests.level = 0  # quota used up; refills 2 requests/s
+
+    async def main():
+        with llm_lane("batch", project_id=1):
+            batch = asyncio.create_task(sched.acquire_async())
+        await asyncio.sleep(0.05)
+        grant = await asyncio.wait_for(sched.acquire_async(), 2)  # interactive by default
+        # batch must keep 30% of the bucket in reserve, so it is still waiting
+        assert not batch.done()
+        batch.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await batch
+        return grant
+
+    grant = asyncio.run(main())
+    assert grant.lane == "interactive" and grant.wait_ms >= 300
+    stats = sched.snapshot()["lanes"]
+    assert stats["interactive"]["waited"] == 1 and stats["batch"]["queued"] == 0
+
+
+def test_fair_share_between_projects_within_a_lane(monkeypatch):
+    monkeypatch.setenv("CEDARPY_LLM_BATCH_CONCURRENCY", "1")
+    sched = LLMScheduler(rpm=0, tpm=0)
+    order = []
+
+    async def worker(project, hold):
+        grant = await sched.acquire_async(lane="batch", project=project)
+        order.append(project)
+        await hold.wait()
+        sched.release(grant)
+
+    async def main():
+        holds = [asyncio.Event() for _ in range(4)]
+        tasks = [asyncio.create_task(worker("A", holds[0]))]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(worker("A", holds[1])))
+        tasks.append(asyncio.create_task(worker("A", holds[2])))
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(worker("B", holds[3])))
+        await asyncio.sleep(0.01)
+        assert order == ["A"]
+        for h in holds:
+            h.set()
+            await asyncio.sleep(0.02)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    # B arrived last but had received no service, so it goes before A's backlog
+    assert order == ["A", "B", "A", "A"]
+    assert sched.snapshot()["lanes"]["batch"]["granted"] == 4
+
+
+def test_queue_timeout_rate_limit_headers_and_token_reconciliation(monkeypatch):
+    monkeypatch.setenv("CEDARPY_LLM_QUEUE_TIMEOUT_S", "0.2")
+    sched = LLMScheduler(rpm=None, tpm=1000)
+    assert sched.requests.per_minute == 0
+    sched.observe_rate_limit({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0"})
+    assert sched.requests.per_minute == 60 and sched.requests.level < 1
+    with llm_lane("batch"):
+        assert current_lane.get() == "batch"
+        with pytest.raises(LLMQueueTimeout):
+            sched.acquire_sync(tokens=10)
+    assert current_lane.get() is None
+    assert sched.snapshot()["lanes"]["batch"]["timeouts"] == 1
+
+    sched.requests.set_limit(0)
+    grant = sched.acquire_sync(tokens=400)
+    assert sched.tokens.level == pytest.approx(600, abs=1)
+    sched.release(grant, actual_tokens=100)
+    assert sched.tokens.level == pytest.approx(900, abs=1)
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import types
+import asyncio
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+import cedar_app.utils.model_router as mr
+from cedar_app.utils.model_router import RoutedLLMClient, run_as_agent, choose_model, classify, adapt_params
+
+JSON_SYSTEM = {"role": "system", "content": "You MUST respond in this EXACT JSON format"}
+
+
+def _msgs(query, system=JSON_SYSTEM):
+    return [system, {"role": "user", "content": f"User Query: {query}\n\nAgent Responses: ..."}]
+
+
+def test_classification():
+    assert classify(_msgs("what is 2 + 2?")).tier == "small"
+    assert classify(_msgs("hello!")).simple_intent
+    assert classify(_msgs("derive the wave equation from Maxwell's equations")).tier == "large"
+    assert classify(_msgs("x" * 50, {"role": "system", "content": "y" * 40000})).tier == "large"
+
+
+def test_policy_stream_and_slo(monkeypatch):
+    monkeypatch.delenv("CEDARPY_MODEL_POLICY", raising=False)
+    monkeypatch.setenv("CEDARPY_SMALL_MODEL", "gpt-5-mini")
+    kw = {"model": "gpt-5", "messages": _msgs("list my tables")}
+    assert choose_model(kw, "ResearchAgent")["model"] == "gpt-5"
+    assert choose_model(kw, "NotesAgent")["model"] == "gpt-5-mini"
+    assert choose_model(kw, "ChiefAgent")["model"] == "gpt-5-mini"
+    # Streams are only downgraded for clearly simple requests
+    assert choose_model({**kw, "stream": True}, "ChiefAgent")["model"] == "gpt-5"
+    assert choose_model({"model": "gpt-5", "messages": _msgs("2+2"), "stream": True}, "ChiefAgent")["model"] == "gpt-5-mini"
+    # A latency SLO the large model keeps missing moves "auto" calls to the small model
+    big = {"model": "gpt-5", "messages": _msgs("compare these two designs " + "z" * 300)}
+    assert choose_model(big, "CodeAgent")["model"] == "gpt-5"
+    monkeypatch.setenv("CEDARPY_MODEL_POLICY", json.dumps({"CodeAgent": {"tier": "auto", "slo_ms": 500}}))
+    monkeypatch.setattr(mr, "_stats", mr._Stats())
+    mr._stats.observe("gpt-5", 4000)
+    assert choose_model(big, "CodeAgent")["model"] == "gpt-5-mini"
+    monkeypatch.setenv("CEDARPY_MODEL_ROUTING", "0")
+    assert choose_model(kw, "NotesAgent")["model"] == "gpt-5"
+
+
+def test_params_are_adapted_between_model_families():
+    out = adapt_params({"model": "gpt-5", "max_completion_tokens": 50}, "gpt-4o-mini")
+    assert out == {"model": "gpt-4o-mini", "max_tokens": 50}
+    out = adapt_params({"model": "gpt-4o", "max_tokens": 50, "temperature": 0.3}, "gpt-5-mini")
+    assert out == {"model": "gpt-5-mini", "max_completion_tokens": 50}
+
+
+def test_invalid_small_answer_escalates(monkeypatch):
+    monkeypatch.delenv("CEDARPY_MODEL_POLICY", raising=False)
+    monkeypatch.setenv("CEDARPY_SMALL_MODEL", "gpt-5-mini")
+    seen = []
+
+    class Completions:
+        async def create(self, **kwargs):
+            seen.append(kwargs["model"])
+            content = "sure, the answer is 4" if kwargs["model"] == "gpt-5-mini" else '{"decision": "final"}'
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(
+                message=types.SimpleNamespace(content=content), finish_reason="stop")])
+
+    client = RoutedLLMClient(types.SimpleNamespace(chat=types.SimpleNamespace(completions=Completions())))
+
+    async def main():
+        return await run_as_agent("ChiefAgent", client.chat.completions.create(model="gpt-5", messages=_msgs("2+2")))
+
+    response = asyncio.run(main())
+    assert seen == ["gpt-5-mini", "gpt-5"]
+    assert response.choices[0].message.content == '{"decision": "final"}'
@@ -0,0 +1,96 @@
+import os
+import sys
+import types
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.query_budget import (
+    QueryBudget, BudgetExceeded, BudgetedLLMClient, current_budget, cap_timeout, price_for,
+)
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="ok"))],
+            usage=types.SimpleNamespace(prompt_tokens=1000, completion_tokens=200),
+        )
+
+    async def _stream(self):
+        for part in ("abcd" * 10, "efgh" * 10):
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=part))], usage=None)
+
+
+def _client():
+    fake = FakeCompletions()
+    return BudgetedLLMClient(types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake))), fake
+
+
+def test_usage_is_charged_and_calls_refused_when_spent():
+    client, fake = _client()
+    budget = QueryBudget(max_llm_calls=2, max_tokens=0, max_wall_s=0, max_cost_usd=0)
+
+    async def main():
+        token = current_budget.set(budget)
+        try:
+            await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}])
+            stream = await client.chat.completions.create(model="gpt-4o-mini", messages=[], stream=True)
+            async for _ in stream:
+                pass
+            with pytest.raises(BudgetExceeded) as info:
+                await client.chat.completions.create(model="gpt-4o-mini", messages=[])
+            assert info.value.reason == "llm_calls"
+        finally:
+            current_budget.reset(token)
+        # Outside an orchestration nothing is enforced
+        await client.chat.completions.create(model="gpt-4o-mini", messages=[])
+
+    asyncio.run(main())
+    assert fake.calls == 3
+    d = budget.to_dict()
+    assert d["llm_calls"] == 2 and d["refused_calls"] == 1 and d["exhausted"] == "llm_calls"
+    assert d["prompt_tokens"] == 1000 and d["completion_tokens"] == 200 + 20
+    assert d["estimated_tokens"] == 20
+    price_in, price_out = price_for("gpt-4o-mini-2024-07-18")
+    assert (price_in, price_out) == (0.15, 0.60)
+    assert d["cost_usd"] == pytest.approx((1000 * price_in + 220 * price_out) / 1e6)
+
+
+def test_token_and_cost_limits_and_budgets_are_per_task():
+    client, _ = _client()
+
+    async def one_query(max_tokens):
+        budget = QueryBudget(max_llm_calls=0, max_tokens=max_tokens, max_wall_s=0, max_cost_usd=0)
+        current_budget.set(budget)
+        await client.chat.completions.create(model="gpt-5", messages=[])
+        return budget
+
+    async def main():
+        return await asyncio.gather(one_query(1000), one_query(5000))
+
+    small, large = asyncio.run(main())
+    assert small.exhausted_reason() == "tokens" and large.exhausted_reason() is None
+    assert small.llm_calls == large.llm_calls == 1
+    assert large.nearly_exhausted(0.2) and not large.nearly_exhausted(0.5)
+    assert QueryBudget(max_llm_calls=0, max_tokens=0, max_wall_s=0, max_cost_usd=0.001).exhausted is False
+
+
+def test_cap_timeout_uses_remaining_wall_time():
+    budget = QueryBudget(max_llm_calls=0, max_tokens=0, max_wall_s=10, max_cost_usd=0)
+    assert cap_timeout(120, budget) <= 10
+    assert cap_timeout(3, budget) == 3
+    assert cap_timeout(0, budget) <= 10
+    assert cap_timeout(120, None) == 120
+    unlimited = QueryBudget(max_llm_calls=0, max_tokens=0, max_wall_s=0, max_cost_usd=0)
+    assert cap_timeout(0, unlimited) == 0
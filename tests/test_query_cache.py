@@ -0,0 +1,89 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.query_cache import QueryResultCache, normalize_sql, is_cacheable
+
+
+def _engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'qc.db'}", future=True)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t VALUES (1), (2)")
+    return eng
+
+
+def _loader(eng, sql, calls):
+    def load():
+        calls.append(sql)
+        with eng.connect() as conn:
+            return {"rows": [list(r) for r in conn.exec_driver_sql(sql).fetchall()]}
+    return load
+
+
+def test_hit_until_data_changes(tmp_path):
+    eng = _engine(tmp_path)
+    cache = QueryResultCache(max_entries=8)
+    calls = []
+    sql = "SELECT sum(x) FROM t"
+    assert cache.get_or_load(eng, sql, _loader(eng, sql, calls))["rows"] == [[3]]
+    # Whitespace differences normalize to the same key
+    assert cache.get_or_load(eng, "SELECT  sum(x)\n FROM t;", _loader(eng, sql, calls))["rows"] == [[3]]
+    assert len(calls) == 1 and cache.stats()["hits"] == 1
+
+    with eng.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO t VALUES (10)")
+    assert cache.get_or_load(eng, sql, _loader(eng, sql, calls))["rows"] == [[13]]
+    st = cache.stats()
+    assert len(calls) == 2 and st["stale"] == 1 and st["hit_rate"] == round(1 / 3, 4)
+
+
+def test_lru_eviction_and_bypass(tmp_path):
+    eng = _engine(tmp_path)
+    cache = QueryResultCache(max_entries=2)
+    calls = []
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3", "SELECT 2"):
+        cache.get_or_load(eng, sql, _loader(eng, sql, calls))
+    # SELECT 2 was least recently used when SELECT 3 arrived
+    assert calls == ["SELECT 1", "SELECT 2", "SELECT 3", "SELECT 2"]
+    assert cache.stats()["evictions"] == 2
+
+    cache.get_or_load(eng, "SELECT random()", _loader(eng, "SELECT random()", calls))
+    cache.get_or_load(eng, "SELECT random()", _loader(eng, "SELECT random()", calls))
+    assert calls.count("SELECT random()") == 2 and cache.stats()["bypassed"] == 2
+
+
+def test_normalize_and_cacheable():
+    assert normalize_sql("  SELECT  'a  b'\n,  x ;") == "SELECT 'a  b' , x"
+    assert is_cacheable("with q as (select 1) select * from q")
+    assert not is_cacheable("WITH q AS (SELECT 1) INSERT INTO t SELECT * FROM q")
+    assert not is_cacheable("SELECT datetime('now')")
+    assert not is_cacheable("PRAGMA user_version = 3")
+
+
+def test_probe_connections_are_bounded_and_released(tmp_path):
+    import sqlite3
+    import pytest
+    engines = []
+    for i in range(3):
+        eng = create_engine(f"sqlite:///{tmp_path / f'p{i}.db'}", future=True)
+        with eng.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        engines.append(eng)
+    cache = QueryResultCache(max_entries=8, max_probes=2)
+    for eng in engines:
+        cache.get_or_load(eng, "SELECT count(*) FROM t", _loader(eng, "SELECT count(*) FROM t", []))
+    assert cache.stats()["probes"] == 2 and str(engines[0].url.database) not in cache._probes
+    probe = cache._probes[engines[2].url.database][0]
+    cache.forget(engines[2])
+    st = cache.stats()
+    assert st["probes"] == 1 and st["entries"] == 2
+    with pytest.raises(sqlite3.ProgrammingError):  # closed
+        probe.execute("SELECT 1")
+    cache.close()
+    assert cache.stats()["probes"] == 0
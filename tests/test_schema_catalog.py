@@ -0,0 +1,44 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.schema_catalog import catalog_for_connection, schema_catalog_stats
+from cedar_app.utils.sql_utils import _get_pk_columns, _table_has_branch_columns
+
+
+def test_catalog_cached_until_schema_version_changes(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'cat.db'}", future=True)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY, project_id INTEGER, branch_id INTEGER, body TEXT)")
+        conn.exec_driver_sql("CREATE INDEX ix_t_body ON t(body)")
+        conn.exec_driver_sql("CREATE TABLE plain (a TEXT, b TEXT, PRIMARY KEY (b, a))")
+
+    with eng.connect() as conn:
+        cat = catalog_for_connection(conn)
+        t = cat.table("t")
+        assert t.branch_aware is True
+        assert t.pk_columns == ["id"]
+        assert [i.columns for i in t.indexes] == [["body"]]
+        assert cat.table("PLAIN").pk_columns == ["b", "a"]
+        assert _table_has_branch_columns(conn, "plain") is False
+        assert _get_pk_columns(conn, "t") == ["id"]
+
+        before = schema_catalog_stats()["rebuilds"]
+        # Data changes do not invalidate the catalog
+        conn.exec_driver_sql("INSERT INTO t (project_id, branch_id, body) VALUES (1, 1, 'x')")
+        assert catalog_for_connection(conn) is cat
+        assert schema_catalog_stats()["rebuilds"] == before
+
+    with eng.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE plain ADD COLUMN project_id INTEGER")
+        conn.exec_driver_sql("ALTER TABLE plain ADD COLUMN branch_id INTEGER")
+    with eng.connect() as conn:
+        cat2 = catalog_for_connection(conn)
+        assert cat2 is not cat
+        assert cat2.table("plain").branch_aware is True
+        assert "plain" in cat2.describe()
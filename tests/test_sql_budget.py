@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.sql_budget import QueryBudget, QueryGuard, QueryCancelled
+from cedar_app.utils.sql_stream import SQLCursor
+
+# Counts to a very large number; would run for minutes without a budget
+RUNAWAY = "WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < 1000000000) SELECT count(*) FROM s"
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'budget.db'}", future=True)
+
+
+def test_timeout_interrupts_runaway_query(tmp_path):
+    eng = _engine(tmp_path)
+    guard = QueryGuard(QueryBudget(timeout_ms=150))
+    t0 = time.monotonic()
+    with pytest.raises(QueryCancelled) as ei:
+        with eng.connect() as conn, guard.active(conn):
+            conn.exec_driver_sql(RUNAWAY).fetchall()
+    assert time.monotonic() - t0 < 5
+    rep = ei.value.report
+    assert rep["cancelled"] is True and rep["reason"] == "timeout"
+    assert rep["elapsed_ms"] >= 150 and rep["vm_steps"] > 0
+    # Connection is usable again after the interrupt
+    with eng.connect() as conn, QueryGuard(QueryBudget(timeout_ms=1000)).active(conn):
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+
+
+def test_step_budget(tmp_path):
+    eng = _engine(tmp_path)
+    guard = QueryGuard(QueryBudget(max_steps=50000))
+    with pytest.raises(QueryCancelled) as ei:
+        with eng.connect() as conn, guard.active(conn):
+            conn.exec_driver_sql(RUNAWAY).fetchall()
+    assert ei.value.report["reason"] == "max_steps"
+
+
+def test_cancel_from_other_thread_stops_streaming_cursor(tmp_path):
+    eng = _engine(tmp_path)
+    guard = QueryGuard(QueryBudget(timeout_ms=0))
+    threading.Timer(0.2, guard.cancel).start()
+    with pytest.raises(QueryCancelled) as ei:
+        SQLCursor(eng, RUNAWAY, guard=guard)
+    assert ei.value.report["reason"] == "client"
+
+
+def test_override_and_no_budget():
+    base = QueryBudget(timeout_ms=30000, max_steps=0)
+    o = base.override({"timeout_ms": "500", "max_steps": None})
+    assert o.to_dict() == {"timeout_ms": 500, "max_steps": 0}
+    assert base.timeout_ms == 30000
@@ -0,0 +1,127 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from main_models import SQLUndoLog
+from cedar_app.utils.sql_journal import run_journaled, find_undo_log, undo_changeset_log, is_journaled_statement
+
+
+def _engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'journal.db'}", future=True)
+    SQLUndoLog.__table__.create(eng)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE a (id INTEGER PRIMARY KEY, v TEXT, b BLOB)")
+        conn.exec_driver_sql("CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER) WITHOUT ROWID")
+        conn.exec_driver_sql("CREATE TABLE plain (x INTEGER)")
+        conn.exec_driver_sql("INSERT INTO a (id, v, b) VALUES (1, 'one', x'00ff'), (2, 'two', NULL)")
+        conn.exec_driver_sql("INSERT INTO kv VALUES ('a', 1), ('b', 2)")
+        conn.exec_driver_sql("INSERT INTO plain VALUES (10), (20)")
+    return eng
+
+
+def _snapshot(eng):
+    with eng.connect() as conn:
+        return {
+            t: conn.exec_driver_sql(f"SELECT rowid, * FROM {t} ORDER BY 1" if t != "kv" else "SELECT * FROM kv ORDER BY k").fetchall()
+            for t in ("a", "kv", "plain")
+        }
+
+
+def _run(eng, sql):
+    with eng.begin() as conn:
+        return run_journaled(conn, sql, project_id=1, branch_id=1)
+
+
+def _undo(eng, log_id=None):
+    with eng.begin() as conn:
+        row = find_undo_log(conn, 1, log_id=log_id)
+        return undo_changeset_log(conn, row)
+
+
+def test_undo_roundtrip_for_each_statement_kind(tmp_path):
+    eng = _engine(tmp_path)
+    before = _snapshot(eng)
+    for sql in (
+        "INSERT INTO a (v) VALUES ('three')",
+        "UPDATE a SET v = upper(v), b = NULL",
+        "UPDATE a SET id = id + 100 WHERE id = 1",
+        "DELETE FROM a WHERE id = 2",
+        "UPDATE kv SET k = k || '2', v = v * 10",
+        "DELETE FROM plain WHERE x = 10",
+        "UPDATE plain SET x = x + 1",
+        "INSERT INTO kv VALUES ('a', 5) ON CONFLICT(k) DO UPDATE SET v = excluded.v",
+        "WITH s AS (SELECT 7 AS n) INSERT INTO plain SELECT n FROM s",
+    ):
+        out = _run(eng, sql)
+        assert out["undo_log_id"] is not None, sql
+        assert out["changes"] >= 1
+        assert _undo(eng, out["undo_log_id"]) == out["changes"]
+        assert _snapshot(eng) == before, sql
+
+
+def test_replace_keeps_the_replaced_row(tmp_path):
+    eng = _engine(tmp_path)
+    before = _snapshot(eng)
+    for sql in (
+        "INSERT OR REPLACE INTO a (id, v) VALUES (1, 'new')",
+        "REPLACE INTO kv VALUES ('a', 99)",
+        "INSERT INTO a (id, v) VALUES (2, 'upsert') ON CONFLICT(id) DO UPDATE SET v = excluded.v",
+    ):
+        out = _run(eng, sql)
+        assert out["undo_log_id"] is not None, sql
+        with eng.connect() as conn:
+            row = find_undo_log(conn, 1, log_id=out["undo_log_id"])
+        if "ON CONFLICT" in sql:
+            assert [c[1] for c in row.rows_before] == ["u"] and row.rows_before[0][4]["v"] == "two"
+        else:
+            # The replaced row's pre-image is journaled before the new row
+            assert [c[1] for c in row.rows_before] == ["d", "i"], sql
+        assert _undo(eng, out["undo_log_id"]) == out["changes"]
+        assert _snapshot(eng) == before, sql
+    with eng.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA recursive_triggers").scalar() == 0
+
+
+def test_multi_statement_history_undone_in_reverse(tmp_path):
+    eng = _engine(tmp_path)
+    before = _snapshot(eng)
+    _run(eng, "INSERT INTO plain VALUES (30)")
+    _run(eng, "DELETE FROM plain")
+    _run(eng, "INSERT INTO a (v) SELECT 'copy ' || x FROM plain")  # no rows left: nothing journaled
+    assert _undo(eng) == 3  # the DELETE
+    assert _undo(eng) == 1  # the INSERT
+    assert _snapshot(eng) == before
+    with eng.connect() as conn:
+        assert find_undo_log(conn, 1) is None
+
+
+def test_writes_outside_journal_are_not_recorded(tmp_path):
+    eng = _engine(tmp_path)
+    _run(eng, "INSERT INTO plain VALUES (1)")  # installs triggers on the pooled connection
+    with eng.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO plain VALUES (2)")
+        assert conn.exec_driver_sql("SELECT count(*) FROM temp._cedar_undo_changes").scalar() == 0
+        assert conn.exec_driver_sql("SELECT count(*) FROM sql_undo_log").scalar() == 1
+
+
+def test_schema_change_rebuilds_triggers(tmp_path):
+    eng = _engine(tmp_path)
+    _run(eng, "INSERT INTO plain VALUES (1)")
+    with eng.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE plain ADD COLUMN y TEXT")
+    out = _run(eng, "UPDATE plain SET y = 'set'")
+    with eng.begin() as conn:
+        changes = find_undo_log(conn, 1, log_id=out["undo_log_id"]).rows_before
+    assert all("y" in c[4] for c in changes)
+
+
+def test_is_journaled_statement():
+    assert is_journaled_statement("update t set x=1")
+    assert is_journaled_statement("WITH s AS (SELECT 1) DELETE FROM t")
+    assert not is_journaled_statement("WITH s AS (SELECT 1) SELECT * FROM s")
+    assert not is_journaled_statement("CREATE TABLE t (x)")
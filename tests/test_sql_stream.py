@@ -0,0 +1,128 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils.sql_stream import SQLCursor, CursorRegistry, is_read_statement
+
+
+def _engine(tmp_path, n_rows):
+    eng = create_engine(f"sqlite:///{tmp_path / 'stream.db'}", future=True)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE big (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.exec_driver_sql(
+            "WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < ?) "
+            "INSERT INTO big (id, name) SELECT i, 'n' || i FROM s",
+            (n_rows,),
+        )
+    return eng
+
+
+def test_cursor_pages_columnar_until_exhausted(tmp_path):
+    eng = _engine(tmp_path, 250)
+    cur = SQLCursor(eng, "SELECT id, name FROM big ORDER BY id", page_size=100)
+    reg = CursorRegistry()
+    p1 = cur.fetch_page()
+    reg.add(cur)
+    assert p1["columns"] == ["id", "name"]
+    assert p1["row_count"] == 100 and p1["has_more"] is True
+    assert p1["data"][0][:3] == [1, 2, 3] and p1["data"][1][0] == "n1"
+
+    p2 = cur.fetch_page()
+    assert p2["data"][0][0] == 101 and p2["has_more"] is True
+    p3 = cur.fetch_page()
+    assert p3["row_count"] == 50 and p3["has_more"] is False
+    assert p3["rows_sent"] == 250
+    assert cur.closed
+    reg.release_if_done(cur)
+    assert len(reg) == 0
+
+
+def test_exact_multiple_has_no_phantom_page(tmp_path):
+    eng = _engine(tmp_path, 100)
+    cur = SQLCursor(eng, "SELECT id FROM big", page_size=100, fmt="rows")
+    page = cur.fetch_page()
+    assert page["row_count"] == 100 and page["has_more"] is False
+    assert page["rows"][0] == [1]
+
+
+def test_cancel_releases_read_lock(tmp_path):
+    eng = _engine(tmp_path, 1000)
+    reg = CursorRegistry(max_open=2)
+    cur = SQLCursor(eng, "SELECT * FROM big", page_size=10)
+    cur.fetch_page()
+    reg.add(cur)
+    assert reg.close(cur.id) is True
+    assert reg.get(cur.id) is None
+    # Writer is not blocked once the cursor is gone
+    with eng.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM big WHERE id > 10")
+    # Registry evicts the least recently used cursor when full
+    a = SQLCursor(eng, "SELECT * FROM big", page_size=1); a.fetch_page(); reg.add(a)
+    b = SQLCursor(eng, "SELECT * FROM big", page_size=1); b.fetch_page(); reg.add(b)
+    c = SQLCursor(eng, "SELECT * FROM big", page_size=1); c.fetch_page(); reg.add(c)
+    assert len(reg) == 2 and reg.get(a.id) is None and a.closed
+    reg.close_all()
+
+
+def test_is_read_statement():
+    assert is_read_statement("  select 1")
+    assert is_read_statement("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert not is_read_statement("INSERT INTO t VALUES (1)")
+    assert not is_read_statement("")
+
+
+_WS_READS_SCRIPT = r"""
+import re, json, sys
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+import main
+from main_models import ChangelogEntry
+from cedar_app.db_utils import _get_project_engine
+
+table = sys.argv[1]
+client = TestClient(main.app)
+r = client.post("/projects/create", data={"title": "SQL changelog"}, follow_redirects=False)
+pid = int(re.search(r"/project/(\d+)", r.headers["location"]).group(1))
+with client.websocket_connect(f"/ws/sqlx/{pid}?token=tok") as ws:
+    ws.send_text(json.dumps({"action": "exec", "sql": f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)"}))
+    assert json.loads(ws.receive_text())["ok"] is True
+    ws.send_text(json.dumps({"action": "exec", "sql": "WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < 30) SELECT i FROM s",
+                             "page_size": 10}))
+    first = json.loads(ws.receive_text())
+    assert first["has_more"] is True
+    ws.send_text(json.dumps({"action": "next", "cursor_id": first["cursor_id"]}))
+    assert json.loads(ws.receive_text())["ok"] is True
+
+db = sessionmaker(bind=_get_project_engine(pid), future=True)()
+try:
+    logged = [e.input_json["sql"] for e in db.query(ChangelogEntry).filter(ChangelogEntry.action == "sql.exec").all()]
+finally:
+    db.close()
+print("LOGGED=" + json.dumps(logged))
+"""
+
+
+def test_ws_reads_are_logged_once_per_exec(tmp_path):
+    # main binds its data dir, registry and project paths at import time, so the
+    # app runs in a fresh interpreter pointed at tmp_path instead of ~/CedarPyData
+    import json
+    import uuid
+    import subprocess
+
+    data_dir = tmp_path / "CedarPyData"
+    env = dict(os.environ, HOME=str(tmp_path), CEDARPY_DATA_DIR=str(data_dir),
+               CEDARPY_DATABASE_URL=f"sqlite:///{data_dir / 'cedarpy-registry.db'}",
+               CEDARPY_SHELL_API_ENABLED="1", CEDARPY_SHELL_API_TOKEN="tok", CEDARPY_OPEN_BROWSER="0")
+    table = f"t_ws_reads_{uuid.uuid4().hex[:8]}"
+    proc = subprocess.run([sys.executable, "-c", _WS_READS_SCRIPT, table], cwd=_REPO_ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    line = [ln for ln in proc.stdout.splitlines() if ln.startswith("LOGGED=")][-1]
+    logged = json.loads(line[len("LOGGED="):])
+    assert len(logged) == 2 and logged[0] == f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)"
+    assert logged[1].startswith("WITH RECURSIVE")
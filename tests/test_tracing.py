@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.utils import tracing
+from cedar_app.utils.tracing import (
+    TraceStore, TracedWebSocket, critical_path, instrument, span, timeline, trace, traced, instrument_sqlalchemy,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+@instrument("tool.shell", kind="client", attributes=lambda command: {"command": command},
+            result_attributes=lambda code: {"exit_code": code})
+async def fake_shell(command):
+    await asyncio.sleep(0.01)
+    return 0
+
+
+def test_chat_message_trace_is_stored_with_agents_tools_and_ws_sends(tmp_path, monkeypatch):
+    store = TraceStore(path=str(tmp_path / "traces.sqlite"), otlp_dir=str(tmp_path / "otlp"))
+    monkeypatch.setattr(tracing, "_store", store)
+    ws = TracedWebSocket(FakeWebSocket())
+
+    async def agent(name, delay):
+        await asyncio.sleep(delay)
+        await fake_shell(f"echo {name}")
+        return name
+
+    async def orchestrate():
+        with trace("chat.message", project_id=3, chat_number=7) as root:
+            with span("think"):
+                await asyncio.sleep(0.005)
+            tasks = [asyncio.ensure_future(traced(f"agent.{n}", agent(n, d))) for n, d in (("Fast", 0.0), ("Slow", 0.05))]
+            await asyncio.gather(*tasks)
+            for _ in range(3):
+                await ws.send_json({"type": "final_delta", "delta": "x"})
+            await ws.send_json({"type": "final", "text": "done"})
+            return root.trace_id
+
+    trace_id = asyncio.run(orchestrate())
+    assert ws._ws.sent[-1]["trace_id"] == trace_id
+    assert asyncio.run(fake_shell("outside a trace")) == 0  # nothing recorded, no error
+
+    data = store.get(trace_id)
+    names = sorted(s["name"] for s in data["spans"])
+    assert names == ["agent.Fast", "agent.Slow", "chat.message", "think", "tool.shell", "tool.shell", "ws.send"]
+    by_name = {s["name"]: s for s in data["spans"]}
+    root_id = by_name["chat.message"]["span_id"]
+    assert by_name["agent.Slow"]["parent_id"] == root_id and by_name["think"]["parent_id"] == root_id
+    assert by_name["chat.message"]["attributes"]["ws.final_delta"] == 3
+    shells = [s for s in data["spans"] if s["name"] == "tool.shell"]
+    assert {s["parent_id"] for s in shells} == {by_name["agent.Fast"]["span_id"], by_name["agent.Slow"]["span_id"]}
+    assert shells[0]["attributes"]["exit_code"] == 0
+
+    # The slow agent (and its shell call) is on the critical path, the fast one is not
+    crit = [next(s["name"] for s in data["spans"] if s["span_id"] == sid) for sid in critical_path(data["spans"])]
+    assert crit[:2] == ["chat.message", "think"] and "agent.Slow" in crit and "agent.Fast" not in crit
+    tl = timeline(data)
+    assert tl["rows"][0]["name"] == "chat.message" and tl["rows"][0]["depth"] == 0
+    assert tl["critical_ms_by_category"]["agent"] > 0
+
+    assert [t["trace_id"] for t in store.list(project_id=3, chat_number=7)] == [trace_id]
+    otlp = json.load(open(tmp_path / "otlp" / f"{trace_id}.json"))
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 7 and all(s["traceId"] == trace_id for s in spans)
+    assert any(a["key"] == "chat_number" and a["value"] == {"intValue": "7"} for a in next(s for s in spans if s["name"] == "chat.message")["attributes"])
+
+
+def test_db_queries_errors_and_pruning(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, text
+
+    store = TraceStore(path=str(tmp_path / "traces.sqlite"), max_traces=2)
+    monkeypatch.setattr(tracing, "_store", store)
+    assert instrument_sqlalchemy()
+    engine = create_engine(f"sqlite:///{tmp_path / 'p.db'}")
+
+    ids = []
+    for i in range(3):
+        try:
+            with trace("chat.message") as root:
+                ids.append(root.trace_id)
+                with engine.begin() as conn:
+                    conn.execute(text("CREATE TABLE IF NOT EXISTS t (x INTEGER)"))
+                    conn.execute(text("INSERT INTO t VALUES (1)"))
+                if i == 2:
+                    raise ValueError("boom")
+        except ValueError:
+            pass
+    with engine.begin() as conn:  # outside a trace
+        conn.execute(text("SELECT 1"))
+
+    assert store.get(ids[0]) is None  # pruned
+    last = store.get(ids[2])
+    assert last["status"] == "error" and "boom" in last["attributes"]["error"]
+    queries = [s for s in last["spans"] if s["name"] == "db.query"]
+    assert [q["attributes"]["statement"] for q in queries] == ["CREATE TABLE IF NOT EXISTS t (x INTEGER)", "INSERT INTO t VALUES (1)"]
+    assert queries[1]["attributes"]["rows"] == 1
+    assert store.snapshot()["stored"] == 2
+
+
+def test_traces_are_written_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    store = TraceStore(path=str(tmp_path / "traces.sqlite"), flush_s=30)
+    monkeypatch.setattr(tracing, "_store", store)
+    writers = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda t: (writers.append(threading.current_thread().name), save(t)))
+
+    async def orchestrate():
+        with trace("chat.message", project_id=1) as root:
+            await asyncio.sleep(0)
+        return root.trace_id
+
+    trace_id = asyncio.run(orchestrate())
+    assert writers == [] and store.stats["queued"] == 1  # not written by the finishing (event loop) thread
+
+    store._wake.set()
+    deadline = time.monotonic() + 2
+    while not writers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writers == ["cedar-trace-store"]
+    assert store.get(trace_id)["project_id"] == 1
+
+    # Reads see traces that are still queued
+    trace_id = asyncio.run(orchestrate())
+    assert store.get(trace_id) is not None and store.snapshot()["stored"] == 2
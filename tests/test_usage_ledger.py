@@ -0,0 +1,113 @@
+import os
+import sys
+import types
+import sqlite3
+import asyncio
+
+import pytest
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cedar_app.llm.gateway import LLMGateway, RetryPolicy
+from cedar_app.llm.response_cache import LLMResponseCache, llm_cache
+from cedar_app.llm.scheduler import llm_lane
+from cedar_app.llm.usage_ledger import UsageLedger, llm_usage, usage_cost
+from cedar_app.utils.model_router import run_as_agent
+
+
+def _completion(text, prompt=100, completion=20, cached=0):
+    msg = types.SimpleNamespace(role="assistant", content=text, tool_calls=None)
+    usage = types.SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion,
+                                  prompt_tokens_details=types.SimpleNamespace(cached_tokens=cached))
+    return types.SimpleNamespace(id="c1", object="chat.completion", created=1, model="gpt-5-mini",
+                                 choices=[types.SimpleNamespace(index=0, finish_reason="stop", message=msg)], usage=usage)
+
+
+class Completions:
+    def __init__(self):
+        self.fail = False
+
+    async def create(self, **kwargs):
+        if self.fail:
+            raise ValueError("bad request")
+        if not kwargs.get("stream"):
+            return _completion("ok", cached=40)
+
+        async def stream():
+            for piece in ("x" * 40, "y" * 40):
+                yield types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(index=0, delta=types.SimpleNamespace(content=piece), finish_reason=None)])
+        return stream()
+
+
+def _gateway(completions, tmp_path, ledger):
+    factory = lambda key: types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return LLMGateway(policy=RetryPolicy(max_retries=0, base_s=0, max_s=0), async_factory=factory,
+                      cache=LLMResponseCache(path=str(tmp_path / "llm.sqlite")), ledger=ledger)
+
+
+def test_calls_are_attributed_and_rolled_up(tmp_path):
+    now = [1_760_000_000.0]
+    ledger = UsageLedger(path=str(tmp_path / "usage.sqlite"), flush_s=0, clock=lambda: now[0])
+    completions = Completions()
+    client = _gateway(completions, tmp_path, ledger).async_client("sk-test")
+    messages = [{"role": "user", "content": "hello " * 50}]
+
+    async def main():
+        with llm_lane("interactive", 3), llm_usage("chat", thread="chat:7"):
+            await run_as_agent("SQLAgent", client.chat.completions.create(model="gpt-5-mini", messages=messages))
+            stream = await run_as_agent("ChiefAgent", client.chat.completions.create(model="gpt-5-mini", messages=messages, stream=True))
+            async for _ in stream:
+                pass
+        with llm_lane("batch"), llm_usage("classify_file"), llm_cache():
+            await client.chat.completions.create(model="gpt-5-mini", messages=messages)
+            await client.chat.completions.create(model="gpt-5-mini", messages=messages)  # response cache hit
+        completions.fail = True
+        with pytest.raises(ValueError):
+            await client.chat.completions.create(model="gpt-5-mini", messages=messages)
+
+    asyncio.run(main())
+    calls = ledger.recent()
+    assert [c["status"] for c in calls] == ["error", "cache_hit", "ok", "ok", "ok"]
+    sql_call = calls[-1]
+    assert (sql_call["project_id"], sql_call["thread"], sql_call["agent"], sql_call["feature"], sql_call["lane"]) == (3, "chat:7", "SQLAgent", "chat", "interactive")
+    assert (sql_call["prompt_tokens"], sql_call["completion_tokens"], sql_call["cached_tokens"]) == (100, 20, 40)
+    assert sql_call["cost_usd"] == pytest.approx(usage_cost("gpt-5-mini", 100, 20, 40)) and sql_call["latency_ms"] >= 0
+    streamed = calls[-2]
+    assert streamed["agent"] == "ChiefAgent" and streamed["stream"] == 1 and streamed["estimated"] == 1 and streamed["completion_tokens"] == 20
+    assert calls[1]["cost_usd"] == 0 and calls[1]["total_tokens"] == 0 and calls[1]["feature"] == "classify_file"
+
+    by_feature = {r["feature"]: r for r in ledger.rollup(group_by=["feature"])}
+    assert by_feature["chat"]["calls"] == 2 and by_feature["classify_file"]["calls"] == 2
+    assert by_feature["classify_file"]["cache_hits"] == 1 and by_feature["other"]["errors"] == 1
+    by_agent_day = ledger.rollup(group_by=["agent", "day"], project=3)
+    assert sorted(r["agent"] for r in by_agent_day) == ["ChiefAgent", "SQLAgent"] and by_agent_day[0]["day"] == "2025-10-09"
+
+    # Append-only
+    conn = sqlite3.connect(ledger.path)
+    with pytest.raises(sqlite3.DatabaseError):
+        conn.execute("DELETE FROM llm_usage")
+    with pytest.raises(sqlite3.DatabaseError):
+        conn.execute("UPDATE llm_usage SET cost_usd = 0")
+
+
+def test_budget_alerts(tmp_path):
+    now = [1_760_000_000.0]
+    ledger = UsageLedger(path=str(tmp_path / "usage.sqlite"), flush_s=60, clock=lambda: now[0])
+    for _ in range(3):
+        ledger.record(model="gpt-5", prompt_tokens=100_000, completion_tokens=10_000, project_id=3, feature="chat", agent="ResearchAgent")
+    ledger.record(model="gpt-5-mini", prompt_tokens=1000, completion_tokens=100, project_id=4, feature="classify_file")
+    assert ledger.snapshot()["pending"] == 4  # buffered; reads flush first
+
+    report = ledger.check_budgets({
+        "project:3": {"daily_usd": 0.5},        # 3 x $0.225 = $0.675: over
+        "*": {"daily_tokens": 400_000},          # 331,100 tokens: warning only
+        "feature:classify_file": {"daily_usd": 1},
+        "agent:ResearchAgent": {"monthly_usd": 10},
+    }, warn_at=0.8)
+    assert not report["ok"]
+    assert [(a["scope"], a["over"]) for a in report["alerts"]] == [("project:3", True), ("*", False)]
+
+    now[0] += 86400  # next day: the daily windows are empty again
+    assert ledger.check_budgets({"project:3": {"daily_usd": 0.5}})["ok"]